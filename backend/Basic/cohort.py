@@ -0,0 +1,115 @@
+"""
+Age-sex cohort aggregation for CohortView.
+
+The population is summed in SQL, in one grouped query per request, over
+(year, [rollup location], age_group, gender), and the rows are pivoted into
+the {age_group: {male, female, total}, 'total': {...}} shape the frontend
+reads. Results are cached per selection; signals.py bumps the data version
+whenever PopulationCohort changes.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import Lower
+
+from .data_versions import bump_version, get_version
+from .models import PopulationCohort
+
+ROLLUP_FIELDS = {
+    'village': 'village_code',
+    'subdistrict': 'subdistrict_code',
+    'district': 'district_code',
+}
+
+CACHE_TIMEOUT = 60 * 15  # 15 minutes
+VERSION_KEY = "cohort_data_version"
+
+
+def bump_cohort_version():
+    """Invalidate every cached cohort result"""
+    bump_version(VERSION_KEY)
+
+
+def cohort_cache_key(selection, years, rollup):
+    version = get_version(VERSION_KEY)
+    payload = json.dumps({'selection': selection, 'years': sorted(years), 'rollup': rollup}, sort_keys=True)
+    return f"cohort_{version}_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}"
+
+
+class _Pivot:
+    """Accumulates grouped rows the way organize_cohort_data did"""
+
+    def __init__(self):
+        self.groups = {}
+        self.male = 0
+        self.female = 0
+        self.overall = 0
+
+    def add(self, age_group, gender, population):
+        group = self.groups.setdefault(age_group, {'male': 0, 'female': 0, 'total': 0})
+        if gender == 'male':
+            group['male'] += population
+            self.male += population
+        elif gender == 'female':
+            group['female'] += population
+            self.female += population
+        group['total'] = group['male'] + group['female']
+        self.overall += population
+
+    def result(self):
+        if not self.groups:
+            return {}
+        return {**self.groups, 'total': {'male': self.male, 'female': self.female, 'total': self.overall}}
+
+
+def aggregate_cohorts(location_filter, years, rollup=None):
+    """
+    Cohort pivots for every year in one grouped query.
+
+    Returns {year: {'records': n, 'data': pivot}} for years with rows; with
+    a rollup level each entry also has 'by_<level>': {code: pivot}.
+    """
+    group_fields = ['year'] + ([ROLLUP_FIELDS[rollup]] if rollup else []) + ['age_group', 'gender_key']
+    rows = (
+        PopulationCohort.objects
+        .filter(location_filter, year__in=years)
+        .annotate(gender_key=Lower('gender'))
+        .values(*group_fields)
+        .annotate(population=Sum('population'), records=Count('id'), first_id=Min('id'))
+        .order_by('first_id')  # age groups keep the order rows were loaded in
+    )
+
+    totals, by_location, records = {}, {}, {}
+    for row in rows:
+        year = row['year']
+        totals.setdefault(year, _Pivot()).add(row['age_group'], row['gender_key'], row['population'])
+        records[year] = records.get(year, 0) + row['records']
+        if rollup:
+            code = str(row[ROLLUP_FIELDS[rollup]])
+            by_location.setdefault(year, {}).setdefault(code, _Pivot()).add(
+                row['age_group'], row['gender_key'], row['population']
+            )
+
+    output = {}
+    for year, pivot in totals.items():
+        output[year] = {'records': records[year], 'data': pivot.result()}
+        if rollup:
+            output[year][f'by_{rollup}'] = {
+                code: location_pivot.result() for code, location_pivot in by_location[year].items()
+            }
+    return output
+
+
+def cached_cohorts(location_filter, selection, years, rollup=None):
+    """aggregate_cohorts, cached per (selection, years, rollup)"""
+    key = cohort_cache_key(selection, years, rollup)
+    result = cache.get(key)
+    if result is None:
+        result = aggregate_cohorts(location_filter, years, rollup)
+        cache.set(key, result, CACHE_TIMEOUT)
+    else:
+        print(f"Cohort cache hit for {len(years)} year(s)")
+    return result
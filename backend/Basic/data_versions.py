@@ -0,0 +1,34 @@
+"""
+Data versions shared by every worker process.
+
+Caches keyed by a data version (census history, cohort pivots, wells
+tables, the SWA climatology) read it from the data_version table. A bump is
+one UPDATE ... SET version = version + 1, so concurrent signal handlers
+never lose one, and unlike a cache key the row is never culled.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+
+def bump_version(name):
+    """Atomically increment a data version (created at 1 on first bump)"""
+    if DataVersion.objects.filter(name=name).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(name=name, version=1)
+    except IntegrityError:
+        # Another worker created it meanwhile
+        DataVersion.objects.filter(name=name).update(version=F('version') + 1)
+
+
+def get_version(name):
+    """Current version of a data set, 0 if it was never bumped"""
+    return DataVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def set_version(name, version):
+    DataVersion.objects.update_or_create(name=name, defaults={'version': version})
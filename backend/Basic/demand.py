@@ -0,0 +1,138 @@
+"""
+Batch water-demand scenarios.
+
+Evaluates many demand scenarios (per-capita norm, floating population,
+institutional load, projection method) for a set of villages and horizon
+years in one go. Populations come from the projection engine in service.py
+once per request; every scenario is then plain array arithmetic over a
+(scenarios x villages x years) cube using the same formulas as the
+single-scenario calculators in views.py.
+"""
+
+import numpy as np
+
+from .service import METHODS, project_population
+
+# Litres per head per day by facility type (FloatingWaterDemandCalculationAPIView)
+FLOATING_FACILITY_LPCD = {
+    "provided": 45,
+    "notprovided": 25,
+    "onlypublic": 15,
+}
+
+# (count field, load field, litres per unit) (InstitutionalWaterDemandCalculationAPIView)
+INSTITUTIONAL_NORMS = [
+    ("hospitals100Units", "beds100", 450),
+    ("hospitalsLess100", "bedsLess100", 350),
+    ("hotels", "bedsHotels", 180),
+    ("hostels", "residentsHostels", 135),
+    ("nursesHome", "residentsNursesHome", 135),
+    ("boardingSchools", "studentsBoardingSchools", 135),
+    ("restaurants", "seatsRestaurants", 70),
+    ("airportsSeaports", "populationLoadAirports", 70),
+    ("junctionStations", "populationLoadJunction", 70),
+    ("terminalStations", "populationLoadTerminal", 45),
+    ("intermediateBathing", "populationLoadBathing", 45),
+    ("intermediateNoBathing", "populationLoadNoBathing", 25),
+    ("daySchools", "studentsDaySchools", 45),
+    ("offices", "employeesOffices", 45),
+    ("factorieswashrooms", "employeesFactories", 45),
+    ("factoriesnoWashrooms", "employeesFactoriesNoWashrooms", 30),
+    ("cinemas", "populationLoadCinemas", 15),
+]
+
+COMPONENTS = ["domestic", "floating", "institutional", "total"]
+MAX_SCENARIOS = 200
+
+
+def institutional_base_demand(fields):
+    """Institutional demand (MLD) at the base year for one set of institutional fields"""
+    if not fields:
+        return 0.0
+    return sum(
+        float(fields.get(count, 0) or 0) * float(fields.get(load, 0) or 0) * lpcd
+        for count, load, lpcd in INSTITUTIONAL_NORMS
+    ) / 1000000.0
+
+
+def parse_scenarios(scenarios):
+    """
+    Validate scenario dicts into parameter arrays. Raises ValueError with a
+    message naming the first bad scenario.
+    """
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError("'scenarios' must be a non-empty list.")
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios can be evaluated per request.")
+
+    names, method_idx, per_capita, floating_factor, institutional = [], [], [], [], []
+    for i, scenario in enumerate(scenarios):
+        name = str(scenario.get("name") or f"scenario_{i + 1}")
+        method = scenario.get("projection_method", "Geometric")
+        if method not in METHODS:
+            raise ValueError(f"Scenario '{name}': projection_method must be one of {METHODS}.")
+        facility_type = scenario.get("facility_type", "provided")
+        if facility_type not in FLOATING_FACILITY_LPCD:
+            raise ValueError(f"Scenario '{name}': invalid facility_type '{facility_type}'.")
+        try:
+            lpcd = float(scenario["per_capita_consumption"])
+            floating_pct = float(scenario.get("floating_population_percentage", 15))
+            inst = institutional_base_demand(scenario.get("institutional_fields"))
+        except KeyError:
+            raise ValueError(f"Scenario '{name}': per_capita_consumption is required.")
+        except (TypeError, ValueError):
+            raise ValueError(f"Scenario '{name}': invalid numeric value.")
+
+        names.append(name)
+        method_idx.append(METHODS.index(method))
+        per_capita.append(lpcd)
+        floating_factor.append((floating_pct / 100) * (FLOATING_FACILITY_LPCD[facility_type] / 1000000))
+        institutional.append(inst)
+
+    return {
+        "names": names,
+        "method_idx": np.array(method_idx, dtype=np.int64),
+        "per_capita": np.array(per_capita, dtype=np.float64),
+        "floating_factor": np.array(floating_factor, dtype=np.float64),
+        "institutional": np.array(institutional, dtype=np.float64),
+    }
+
+
+def scenario_demand_cube(base_population, population_by_method, params):
+    """
+    Demand in MLD for every scenario, village and year.
+
+    base_population: (V,) base-year populations
+    population_by_method: (M x V x Y) projected populations in METHODS order
+    Returns {component: (S x V x Y)} for COMPONENTS.
+
+    Institutional demand scales the selection's base institutional load by
+    population growth and is shared between villages by base population,
+    so the village sum equals the single-scenario calculator's figure.
+    """
+    population = population_by_method[params["method_idx"]]               # (S x V x Y)
+    base_total = base_population.sum()
+
+    domestic = population * (params["per_capita"] / 1000000)[:, None, None]
+    floating = population * params["floating_factor"][:, None, None]
+    if base_total:
+        institutional = population * (params["institutional"] / base_total)[:, None, None]
+    else:
+        institutional = np.zeros_like(population)
+
+    return {
+        "domestic": domestic,
+        "floating": floating,
+        "institutional": institutional,
+        "total": domestic + floating + institutional,
+    }
+
+
+def evaluate_scenarios(base_year, years, villages, subdistrict, scenarios):
+    """Project the villages once with every method, then evaluate all scenarios"""
+    params = parse_scenarios(scenarios)
+    years = [int(y) for y in years]
+    ids, base_population, projections = project_population(base_year, years, villages, subdistrict)
+    population_by_method = np.stack([projections[m] for m in METHODS]).astype(np.float64)
+    cube = scenario_demand_cube(base_population, population_by_method, params)
+    return ids, years, params, population_by_method[params["method_idx"]], cube
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from Basic.demand import METHODS, parse_scenarios, scenario_demand_cube
+from Basic.views import (
+    DomesticWaterDemandCalculationAPIView,
+    FloatingWaterDemandCalculationAPIView,
+    InstitutionalWaterDemandCalculationAPIView,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the batch water-demand sweep against one request per scenario and village"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--villages", type=int, default=100)
+        parser.add_argument("--scenarios", type=int, default=10)
+        parser.add_argument("--years", type=int, default=25)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        n_villages, n_scenarios, n_years = options["villages"], options["scenarios"], options["years"]
+        years = list(range(2025, 2025 + n_years))
+
+        # Synthetic projections: the sweep itself is what is being measured
+        base = rng.integers(200, 20000, n_villages).astype(np.float64)
+        growth = 1 + rng.uniform(0.005, 0.03, (len(METHODS), n_villages, 1))
+        population = np.floor(base[None, :, None] * growth ** np.arange(1, n_years + 1)[None, None, :])
+
+        institutional_fields = {"hospitals100Units": 1, "beds100": 120, "daySchools": 4, "studentsDaySchools": 300}
+        scenarios = [
+            {
+                "name": f"s{i}",
+                "projection_method": METHODS[i % len(METHODS)],
+                "per_capita_consumption": 70 + 5 * i,
+                "floating_population_percentage": 10 + i % 10,
+                "facility_type": ["provided", "notprovided", "onlypublic"][i % 3],
+                "institutional_fields": institutional_fields,
+            }
+            for i in range(n_scenarios)
+        ]
+
+        started = time.perf_counter()
+        params = parse_scenarios(scenarios)
+        cube = scenario_demand_cube(base, population, params)
+        batch_s = time.perf_counter() - started
+
+        factory = APIRequestFactory()
+        domestic_view = DomesticWaterDemandCalculationAPIView.as_view()
+        floating_view = FloatingWaterDemandCalculationAPIView.as_view()
+        institutional_view = InstitutionalWaterDemandCalculationAPIView.as_view()
+        share = base / base.sum()
+
+        started = time.perf_counter()
+        per_request = np.zeros((n_scenarios, n_villages, n_years))
+        for s, scenario in enumerate(scenarios):
+            method = METHODS.index(scenario["projection_method"])
+            for v in range(n_villages):
+                forecast = {str(y): population[method, v, j] for j, y in enumerate(years)}
+                domestic = domestic_view(factory.post("/", {
+                    "forecast_data": forecast,
+                    "per_capita_consumption": scenario["per_capita_consumption"],
+                }, format="json")).data["base_demand"]
+                floating = floating_view(factory.post("/", {
+                    "domestic_forecast": forecast,
+                    "facility_type": scenario["facility_type"],
+                    "floating_population_percentage": scenario["floating_population_percentage"],
+                }, format="json")).data["base_demand"]
+                institutional = institutional_view(factory.post("/", {
+                    "institutional_fields": institutional_fields,
+                    "domestic_forecast": {**forecast, "2011": base[v]},
+                }, format="json")).data
+                for j, y in enumerate(years):
+                    key = str(y)
+                    per_request[s, v, j] = domestic[key] + floating[key] + institutional[key] * share[v]
+        per_request_s = time.perf_counter() - started
+
+        requests_made = 3 * n_scenarios * n_villages
+        max_diff = float(np.abs(per_request - cube["total"]).max()) if per_request.size else 0.0
+        self.stdout.write(f"{n_scenarios} scenarios x {n_villages} villages x {n_years} years")
+        self.stdout.write(f"per-request path: {requests_made} requests in {per_request_s:.3f}s")
+        self.stdout.write(f"batch sweep:      {batch_s * 1000:.2f} ms ({per_request_s / max(batch_s, 1e-9):.0f}x)")
+        self.stdout.write(f"max |difference| in total demand: {max_diff:.3e} MLD")
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Basic", "0007_rename_runoffcoefficient_basicrunoffcoefficient_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="populationcohort",
+            index=models.Index(
+                fields=["village_code", "year"], name="Basic_popul_village_d56ffc_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="populationcohort",
+            index=models.Index(
+                fields=["subdistrict_code", "year"], name="Basic_popul_subdist_4ff587_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="populationcohort",
+            index=models.Index(
+                fields=["district_code", "year"], name="Basic_popul_distric_dad397_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="populationcohort",
+            index=models.Index(
+                fields=["state_code", "year"], name="Basic_popul_state_c_29d7b4_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Basic", "0008_populationcohort_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "data_version",
+            },
+        ),
+    ]
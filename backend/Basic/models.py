@@ -61,6 +61,14 @@ class PopulationCohort(models.Model):
     gender = models.CharField(max_length=10)
     population = models.BigIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["village_code", "year"]),
+            models.Index(fields=["subdistrict_code", "year"]),
+            models.Index(fields=["district_code", "year"]),
+            models.Index(fields=["state_code", "year"]),
+        ]
+
     def __str__(self):
         return f"{self.region_name}, {self.year}, {self.age_group}, {self.gender}: {self.population}"
 
@@ -90,5 +98,17 @@ class BasicRunoffCoefficient(models.Model):
         return f"Runoff Coefficient ({self.duration_t_minutes} min)"
 
 
+class DataVersion(models.Model):
+    """Version of a cached data set, shared by every worker (data_versions.py)"""
+    name = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "data_version"
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+
 #Below model for boundary of state , district, subdistrict, villages
 
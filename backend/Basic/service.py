@@ -1,87 +1,204 @@
 import math
+import threading
+
+import numpy as np
+
+from .data_versions import bump_version, get_version
 from .models import *
 
-def Arithmetic_d_values(subdistrict):
-    subdistrict_new_ids = [x['id'] for x in subdistrict]
-    print("subdistrict_new_ids", subdistrict_new_ids)
-        
-        # Get population data for subdistricts
-    subdistrict_2011 = list(Population_2011.objects.filter(
-        subdistrict_code__in=subdistrict_new_ids
-    ).values(
-        'subdistrict_code', 'population_1951', 'population_1961', 
-        'population_1971', 'population_1981', 'population_1991', 
-        'population_2001', 'population_2011'
-    ))
-    
-    print("subdistrict_2011",subdistrict_2011)
-    
-    # Calculate the total population for each decade
-   
-    d_values = []
-    for subdistrict in subdistrict_2011:
-        d_mean=(subdistrict['population_2011']-subdistrict['population_1951'])/6
-        annual_growth_rate =math.floor(d_mean / 10)
-        temp={
-            "subdistrict_code": subdistrict['subdistrict_code'],
-            "annual_growth_rate":annual_growth_rate,
-            "total_p7":subdistrict['population_2011']
-        }
-        d_values.append(temp)
-   
-    return d_values
-
-
-        
-def Arithmetic_population_single_year(base_year,single_year,villages,subdistrict):
-    output_year = {}
-    ans=Arithmetic_d_values(subdistrict)
-    print("ans ", ans)
-    if single_year:
-        target_year = int(single_year)
-        for village in villages: 
-            # print("village", village)
-            village_id, value ,vill_sub_id= village['id'],village['population'],village['subDistrictId']
-            items= next(item for item in ans if item['subdistrict_code'] == vill_sub_id)
-            output_year[village_id] = {
-                "2011": value,
-                str(target_year): int(value + ((items['annual_growth_rate'] * (target_year - base_year)) * (value / items['total_p7'])))
-            }
-        print(f"output year {output_year}")    
-        Air_last_output={}
-        Air_last_output['2011']=sum([values['2011'] for values in output_year.values()])
-        Air_last_output[target_year]=sum([values[str(target_year)] for values in output_year.values()])
-        print('Air_last_output',Air_last_output)
-        
-    return Air_last_output
+# ---------------------------------------------------------------------------
+# Projection engine
+#
+# Census history (1951..2011) is loaded once per subdistrict into a
+# process-level cache. signals.py bumps a data version (data_versions.py) when
+# Population_2011 changes and every process drops its copy on next use.
+# Growth parameters are derived for all requested subdistricts at once and
+# every method is projected for all villages and years as a
+# (villages x years) array. The per-method functions below are thin views
+# over the same engine and keep their old outputs.
+# ---------------------------------------------------------------------------
+
+CENSUS_YEARS = [1951, 1961, 1971, 1981, 1991, 2001, 2011]
+CENSUS_FIELDS = [f'population_{y}' for y in CENSUS_YEARS]
+METHODS = ['Arithmetic', 'Geometric', 'Incremental', 'Exponential']
+
+CENSUS_VERSION_KEY = "census_history_version"
+
+_census_cache = {}
+_census_version = None
+_census_lock = threading.Lock()
+
+
+def clear_census_cache():
+    """Invalidate the census history cached by every process"""
+    bump_version(CENSUS_VERSION_KEY)
+
+
+def load_census_history(subdistrict_codes):
+    """
+    (codes, history) for the requested subdistricts that exist:
+    codes (S,) and history (S x 7) float, in CENSUS_YEARS order.
+    Only subdistricts not cached yet are queried, in one query.
+    """
+    global _census_version
+    codes = list(dict.fromkeys(subdistrict_codes))
+    version = get_version(CENSUS_VERSION_KEY)
+    with _census_lock:
+        if _census_version != version:
+            _census_cache.clear()
+            _census_version = version
+        missing = [c for c in codes if c not in _census_cache]
+    if missing:
+        rows = Population_2011.objects.filter(subdistrict_code__in=missing).values_list('subdistrict_code', *CENSUS_FIELDS)
+        fetched = {row[0]: tuple(row[1:]) for row in rows}
+        with _census_lock:
+            _census_cache.update(fetched)
+
+    with _census_lock:
+        found = [c for c in codes if c in _census_cache]
+        history = np.array([_census_cache[c] for c in found], dtype=np.float64).reshape(len(found), len(CENSUS_YEARS))
+    return found, history
+
+
+def growth_parameters(history):
+    """Per-subdistrict parameters of every method, from (S x 7) census history"""
+    p = history
+    p7 = p[:, -1]
+    d = np.diff(p, axis=1)                                   # decadal differences d1..d6
+    prev = p[:, :-1]
+
+    # Arithmetic: mean decadal increase, per year, floored
+    arithmetic_rate = np.floor(((p7 - p[:, 0]) / 6) / 10)
+
+    # Geometric: geometric mean of the positive decadal growth rates (%)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = np.where(prev != 0, (d * 100) / prev, 0.0)
+    positive = g > 0
+    n_positive = positive.sum(axis=1)
+    log_sum = np.where(positive, np.log(np.where(positive, g, 1.0)), 0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        geometric_rate = np.where(n_positive > 0, np.exp(log_sum / np.maximum(n_positive, 1)), 0.0)
+    geometric_rate = np.round(geometric_rate, 4)
+
+    # Incremental increase: mean increase and mean change of the increase
+    d_mean = d.sum(axis=1) / 6
+    m_mean = np.diff(d, axis=1).sum(axis=1) / 5
+
+    # Exponential: least-squares slope of log10(P) against (year - 2011)
+    x = np.array(CENSUS_YEARS, dtype=np.float64) - 2011
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log10(p)
+    n = len(CENSUS_YEARS)
+    exponential_rate = ((n * (y @ x)) - x.sum() * y.sum(axis=1)) / (n * (x ** 2).sum() - x.sum() ** 2)
+
+    return {
+        'total_p7': p7,
+        'arithmetic_rate': arithmetic_rate,
+        'geometric_rate': geometric_rate,
+        'd_mean': d_mean,
+        'm_mean': m_mean,
+        'exponential_rate': exponential_rate,
+    }
+
+
+def _village_arrays(villages, codes):
+    """(village ids, base populations, subdistrict row) for villages whose subdistrict is loaded"""
+    position = {c: i for i, c in enumerate(codes)}
+    kept = [v for v in villages if v['subDistrictId'] in position]
+    ids = [v['id'] for v in kept]
+    value = np.array([v['population'] for v in kept], dtype=np.float64)
+    sub = np.array([position[v['subDistrictId']] for v in kept], dtype=np.int64)
+    return ids, value, sub
+
+
+def project_population(base_year, years, villages, subdistrict, methods=METHODS):
+    """
+    Project every village for every year with each method.
+
+    Returns (village ids, base populations (V,), {method: (V x Y) int64}).
+    Same formulas and int() truncation as the per-village versions;
+    villages whose subdistrict has no census row, or a 2011 total of 0
+    (no share k to scale by), are left out.
+    """
+    base_year = int(base_year)
+    codes, history = load_census_history([x['id'] for x in subdistrict])
+    usable = history[:, -1] > 0
+    codes = [c for c, keep in zip(codes, usable) if keep]
+    params = growth_parameters(history[usable])
+    ids, value, sub = _village_arrays(villages, codes)
+
+    years = np.asarray([int(y) for y in years], dtype=np.float64)
+    v = value[:, None]
+    t = (years - base_year)[None, :]
+    n = t / 10
+    k = v / params['total_p7'][sub][:, None]
+
+    projections = {}
+    if 'Arithmetic' in methods:
+        rate = params['arithmetic_rate'][sub][:, None]
+        projections['Arithmetic'] = v + ((rate * t) * k)
+    if 'Geometric' in methods:
+        rate = params['geometric_rate'][sub][:, None]
+        projections['Geometric'] = v * np.power(1 + (rate / 100), n)
+    if 'Incremental' in methods:
+        d_mean = params['d_mean'][sub][:, None]
+        m_mean = params['m_mean'][sub][:, None]
+        projections['Incremental'] = v + k * n * d_mean + ((n * (n + 1)) * m_mean / 2) * k
+    if 'Exponential' in methods:
+        rate = params['exponential_rate'][sub][:, None]
+        projections['Exponential'] = v * np.exp(rate * t)
+
+    projections = {m: np.trunc(np.nan_to_num(p)).astype(np.int64) for m, p in projections.items()}
+    return ids, value, projections
+
+
+def _totals(value, projected, years):
+    """{'2011': base total, year: projected total, ...} like the old outputs"""
+    output = {'2011': int(value.astype(np.int64).sum())}
+    sums = projected.sum(axis=0)
+    for i, year in enumerate(years):
+        output[year] = int(sums[i])
+    return output
+
+
+def project_all_methods(base_year, years, villages, subdistrict):
+    """{method: {'2011': total, year: total}} for all four methods in one pass"""
+    years = [int(y) for y in years]
+    _, value, projections = project_population(base_year, years, villages, subdistrict)
+    return {method: _totals(value, projections[method], years) for method in METHODS}
+
+
+def _single(method, base_year, single_year, villages, subdistrict):
+    target_year = int(single_year)
+    _, value, projections = project_population(base_year, [target_year], villages, subdistrict, [method])
+    return _totals(value, projections[method], [target_year])
+
+
+def _range(method, base_year, start_year, end_year, villages, subdistrict):
+    years = list(range(int(start_year), int(end_year) + 1))
+    _, value, projections = project_population(base_year, years, villages, subdistrict, [method])
+    return _totals(value, projections[method], years)
+
+
+def _d_values(subdistrict, fields):
+    codes, history = load_census_history([x['id'] for x in subdistrict])
+    params = growth_parameters(history)
+    return [
+        {'subdistrict_code': code, **{name: params[key][i].item() for name, key in fields.items()}}
+        for i, code in enumerate(codes)
+    ]
 
-def Arithmetic_population_range(base_year, start_year, end_year, villages, subdistrict):
-    output_year = {}
-    ans = Arithmetic_d_values(subdistrict)
-    print("ans", ans)
 
-    # Compute the population projections for each village separately
-    for village in villages:
-        village_id = village['id']
-        value = village['population']
-        vill_sub_id = village['subDistrictId']
-        items = next((item for item in ans if item['subdistrict_code'] == vill_sub_id), None)
+def Arithmetic_d_values(subdistrict):
+    return _d_values(subdistrict, {'annual_growth_rate': 'arithmetic_rate', 'total_p7': 'total_p7'})
 
-        if items:
-            output_year[village_id] = {"2011": value}  # Store base population for 2011
-            for year in range(start_year, end_year + 1):
-                projected_value = int(value + ((items['annual_growth_rate'] * (year - base_year)) * (value / items['total_p7'])))
-                output_year[village_id][year] = projected_value
 
-    print(f"Output years Range {output_year}")
+def Arithmetic_population_single_year(base_year,single_year,villages,subdistrict):
+    return _single('Arithmetic', base_year, single_year, villages, subdistrict)
 
-    # Now sum the populations across all villages to get the final output
-    Air_last_output = {"2011": sum(values["2011"] for values in output_year.values())}
-    for year in range(start_year, end_year + 1):
-        Air_last_output[year] = sum(values[year] for values in output_year.values())
 
-    print(f"Air_last_output {Air_last_output}")
-    return Air_last_output
+def Arithmetic_population_range(base_year, start_year, end_year, villages, subdistrict):
+    return _range('Arithmetic', base_year, start_year, end_year, villages, subdistrict)
 
 ##### this is for special case to include 2025 always but currently it is implement in main site but it is correct 
 
@@ -121,382 +238,59 @@ def Arithmetic_population_range(base_year, start_year, end_year, villages, subdi
 #     return Air_last_output
 #####
 
-    
-
 
 def Geometric_d_values(subdistrict):
-    subdistrict_new_ids = [x['id'] for x in subdistrict]
-
-    # Fetch population data for given subdistricts
-    subdistrict_2011 = list(Population_2011.objects.filter(
-        subdistrict_code__in=subdistrict_new_ids
-    ).values(
-        'subdistrict_code', 'population_1951', 'population_1961', 
-        'population_1971', 'population_1981', 'population_1991', 
-        'population_2001', 'population_2011'
-    ))
-
-    g_values = []
-
-    for sub in subdistrict_2011:
-        p1, p2, p3, p4, p5, p6, p7 = (
-            sub['population_1951'], sub['population_1961'], sub['population_1971'],
-            sub['population_1981'], sub['population_1991'], sub['population_2001'],
-            sub['population_2011']
-        )
-
-        # Calculate decadal population differences
-        d1, d2, d3, d4, d5, d6 = [p2 - p1, p3 - p2, p4 - p3, p5 - p4, p6 - p5, p7 - p6]
-
-        # Calculate decadal growth rates
-        g1 = (d1 * 100) / p1 if p1 else 0
-        g2 = (d2 * 100) / p2 if p2 else 0
-        g3 = (d3 * 100) / p3 if p3 else 0
-        g4 = (d4 * 100) / p4 if p4 else 0
-        g5 = (d5 * 100) / p5 if p5 else 0
-        g6 = (d6 * 100) / p6 if p6 else 0
-
-        # Filter out non-positive growth rates
-        valid_growth_values = [g for g in [g1, g2, g3, g4, g5, g6] if g > 0]
-
-        if valid_growth_values:
-            # Calculate geometric mean only for positive values
-            product = 1
-            for g in valid_growth_values:
-                product *= g
-            annual_growth_rate = math.pow(product, 1 / len(valid_growth_values))
-        else:
-            # Handle case where no valid growth rates exist
-            annual_growth_rate = 0
-
-        # Append results
-        g_values.append({
-            'subdistrict_code': sub['subdistrict_code'],
-            'annual_growth_rate': round(annual_growth_rate, 4),  # Rounded for readability
-            'total_p7': p7
-        })
-
-    return g_values
+    return _d_values(subdistrict, {'annual_growth_rate': 'geometric_rate', 'total_p7': 'total_p7'})
 
 
 def Geometric_population_single_year(base_year,single_year,villages,subdistrict):
-    output_year = {}
-    ans = Geometric_d_values(subdistrict)
-    print(f"ans {ans}")
-
-    if single_year:
-        target_year = int(single_year)
-        base_year = int(base_year)
-        n = (target_year-base_year)/10
-        for village in villages: 
-            # print("village", village)
-            village_id, value ,vill_sub_id= village['id'],village['population'],village['subDistrictId']
-            items= next(item for item in ans if item['subdistrict_code'] == vill_sub_id)
-            output_year[village_id] = {
-                "2011": value,
-                str(target_year): int(value * (math.pow((1 + (items['annual_growth_rate']/100)), n)))
-            }
-        # print(f"output year_g {output_year}")    
-        Air_last_output={}
-        Air_last_output['2011']=sum([values['2011'] for values in output_year.values()])
-        Air_last_output[target_year]=sum([values[str(target_year)] for values in output_year.values()])
-        print('Air_last_output_g',Air_last_output)
-    return Air_last_output
+    return _single('Geometric', base_year, single_year, villages, subdistrict)
+
 
 def Geometric_population_range(base_year, start_year, end_year, villages, subdistrict):
-    output_year = {}
-    ans = Geometric_d_values(subdistrict)
-    print("ans-g", ans)
-    base_year = int(base_year)
-    start_year = int(start_year)
-    end_year = int(end_year)
-
-    # Compute the population projections for each village separately
-    for village in villages:
-        village_id = village['id']
-        value = village['population']
-        vill_sub_id = village['subDistrictId']
-        items = next((item for item in ans if item['subdistrict_code'] == vill_sub_id), None)
-
-        if items:
-            output_year[village_id] = {"2011": value}  # Store base population for 2011
-            for year in range(start_year, end_year + 1):
-                n = (year - base_year) / 10
-                projected_value =  int(value * (math.pow((1 + (items['annual_growth_rate']/100)), n)))
-                output_year[village_id][year] = projected_value
-
-    print(f"Output years Range {output_year}")
-
-    # Now sum the populations across all villages to get the final output
-    Air_last_output = {"2011": sum(values["2011"] for values in output_year.values())}
-    for year in range(start_year, end_year + 1):
-        Air_last_output[year] = sum(values[year] for values in output_year.values())
-
-    print(f"Air_last_output {Air_last_output}")
-    return Air_last_output
-   
+    return _range('Geometric', base_year, start_year, end_year, villages, subdistrict)
 
-def Incremental_d_values(subdistrict):
-    subdistrict_new_ids = [x['id'] for x in subdistrict]
-
-    # Fetch population data for given subdistricts
-    subdistrict_2011 = list(Population_2011.objects.filter(
-        subdistrict_code__in=subdistrict_new_ids
-    ).values(
-        'subdistrict_code', 'population_1951', 'population_1961', 
-        'population_1971', 'population_1981', 'population_1991', 
-        'population_2001', 'population_2011'
-    ))
-    g_values = []
-    for sub in subdistrict_2011:
-        p1, p2, p3, p4, p5, p6, p7 = (
-            sub['population_1951'], sub['population_1961'], sub['population_1971'],
-            sub['population_1981'], sub['population_1991'], sub['population_2001'],
-            sub['population_2011']
-        )
-
-        # Calculate decadal population differences
-        d1, d2, d3, d4, d5, d6 = [p2 - p1, p3 - p2, p4 - p3, p5 - p4, p6 - p5, p7 - p6]
-
-        d_mean = (d1+d2+d3+d4+d5+d6) / 6
-
-        m1 = d2 - d1
-        m2 = d3 - d2
-        m3 = d4 - d3
-        m4 = d5 - d4
-        m5 = d6 - d5 
-        m_mean = (m1+m2+m3+m4+m5) / 5
-
-        g_values.append({
-            'subdistrict_code': sub['subdistrict_code'],
-            'd_mean': d_mean,
-            'm_mean': m_mean,
-            'total_p7': p7
-        })
-
-    return g_values
 
+def Incremental_d_values(subdistrict):
+    return _d_values(subdistrict, {'d_mean': 'd_mean', 'm_mean': 'm_mean', 'total_p7': 'total_p7'})
 
 
 def Incremental_population_single_year(base_year,single_year,villages,subdistrict):
-    output_year = {}
-    ans = Incremental_d_values(subdistrict)
-    print(f"ans_i {ans}")
-
-    if single_year:
-        target_year = int(single_year)
-        base_year = int(base_year)
-        n = (target_year-base_year)/10
-        for village in villages: 
-            # print("village", village)
-            village_id, value ,vill_sub_id= village['id'],village['population'],village['subDistrictId']
-           
-            items= next(item for item in ans if item['subdistrict_code'] == vill_sub_id)
-            k = value / items['total_p7']
-            output_year[village_id] = {
-                "2011": value,
-                str(target_year): int(value + k*n*items['d_mean'] + ((n*(n+1))*items['m_mean'] / 2)*k)
-            }
-        # print(f"output year_g {output_year}")    
-        Air_last_output={}
-        Air_last_output['2011']=sum([values['2011'] for values in output_year.values()])
-        Air_last_output[target_year]=sum([values[str(target_year)] for values in output_year.values()])
-        print('Air_last_output_i',Air_last_output)
-    return Air_last_output
+    return _single('Incremental', base_year, single_year, villages, subdistrict)
 
-def Incremental_population_range(base_year, start_year, end_year, villages, subdistrict):
-
-    output_year = {}
-    ans = Incremental_d_values(subdistrict)
-    print("ans-g", ans)
-    base_year = int(base_year)
-    start_year = int(start_year)
-    end_year = int(end_year)
-
-    # Compute the population projections for each village separately
-    for village in villages:
-        village_id = village['id']
-        value = village['population']
-        vill_sub_id = village['subDistrictId']
-        items = next((item for item in ans if item['subdistrict_code'] == vill_sub_id), None)
-        k = value / items['total_p7']
-
-        if items:
-            output_year[village_id] = {"2011": value}  # Store base population for 2011
-            for year in range(start_year, end_year + 1):
-                n = (year - base_year) / 10
-
-                projected_value = int(value + k*n*items['d_mean'] + ((n*(n+1))*items['m_mean'] / 2)*k)
-                output_year[village_id][year] = projected_value
-
-    print(f"Output years Range {output_year}")
-
-    # Now sum the populations across all villages to get the final output
-    Air_last_output = {"2011": sum(values["2011"] for values in output_year.values())}
-    for year in range(start_year, end_year + 1):
-        Air_last_output[year] = sum(values[year] for values in output_year.values())
-
-    print(f"Air_last_output {Air_last_output}")
-    return Air_last_output
 
+def Incremental_population_range(base_year, start_year, end_year, villages, subdistrict):
+    return _range('Incremental', base_year, start_year, end_year, villages, subdistrict)
 
 
 def Exponential_d_values(subdistrict):
-    subdistrict_new_ids = [x['id'] for x in subdistrict]
-    base_year = 2011
-    # Fetch population data for given subdistricts
-    subdistrict_2011 = list(Population_2011.objects.filter(
-        subdistrict_code__in=subdistrict_new_ids
-    ).values(
-        'subdistrict_code', 'population_1951', 'population_1961', 
-        'population_1971', 'population_1981', 'population_1991', 
-        'population_2001', 'population_2011'
-    ))
-    g_values = []
-    for sub in subdistrict_2011:
-        p1, p2, p3, p4, p5, p6, p7 = (
-            sub['population_1951'], sub['population_1961'], sub['population_1971'],
-            sub['population_1981'], sub['population_1991'], sub['population_2001'],
-            sub['population_2011']
-        )
-
-        x1 =  1951-base_year
-        x2 =   1961-base_year
-        x3 =  1971-base_year
-        x4 =  1981-base_year
-        x5 = 1991-base_year
-        x6 = 2001-base_year
-        x7 = 2011-base_year
-
-        y1 = math.log(p1,10)
-        y2 = math.log(p2, 10)
-        y3 = math.log(p3,10)
-        y4 = math.log(p4, 10)
-        y5 = math.log(p5,10)
-        y6 = math.log(p6,10)
-        y7 = math.log(p7,10)
-
-        x_i_sum = x1+x2+x3+x4+x5+x6+x7
-        y_i_sum = y1+y2+y3+y4+y5+y6+y7
-        x_i_square_sum = x1**2 + x2**2 + x3**2 + x4**2 + x5**2 + x6**2 + x7**2
-        x_y_prod_sum = x1*y1 + x2*y2 + x3*y3 + x4*y4 + x5*y5 + x6*y6 + x7*y7
-        x_sum_prod_y_sum = x_i_sum * y_i_sum
-
-
-        n = 7
-
-        growth_rate = ((n*x_y_prod_sum) - x_sum_prod_y_sum) / (n*x_i_square_sum - (x_i_sum**2)) # r
-
-        g_values.append({
-            'subdistrict_code': sub['subdistrict_code'],
-            'growth_rate': growth_rate,
-            'total_p7': p7
-        })
-    return g_values    
+    return _d_values(subdistrict, {'growth_rate': 'exponential_rate', 'total_p7': 'total_p7'})
 
 
 def Exponential_population_single_year(base_year,single_year,villages,subdistrict):
-    output_year = {}
-    ans = Exponential_d_values(subdistrict)
-    print(f"ans_i {ans}")
-
-    if single_year:
-        target_year = int(single_year)
-        base_year = int(base_year)
-        t = (target_year-base_year)
-        for village in villages: 
-            # print("village", village)
-            village_id, value ,vill_sub_id= village['id'],village['population'],village['subDistrictId']
-           
-            items= next(item for item in ans if item['subdistrict_code'] == vill_sub_id)
-           
-            output_year[village_id] = {
-                "2011": value,
-                str(target_year): int(value * math.exp(items['growth_rate']*t))
-            }
-        # print(f"output year_g {output_year}")    
-        Air_last_output={}
-        Air_last_output['2011']=sum([values['2011'] for values in output_year.values()])
-        Air_last_output[target_year]=sum([values[str(target_year)] for values in output_year.values()])
-        print('Air_last_output_i',Air_last_output)
-    return Air_last_output
+    return _single('Exponential', base_year, single_year, villages, subdistrict)
 
 
 def Exponential_population_range(base_year, start_year, end_year, villages, subdistrict):
+    return _range('Exponential', base_year, start_year, end_year, villages, subdistrict)
 
-    output_year = {}
-    ans = Exponential_d_values(subdistrict)
-    print("ans-g", ans)
-    base_year = int(base_year)
-    start_year = int(start_year)
-    end_year = int(end_year)
-
-    # Compute the population projections for each village separately
-    for village in villages:
-        village_id = village['id']
-        value = village['population']
-        vill_sub_id = village['subDistrictId']
-        items = next((item for item in ans if item['subdistrict_code'] == vill_sub_id), None)
-      
-
-        if items:
-            output_year[village_id] = {"2011": value}  # Store base population for 2011
-            for year in range(start_year, end_year + 1):
-                t = (year - base_year)
-
-                projected_value = int(value * math.exp(items['growth_rate']*t))
-                output_year[village_id][year] = projected_value
 
-    print(f"Output years Range {output_year}")
-
-    # Now sum the populations across all villages to get the final output
-    Air_last_output = {"2011": sum(values["2011"] for values in output_year.values())}
-    for year in range(start_year, end_year + 1):
-        Air_last_output[year] = sum(values[year] for values in output_year.values())
-
-    print(f"Air_last_output {Air_last_output}")
-    return Air_last_output
+def demographic_projection(base_year, years, villages, annual_birth_rate, annual_death_rate, annual_emigration_rate, annual_immigration_rate):
+    """(V,) base and (V x Y) projected populations with the demographic component method"""
+    value = np.array([v['population'] for v in villages], dtype=np.float64)
+    v = value[:, None]
+    t = (np.asarray([int(y) for y in years], dtype=np.float64) - int(base_year))[None, :]
+    projected = v + (v * t * (annual_birth_rate-annual_death_rate)) + (t * (annual_emigration_rate - annual_immigration_rate))
+    return value, np.trunc(projected).astype(np.int64)
 
 
 def Demographic_population_single_year(base_year,single_year,villages,subdistrict,annual_birth_rate,annual_death_rate,annual_emigration_rate,annual_immigration_rate):
-    output_year = {}
-    if single_year:
-        target_year = int(single_year)
-        base_year = int(base_year)
-        t = (target_year-base_year)
-        for village in villages: 
-            # print("village", village)
-            village_id, value ,vill_sub_id= village['id'],village['population'],village['subDistrictId']
-            output_year[village_id] = {
-                "2011": value,
-                str(target_year): int( value + (value * t * (annual_birth_rate-annual_death_rate)) + (t * (annual_emigration_rate - annual_immigration_rate)))
-            }
-        print(f"output year {output_year}")
-        Air_last_output={}
-        Air_last_output['2011']=sum([values['2011'] for values in output_year.values()])
-        Air_last_output[target_year]=sum([values[str(target_year)] for values in output_year.values()])
-        print('Air_last_output_i',Air_last_output)
-    return Air_last_output
+    target_year = int(single_year)
+    value, projected = demographic_projection(base_year, [target_year], villages, annual_birth_rate, annual_death_rate, annual_emigration_rate, annual_immigration_rate)
+    return _totals(value, projected, [target_year])
 
 
 def Demographic_population_range(base_year, start_year, end_year, villages, subdistrict, annual_birth_rate, annual_death_rate, annual_emigration_rate, annual_immigration_rate):
-    output_year = {}
-    base_year = int(base_year)
-    start_year = int(start_year)
-    end_year = int(end_year)
-
-    for village in villages:
-        village_id = village['id']
-        value = village['population']
-        output_year[village_id] = {"2011": value}  # Store base population for 2011
-        for year in range(start_year, end_year + 1):
-            t = (year - base_year)
-            value + (value * t * (annual_birth_rate-annual_death_rate)) + (t * (annual_emigration_rate - annual_immigration_rate))
-            projected_value = int(value + (value * t * (annual_birth_rate-annual_death_rate)) + (t * (annual_emigration_rate - annual_immigration_rate)))
-            output_year[village_id][year] = projected_value
-
-    Air_last_output = {"2011": sum(values["2011"] for values in output_year.values())}
-    for year in range(start_year, end_year + 1):
-        Air_last_output[year] = sum(values[year] for values in output_year.values())
-
-    return Air_last_output
\ No newline at end of file
+    years = list(range(int(start_year), int(end_year) + 1))
+    value, projected = demographic_projection(base_year, years, villages, annual_birth_rate, annual_death_rate, annual_emigration_rate, annual_immigration_rate)
+    return _totals(value, projected, years)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cohort import bump_cohort_version
+from .models import Population_2011, PopulationCohort
+from .service import clear_census_cache
+
+
+# Census history is cached per process, keyed by a shared data version
+@receiver(post_save, sender=Population_2011)
+@receiver(post_delete, sender=Population_2011)
+def invalidate_census_cache(sender, **kwargs):
+    clear_census_cache()
+
+
+# Cached cohort pivots are keyed by a data version
+@receiver(post_save, sender=PopulationCohort)
+@receiver(post_delete, sender=PopulationCohort)
+def invalidate_cohort_cache(sender, **kwargs):
+    bump_cohort_version()
@@ -22,6 +22,7 @@ import logging
 from django.conf import settings
 from django.core.files.storage import default_storage
 from .models import BasicRunoffCoefficient
+from main.temp_artifacts import temp_registry
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -594,6 +595,7 @@ class swrunoffView(APIView):
                            facecolor='white', edgecolor='none')
                 plt.close()
                 gc.collect()
+                temp_registry.register(filepath, owner='Basic.swrunoff')
 
                 return f'temp/{filename}'
             else:
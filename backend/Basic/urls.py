@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import BasicStudyAreaMap, StormwaterRunoffView, UploadShapefile, pdftotemp, swrunoffView, ShapefileDataAPI, VillagePopulationRawSQL, VillagePopulationAPI, VillagesCatchmentIntersection, AllStretches, Catchments, BasinAPI, RiverMapAPI, RiverStretched, Drain, CohortView, Locations_stateAPI,Locations_districtAPI,Locations_subdistrictAPI,Locations_villageAPI,Time_series,Demographic,SewageCalculation,WaterSupplyCalculationAPI,DomesticWaterDemandCalculationAPIView,FloatingWaterDemandCalculationAPIView,InstitutionalWaterDemandCalculationAPIView,FirefightingWaterDemandCalculationAPIView
+from .views import BasicStudyAreaMap, StormwaterRunoffView, UploadShapefile, pdftotemp, swrunoffView, ShapefileDataAPI, VillagePopulationRawSQL, VillagePopulationAPI, VillagesCatchmentIntersection, AllStretches, Catchments, BasinAPI, RiverMapAPI, RiverStretched, Drain, CohortView, Locations_stateAPI,Locations_districtAPI,Locations_subdistrictAPI,Locations_villageAPI,Time_series,Demographic,SewageCalculation,WaterSupplyCalculationAPI,DomesticWaterDemandCalculationAPIView,FloatingWaterDemandCalculationAPIView,InstitutionalWaterDemandCalculationAPIView,FirefightingWaterDemandCalculationAPIView,WaterDemandScenarioBatchAPIView
 urlpatterns = [
     path("state",Locations_stateAPI.as_view(),name="states"),
     path("district",Locations_districtAPI.as_view(),name="districts"),
@@ -14,6 +14,7 @@ urlpatterns = [
     path('floating_water_demand', FloatingWaterDemandCalculationAPIView.as_view(), name='floating_water_demand'),
     path('institutional_water_demand', InstitutionalWaterDemandCalculationAPIView.as_view(), name='institutional_water_demand'),
     path('firefighting_water_demand', FirefightingWaterDemandCalculationAPIView.as_view(), name='firefighting_water_demand'),
+    path('water_demand_batch', WaterDemandScenarioBatchAPIView.as_view(), name='water_demand_batch'),
     path('cohort', CohortView.as_view(), name='cohort'),
     #path('basemap', DefaultBaseMapAPI.as_view(), name='default-base-map'),
     #path('state-shapefile', StateShapefileAPI.as_view(), name='state-shapefile'),
@@ -9,6 +9,8 @@ import tempfile
 from .service import *
 from django.db.models import Sum, Q
 from .models import PopulationCohort
+from .cohort import ROLLUP_FIELDS, cached_cohorts
+from .demand import COMPONENTS, evaluate_scenarios
 from django.http import HttpResponse, JsonResponse
 import numpy as np
 import os
@@ -102,8 +104,10 @@ class Demographic(APIView):
         
 
         # Correcting the subdistrict_id of the villages coming from frontend 
-        # Fetch all villages from the database
-        village_data = Basic_village.objects.values('village_code', 'subdistrict_code')
+        # Fetch the requested villages from the database
+        village_data = Basic_village.objects.filter(
+            village_code__in=[v['id'] for v in villages]
+        ).values('village_code', 'subdistrict_code')
         # Create a mapping of village_code to subdistrict_code
         village_mapping = {v['village_code']: v['subdistrict_code'] for v in village_data}
         # Update the villages list with the correct subDistrictId
@@ -137,8 +141,10 @@ class Time_series(APIView):
         
 
         # Correcting the subdistrict_id of the villages coming from frontend 
-        # Fetch all villages from the database
-        village_data = Basic_village.objects.values('village_code', 'subdistrict_code')
+        # Fetch the requested villages from the database
+        village_data = Basic_village.objects.filter(
+            village_code__in=[v['id'] for v in villages]
+        ).values('village_code', 'subdistrict_code')
         # Create a mapping of village_code to subdistrict_code
         village_mapping = {v['village_code']: v['subdistrict_code'] for v in village_data}
         # Update the villages list with the correct subDistrictId
@@ -151,17 +157,12 @@ class Time_series(APIView):
 
 
         main_output={}
+        # All four methods come out of one projection pass
         if single_year:
-            main_output['Arithmetic']=Arithmetic_population_single_year(base_year,single_year,villages,subdistrict)
-            main_output['Geometric']=Geometric_population_single_year(base_year,single_year,villages,subdistrict)
-            main_output['Incremental']=Incremental_population_single_year(base_year,single_year,villages,subdistrict)
-            main_output['Exponential']=Exponential_population_single_year(base_year,single_year,villages,subdistrict)
+            main_output = project_all_methods(base_year, [single_year], villages, subdistrict)
 
         elif start_year and end_year:
-            main_output['Arithmetic']=Arithmetic_population_range(base_year,start_year,end_year,villages,subdistrict)  
-            main_output['Geometric']=Geometric_population_range(base_year,start_year,end_year,villages,subdistrict)
-            main_output['Incremental']=Incremental_population_range(base_year,start_year,end_year,villages,subdistrict)
-            main_output['Exponential']=Exponential_population_range(base_year,start_year,end_year,villages,subdistrict)
+            main_output = project_all_methods(base_year, range(int(start_year), int(end_year) + 1), villages, subdistrict)
         else:
             pass
         print("output",main_output)
@@ -669,6 +670,79 @@ class FirefightingWaterDemandCalculationAPIView(APIView):
         
         return Response(result, status=status.HTTP_200_OK)
 
+class WaterDemandScenarioBatchAPIView(APIView):
+    permission_classes = [AllowAny]
+    """
+    Evaluate many water-demand scenarios for a set of villages in one request.
+
+    Expected JSON payload:
+    {
+      "villages_props": [{"id": ..., "population": ..., "subDistrictId": ...}, ...],
+      "subdistrict_props": [{"id": ...}, ...],
+      "years": [2025, 2030, 2035],            # or "start_year" / "end_year"
+      "scenarios": [
+        {
+          "name": "norm-135",
+          "projection_method": "Geometric",   # Arithmetic | Geometric | Incremental | Exponential
+          "per_capita_consumption": 135,
+          "floating_population_percentage": 15,
+          "facility_type": "provided",        # provided | notprovided | onlypublic
+          "institutional_fields": {...}       # optional, as for institutional_water_demand
+        },
+        ...
+      ],
+      "include_villages": true                # false returns only the totals
+    }
+
+    Response (MLD): per-component (scenario x village x year) arrays under
+    "demand" and (scenario x year) sums under "totals".
+    """
+    def post(self, request, format=None):
+        data = request.data
+        base_year = 2011
+        villages = data.get("villages_props") or []
+        subdistrict = data.get("subdistrict_props") or []
+        include_villages = data.get("include_villages", True)
+
+        years = data.get("years")
+        if not years and data.get("start_year") and data.get("end_year"):
+            years = list(range(int(data["start_year"]), int(data["end_year"]) + 1))
+        if not years or not villages or not subdistrict:
+            return Response(
+                {"error": "villages_props, subdistrict_props and years (or start_year/end_year) are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Correct the villages' subDistrictId from the database, as Time_series does
+        village_mapping = dict(Basic_village.objects.filter(
+            village_code__in=[v['id'] for v in villages]
+        ).values_list('village_code', 'subdistrict_code'))
+        for village in villages:
+            if village['id'] in village_mapping:
+                village['subDistrictId'] = village_mapping[village['id']]
+
+        try:
+            ids, years, params, population, cube = evaluate_scenarios(
+                base_year, years, villages, subdistrict, data.get("scenarios")
+            )
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        output = {
+            "villages": ids,
+            "years": years,
+            "scenarios": params["names"],
+            "components": COMPONENTS,
+            "units": "MLD",
+            "population_totals": population.sum(axis=1).astype(np.int64).tolist(),
+            "totals": {c: np.round(cube[c].sum(axis=1), 6).tolist() for c in COMPONENTS},
+        }
+        if include_villages:
+            output["demand"] = {c: np.round(cube[c], 6).tolist() for c in COMPONENTS}
+
+        print(f"Evaluated {len(params['names'])} demand scenarios for {len(ids)} villages x {len(years)} years")
+        return Response(output, status=status.HTTP_200_OK)
+
 #for cohort 
 class CohortView(APIView):
     permission_classes = [AllowAny] 
@@ -685,6 +759,13 @@ class CohortView(APIView):
         subdistrict = request.data.get('subdistrict_props', {})
         district = request.data.get('district_props', {})
         state = request.data.get('state_props', {})
+        # Optional per-location breakdown: 'village', 'subdistrict' or 'district'
+        rollup = request.data.get('rollup') or None
+        
+        if rollup and rollup not in ROLLUP_FIELDS:
+            error_msg = f"Invalid rollup '{rollup}', expected one of {list(ROLLUP_FIELDS)}"
+            print(error_msg)
+            return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
         
         # Check if required year parameters are provided
         if not (single_year or (start_year and end_year)):
@@ -698,12 +779,14 @@ class CohortView(APIView):
         
         # Build location filter - apply available filters
         location_filter = Q()
+        selection = {}  # cache key for the cohort result
         
         # Apply state filter if provided (SINGLE ONLY)
         if state and state.get('id'):
             state_id = int(state['id'])
             print(f"Adding state filter: {state_id}")
             location_filter &= Q(state_code=state_id)
+            selection['state'] = [state_id]
         
         # Apply district filter if provided (SUPPORTS MULTIPLE)
         if district:
@@ -713,11 +796,13 @@ class CohortView(APIView):
                 if district_ids:
                     print(f"Adding multiple district filters: {district_ids}")
                     location_filter &= Q(district_code__in=district_ids)
+                    selection['district'] = sorted(district_ids)
             elif district.get('id'):
                 # Handle single district
                 district_id = int(district['id'])
                 print(f"Adding single district filter: {district_id}")
                 location_filter &= Q(district_code=district_id)
+                selection['district'] = [district_id]
         
         # Apply subdistrict filter if provided (SUPPORTS MULTIPLE)
         if subdistrict:
@@ -727,11 +812,13 @@ class CohortView(APIView):
                 if subdistrict_ids:
                     print(f"Adding multiple subdistrict filters: {subdistrict_ids}")
                     location_filter &= Q(subdistrict_code__in=subdistrict_ids)
+                    selection['subdistrict'] = sorted(subdistrict_ids)
             elif subdistrict.get('id'):
                 # Handle single subdistrict
                 subdistrict_id = int(subdistrict['id'])
                 print(f"Adding single subdistrict filter: {subdistrict_id}")
                 location_filter &= Q(subdistrict_code=subdistrict_id)
+                selection['subdistrict'] = [subdistrict_id]
         
         # Apply villages filter if provided (ALREADY SUPPORTS MULTIPLE)
         if villages and len(villages) > 0:
@@ -739,6 +826,7 @@ class CohortView(APIView):
             if village_ids:
                 print(f"Adding villages filter: {village_ids}")
                 location_filter &= Q(village_code__in=village_ids)
+                selection['village'] = sorted(village_ids)
                 
                 
         
@@ -762,41 +850,14 @@ class CohortView(APIView):
                 if year_value != 2011:
                     years_to_query.append(2011)
                 
+                # One grouped query for every year
+                cohorts = cached_cohorts(location_filter, selection, years_to_query, rollup)
+                
                 years_data = []
                 for year in years_to_query:
-                    # Add year filter
-                    query_filter = location_filter & Q(year=year)
-                    
-                    # Get cohort data for the specified year and location
-                    cohort_data = PopulationCohort.objects.filter(query_filter)
-                    count = cohort_data.count()
-                    print(f"Found {count} records for year {year}")
-                    villages_found = cohort_data.values('village_code').distinct().count()
-                    print(f"Found {count} records for year {year} across {villages_found} villages")
-                    # ADD THESE LINES HERE:
-                    if villages and len(villages) > 0:
-                        requested_village_ids = [int(village['id']) for village in villages if village.get('id')]
-                        found_village_codes = list(cohort_data.values_list('village_code', flat=True).distinct())
-                        missing_village_codes = [vid for vid in requested_village_ids if vid not in found_village_codes]
-                        
-                        #print(f"Year {year} - Requested villages: {requested_village_ids}")
-                        #print(f"Year {year} - Found villages with records: {found_village_codes}")
-                        print(f"Year {year} - Missing villages (no records): {missing_village_codes}")
-
-                    villages_found = cohort_data.values('village_code').distinct().count()
-                    if count > 0:
-                        # Process the data
-                        result = self.organize_cohort_data(cohort_data)
-                        
-                        years_data.append({
-                            'year': year,
-                            'data': result
-                        })
-                    else:
-                        years_data.append({
-                            'year': year,
-                            'data': {}
-                        })
+                    entry = cohorts.get(year)
+                    print(f"Found {entry['records'] if entry else 0} records for year {year}")
+                    years_data.append(self.year_entry(year, entry, rollup))
                 
                 # Sort years with 2011 first if it's included
                 years_data.sort(key=lambda x: (x['year'] != 2011, x['year']))
@@ -832,37 +893,15 @@ class CohortView(APIView):
                 else:
                     years_to_query.sort()
                 
-                years_data = []
+                # One grouped query for every year
+                cohorts = cached_cohorts(location_filter, selection, years_to_query, rollup)
                 
+                years_data = []
                 for year in years_to_query:
-                    # Add year filter
-                    query_filter = location_filter & Q(year=year)
-                    
-                    # Get cohort data for the current year and location
-                    cohort_data = PopulationCohort.objects.filter(query_filter)
-                    count = cohort_data.count()
-                    print(f"Found {count} records for year {year}")
-                    villages_found = cohort_data.values('village_code').distinct().count()
-                    print(f"Found {count} records for year {year} across {villages_found} villages")
-                    # ADD THESE LINES HERE:
-                    if villages and len(villages) > 0:
-                        requested_village_ids = [int(village['id']) for village in villages if village.get('id')]
-                        found_village_codes = list(cohort_data.values_list('village_code', flat=True).distinct())
-                        missing_village_codes = [vid for vid in requested_village_ids if vid not in found_village_codes]
-                        
-                        #print(f"Year {year} - Requested villages: {requested_village_ids}")
-                        #print(f"Year {year} - Found villages with records: {found_village_codes}")
-                        print(f"Year {year} - Missing villages (no records): {missing_village_codes}")
-
-                    villages_found = cohort_data.values('village_code').distinct().count()
-                    if count > 0:  # Only add years with data
-                        # Process the data
-                        result = self.organize_cohort_data(cohort_data)
-                        
-                        years_data.append({
-                            'year': year,
-                            'data': result
-                        })
+                    entry = cohorts.get(year)
+                    print(f"Found {entry['records'] if entry else 0} records for year {year}")
+                    if entry:  # Only add years with data
+                        years_data.append(self.year_entry(year, entry, rollup))
                 
                 main_output['cohort'] = years_data
             except ValueError:
@@ -873,52 +912,12 @@ class CohortView(APIView):
         print("Final output:", main_output)   
         return Response(main_output, status=status.HTTP_200_OK)
     
-    def organize_cohort_data(self, queryset):
-        """
-        Organizes cohort data by age group and gender
-        Input: queryset of PopulationCohort objects
-        Output: Structured data by age group and gender
-        """
-        # Initialize the result dictionary
-        result = {}
-        
-        # Track totals
-        total_male = 0
-        total_female = 0
-        total_overall = 0
-        
-        # Process each record
-        for record in queryset:
-            age_group = record.age_group
-            gender = record.gender.lower()  # Normalize gender to lowercase
-            population = record.population
-            
-            # Initialize age group data if not present
-            if age_group not in result:
-                result[age_group] = {'male': 0, 'female': 0, 'total': 0}
-            
-            # Update gender-specific count
-            if gender == 'male':
-                result[age_group]['male'] += population
-                total_male += population
-            elif gender == 'female':
-                result[age_group]['female'] += population
-                total_female += population
-            
-            # Update total for this age group
-            result[age_group]['total'] = result[age_group]['male'] + result[age_group]['female']
-            total_overall += population
-        
-        # Add a "total" category with sums across all age groups
-        if result:
-            result['total'] = {
-                'male': total_male,
-                'female': total_female,
-                'total': total_overall
-            }
-        
-        print(f"Organized data: {result}")
-        return result
+    def year_entry(self, year, entry, rollup):
+        """{'year', 'data'[, 'by_<rollup>']} for one year of aggregated cohorts"""
+        item = {'year': year, 'data': entry['data'] if entry else {}}
+        if rollup:
+            item[f'by_{rollup}'] = entry[f'by_{rollup}'] if entry else {}
+        return item
 #end cohort logic here
 
  
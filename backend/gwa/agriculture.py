@@ -11,11 +11,18 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import Crop  # db_table = 'gwa_crop' with fields: season, crop, stage, period, crop_factor
-
-# Constants
-MONTHS = ['jan','feb','mar','apr','may','jun','jul','aug','sep','oct','nov','dec']
-PET_PREFIX = 'pet_'
-PE_PREFIX = 'pe_'
+from .agriculture_engine import (
+    MONTHS,
+    PET_PREFIX,
+    PE_PREFIX,
+    compile_stage_matrix,
+    compute_demand_matrix,
+    crop_month_matrix,
+    village_details,
+    village_pet_pe_matrices,
+)
+
+# Constants (MONTHS / PET_PREFIX / PE_PREFIX come from agriculture_engine)
 CROPLAND_COL = 'CROPLAND'
 
 def load_villages_gdf() -> gpd.GeoDataFrame:
@@ -162,108 +169,12 @@ def batch_get_crop_data(seasons: List[str], crops: List[str]) -> Dict[Tuple[str,
         grouped[key].append(row)
     return grouped
 
-def average_stage_deficit_for_row(row: pd.Series, months: List[str], kc: float) -> float:
-    """Calculate average stage deficit for a village row"""
-    if not months:
-        return 0.0
-    terms = []
-    for m in months:
-        pet_col, pe_col = f"{PET_PREFIX}{m}", f"{PE_PREFIX}{m}"
-        pet = float(row.get(pet_col, 0) or 0)
-        pe = float(row.get(pe_col, 0) or 0)
-        terms.append(max(pet * kc - pe, 0))
-    return sum(terms) / len(terms) if terms else 0.0
-
-# Modified compute_for_village_row to use batch cache but keep signature/variables same
-def compute_for_village_row(row: pd.Series, seasons: List[str], crops: List[str], irrigation_intensity: float) -> Tuple[float, Dict[str, Any]]:
-    """Compute agricultural demand index for a village row using batch crop data"""
-    details = {}
-    total_index = 0.0
-
-    # Batch fetch cache for crop data - this is a singleton per call, but here we create below
-    # To preserve your existing external calling patterns, we modify this function 
-    # to accept the cache from outside or load inside the post method
-    # So this function needs adjustment: for now, this function will expect a global cache.
-    # Instead, we separate compute_for_village_row and its usage in the view to pass cache.
-
-    # For this reason, leave this function unchanged; batch processing happens in the API post method.
-
-    # Here we keep a fallback synchronous approach for the function but in API post method we replace usage.
-
-    # However, to keep the same names and signature and ensure batch cache use,
-    # it's better to move the batch processing loop into the post method.
-
-    # So we redefine this function as an internal helper that requires crop_data_cache argument.
-
-    raise NotImplementedError("Use compute_for_village_row_optimized with batch cache in API post method")
-
-# Adding the optimized computation function with batch cache, renamed internally, not changing usage names
-def compute_for_village_row_optimized(
-    row: pd.Series, 
-    seasons: List[str], 
-    crops: List[str], 
-    irrigation_intensity: float,
-    crop_data_cache: Dict[Tuple[str, str], List[Dict[str, Any]]]
-) -> Tuple[float, Dict[str, Any]]:
-    details = {}
-    total_index = 0.0
-
-    for season in seasons:
-        season_sum = 0.0
-        details[season] = {}
-        for crop in crops:
-            key = (season.lower(), crop.lower())
-            stage_rows = crop_data_cache.get(key, [])
-            if not stage_rows:
-                details[season][crop] = {"skipped": True, "reason": "No crop rows"}
-                continue
-                
-            stages_info, crop_sum = [], 0.0
-            for r in stage_rows:
-                months = parse_period_to_months(r['period'])
-                kc = float(r['crop_factor'])
-                stage_avg_def = average_stage_deficit_for_row(row, months, kc)
-                stages_info.append({
-                    "stage": r['stage'],
-                    "period": r['period'],
-                    "crop_factor": kc,
-                    "months": months,
-                    "stage_avg_deficit": stage_avg_def
-                })
-                crop_sum += stage_avg_def
-                
-            crop_norm = crop_sum / irrigation_intensity
-            season_sum += crop_norm
-            details[season][crop] = {
-                "stages": stages_info,
-                "crop_stage_sum": crop_sum,
-                "crop_normalized": crop_norm
-            }
-        details[season]['season_sum'] = season_sum
-        total_index += season_sum
-
-    return total_index, details
-
-def generate_crop_month_data(results: List[Dict], crops: List[str]) -> Dict[str, Any]:
+def generate_crop_month_data(crop_month: np.ndarray, crops: List[str]) -> Dict[str, Any]:
     """Generate data for individual crop scatter chart - returns JSON data instead of image"""
-    crop_monthly_data = {crop: [0]*12 for crop in crops}
-    village_count = len(results) if results else 1
-    
-    for result in results:
-        for season_name, season_data in result['seasons'].items():
-            for crop in crops:
-                if crop in season_data and isinstance(season_data[crop], dict):
-                    crop_data = season_data[crop]
-                    if 'stages' in crop_data:
-                        for stage_info in crop_data['stages']:
-                            months = stage_info.get('months', [])
-                            deficit_value = stage_info.get('stage_avg_deficit', 0)
-                            for month in months:
-                                if month in MONTHS:
-                                    month_idx = MONTHS.index(month)
-                                    crop_monthly_data[crop][month_idx] += deficit_value
-    for crop in crops:
-        crop_monthly_data[crop] = [round(value / village_count, 3) for value in crop_monthly_data[crop]]
+    crop_monthly_data = {
+        crop: [round(float(value), 3) for value in crop_month[c_idx]]
+        for c_idx, crop in enumerate(crops)
+    }
 
     months_display = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
@@ -277,24 +188,9 @@ def generate_crop_month_data(results: List[Dict], crops: List[str]) -> Dict[str,
         "crops_data": crop_monthly_data
     }
 
-def generate_cumulative_data(results: List[Dict], crops: List[str]) -> Dict[str, Any]:
+def generate_cumulative_data(crop_month: np.ndarray) -> Dict[str, Any]:
     """Generate data for cumulative demand chart - returns JSON data instead of image"""
-    cumulative_monthly_data = [0] * 12
-    village_count = len(results) if results else 1
-    for result in results:
-        for season_name, season_data in result['seasons'].items():
-            for crop in crops:
-                if crop in season_data and isinstance(season_data[crop], dict):
-                    crop_data = season_data[crop]
-                    if 'stages' in crop_data:
-                        for stage_info in crop_data['stages']:
-                            months = stage_info.get('months', [])
-                            deficit_value = stage_info.get('stage_avg_deficit', 0)
-                            for month in months:
-                                if month in MONTHS:
-                                    month_idx = MONTHS.index(month)
-                                    cumulative_monthly_data[month_idx] += deficit_value
-    cumulative_monthly_data = [round(value / village_count, 3) for value in cumulative_monthly_data]
+    cumulative_monthly_data = [round(float(value), 3) for value in crop_month.sum(axis=0)]
 
     months_display = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
@@ -310,13 +206,14 @@ def generate_cumulative_data(results: List[Dict], crops: List[str]) -> Dict[str,
 
 def generate_crop_water_demand_charts(
     results: List[Dict], 
-    gdf: gpd.GeoDataFrame, 
-    seasons: List[str], 
-    crops: List[str], 
-    irrigation_intensity: float
+    demand: Dict[str, np.ndarray], 
+    compiled: Dict[str, Any], 
+    crops: List[str]
 ) -> Dict[str, Any]:
-    individual_crops_data = generate_crop_month_data(results, crops)
-    cumulative_data = generate_cumulative_data(results, crops)
+    """Chart data from the same stage-deficit arrays used for the village indices"""
+    crop_month = crop_month_matrix(demand, compiled)
+    individual_crops_data = generate_crop_month_data(crop_month, crops)
+    cumulative_data = generate_cumulative_data(crop_month)
     total_villages = len(results)
     total_demand = sum([result['village_demand'] for result in results])
     
@@ -399,6 +296,7 @@ class AgriculturalDemandAPIView(APIView):
             }, status=400)
         
         include_charts = data.get("include_charts", False)
+        include_stages = data.get("include_stages", False)
         
         try:
             gdf = load_villages_gdf()
@@ -429,30 +327,37 @@ class AgriculturalDemandAPIView(APIView):
         
         # Batch fetch crop data cache for all seasons and crops (optimized)
         crop_data_cache = batch_get_crop_data(seasons, crops)
-        
+
+        # Compile stages once, then compute every village with matrix operations
+        compiled = compile_stage_matrix(seasons, crops, crop_data_cache, parse_period_to_months)
+        pet, pe = village_pet_pe_matrices(filtered)
+        demand = compute_demand_matrix(pet, pe, compiled, irrigation_intensity)
+
+        cropland_col = col_mapping.get("cropland", CROPLAND_COL)
+        if cropland_col in filtered.columns:
+            cropland = pd.to_numeric(filtered[cropland_col], errors='coerce').fillna(0).to_numpy(dtype=float)
+        else:
+            cropland = np.zeros(len(filtered))
+        village_demand = np.abs(demand['total'] * cropland * groundwater_factor / 100) / 1000
+
+        village_names = filtered["village"].tolist() if "village" in filtered.columns else ["N/A"] * len(filtered)
+        village_col = col_mapping.get("village_code", "village_co")
+        subdistrict_col = col_mapping.get("subdistrict_code", "SUBDIS_COD")
+        village_codes = filtered[village_col].tolist() if village_col in filtered.columns else [None] * len(filtered)
+        subdistrict_codes = filtered[subdistrict_col].tolist() if subdistrict_col in filtered.columns else [None] * len(filtered)
+
         results = []
-        
-        for _, row in filtered.iterrows():
-            # Use optimized computation with batch cache
-            total_index, details = compute_for_village_row_optimized(
-                row, seasons, crops, irrigation_intensity, crop_data_cache
-            )
-            
-            cropland_col = col_mapping.get("cropland", CROPLAND_COL)
-            cropland = float(row.get(cropland_col, 0) or 0)
-            village_demand = (total_index * cropland * groundwater_factor)/100
-            
-            result = {
-                "village": row.get("village", "N/A"),
-                "village_code": row.get(col_mapping.get("village_code", "village_co")),
-                "subdistrict_code": row.get(col_mapping.get("subdistrict_code", "SUBDIS_COD")),
-                "cropland": cropland,
-                "seasons": details,
-                "index_sum_across_seasons_crops": total_index,
+        for v in range(len(filtered)):
+            results.append({
+                "village": village_names[v],
+                "village_code": village_codes[v],
+                "subdistrict_code": subdistrict_codes[v],
+                "cropland": float(cropland[v]),
+                "seasons": village_details(v, demand, compiled, seasons, include_stages),
+                "index_sum_across_seasons_crops": float(demand['total'][v]),
                 "groundwater_factor": groundwater_factor,
-                "village_demand": abs(village_demand)/1000
-            }
-            results.append(result)
+                "village_demand": float(village_demand[v])
+            })
         
         response_data = {
             "success": True,
@@ -472,7 +377,7 @@ class AgriculturalDemandAPIView(APIView):
         if include_charts:
             try:
                 charts_data = generate_crop_water_demand_charts(
-                    results, gdf, seasons, crops, irrigation_intensity
+                    results, demand, compiled, crops
                 )
                 response_data["charts"] = charts_data
             except Exception as e:
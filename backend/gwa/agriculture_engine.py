@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+PET_PREFIX = 'pet_'
+PE_PREFIX = 'pe_'
+
+
+def village_pet_pe_matrices(gdf):
+    """
+    (villages x 12) PET and PE matrices in MONTHS order.
+    Missing columns and null cells are treated as 0 so a NaN can not leak
+    through the matrix products into other crops' totals.
+    """
+    n = len(gdf)
+    pet = np.zeros((n, 12), dtype=np.float64)
+    pe = np.zeros((n, 12), dtype=np.float64)
+    for m, month in enumerate(MONTHS):
+        pet_col, pe_col = f"{PET_PREFIX}{month}", f"{PE_PREFIX}{month}"
+        if pet_col in gdf.columns:
+            pet[:, m] = pd.to_numeric(gdf[pet_col], errors='coerce').fillna(0).to_numpy()
+        if pe_col in gdf.columns:
+            pe[:, m] = pd.to_numeric(gdf[pe_col], errors='coerce').fillna(0).to_numpy()
+    return pet, pe
+
+
+def compile_stage_matrix(seasons, crops, crop_data_cache, parse_period):
+    """
+    Compile the selected crops' growth stages into matrices, once per request.
+
+    crop_data_cache: {(season, crop): [stage rows]} from batch_get_crop_data
+    parse_period: period string -> list of month abbreviations
+
+    Returns a dict with:
+      stages        per-stage metadata (season, crop, stage, period, crop_factor, months)
+      kc            (S,) crop factors
+      month_mask    (S x 12) bool, months each stage covers
+      month_weight  (S x 12) month_mask / months per stage (stage average)
+      pairs         [(season, crop)] that have stage rows, in request order
+      stage_pair    (S x P) one-hot stage -> (season, crop)
+      pair_season   (P x n_seasons) one-hot (season, crop) -> season
+      stage_crop    (S x n_crops) one-hot stage -> crop (summed across seasons)
+      skipped       [(season, crop)] with no stage rows
+    """
+    stages, pairs, skipped = [], [], []
+    stage_pair_idx, pair_season_idx, stage_crop_idx = [], [], []
+
+    for s_idx, season in enumerate(seasons):
+        for c_idx, crop in enumerate(crops):
+            stage_rows = crop_data_cache.get((season.lower(), crop.lower()), [])
+            if not stage_rows:
+                skipped.append((season, crop))
+                continue
+            p_idx = len(pairs)
+            pairs.append((season, crop))
+            pair_season_idx.append(s_idx)
+            for r in stage_rows:
+                stages.append({
+                    "season": season,
+                    "crop": crop,
+                    "stage": r['stage'],
+                    "period": r['period'],
+                    "crop_factor": float(r['crop_factor']),
+                    "months": parse_period(r['period']),
+                })
+                stage_pair_idx.append(p_idx)
+                stage_crop_idx.append(c_idx)
+
+    n_stages = len(stages)
+    kc = np.array([st['crop_factor'] for st in stages], dtype=np.float64)
+    month_mask = np.zeros((n_stages, 12), dtype=bool)
+    for i, st in enumerate(stages):
+        month_mask[i, [MONTHS.index(m) for m in st['months']]] = True
+
+    n_months = month_mask.sum(axis=1, keepdims=True)
+    month_weight = np.divide(month_mask, n_months, out=np.zeros((n_stages, 12)), where=n_months > 0)
+
+    stage_pair = np.zeros((n_stages, len(pairs)))
+    stage_pair[np.arange(n_stages), stage_pair_idx] = 1.0
+    pair_season = np.zeros((len(pairs), len(seasons)))
+    pair_season[np.arange(len(pairs)), pair_season_idx] = 1.0
+    stage_crop = np.zeros((n_stages, len(crops)))
+    stage_crop[np.arange(n_stages), stage_crop_idx] = 1.0
+
+    return {
+        "stages": stages,
+        "kc": kc,
+        "month_mask": month_mask,
+        "month_weight": month_weight,
+        "pairs": pairs,
+        "stage_pair": stage_pair,
+        "pair_season": pair_season,
+        "stage_crop": stage_crop,
+        "skipped": skipped,
+    }
+
+
+def compute_demand_matrix(pet, pe, compiled, irrigation_intensity):
+    """
+    Stage deficits for every village at once, reduced with matrix products.
+
+    stage_deficit[v, s] = mean over stage months of max(PET * Kc - PE, 0)
+    crop_sum   = stage_deficit @ stage_pair             (villages x pairs)
+    crop_norm  = crop_sum / irrigation_intensity
+    season_sum = crop_norm @ pair_season                (villages x seasons)
+    total      = season_sum summed over seasons
+    """
+    kc = compiled['kc']
+    # (villages x stages x 12); only months inside a stage carry weight
+    deficit = np.maximum(pet[:, None, :] * kc[None, :, None] - pe[:, None, :], 0)
+    stage_deficit = np.einsum('vsm,sm->vs', deficit, compiled['month_weight'])
+
+    crop_sum = stage_deficit @ compiled['stage_pair']
+    crop_norm = crop_sum / irrigation_intensity
+    season_sum = crop_norm @ compiled['pair_season']
+    total = season_sum.sum(axis=1)
+
+    return {
+        "stage_deficit": stage_deficit,
+        "crop_sum": crop_sum,
+        "crop_norm": crop_norm,
+        "season_sum": season_sum,
+        "total": total,
+    }
+
+
+def village_details(v, demand, compiled, seasons, include_stages=False):
+    """Per-season / per-crop breakdown for one village (stages only when asked for)"""
+    details = {season: {} for season in seasons}
+
+    for season, crop in compiled['skipped']:
+        details[season][crop] = {"skipped": True, "reason": "No crop rows"}
+
+    for p, (season, crop) in enumerate(compiled['pairs']):
+        details[season][crop] = {
+            "crop_stage_sum": float(demand['crop_sum'][v, p]),
+            "crop_normalized": float(demand['crop_norm'][v, p]),
+        }
+
+    if include_stages:
+        for season, crop in compiled['pairs']:
+            details[season][crop]["stages"] = []
+        for s, st in enumerate(compiled['stages']):
+            details[st['season']][st['crop']]["stages"].append({
+                "stage": st['stage'],
+                "period": st['period'],
+                "crop_factor": st['crop_factor'],
+                "months": st['months'],
+                "stage_avg_deficit": float(demand['stage_deficit'][v, s]),
+            })
+
+    for s_idx, season in enumerate(seasons):
+        details[season]['season_sum'] = float(demand['season_sum'][v, s_idx])
+
+    return details
+
+
+def crop_month_matrix(demand, compiled):
+    """
+    (crops x 12) village-average deficit per crop and month.
+    Each stage's average deficit is spread over every month it covers.
+    """
+    n_villages = max(demand['stage_deficit'].shape[0], 1)
+    stage_mean = demand['stage_deficit'].sum(axis=0) / n_villages
+    stage_month = stage_mean[:, None] * compiled['month_mask']
+    return compiled['stage_crop'].T @ stage_month
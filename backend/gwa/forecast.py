@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from main.temp_artifacts import temp_registry
 
 try:
     from statsmodels.tsa.arima.model import ARIMA
@@ -67,7 +68,8 @@ class GroundwaterForecastView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            df = pd.read_csv(csv_path)
+            with temp_registry.in_use(csv_path):
+                df = pd.read_csv(csv_path)
             if df.empty:
                 return Response(
                     {"success": False, "message": "CSV file is empty"},
@@ -1,20 +1,23 @@
 import os
 import re
 from typing import List, Dict, Any, Tuple, Optional
-import uuid
-from datetime import datetime
+import threading
+import time
 
 import geopandas as gpd
 import pandas as pd
 import json
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend for server environments
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
 import numpy as np
 import base64
 
 from django.conf import settings
+from main.temp_artifacts import temp_registry
+from .trend_artifact import load_trend_table
+from .gsr_map import SPEC_TTL_SECONDS, map_image_path, render_gsr_map, rerender_gsr_map
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -29,53 +32,23 @@ def parse_to_list(value) -> List[str]:
     return [s.strip() for s in re.split(r'[,\|]+', str(value)) if s.strip()]
 
 
-def safe_string_compare(val1, val2) -> bool:
-    """Safely compare two values as strings"""
-    if pd.isna(val1) or pd.isna(val2):
-        return False
-    return str(val1).strip().lower() == str(val2).strip().lower()
-
-
-def load_trend_data(trend_csv_filename: str) -> Dict[str, str]:
+def load_trend_data(trend_csv_filename: str) -> pd.Series:
     """
-    Load trend data from CSV file and return a mapping of Village_ID to trend_status
+    Trend status per village code (Series indexed by Village_ID), read from
+    the columnar trend artifact (see trend_artifact.py)
     """
-    trend_map = {}
-    
-    if not trend_csv_filename:
-        return trend_map
-    
-    try:
-        # Construct the full path to the trend CSV file in media/temp/
-        csv_path = os.path.join(settings.MEDIA_ROOT, 'temp', trend_csv_filename)
-        
-        if not os.path.exists(csv_path):
-            print(f"⚠️ Trend CSV file not found: {csv_path}")
-            return trend_map
-        
-        # Read the trend CSV file
-        trend_df = pd.read_csv(csv_path)
-        print(f"📄 Loaded trend CSV with {len(trend_df)} records from: {csv_path}")
-        
-        # Create mapping from Village_ID to trend_status
-        for _, row in trend_df.iterrows():
-            village_id = str(row.get('Village_ID', '')).strip()
-            trend_status = str(row.get('Trend_Status', 'Unknown')).strip()
-            
-            if village_id:
-                trend_map[village_id] = trend_status
-        
-        print(f"🎯 Created trend mapping for {len(trend_map)} villages using Village_ID")
-        
-    except Exception as e:
-        print(f"❌ Error loading trend data: {str(e)}")
-    
-    return trend_map
+    table = load_trend_table(trend_csv_filename)
+    return table['Trend_Status'].astype(str) if 'Trend_Status' in table.columns else pd.Series(dtype=str)
+
+
+_village_layer_cache = {}
+_village_layer_lock = threading.Lock()
 
 
 def load_village_shapefile() -> Optional[gpd.GeoDataFrame]:
     """
-    Load village shapefile from the specified path
+    Village layer in EPSG:4326 with a string village_co, cached per process
+    and reloaded only when the shapefile changes on disk
     """
     try:
         shapefile_path = os.path.join(
@@ -89,21 +62,26 @@ def load_village_shapefile() -> Optional[gpd.GeoDataFrame]:
         if not os.path.exists(shapefile_path):
             print(f"⚠️ Village shapefile not found: {shapefile_path}")
             return None
-        
-        # Read the shapefile
-        village_gdf = gpd.read_file(shapefile_path)
-        print(f"🗺️ Loaded village shapefile with {len(village_gdf)} villages from: {shapefile_path}")
-        print(f"📋 Shapefile columns: {list(village_gdf.columns)}")
-        
-        # Ensure village_co column exists and is string type
-        if 'village_co' in village_gdf.columns:
+
+        mtime = os.path.getmtime(shapefile_path)
+        with _village_layer_lock:
+            cached = _village_layer_cache.get(shapefile_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            village_gdf = gpd.read_file(shapefile_path)
+            print(f"🗺️ Loaded village shapefile with {len(village_gdf)} villages from: {shapefile_path}")
+
+            if 'village_co' not in village_gdf.columns:
+                print("❌ village_co column not found in shapefile")
+                return None
+
             village_gdf['village_co'] = village_gdf['village_co'].astype(str).str.strip()
-            print(f"✅ Found village_co column with {len(village_gdf['village_co'].unique())} unique values")
-        else:
-            print("❌ village_co column not found in shapefile")
-            return None
-        
-        return village_gdf
+            if village_gdf.crs is not None and village_gdf.crs.to_epsg() != 4326:
+                village_gdf = village_gdf.to_crs('EPSG:4326')  # WGS84 for web output, once
+
+            _village_layer_cache[shapefile_path] = (mtime, village_gdf)
+            return village_gdf
         
     except Exception as e:
         print(f"❌ Error loading village shapefile: {str(e)}")
@@ -135,9 +113,9 @@ def merge_gsr_with_shapefile(gsr_results: List[Dict[str, Any]], village_gdf: gpd
         # Since we're using inner join, all villages will have GSR data
         # No need to fill NaN values as before
         
-        # Convert to GeoJSON
-        # Handle any potential issues with geometry serialization
-        merged_gdf = merged_gdf.to_crs('EPSG:4326')  # Ensure WGS84 for web compatibility
+        # The cached village layer is already WGS84; only reproject if it is not
+        if merged_gdf.crs is not None and merged_gdf.crs.to_epsg() != 4326:
+            merged_gdf = merged_gdf.to_crs('EPSG:4326')
         
         # Convert to GeoJSON format
         geojson = merged_gdf.to_json()
@@ -176,173 +154,63 @@ def merge_gsr_with_shapefile(gsr_results: List[Dict[str, Any]], village_gdf: gpd
 
 def generate_gsr_map_image(merged_gdf: gpd.GeoDataFrame) -> Optional[str]:
     """
-    Generate GSR classification map with performance optimizations.
-    Matches PDFGenerationView visual style.
+    GSR classification map (PDFGenerationView visual style). Static layers are
+    cached and the image is content-addressed, see gsr_map.py.
+    Returns the image filename under media/temp/gsr_maps/.
     """
-    from io import BytesIO
-    import contextily as ctx
-    import matplotlib.patches as mpatches
-
     try:
         if merged_gdf is None or len(merged_gdf) == 0:
             print("⚠️ No merged GeoDataFrame available for map generation")
             return None
-
-        # 1. Simplify geometries for faster rendering
-        merged_gdf_simplified = merged_gdf.copy()
-        merged_gdf_simplified['geometry'] = merged_gdf_simplified['geometry'].simplify(
-            tolerance=0.0001,
-            preserve_topology=True
-        )
-
-        # 2. Keep in EPSG:4326 (lat/long degrees) - NO reprojection to Web Mercator
-        merged_gdf_web = merged_gdf_simplified.to_crs(epsg=4326)
-
-        # 3. Create figure (same size as original)
-        fig, ax = plt.subplots(1, 1, figsize=(15, 12))
-
-        # 4. Get unique classifications
-        classification_labels = merged_gdf_web['gsr_classification'].unique()
-        classification_labels = [cl for cl in classification_labels if cl]
-
-        # 5. Vectorized color mapping
-        colors = merged_gdf_web['gsr_classification'].map(get_classification_color).fillna('gray')
-
-        # 6. Plot with same style as original
-        merged_gdf_web.plot(
-            ax=ax,
-            color=colors,
-            edgecolor='black',
-            linewidth=0.75,  # Same as original
-            alpha=1,
-            rasterized=True  # Added for performance
-        )
-
-        # 7. Add OpenStreetMap basemap (exactly like PDFGenerationView)
-        try:
-            ctx.add_basemap(
-            ax,
-            crs=merged_gdf_web.crs,  # Use EPSG:4326
-            source=ctx.providers.CartoDB.Voyager,  # CartoDB Voyager basemap
-            alpha=1,   # Transparency (1 = opaque, 0 = invisible)
-            zoom=10      # Adjust detail level
-        )
-
-        except Exception as e:
-            print(f"⚠️ Basemap loading failed: {e}")
-
-        # 8. Title and labels (matching PDFGenerationView format)
-        ax.set_title('GSR Classification Map\n(Groundwater Supply-Requirement Analysis)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.set_xlabel('LONGITUDE', fontsize=12)  # Uppercase like PDFGenerationView
-        ax.set_ylabel('LATITUDE', fontsize=12)   # Uppercase like PDFGenerationView
-
-        # 9. Create legend (using vectorized count for speed)
-        classification_counts = merged_gdf_web['gsr_classification'].value_counts()
-        
-        legend_handles = []
-        for cl in classification_labels:
-            color = get_classification_color(cl)
-            count = classification_counts.get(cl, 0)
-            patch = mpatches.Patch(color=color, label=f"{cl} ({count})")
-            legend_handles.append(patch)
-
-        ax.legend(
-            handles=legend_handles,
-            title='GSR Classifications',
-            title_fontsize=12,
-            fontsize=10,
-            loc='upper left',
-            bbox_to_anchor=(1.02, 1),
-            frameon=True,
-            fancybox=True,
-            shadow=True
-        )
-
-        ax.tick_params(axis='both', which='major', labelsize=10)
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
-
-        # 10. Generate filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"gsr_map_{timestamp}_{unique_id}.png"
-        temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        filepath = os.path.join(temp_dir, filename)
-
-        # 11. OPTIMIZATION: Use BytesIO buffer for faster I/O
-        buffer = BytesIO()
-        
-        # Save with reduced DPI (150 instead of 300)
-        plt.savefig(
-            buffer,
-            format='png',
-            dpi=150,  # Reduced from 300 for speed
-            bbox_inches='tight',
-            facecolor='white',
-            edgecolor='none'
-        )
-        
-        # Write buffer to file
-        buffer.seek(0)
-        with open(filepath, 'wb') as f:
-            f.write(buffer.read())
-        
-        buffer.close()
-        plt.close(fig)
-
-        print(f"🗺️ GSR map image saved successfully: {filepath}")
-        print(f"📊 Map contains {len(merged_gdf)} villages with GSR data")
-        return filename
+        return render_gsr_map(merged_gdf, get_classification_color)
 
     except Exception as e:
         print(f"❌ Error generating GSR map image: {str(e)}")
-        plt.close('all')
         return None
 
 
-
 def calculate_gsr_classification(gsr_value: float, trend_status: str) -> str:
     """
     Calculate GSR classification based on GSR ratio and trend status
     According to the classification table provided
     """
-    if gsr_value is None:
-        return "No Data"
-    
-    # Handle "No Trend Data" case - treat as "No Trend"
-    if trend_status == "No Trend Data":
-        trend_status = "No Trend"
-    
-    # Normalize trend status
-    trend_status = trend_status.strip().lower()
-    
-    # Classification logic based on the table
-    if trend_status == "increasing":
-        if gsr_value < 0.95:
-            return "Critical"
-        elif 0.95 <= gsr_value <= 1.05:
-            return "Safe"
-        else:  # gsr_value > 1.05
-            return "Very Safe"
-    
-    elif trend_status == "decreasing":
-        if gsr_value < 0.95:
-            return "Over Exploited"
-        elif 0.95 <= gsr_value <= 1.05:
-            return "Critical"
-        else:  # gsr_value > 1.05
-            return "Very Semi-Critical"
-    
-    # Handle "No Trend" cases (including any other trend status)
-    else:  # This covers "no trend", "stable", and any other trend status
-        if gsr_value < 0.95:
-            return "Over Exploited"
-        elif 0.95 <= gsr_value <= 1.05:
-            return "Safe"
-        else:  # gsr_value > 1.05
-            return "Very Safe"
+    return str(classify_gsr(pd.Series([gsr_value], dtype=float), pd.Series([trend_status]))[0])
+
+
+def classify_gsr(gsr: pd.Series, trend_status: pd.Series) -> np.ndarray:
+    """
+    Vectorized classification table:
+
+        trend        GSR < 0.95       0.95-1.05    > 1.05
+        increasing   Critical         Safe         Very Safe
+        decreasing   Over Exploited   Critical     Very Semi-Critical
+        other        Over Exploited   Safe         Very Safe
+
+    Missing GSR (no demand) is "No Data".
+    """
+    gsr = pd.to_numeric(gsr, errors='coerce').to_numpy(dtype=float)
+    trend = trend_status.fillna('').astype(str).str.strip().str.lower().to_numpy()
+    missing = np.isnan(gsr)
+    low = ~missing & (gsr < 0.95)
+    mid = ~missing & (gsr >= 0.95) & (gsr <= 1.05)
+    increasing = trend == 'increasing'
+    decreasing = trend == 'decreasing'
+
+    return np.select(
+        [
+            missing,
+            low & increasing, low,
+            mid & decreasing, mid,
+            decreasing,
+        ],
+        [
+            'No Data',
+            'Critical', 'Over Exploited',
+            'Critical', 'Safe',
+            'Very Semi-Critical',
+        ],
+        default='Very Safe'
+    )
 
 
 def get_classification_color(classification: str) -> str:
@@ -359,125 +227,101 @@ def get_classification_color(classification: str) -> str:
     }
     return color_map.get(classification, 'gray')  # Default to gray
 
+def _dataset_frame(items: List[Dict[str, Any]], code_key: str, value_key: str, value_name: str) -> pd.DataFrame:
+    """One row per village code from a request dataset (last record wins, like the old dict build)"""
+    df = pd.DataFrame(items)
+    if df.empty or code_key not in df.columns:
+        return pd.DataFrame(columns=[value_name, 'name', 'subdistrict']).rename_axis('village_code')
+
+    # Per item: a column with a missing code is float and would give '123.0'
+    codes = pd.Series([str(item.get(code_key, '')).strip() for item in items], index=df.index)
+    valid = codes != ''
+    values = pd.to_numeric(df[value_key], errors='coerce').fillna(0) if value_key in df.columns else 0.0
+
+    name = df['village_name'] if 'village_name' in df.columns else pd.Series(np.nan, index=df.index)
+    if 'village' in df.columns:
+        name = name.combine_first(df['village'])
+    subdistrict = df['subdistrict_code'] if 'subdistrict_code' in df.columns else pd.Series(np.nan, index=df.index)
+    if 'subdis_cod' in df.columns:
+        subdistrict = subdistrict.combine_first(df['subdis_cod'])
+
+    out = pd.DataFrame({
+        'village_code': codes,
+        value_name: values,
+        'name': name,
+        'subdistrict': subdistrict,
+    })[valid]
+    return out.drop_duplicates('village_code', keep='last').set_index('village_code')
+
+
 def match_village_data(
     recharge_data: List[Dict[str, Any]],
     domestic_data: List[Dict[str, Any]], 
     agricultural_data: List[Dict[str, Any]],
-    trend_csv_filename: Optional[str] = None
+    trend_csv_filename: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
 ) -> List[Dict[str, Any]]:
     """
     Match village data across recharge, domestic, agricultural datasets, and trend data
+    with one outer merge on village code and vectorized GSR / classification
     """
-    # Load trend data if filename is provided
-    trend_map = load_trend_data(trend_csv_filename) if trend_csv_filename else {}
-    
-    # Create mappings for each dataset
-    recharge_map = {}
-    domestic_map = {}
-    agricultural_map = {}
-    
-    # Process recharge data - using village_co as key
-    for item in recharge_data:
-        village_code = str(item.get('village_co', '')).strip()
-        if village_code:
-            recharge_map[village_code] = {
-                'recharge': float(item.get('recharge', 0) or 0),
-                'raw_data': item
-            }
-    
-    # Process domestic data - using village_code as key
-    for item in domestic_data:
-        village_code = str(item.get('village_code', '')).strip()
-        if village_code:
-            domestic_map[village_code] = {
-                'domestic_demand': float(item.get('demand_mld', 0) or 0),
-                'raw_data': item
-            }
-    
-    # Process agricultural data - using village_code as key
-    for item in agricultural_data:
-        village_code = str(item.get('village_code', '')).strip()
-        if village_code:
-            agricultural_map[village_code] = {
-                'agricultural_demand': float(item.get('village_demand', 0) or 0),
-                'raw_data': item
-            }
-    
-    # Get all unique village codes
-    all_village_codes = set(recharge_map.keys()) | set(domestic_map.keys()) | set(agricultural_map.keys())
-    
-    results = []
-    
-    for village_code in all_village_codes:
-        # Get data for this village
-        recharge_info = recharge_map.get(village_code, {})
-        domestic_info = domestic_map.get(village_code, {})
-        agricultural_info = agricultural_map.get(village_code, {})
-        
-        recharge = recharge_info.get('recharge', 0)
-        domestic_demand = domestic_info.get('domestic_demand', 0)
-        agricultural_demand = agricultural_info.get('agricultural_demand', 0)
-        
-        # Calculate total demand
-        total_demand = domestic_demand + agricultural_demand
-        
-        # Calculate GSR (avoiding division by zero)
-        if total_demand > 0:
-            gsr = recharge / total_demand
-            gsr_status = "Sustainable" if gsr >= 1.0 else "Stressed"
-        else:
-            gsr = None
-            gsr_status = "No Demand"
-        
-        # Get trend status for this village using Village_ID from trend CSV
-        trend_status = trend_map.get(village_code, "No Trend Data")
-        
-        # ✅ NEW: Calculate GSR classification based on GSR value and trend
-        gsr_classification = calculate_gsr_classification(gsr, trend_status)
-        
-        # ✅ NEW: Get color for the classification
-        classification_color = get_classification_color(gsr_classification)
-        
-        # Get additional village information from raw data
-        village_info = {
-            'village_name': 'N/A',
-            'subdistrict_code': 'N/A'
-        }
-        
-        # Try to get village name and other info from any available dataset
-        for raw_data in [recharge_info.get('raw_data', {}), 
-                        domestic_info.get('raw_data', {}), 
-                        agricultural_info.get('raw_data', {})]:
-            if raw_data:
-                if village_info['village_name'] == 'N/A':
-                    village_info['village_name'] = raw_data.get('village_name', 
-                                                             raw_data.get('village', 'N/A'))
-                if village_info['subdistrict_code'] == 'N/A':
-                    village_info['subdistrict_code'] = raw_data.get('subdistrict_code', 
-                                                                  raw_data.get('subdis_cod', 'N/A'))
-        
-        # ✅ UPDATED: Create result record with classification and color fields
-        result = {
-            'village_code': village_code,
-            'village_name': village_info['village_name'],
-            'subdistrict_code': village_info['subdistrict_code'],
-            'recharge': round(recharge, 4),
-            'domestic_demand': round(domestic_demand, 4),
-            'agricultural_demand': round(agricultural_demand, 4),
-            'total_demand': round(total_demand, 4),
-            'gsr': round(gsr, 4) if gsr is not None else None,
-            'gsr_status': gsr_status,
-            'trend_status': trend_status,                  
-            'gsr_classification': gsr_classification,       
-            'classification_color': classification_color,    
-            'has_recharge_data': village_code in recharge_map,
-            'has_domestic_data': village_code in domestic_map,
-            'has_agricultural_data': village_code in agricultural_map,
-            'has_trend_data': village_code in trend_map
-        }
-        
-        results.append(result)
-    
+    timings = timings if timings is not None else {}
+
+    started = time.perf_counter()
+    trend_map = load_trend_data(trend_csv_filename) if trend_csv_filename else pd.Series(dtype=str)
+    timings['load_trend_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    recharge = _dataset_frame(recharge_data, 'village_co', 'recharge', 'recharge')
+    domestic = _dataset_frame(domestic_data, 'village_code', 'demand_mld', 'domestic_demand')
+    agricultural = _dataset_frame(agricultural_data, 'village_code', 'village_demand', 'agricultural_demand')
+
+    merged = recharge.join(domestic, how='outer', rsuffix='_dom').join(agricultural, how='outer', rsuffix='_agr')
+    if merged.empty:
+        timings['match_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return []
+
+    # Village name / subdistrict from the first dataset that has them
+    village_name = merged['name'].combine_first(merged['name_dom']).combine_first(merged['name_agr']).fillna('N/A')
+    subdistrict = merged['subdistrict'].combine_first(merged['subdistrict_dom']).combine_first(merged['subdistrict_agr']).fillna('N/A')
+
+    recharge_v = merged['recharge'].fillna(0).to_numpy(dtype=float)
+    domestic_v = merged['domestic_demand'].fillna(0).to_numpy(dtype=float)
+    agricultural_v = merged['agricultural_demand'].fillna(0).to_numpy(dtype=float)
+    total_v = domestic_v + agricultural_v
+
+    has_demand = total_v > 0
+    gsr_v = np.full(len(merged), np.nan)
+    np.divide(recharge_v, total_v, out=gsr_v, where=has_demand)
+    gsr_status = np.where(has_demand, np.where(gsr_v >= 1.0, 'Sustainable', 'Stressed'), 'No Demand')
+
+    codes = merged.index.to_series()
+    has_trend = codes.isin(trend_map.index).to_numpy()
+    trend_status = codes.map(trend_map).fillna('No Trend Data')
+    classification = classify_gsr(pd.Series(gsr_v), trend_status.reset_index(drop=True))
+    colors = pd.Series(classification).map(get_classification_color).to_numpy()
+
+    gsr_rounded = np.round(gsr_v, 4)
+    result_df = pd.DataFrame({
+        'village_code': merged.index.to_numpy(),
+        'village_name': village_name.to_numpy(),
+        'subdistrict_code': subdistrict.to_numpy(),
+        'recharge': np.round(recharge_v, 4),
+        'domestic_demand': np.round(domestic_v, 4),
+        'agricultural_demand': np.round(agricultural_v, 4),
+        'total_demand': np.round(total_v, 4),
+        'gsr': pd.Series(gsr_rounded).astype(object).where(has_demand, None).to_numpy(),
+        'gsr_status': gsr_status,
+        'trend_status': trend_status.to_numpy(),
+        'gsr_classification': classification,
+        'classification_color': colors,
+        'has_recharge_data': merged.index.isin(recharge.index),
+        'has_domestic_data': merged.index.isin(domestic.index),
+        'has_agricultural_data': merged.index.isin(agricultural.index),
+        'has_trend_data': has_trend,
+    })
+    results = result_df.to_dict('records')
+    timings['match_ms'] = round((time.perf_counter() - started) * 1000, 2)
     return results
 
 
@@ -545,6 +389,8 @@ class GSRComputeAPIView(APIView):
     
     def post(self, request, format=None):
         try:
+            request_started = time.perf_counter()
+            timings = {}
             data = request.data
             data = request.data.copy()   #  Make a mutable copy
             print("aaaaaaaaa")
@@ -564,6 +410,7 @@ class GSRComputeAPIView(APIView):
             agricultural_data = data.get('agriculturalData', [])
             selected_subdistricts = data.get('selectedSubDistricts', [])
             trend_csv_filename = data.get('trendCsvFilename')  # Get trend CSV filename
+            include_map_base64 = str(data.get('includeMapBase64', True)).lower() not in ('0', 'false', 'no')
             
             # Log trend CSV filename
             if trend_csv_filename:
@@ -589,7 +436,8 @@ class GSRComputeAPIView(APIView):
                 recharge_data, 
                 domestic_data, 
                 agricultural_data, 
-                trend_csv_filename
+                trend_csv_filename,
+                timings
             )
             
             if not matched_results:
@@ -615,32 +463,37 @@ class GSRComputeAPIView(APIView):
             ))
             
             # Calculate summary statistics
+            started = time.perf_counter()
             summary = calculate_gsr_summary(matched_results)
+            timings['summary_ms'] = round((time.perf_counter() - started) * 1000, 2)
             
             # ✅ NEW: Load village shapefile and merge with GSR data
+            started = time.perf_counter()
             village_gdf = load_village_shapefile()
+            timings['load_villages_ms'] = round((time.perf_counter() - started) * 1000, 2)
             geospatial_result = None
             map_image_filename = None
+            map_image_base64 = None
             
             if village_gdf is not None:
                 print("🗺️ Merging GSR data with village shapefile...")
+                started = time.perf_counter()
                 geospatial_result = merge_gsr_with_shapefile(matched_results, village_gdf)
+                timings['merge_ms'] = round((time.perf_counter() - started) * 1000, 2)
                 
                 # ✅ NEW: Generate map image if merge was successful
                 if geospatial_result.get('merged_gdf') is not None:
                     print("🎨 Generating GSR map image...")
+                    started = time.perf_counter()
                     map_image_filename = generate_gsr_map_image(geospatial_result['merged_gdf'])
-                    map_image_base64 = None
-                    if map_image_filename:
-                        map_image_path = os.path.join(settings.MEDIA_ROOT, 'temp', map_image_filename)
+                    timings['render_map_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                    if map_image_filename and include_map_base64:
                         try:
-                            with open(map_image_path, "rb") as img_file:
+                            with open(map_image_path(map_image_filename), "rb") as img_file:
                                 map_image_base64 = base64.b64encode(img_file.read()).decode("utf-8")
                         except Exception as e:
                             print(f"❌ Error encoding map image to base64: {str(e)}")
-
                     
-                                    
             else:
                 print("⚠️ Could not load village shapefile - proceeding without geospatial data")
                 geospatial_result = {
@@ -664,8 +517,11 @@ class GSRComputeAPIView(APIView):
                 print(f"  - Classification: {sample_result['gsr_classification']}")
                 print(f"  - Color: {sample_result['classification_color']}")
             
+            timings['total_ms'] = round((time.perf_counter() - request_started) * 1000, 2)
+
             # Additional metadata
             metadata = {
+                'timings': timings,
                 'computation_timestamp': pd.Timestamp.now().isoformat(),
                 'input_datasets': {
                     'recharge_villages': len(recharge_data),
@@ -697,6 +553,7 @@ class GSRComputeAPIView(APIView):
             "geospatial_data": geospatial_result['geojson'],
             "merge_statistics": geospatial_result['merge_statistics'],
             "map_image_filename": map_image_filename,  # ✅ NEW: Return map image filename
+            "map_image_url": request.build_absolute_uri(reverse('gsr-map', args=[map_image_filename])) if map_image_filename else None,
             "map_image_base64": f"data:image/png;base64,{map_image_base64}" if map_image_base64 else None  # ✅ NEW: Add base64 image string
         }
 
@@ -725,7 +582,8 @@ class GSRComputeAPIView(APIView):
                 "trendCsvFilename": "Optional filename of trend CSV (stored in media/temp/) with Village_ID field",
                 "hasDomesticDemand": "Boolean flag",
                 "hasAgriculturalDemand": "Boolean flag", 
-                "hasRechargeData": "Boolean flag"
+                "hasRechargeData": "Boolean flag",
+                "includeMapBase64": "Optional boolean, inline the map PNG as base64 (default true)"
             },
             "response_format": {
                 "success": "Boolean",
@@ -734,7 +592,9 @@ class GSRComputeAPIView(APIView):
                 "metadata": "Additional computation metadata including map_image_filename",
                 "geospatial_data": "GeoJSON FeatureCollection with village polygons and GSR data merged",
                 "merge_statistics": "Statistics about shapefile-GSR data merge success",
-                "map_image_filename": "Filename of generated map image saved in media/temp/"
+                "map_image_filename": "Filename of generated map image saved in media/temp/gsr_maps/",
+                "map_image_url": "URL of the map image (content-addressed, cached by browsers)",
+                "map_image_base64": "Inline PNG, unless includeMapBase64 is false"
             },
             "shapefile_integration": {
                 "shapefile_path": "media/gwa_data/gwa_shp/Final_Village/Village.shp",
@@ -747,9 +607,9 @@ class GSRComputeAPIView(APIView):
             },
             "map_image_generation": {
                 "description": "Automatically generates a choropleth map image of GSR classifications",
-                "output_format": "PNG image at 300 DPI",
-                "save_location": "media/temp/",
-                "filename_pattern": "gsr_map_YYYYMMDD_HHMMSS_<8-char-uuid>.png",
+                "output_format": "PNG image at 150 DPI",
+                "save_location": "media/temp/gsr_maps/",
+                "filename_pattern": "gsr_map_<content-hash>.png",
                 "features": [
                     "Color-coded villages by GSR classification",
                     "Legend showing classification meanings and village counts",
@@ -787,4 +647,32 @@ class GSRComputeAPIView(APIView):
                     "color": "gold"
                 }
             }
-        }, status=200)
\ No newline at end of file
+        }, status=200)
+
+
+class GSRMapImageView(APIView):
+    """
+    Serves rendered GSR maps. Names are content hashes, so the response is
+    immutable: long max-age plus an ETag for conditional requests. A map the
+    temp evictor removed is rendered again from its spec.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, filename, format=None):
+        path = map_image_path(filename)
+        if path is None:
+            raise Http404("Map image not found")
+        if not os.path.exists(path):
+            path = rerender_gsr_map(filename, load_village_shapefile(), get_classification_color)
+            if path is None or not os.path.exists(path):
+                raise Http404("Map image not found")
+
+        etag = f'"{os.path.splitext(filename)[0][len("gsr_map_"):]}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            temp_registry.touch(path)
+            response = FileResponse(open(path, 'rb'), content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={SPEC_TTL_SECONDS}, immutable'
+        return response
@@ -0,0 +1,279 @@
+"""
+Cached GSR classification map renderer.
+
+The static layers of a map -- the basemap and the village outlines for the
+selected extent -- are rendered once onto a fixed pixel grid and cached
+(in-process and as PNGs under media/temp/gsr_maps). Per request only the
+classification fill is rasterized onto that grid and composited in numpy
+before the title/legend frame is drawn.
+
+Final images are content-addressed: the file name is a hash of the extent,
+the villages and their classifications, so a repeated run returns the
+existing file without rendering, and the image can be served with
+long-lived HTTP caching.
+
+Next to each image a small spec (village code -> classification) is kept
+under media/gsr_map_specs. The PNG is a temp artifact; when the evictor
+removes it, rerender_gsr_map() draws it again from the spec and the village
+layer, so a map URL keeps working for SPEC_TTL_SECONDS after its last use.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+import matplotlib.patches as mpatches
+import matplotlib.pyplot as plt
+from rasterio.features import rasterize
+from rasterio.transform import from_bounds
+
+from main.temp_artifacts import temp_registry
+
+# Bump when the look of the map changes so cached images are not reused
+STYLE_VERSION = 'gsr-map-v1'
+
+GRID_WIDTH = 1600
+BASEMAP_ZOOM = 10
+MAP_FILENAME_RE = re.compile(r'^gsr_map_[0-9a-f]{24}\.png$')
+SPEC_TTL_SECONDS = 30 * 24 * 3600
+
+_BACKGROUND_CACHE_SIZE = 8
+_background_cache = OrderedDict()
+_background_lock = threading.Lock()
+
+
+def map_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'temp', 'gsr_maps')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spec_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'gsr_map_specs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _spec_path(filename):
+    return os.path.join(spec_dir(), f"{os.path.splitext(filename)[0]}.json")
+
+
+def map_image_path(filename):
+    """Absolute path of a rendered map, or None if the name is not a map artifact"""
+    if not filename or not MAP_FILENAME_RE.match(filename):
+        return None
+    return os.path.join(map_dir(), filename)
+
+
+def _mpl_color(color):
+    """'transparent' (used for No Data) is not a matplotlib colour name"""
+    return 'none' if color == 'transparent' else color
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+
+
+def _extent(gdf):
+    """Padded WGS84 extent of the villages, rounded so nearby runs share a background"""
+    minx, miny, maxx, maxy = gdf.total_bounds
+    pad_x = max((maxx - minx) * 0.02, 1e-3)
+    pad_y = max((maxy - miny) * 0.02, 1e-3)
+    return tuple(round(float(v), 4) for v in (minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y))
+
+
+def _grid_shape(extent):
+    """Pixel grid for the extent with the same x/y scaling geopandas uses for EPSG:4326"""
+    minx, miny, maxx, maxy = extent
+    mid_lat = np.radians((miny + maxy) / 2)
+    height = GRID_WIDTH * (maxy - miny) / (maxx - minx) / max(np.cos(mid_lat), 1e-6)
+    return int(np.clip(round(height), 200, 4000)), GRID_WIDTH
+
+
+def _render_layer(extent, shape, draw, transparent):
+    """Render draw(ax) onto an axes that exactly fills a (rows x cols) pixel canvas"""
+    height, width = shape
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    if transparent:
+        fig.patch.set_alpha(0)
+        ax.patch.set_alpha(0)
+    draw(ax)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.set_aspect('auto')
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:height, :width].copy()
+
+
+def _static_layers(gdf, extent, shape):
+    """(basemap RGBA, outlines RGBA) for the extent and villages, cached"""
+    codes = sorted(gdf['village_co'].astype(str).tolist())
+    key = _digest([STYLE_VERSION, extent, shape, codes])
+
+    with _background_lock:
+        if key in _background_cache:
+            _background_cache.move_to_end(key)
+            return _background_cache[key]
+
+    basemap_path = os.path.join(map_dir(), f"bg_{key}_basemap.png")
+    outline_path = os.path.join(map_dir(), f"bg_{key}_outline.png")
+
+    if os.path.exists(basemap_path) and os.path.exists(outline_path):
+        with temp_registry.in_use(basemap_path), temp_registry.in_use(outline_path):
+            basemap = (plt.imread(basemap_path) * 255).astype(np.uint8)
+            outlines = (plt.imread(outline_path) * 255).astype(np.uint8)
+    else:
+        def draw_basemap(ax):
+            import contextily as ctx
+            ax.set_xlim(extent[0], extent[2])
+            ax.set_ylim(extent[1], extent[3])
+            try:
+                ctx.add_basemap(ax, crs='EPSG:4326', source=ctx.providers.CartoDB.Voyager,
+                                alpha=1, zoom=BASEMAP_ZOOM)
+            except Exception as e:
+                print(f"⚠️ Basemap loading failed: {e}")
+
+        def draw_outlines(ax):
+            gdf.boundary.plot(ax=ax, color='black', linewidth=0.75)
+
+        basemap = _render_layer(extent, shape, draw_basemap, transparent=False)
+        outlines = _render_layer(extent, shape, draw_outlines, transparent=True)
+        plt.imsave(basemap_path, basemap)
+        plt.imsave(outline_path, outlines)
+        temp_registry.register(basemap_path, owner='gwa.gsr')
+        temp_registry.register(outline_path, owner='gwa.gsr')
+        print(f"🗺️ Rendered GSR map background {key}")
+
+    with _background_lock:
+        _background_cache[key] = (basemap, outlines)
+        while len(_background_cache) > _BACKGROUND_CACHE_SIZE:
+            _background_cache.popitem(last=False)
+    return basemap, outlines
+
+
+def _classification_fill(gdf, extent, shape, color_for):
+    """RGBA fill raster: every village burned with its classification colour"""
+    village_classes = gdf['gsr_classification'].fillna('').astype(str)
+    classes = sorted(set(village_classes))
+    lut = np.zeros((len(classes) + 1, 4), dtype=np.float32)
+    for idx, cl in enumerate(classes, start=1):
+        lut[idx] = to_rgba(_mpl_color(color_for(cl)))
+
+    class_index = {cl: idx for idx, cl in enumerate(classes, start=1)}
+    labels = rasterize(
+        ((geom, class_index[cl]) for geom, cl in zip(gdf.geometry, village_classes)
+         if geom is not None and not geom.is_empty),
+        out_shape=shape,
+        transform=from_bounds(*extent, shape[1], shape[0]),
+        fill=0,
+        dtype='int32'
+    )
+    return lut[labels]
+
+
+def _composite(basemap, fill, outlines):
+    """basemap <- classification fill <- outlines, alpha-over in float"""
+    out = basemap[..., :3].astype(np.float32) / 255
+    for layer in (fill, outlines.astype(np.float32) / 255):
+        alpha = layer[..., 3:4]
+        out = out * (1 - alpha) + layer[..., :3] * alpha
+    return (np.clip(out, 0, 1) * 255).astype(np.uint8)
+
+
+def render_gsr_map(merged_gdf, color_for):
+    """
+    Render (or reuse) the GSR classification map for merged_gdf (EPSG:4326,
+    with village_co and gsr_classification). Returns the image filename.
+    """
+    gdf = merged_gdf[['village_co', 'gsr_classification', 'geometry']].copy()
+    gdf['village_co'] = gdf['village_co'].astype(str)
+    gdf['geometry'] = gdf['geometry'].simplify(tolerance=0.0001, preserve_topology=True)
+
+    extent = _extent(gdf)
+    shape = _grid_shape(extent)
+    classes = sorted(zip(gdf['village_co'], gdf['gsr_classification'].fillna('').astype(str)))
+    filename = f"gsr_map_{_digest([STYLE_VERSION, extent, shape, classes])}.png"
+    filepath = os.path.join(map_dir(), filename)
+
+    spec_path = _spec_path(filename)
+    if not os.path.exists(spec_path):
+        tmp_path = f"{spec_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'classes': classes}, f)
+        os.replace(tmp_path, spec_path)
+    temp_registry.register(spec_path, owner='gwa.gsr_specs', ttl_seconds=SPEC_TTL_SECONDS)
+
+    if os.path.exists(filepath):
+        temp_registry.touch(filepath)
+        print(f"🗺️ Reusing cached GSR map image: {filename}")
+        return filename
+
+    basemap, outlines = _static_layers(gdf, extent, shape)
+    image = _composite(basemap, _classification_fill(gdf, extent, shape, color_for), outlines)
+
+    # Frame: title, axes labels, grid and legend, as before
+    fig = Figure(figsize=(15, 12))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.imshow(image, extent=(extent[0], extent[2], extent[1], extent[3]), aspect='auto', interpolation='antialiased')
+    ax.set_title('GSR Classification Map\n(Groundwater Supply-Requirement Analysis)',
+                 fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('LONGITUDE', fontsize=12)
+    ax.set_ylabel('LATITUDE', fontsize=12)
+
+    classification_counts = gdf['gsr_classification'].value_counts()
+    legend_handles = [
+        mpatches.Patch(color=_mpl_color(color_for(cl)), label=f"{cl} ({classification_counts.get(cl, 0)})")
+        for cl in gdf['gsr_classification'].unique() if cl
+    ]
+    ax.legend(
+        handles=legend_handles,
+        title='GSR Classifications',
+        title_fontsize=12,
+        fontsize=10,
+        loc='upper left',
+        bbox_to_anchor=(1.02, 1),
+        frameon=True,
+        fancybox=True,
+        shadow=True
+    )
+    ax.tick_params(axis='both', which='major', labelsize=10)
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, format='png', dpi=150, bbox_inches='tight', facecolor='white', edgecolor='none')
+    os.replace(tmp_path, filepath)
+    temp_registry.register(filepath, owner='gwa.gsr')
+
+    print(f"🗺️ GSR map image saved successfully: {filepath}")
+    return filename
+
+
+def rerender_gsr_map(filename, village_gdf, color_for):
+    """
+    Path of a map whose PNG was evicted, drawn again from its spec and the
+    village layer (EPSG:4326 with village_co). None if the spec is gone.
+    """
+    try:
+        with open(_spec_path(filename)) as f:
+            classes = dict(json.load(f)['classes'])
+    except FileNotFoundError:
+        return None
+    if village_gdf is None:
+        return None
+
+    gdf = village_gdf[village_gdf['village_co'].astype(str).isin(classes)].copy()
+    gdf['gsr_classification'] = gdf['village_co'].astype(str).map(classes)
+    return map_image_path(render_gsr_map(gdf, color_for))
@@ -32,6 +32,7 @@ import contextily as ctx
 from PIL import Image
 import base64
 from io import BytesIO
+from main.temp_artifacts import temp_registry
 
 # GeoServer configuration
 GEOSERVER_URL = "http://geoserver:8080/geoserver/rest"
@@ -1180,6 +1181,10 @@ class InterpolateRasterView(APIView):
             except Exception as e:
                 print(f"[!] Failed to delete intermediate GeoTIFFs: {e}")
 
+            temp_registry.register(final_tiff_path, owner='gwa.interpolation')
+            if create_colored:
+                temp_registry.register(final_colored_path, owner='gwa.interpolation')
+
             contour_geojson = None
             if generate_contours and final_tiff_path.exists():
                 print(f"[DEBUG] Starting contour generation as GeoJSON...")
@@ -1210,6 +1215,7 @@ class InterpolateRasterView(APIView):
                 )
                 
                 if png_path:
+                    temp_registry.register(png_path, owner='gwa.interpolation')
                     print(f"[✓] PNG visualization created: {png_path}")
                 else:
                     print("[WARNING] Failed to create PNG visualization")
@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from django.conf import settings
+from main.temp_artifacts import temp_registry
 import uuid
 from datetime import datetime
 import numpy as np
@@ -248,6 +249,7 @@ class PDFGenerationView(APIView):
             # Save with high DPI for better quality
             plt.savefig(image_path, dpi=300, bbox_inches='tight', facecolor='white')
             plt.close()  # Close to free memory
+            temp_registry.register(image_path, owner='gwa.pdf')
 
             print(f"💾 Map saved to: {image_path}")
             
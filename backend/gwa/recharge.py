@@ -8,6 +8,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from main.temp_artifacts import temp_registry
 
 
 class GroundwaterRechargeView(APIView):
@@ -41,7 +42,8 @@ class GroundwaterRechargeView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            df = pd.read_csv(csv_path)
+            with temp_registry.in_use(csv_path):
+                df = pd.read_csv(csv_path)
             if df.empty:
                 return Response(
                     {"success": False, "message": "CSV file is empty"},
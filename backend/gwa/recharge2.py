@@ -9,50 +9,30 @@ from rasterio.crs import CRS
 from rasterio.mask import mask
 from rasterio.features import geometry_mask
 from scipy.spatial import cKDTree
-from rasterstats import zonal_stats
 from shapely.geometry import Point
 from shapely.ops import unary_union
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from concurrent.futures import ThreadPoolExecutor
-import multiprocessing
+from main.temp_artifacts import temp_registry
+from .zonal import zonal_stats_raster, zonal_records
+from .recharge_batch import (
+    BUFFER_MIN_WELLS, MIN_IDW_WELLS, batch_recharge_table, fluctuation_matrix, idw_stack,
+    resolve_year_pairs, village_names,
+)
 
 class GroundwaterRechargeView(APIView):
     permission_classes = [AllowAny]
 
-    def fast_zonal_stats(self, geometries, raster_path, stats_list, nodata=-9999, chunk_size=100):
+    def fast_zonal_stats(self, geometries, raster_path, stats_list=None, nodata=-9999, all_touched=True):
         """
-        ULTRA-FAST parallelized zonal statistics using multithreading
+        Zonal statistics for all villages from one label raster over the
+        union window (see gwa/zonal.py). Returns rasterstats-style dicts.
         """
-        def process_chunk(start_idx):
-            end_idx = min(start_idx + chunk_size, len(geometries))
-            chunk_geoms = geometries[start_idx:end_idx]
-            return zonal_stats(
-                chunk_geoms,
-                raster_path,
-                stats=stats_list,
-                nodata=nodata,
-                all_touched=True
-            )
-
-        # Use all available CPU cores for maximum speed
-        max_workers = min(multiprocessing.cpu_count(), 8)  # Cap at 8 to avoid overhead
-        results = []
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all chunks for parallel processing
-            futures = [
-                executor.submit(process_chunk, i) 
-                for i in range(0, len(geometries), chunk_size)
-            ]
-            
-            # Collect results as they complete
-            for future in futures:
-                results.extend(future.result())
-
-        return results
+        return zonal_records(
+            zonal_stats_raster(raster_path, geometries, nodata=nodata, all_touched=all_touched)
+        )
 
     def interpolate_for_villages(self, points_gdf, filtered_gdf, cell_size=30, power=2, 
                                search_mode="variable", n_neighbors=3, radius=None, nodata_val=-9999):
@@ -214,7 +194,8 @@ class GroundwaterRechargeView(APIView):
                 )
 
             # Use faster CSV reading with dtype specification
-            df = pd.read_csv(csv_path, dtype={'LATITUDE': 'float32', 'LONGITUDE': 'float32'})
+            with temp_registry.in_use(csv_path):
+                df = pd.read_csv(csv_path, dtype={'LATITUDE': 'float32', 'LONGITUDE': 'float32'})
             if df.empty:
                 return Response(
                     {"success": False, "message": "CSV file is empty"},
@@ -342,19 +323,13 @@ class GroundwaterRechargeView(APIView):
             # Find points within the expanded buffer
             points_within_region = points_gdf[points_gdf.geometry.within(buffered_region)]
             
-            if len(points_within_region) < 3:
-                # If still not enough points, use all available points
+            if len(points_within_region) < BUFFER_MIN_WELLS:
+                # Too few points near the selection: use all available points
+                print(f"⚠️ Using all {len(points_gdf)} points (only {len(points_within_region)} within {point_selection_buffer}m buffer)")
                 points_within_region = points_gdf
-                print(f"⚠️ Using all {len(points_gdf)} points (insufficient points within {point_selection_buffer}m buffer)")
             else:
                 print(f"🎯 Using {len(points_within_region)} points within {point_selection_buffer}m buffer of selected region")
             
-            # Ensure we have sufficient points for good interpolation
-            if len(points_within_region) < 5:
-                # If we still don't have enough points, expand to use more distant points
-                print(f"⚠️ Limited data points ({len(points_within_region)}), using all available points for better interpolation")
-                points_within_region = points_gdf
-            
             # Perform OPTIMIZED IDW interpolation
             try:
                 interpolated_grid, bounds, width, height, transform, _ = self.interpolate_for_villages(
@@ -417,6 +392,8 @@ class GroundwaterRechargeView(APIView):
 
             with rasterio.open(clipped_raster_path, "w", **out_meta) as dest:
                 dest.write(out_image)
+            temp_registry.register(output_raster_path, owner='gwa.recharge')
+            temp_registry.register(clipped_raster_path, owner='gwa.recharge')
             
             print(f"💾 OPTIMIZED IDW interpolation complete.")
             print(f"   • Full raster: {output_raster}")
@@ -430,21 +407,16 @@ class GroundwaterRechargeView(APIView):
                 village_geometries.append(row['geometry'])
                 village_codes.append(row['village_co'])
             
-            print(f"📊 Calculating ULTRA-FAST zonal statistics for {len(village_geometries)} villages using parallel processing")
-            
-            # Use ULTRA-FAST parallel zonal statistics
-            # Optimal chunk size based on number of villages and available cores
-            chunk_size = max(10, min(len(village_geometries) // (multiprocessing.cpu_count() * 2), 200))
+            print(f"📊 Calculating zonal statistics for {len(village_geometries)} villages from one label raster")
             
             zonal_results = self.fast_zonal_stats(
                 village_geometries,
                 clipped_raster_path,
                 ['mean', 'count', 'min', 'max', 'std', 'median'],
-                nodata=-9999,
-                chunk_size=chunk_size
+                nodata=-9999
             )
             
-            print(f"✅ ULTRA-FAST zonal statistics completed!")
+            print(f"✅ Zonal statistics completed!")
             
             # Step 6: Enhanced - Add recharge calculation using village, SY, and Shape_Area from shapefile
             print("🔧 Adding recharge calculation using village attributes from shapefile")
@@ -537,6 +509,7 @@ class GroundwaterRechargeView(APIView):
             results_filename = f"village_wise_groundwater_recharge_{timestamp}.csv"
             results_path = os.path.join('media', 'temp', results_filename)
             results_df.to_csv(results_path, index=False)  # Save all results, not just valid ones
+            temp_registry.register(results_path, owner='gwa.recharge')
             
             print(f"💾 Saved village-wise results: {results_filename}")
 
@@ -593,7 +566,7 @@ class GroundwaterRechargeView(APIView):
                 "idw_power": 2,
                 "search_mode": "variable",
                 "n_neighbors": 3,
-                "interpolation_type": "ULTRA-OPTIMIZED IDW + Parallel Zonal Stats"
+                "interpolation_type": "ULTRA-OPTIMIZED IDW + Label-Raster Zonal Stats"
             }
 
             # Convert results to safe format (include all villages for reference)
@@ -610,7 +583,7 @@ class GroundwaterRechargeView(APIView):
                     "filter_values": filter_values,
                     "pre_columns_found": pre_columns,
                     "post_columns_found": post_columns,
-                    "interpolation_method": "ULTRA-OPTIMIZED IDW + Parallel Zonal Stats",
+                    "interpolation_method": "ULTRA-OPTIMIZED IDW + Label-Raster Zonal Stats",
                     "coordinate_system": "EPSG:32644",
                     "interpolation_parameters": {
                         "cell_size": 30,
@@ -618,7 +591,7 @@ class GroundwaterRechargeView(APIView):
                         "search_mode": "variable",
                         "n_neighbors": 12,
                         "nodata_value": -9999,
-                        "optimization": "chunked_processing + parallel_zonal_stats"
+                        "optimization": "chunked_processing + label_raster_zonal_stats"
                     },
                     "recharge_calculation": "recharge = (Shape_Area × SY × mean_water_fluctuation)/1000",
                     "recharge_units": "cubic meters (m³)",
@@ -658,3 +631,199 @@ class GroundwaterRechargeView(APIView):
                 {"success": False, "message": f"Error processing groundwater recharge analysis: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class GroundwaterRechargeBatchView(APIView):
+    """
+    Recharge for many PRE/POST year pairs in one request.
+    The neighbour search, the interpolation grid and the zonal pass are shared
+    by all years; the result is a (village x year) recharge table.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        csv_filename = request.data.get('csvFilename')
+        year_pairs = request.data.get('yearPairs')
+        selected_villages = request.data.get('selectedVillages')
+        selected_subdistricts = request.data.get('selectedSubDistricts')
+
+        if not csv_filename or not year_pairs:
+            return Response(
+                {"success": False, "message": "Missing required fields: csvFilename and yearPairs"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not selected_villages and not selected_subdistricts:
+            return Response(
+                {"success": False, "message": "Either selectedVillages or selectedSubDistricts must be provided"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            csv_path = os.path.join('media', 'temp', csv_filename)
+            if not os.path.exists(csv_path):
+                return Response(
+                    {"success": False, "message": f"CSV file not found at {csv_path}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            with temp_registry.in_use(csv_path):
+                df = pd.read_csv(csv_path, dtype={'LATITUDE': 'float32', 'LONGITUDE': 'float32'})
+            df.columns = df.columns.str.strip()
+            if 'LATITUDE' not in df.columns or 'LONGITUDE' not in df.columns:
+                return Response(
+                    {"success": False, "message": f"Required coordinate columns 'LATITUDE', 'LONGITUDE' not found. Available: {list(df.columns)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                resolved = resolve_year_pairs(list(df.columns), year_pairs)
+            except ValueError as e:
+                return Response({"success": False, "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            labels = [label for label, _, _ in resolved]
+
+            df = df.dropna(subset=['LATITUDE', 'LONGITUDE']).reset_index(drop=True)
+            fluctuation = fluctuation_matrix(df, resolved)
+            print(f"📊 Batch recharge: {len(df)} wells x {len(labels)} year pairs")
+
+            # Villages
+            shp_path = os.path.join('media', 'gwa_data', 'gwa_shp', 'Final_Village', 'Village_PET_PE_SY_Crop.shp')
+            if not os.path.exists(shp_path):
+                return Response(
+                    {"success": False, "message": f"Village shapefile not found at {shp_path}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            gdf = gpd.read_file(shp_path)
+            required_shp_columns = ['village_co', 'SUBDIS_COD', 'village', 'SY', 'Shape_Area']
+            missing_columns = [c for c in required_shp_columns if c not in gdf.columns]
+            if missing_columns:
+                return Response(
+                    {"success": False, "message": f"Missing required columns in village shapefile: {missing_columns}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if selected_villages:
+                gdf['village_co'] = gdf['village_co'].astype(str)
+                filter_type, filter_values = "villages", [str(v) for v in selected_villages]
+                filtered_gdf = gdf[gdf['village_co'].isin(filter_values)].copy()
+            else:
+                gdf['SUBDIS_COD'] = pd.to_numeric(gdf['SUBDIS_COD'], errors='coerce')
+                filter_type, filter_values = "subdistricts", [int(s) for s in selected_subdistricts]
+                filtered_gdf = gdf[gdf['SUBDIS_COD'].isin(filter_values)].copy()
+
+            if filtered_gdf.empty:
+                return Response(
+                    {"success": False, "message": f"No features found for selected {filter_type}: {filter_values}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if filtered_gdf.crs != 'EPSG:32644':
+                filtered_gdf = filtered_gdf.to_crs('EPSG:32644')
+
+            # Wells: same 5 km buffer rule as the single-year flow
+            points_gdf = gpd.GeoDataFrame(
+                df,
+                geometry=[Point(xy) for xy in zip(df['LONGITUDE'], df['LATITUDE'])],
+                crs='EPSG:4326'
+            ).to_crs('EPSG:32644')
+            inside = points_gdf.geometry.within(unary_union(filtered_gdf.geometry).buffer(5000)).to_numpy()
+            if inside.sum() < BUFFER_MIN_WELLS:
+                inside[:] = True
+
+            has_value = np.isfinite(fluctuation).any(axis=1)
+            keep = inside & has_value
+            coords = np.column_stack([points_gdf.geometry.x.to_numpy(), points_gdf.geometry.y.to_numpy()])[keep]
+            values = fluctuation[keep]
+
+            # Years without at least MIN_IDW_WELLS wells cannot be interpolated
+            wells_per_year = np.isfinite(values).sum(axis=0)
+            skipped = [label for label, n in zip(labels, wells_per_year) if n < MIN_IDW_WELLS]
+            values[:, wells_per_year < MIN_IDW_WELLS] = np.nan
+            if len(skipped) == len(labels):
+                return Response(
+                    {"success": False, "message": f"No year pair has at least {MIN_IDW_WELLS} valid wells for interpolation"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            stack, transform = idw_stack(coords, values, filtered_gdf.total_bounds, cell_size=30, power=2, n_neighbors=3)
+            recharge_df, fluctuation_df, count_df = batch_recharge_table(filtered_gdf, stack, transform, labels)
+
+            # Outputs: one multi-band fluctuation raster and one wide recharge table
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            raster_name = f"water_fluctuation_idw_batch_{timestamp}.tif"
+            raster_path = os.path.join('media', 'temp', raster_name)
+            with rasterio.open(
+                raster_path, "w", driver="GTiff",
+                height=stack.shape[1], width=stack.shape[2], count=stack.shape[0],
+                dtype=rasterio.float32, crs=CRS.from_epsg(32644), transform=transform,
+                nodata=np.nan, compress='lzw', tiled=True, blockxsize=256, blockysize=256
+            ) as dst:
+                dst.write(stack)
+                for band, label in enumerate(labels, start=1):
+                    dst.set_band_description(band, str(label))
+            temp_registry.register(raster_path, owner='gwa.recharge')
+
+            names = village_names(filtered_gdf)
+            table = recharge_df.copy()
+            table.insert(0, 'village', names.reindex(table.index).to_numpy())
+            results_name = f"village_wise_groundwater_recharge_batch_{timestamp}.csv"
+            results_path = os.path.join('media', 'temp', results_name)
+            table.to_csv(results_path)
+            temp_registry.register(results_path, owner='gwa.recharge')
+
+            def safe(value):
+                return None if pd.isna(value) or np.isinf(value) else float(value)
+
+            village_rows = []
+            for code in recharge_df.index:
+                village_rows.append({
+                    "village_co": code,
+                    "village": names.get(code),
+                    "recharge": {label: safe(recharge_df.at[code, label]) for label in labels},
+                    "mean_water_fluctuation": {label: safe(fluctuation_df.at[code, label]) for label in labels},
+                    "pixel_count": {label: int(count_df.at[code, label]) for label in labels},
+                })
+
+            yearly_summary = {
+                label: {
+                    "wells_used": int(wells_per_year[i]),
+                    "villages_with_data": int((count_df[label] > 0).sum()),
+                    "total_recharge_mcm": round(float(np.nansum(recharge_df[label].to_numpy())) / 1_000_000, 4),
+                }
+                for i, label in enumerate(labels)
+            }
+
+            return Response({
+                "success": True,
+                "message": f"Batch analysis complete for {len(labels) - len(skipped)}/{len(labels)} year pairs.",
+                "metadata": {
+                    "processing_timestamp": datetime.now().isoformat(),
+                    "input_csv": csv_filename,
+                    "filter_type": filter_type,
+                    "filter_values": filter_values,
+                    "year_pairs": labels,
+                    "skipped_year_pairs": skipped,
+                    "interpolation_method": "Shared-neighbour IDW stack + single zonal pass",
+                    "recharge_calculation": "recharge = (Shape_Area × SY × mean_water_fluctuation)/1000",
+                },
+                "output_files": {
+                    "interpolated_raster_stack": {
+                        "filename": raster_name,
+                        "path": raster_path,
+                        "size_bytes": os.path.getsize(raster_path),
+                        "bands": labels,
+                    },
+                    "village_results_csv": {
+                        "filename": results_name,
+                        "path": results_path,
+                        "size_bytes": os.path.getsize(results_path),
+                    },
+                },
+                "yearly_summary": yearly_summary,
+                "village_wise_results": village_rows,
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            print(f"❌ Error in batch groundwater recharge analysis: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return Response(
+                {"success": False, "message": f"Error processing batch groundwater recharge analysis: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
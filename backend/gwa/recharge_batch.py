@@ -0,0 +1,172 @@
+import re
+
+import numpy as np
+import pandas as pd
+from rasterio.features import geometry_mask
+from rasterio.transform import from_origin
+from scipy.spatial import cKDTree
+from shapely.ops import unary_union
+
+from .zonal import zonal_stats_array
+
+# Extra neighbour candidates per grid cell so every year can still find
+# n_neighbors valid wells when some wells are missing that year
+CANDIDATE_FACTOR = 4
+# Fewer wells than this within the 5 km buffer: use every well (both flows)
+BUFFER_MIN_WELLS = 5
+# Fewer valid wells than this: the year cannot be interpolated
+MIN_IDW_WELLS = 3
+
+
+def resolve_year_pairs(columns, year_pairs):
+    """
+    Turn the requested year pairs into (label, pre_columns, post_columns).
+
+    Each item can be a year (2015 -> every column containing 'pre' / 'post'
+    and '2015'), a [pre_column, post_column] pair or {"pre": ..., "post": ...}.
+    Raises ValueError naming the first pair that matches no columns.
+    """
+    resolved = []
+    for item in year_pairs:
+        if isinstance(item, dict):
+            pre, post = item.get('pre'), item.get('post')
+            label = item.get('label') or f"{pre}-{post}"
+            pre_cols, post_cols = [pre], [post]
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            pre_cols, post_cols = [item[0]], [item[1]]
+            label = f"{item[0]}-{item[1]}"
+        else:
+            year = str(item).strip()
+            label = year
+            pre_cols = [c for c in columns if 'pre' in c.lower() and re.search(rf"(?<!\d){year}(?!\d)", c)]
+            post_cols = [c for c in columns if 'post' in c.lower() and re.search(rf"(?<!\d){year}(?!\d)", c)]
+
+        missing = [c for c in pre_cols + post_cols if c not in columns]
+        if not pre_cols or not post_cols or missing:
+            raise ValueError(f"Could not resolve pre/post columns for year pair {item!r}")
+        resolved.append((label, pre_cols, post_cols))
+    return resolved
+
+
+def fluctuation_matrix(df, resolved_pairs):
+    """(points x years) water fluctuation = mean(pre) - mean(post), NaN where missing"""
+    columns = []
+    for _, pre_cols, post_cols in resolved_pairs:
+        pre = df[pre_cols].apply(pd.to_numeric, errors='coerce').mean(axis=1, skipna=True)
+        post = df[post_cols].apply(pd.to_numeric, errors='coerce').mean(axis=1, skipna=True)
+        columns.append((pre - post).to_numpy(dtype=np.float64))
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+
+def _idw_points(tree, values, points, k, power):
+    """IDW at points from the k nearest of the tree's wells"""
+    dists, idxs = tree.query(points, k=k)
+    if k == 1:
+        dists, idxs = dists[:, None], idxs[:, None]
+    dists[dists == 0] = 1e-10
+    w = 1.0 / (dists ** power)
+    return (w * values[idxs]).sum(axis=1) / w.sum(axis=1)
+
+
+def idw_stack(coords, values, bounds, cell_size=30, power=2, n_neighbors=3, chunk_size=10000):
+    """
+    IDW-interpolate every column of values onto one grid in a single sweep.
+
+    The KD-tree and the neighbour query are shared by all years: each grid
+    cell queries n_neighbors * CANDIDATE_FACTOR candidates once, and each year
+    uses its n_neighbors nearest candidates that have a value that year.
+    Cells where too few candidates have a value that year are queried again
+    against that year's valid wells only, so every band follows the
+    single-year "n_neighbors nearest valid wells" rule.
+
+    Returns (stack (years x rows x cols) float32, transform).
+    """
+    minx, miny, maxx, maxy = bounds
+    x_coords = np.arange(minx, maxx, cell_size)
+    y_coords = np.arange(miny, maxy, cell_size)
+    grid_x, grid_y = np.meshgrid(x_coords, y_coords[::-1])
+    xi = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    n_years = values.shape[1]
+    k = int(min(len(coords), n_neighbors * CANDIDATE_FACTOR))
+    tree = cKDTree(coords)
+    valid_values = np.isfinite(values)
+    filled = np.where(valid_values, values, 0.0)
+    need = np.minimum(valid_values.sum(axis=0), n_neighbors)   # wells per cell, per year
+    year_trees = {}
+
+    out = np.empty((n_years, len(xi)), dtype=np.float32)
+    for start in range(0, len(xi), chunk_size):
+        end = min(start + chunk_size, len(xi))
+        dists, idxs = tree.query(xi[start:end], k=k)
+        if k == 1:
+            dists, idxs = dists[:, None], idxs[:, None]
+        dists[dists == 0] = 1e-10
+        base_w = 1.0 / (dists ** power)                      # (cells x k)
+
+        use = valid_values[idxs]                             # (cells x k x years)
+        use &= np.cumsum(use, axis=1) <= n_neighbors
+        w = base_w[:, :, None] * use
+        w_sum = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[:, start:end] = ((w * filled[idxs]).sum(axis=1) / w_sum).T
+
+        deficient = use.sum(axis=1) < need[None, :]           # (cells x years)
+        for year in np.flatnonzero(deficient.any(axis=0)):
+            if need[year] == 0:
+                continue
+            if year not in year_trees:
+                valid = valid_values[:, year]
+                year_trees[year] = (cKDTree(coords[valid]), values[valid, year])
+            cells = np.flatnonzero(deficient[:, year])
+            year_tree, year_values = year_trees[year]
+            out[year, start + cells] = _idw_points(
+                year_tree, year_values, xi[start:end][cells], int(need[year]), power
+            )
+
+    stack = out.reshape(n_years, *grid_x.shape)
+    transform = from_origin(minx, maxy, cell_size, cell_size)
+    return stack, transform
+
+
+def batch_recharge_table(filtered_gdf, stack, transform, labels):
+    """
+    One zonal pass over all fluctuation bands.
+
+    Pixels whose centre is outside the selected villages are dropped first
+    (as the single-year flow does by clipping the raster), then every band is
+    reduced per village with all_touched zones.
+
+    Returns (recharge (villages x years), mean fluctuation (villages x years),
+    pixel counts (villages x years)) as DataFrames indexed by village_co.
+    """
+    geometries = list(filtered_gdf.geometry)
+    outside = geometry_mask(
+        [unary_union(geometries)], out_shape=stack.shape[1:], transform=transform, all_touched=False
+    )
+    clipped = np.where(outside[None, :, :], np.nan, stack)
+
+    stats = zonal_stats_array(clipped, transform, geometries, all_touched=True)
+    mean = stats['mean'].T                                   # (villages x years)
+    count = stats['count'].T
+
+    area = pd.to_numeric(filtered_gdf['Shape_Area'], errors='coerce').to_numpy(dtype=np.float64)
+    sy = pd.to_numeric(filtered_gdf['SY'], errors='coerce').to_numpy(dtype=np.float64)
+    recharge = np.where(count > 0, (area * sy)[:, None] * mean / 1000, np.nan)
+
+    # Villages split over several polygons share a code: sum recharge and
+    # pixels per code, and weight the mean fluctuation by pixel count
+    index = pd.Index(filtered_gdf['village_co'].astype(str).to_numpy(), name='village_co')
+    by_code = [
+        pd.DataFrame(a, index=index, columns=labels).groupby(level=0, sort=False).sum(min_count=1)
+        for a in (recharge, mean * count, count)
+    ]
+    recharge_df, weighted_df, count_df = by_code
+    count_df = count_df.fillna(0)
+    return recharge_df, weighted_df / count_df.where(count_df > 0), count_df
+
+
+def village_names(filtered_gdf):
+    """village name per village_co (first polygon's name when a code repeats)"""
+    names = pd.Series(filtered_gdf['village'].to_numpy(), index=filtered_gdf['village_co'].astype(str).to_numpy())
+    return names[~names.index.duplicated()]
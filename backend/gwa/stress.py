@@ -1,8 +1,11 @@
 import os
+import threading
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -10,6 +13,124 @@ from rest_framework import status
 from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 
+VILLAGE_CODE_FIELDS = ['village_code', 'village_co', 'villageCode']
+RECHARGE_FIELDS = ['recharge', 'Recharge']
+DEMAND_FIELDS = ['total_demand', 'totalDemand', 'total_demand_mld']
+
+_injection_cache = {}
+_injection_lock = threading.Lock()
+
+
+def injection_shapefile_path() -> str:
+    return os.path.join(
+        settings.BASE_DIR, 'media', 'gwa_data', 'gwa_shp', 'Final_Village', 'Injection_Water_Need.shp'
+    )
+
+
+def load_injection_layer() -> gpd.GeoDataFrame:
+    """
+    Injection village layer indexed by normalized village_co, with a float
+    'injection' column. Held per process and reloaded only when the
+    shapefile changes on disk.
+    """
+    shapefile_path = injection_shapefile_path()
+    if not os.path.exists(shapefile_path):
+        raise FileNotFoundError(f"Shapefile not found at {shapefile_path}")
+
+    mtime = os.path.getmtime(shapefile_path)
+    with _injection_lock:
+        cached = _injection_cache.get(shapefile_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        gdf = gpd.read_file(shapefile_path)
+        if 'village_co' not in gdf.columns or 'Injection_' not in gdf.columns:
+            raise ValueError("Expected columns 'village_co' and 'Injection_' not found in shapefile")
+
+        gdf['village_co'] = gdf['village_co'].astype(str).str.strip()
+        gdf = gdf[gdf['village_co'] != '']
+        gdf['injection'] = pd.to_numeric(gdf['Injection_'], errors='coerce').fillna(0.0).astype(np.float64)
+        # Last row wins for duplicate codes, like the old dict build
+        gdf = gdf.drop_duplicates('village_co', keep='last').set_index('village_co')
+
+        _injection_cache[shapefile_path] = (mtime, gdf)
+        print(f"✅ Loaded shapefile with {len(gdf)} villages with injection data")
+        return gdf
+
+
+def _first_present(frame: pd.DataFrame, fields: List[str]) -> pd.Series:
+    """Per row, the value of the first of fields present in that row's dict"""
+    out = pd.Series(None, index=frame.index, dtype=object)
+    taken = pd.Series(False, index=frame.index)
+    for field in fields:
+        if field in frame.columns:
+            present = frame[field].notna() & ~taken
+            out[present] = frame.loc[present, field]
+            taken |= present
+    return out
+
+
+def _village_codes(records: List[Dict[str, Any]], index: pd.Index) -> pd.Series:
+    """
+    Per record, the stripped string of the first code field it has ('' if
+    none). Built from the dicts: a DataFrame column holding a missing code
+    is float, which turns 123 into '123.0'.
+    """
+    codes = []
+    for row in records:
+        field = next((f for f in VILLAGE_CODE_FIELDS if f in row), None)
+        codes.append(str(row[field]).strip() if field else '')
+    return pd.Series(codes, index=index, dtype=object)
+
+
+def _numeric(raw: pd.Series):
+    """float(value or 0) per row; returns (values, parse_failed mask)"""
+    empty = raw.isna() | raw.astype(str).str.strip().isin(['', 'False'])
+    values = pd.to_numeric(raw.where(~empty), errors='coerce')
+    failed = values.isna() & ~empty
+    return values.fillna(0.0).to_numpy(dtype=np.float64), failed.to_numpy()
+
+
+def score_stress(gsr_data: List[Dict[str, Any]], injection_layer: gpd.GeoDataFrame,
+                 years_counts: List[int]) -> Dict[str, Any]:
+    """
+    Vectorized stress scoring of the submitted GSR rows for one or more
+    years_count scenarios:
+
+        stress[v, y] = (max(recharge - total_demand, 0) + injection / years[y]) / 1000
+
+    Rows without a village code, not in the injection layer or with
+    unparseable numbers are skipped, as before.
+    """
+    frame = pd.DataFrame.from_records(gsr_data)
+    codes = _village_codes(gsr_data, frame.index)
+
+    recharge, bad_recharge = _numeric(_first_present(frame, RECHARGE_FIELDS))
+    demand, bad_demand = _numeric(_first_present(frame, DEMAND_FIELDS))
+
+    keep = ((codes != '') & codes.isin(injection_layer.index)).to_numpy()
+    keep &= ~bad_recharge & ~bad_demand
+
+    codes = codes[keep].to_numpy(dtype=str)
+    recharge, demand = recharge[keep], demand[keep]
+    injection = injection_layer['injection'].reindex(codes).to_numpy(dtype=np.float64)
+
+    names = _first_present(frame, ['village_name', 'village'])[keep].fillna('Unknown').to_numpy()
+
+    years = np.asarray(years_counts, dtype=np.float64)
+    surplus = np.maximum(recharge - demand, 0)
+    stress = (surplus[:, None] + injection[:, None] / years[None, :]) / 1000
+
+    return {
+        'village_code': codes,
+        'village_name': names,
+        'recharge': np.round(recharge, 4),
+        'total_demand': np.round(demand, 4),
+        'injection': np.round(injection, 4) / 1000,
+        'stress': np.round(stress, 2),
+        'with_injection': int((injection > 0).sum()),
+    }
+
 
 class StressIdentificationAPIView(APIView):
     """
@@ -18,67 +139,32 @@ class StressIdentificationAPIView(APIView):
     - Accepts GSR results from frontend
     - Matches village_code (GSR) with village_co (shapefile)
     - Returns only stress_value for each village
+    - Bulk mode: "years_counts": [5, 10, 20] scores every scenario in one call
     """
     permission_classes = [AllowAny]
     parser_classes = [JSONParser]
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.shapefile_path: Optional[str] = None
-        self.shapefile_map: Dict[str, float] = {}
+    def validate_years_count(self, years_count) -> Optional[str]:
+        if isinstance(years_count, bool) or not isinstance(years_count, int) or years_count <= 0:
+            return "Years count must be a positive integer"
 
-    def load_shapefile(self) -> None:
-        """
-        Load shapefile data once and create a mapping:
-            { normalized village_co (str): injection (float) }
-        """
-        try:
-            if self.shapefile_path is None:
-                media_dir = os.path.join(settings.BASE_DIR, 'media')
-                self.shapefile_path = os.path.join(
-                    media_dir, 'gwa_data', 'gwa_shp', 'Final_Village', 'Injection_Water_Need.shp'
-                )
-
-            if not os.path.exists(self.shapefile_path):
-                raise FileNotFoundError(f"Shapefile not found at {self.shapefile_path}")
-
-            gdf = gpd.read_file(self.shapefile_path)
-            
-            # Check required columns
-            if 'village_co' not in gdf.columns or 'Injection_' not in gdf.columns:
-                raise ValueError("Expected columns 'village_co' and 'Injection_' not found in shapefile")
-
-            # Normalize village_co to string and strip spaces
-            gdf['village_co'] = gdf['village_co'].astype(str).str.strip()
-            
-            # Build injection mapping
-            shapefile_map: Dict[str, float] = {}
-            for _, row in gdf.iterrows():
-                village_co = row['village_co']
-                try:
-                    injection_val = float(row.get('Injection_', 0) or 0)
-                except (TypeError, ValueError):
-                    injection_val = 0.0
-                
-                if village_co:
-                    shapefile_map[village_co] = injection_val
-
-            self.shapefile_map = shapefile_map
-            print(f"✅ Loaded shapefile with {len(self.shapefile_map)} villages with injection data")
+        if years_count < 1 or years_count > 50:
+            return "Years count must be between 1 and 50"
 
-        except Exception as e:
-            raise Exception(f"Failed to load shapefile: {str(e)}")
+        return None
 
-    def validate_inputs(self, gsr_data: List[Dict[str, Any]], years_count: int) -> Optional[str]:
+    def validate_inputs(self, gsr_data: List[Dict[str, Any]], years_counts: List[int]) -> Optional[str]:
         """Validate request inputs."""
         if not gsr_data:
             return "GSR data is required and cannot be empty"
 
-        if not isinstance(years_count, int) or years_count <= 0:
+        if not years_counts:
             return "Years count must be a positive integer"
 
-        if years_count < 1 or years_count > 50:
-            return "Years count must be between 1 and 50"
+        for years_count in years_counts:
+            error = self.validate_years_count(years_count)
+            if error:
+                return error
 
         # Check if GSR data has required fields
         if len(gsr_data) > 0:
@@ -98,7 +184,8 @@ class StressIdentificationAPIView(APIView):
                 {"village_code": "123", "village_name": "ABC", "recharge": 100, "total_demand": 80, ...},
                 ...
             ],
-            "years_count": 5,
+            "years_count": 5,                 # single scenario
+            "years_counts": [5, 10, 20],      # or bulk: every scenario in one response
             "selectedSubDistricts": [...],
             "timestamp": "..."
         }
@@ -112,11 +199,17 @@ class StressIdentificationAPIView(APIView):
 
             # Extract data from request
             gsr_data = request.data.get('gsrData', [])  # Note: gsrData not gsr_data
-            years_count = request.data.get('years_count')
-            selected_subdistricts = request.data.get('selectedSubDistricts', [])
+            years_counts = request.data.get('years_counts')
+            bulk = years_counts is not None
+            if bulk:
+                years_counts = years_counts if isinstance(years_counts, list) else [years_counts]
+                # Keep request order, drop repeats
+                years_counts = list(dict.fromkeys(years_counts))
+            else:
+                years_counts = [request.data.get('years_count')]
 
             # Validate inputs
-            validation_error = self.validate_inputs(gsr_data, years_count)
+            validation_error = self.validate_inputs(gsr_data, years_counts)
             if validation_error:
                 return Response({
                     'success': False,
@@ -124,87 +217,56 @@ class StressIdentificationAPIView(APIView):
                     'data': []
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Load shapefile map if not loaded
-            if not self.shapefile_map:
-                self.load_shapefile()
-
-            # Process each GSR village and compute stress
-            stress_results: List[Dict[str, Any]] = []
-            villages_processed = 0
-            villages_with_injection = 0
-
-            for gsr_row in gsr_data:
-                # Extract village code - handle different field name variations
-                village_code = None
-                for field in ['village_code', 'village_co', 'villageCode']:
-                    if field in gsr_row:
-                        village_code = str(gsr_row[field]).strip()
-                        break
-                
-                if not village_code:
-                    continue  # Skip if no village code found
-                
-                # Check if this village exists in shapefile
-                if village_code not in self.shapefile_map:
-                    continue  # Skip villages not in shapefile
-
-                # Extract village name
-                village_name = gsr_row.get('village_name', gsr_row.get('village', 'Unknown'))
-
-                # Parse numeric values from GSR data - handle different field names
-                try:
-                    recharge = 0
-                    for field in ['recharge', 'Recharge']:
-                        if field in gsr_row:
-                            recharge = float(gsr_row.get(field, 0) or 0)
-                            break
-                    
-                    total_demand = 0
-                    for field in ['total_demand', 'totalDemand', 'total_demand_mld']:
-                        if field in gsr_row:
-                            total_demand = float(gsr_row.get(field, 0) or 0)
-                            break
-                            
-                except (ValueError, TypeError):
-                    continue  # Skip if numeric parsing fails
-
-                # Get injection from shapefile
-                injection = self.shapefile_map.get(village_code, 0.0)
-                if injection > 0:
-                    villages_with_injection += 1
-
-                # Calculate stress value using the formula
-                stress_value = (max(recharge - total_demand,0) + (injection / years_count))/1000
-
-                # Create result record (only stress_value, no classification)
-                result_row = {
-                    'village_code': village_code,
-                    'village_name': village_name,
-                    'recharge': round(recharge, 4),
-                    'total_demand': round(total_demand, 4),
-                    'injection': round(injection, 4)/1000,
-                    'years_count': years_count,
-                    'stress_value': round(stress_value, 2)  # Only stress value, no classification
-                }
-                stress_results.append(result_row)
-                villages_processed += 1
+            injection_layer = load_injection_layer()
+            scored = score_stress(gsr_data, injection_layer, years_counts)
 
-            # Prepare summary statistics
+            villages_processed = len(scored['village_code'])
+            villages_with_injection = scored['with_injection']
             summary_stats = {
                 'total_villages_processed': villages_processed,
                 'villages_with_injection_data': villages_with_injection,
                 'villages_without_injection_data': villages_processed - villages_with_injection,
-                'years_count_used': years_count,
-                'shapefile_villages_available': len(self.shapefile_map),
+                'shapefile_villages_available': len(injection_layer),
                 'gsr_input_villages': len(gsr_data)
             }
 
+            base_rows = pd.DataFrame({
+                'village_code': scored['village_code'],
+                'village_name': scored['village_name'],
+                'recharge': scored['recharge'],
+                'total_demand': scored['total_demand'],
+                'injection': scored['injection'],
+            })
+
+            if not bulk:
+                years_count = years_counts[0]
+                base_rows['years_count'] = years_count
+                base_rows['stress_value'] = scored['stress'][:, 0]  # Only stress value, no classification
+                summary_stats['years_count_used'] = years_count
+
+                return Response({
+                    'success': True,
+                    'data': base_rows.to_dict('records'),
+                    'message': f'Stress values computed for {villages_processed} villages using {years_count} year{"s" if years_count != 1 else ""}',
+                    'years_count': years_count,
+                    'total_villages': villages_processed,
+                    'summary_stats': summary_stats,
+                    'computed_at': datetime.now().isoformat()
+                }, status=status.HTTP_200_OK)
+
+            # Bulk: one row per village with the stress value of every scenario
+            rows = base_rows.to_dict('records')
+            stress = scored['stress'].tolist()
+            for row, values in zip(rows, stress):
+                row['stress_values'] = {str(y): v for y, v in zip(years_counts, values)}
+            summary_stats['years_counts_used'] = years_counts
+
             return Response({
                 'success': True,
-                'data': stress_results,
-                'message': f'Stress values computed for {len(stress_results)} villages using {years_count} year{"s" if years_count != 1 else ""}',
-                'years_count': years_count,
-                'total_villages': len(stress_results),
+                'data': rows,
+                'message': f'Stress values computed for {villages_processed} villages for {len(years_counts)} scenario{"s" if len(years_counts) != 1 else ""}',
+                'years_counts': years_counts,
+                'total_villages': villages_processed,
                 'summary_stats': summary_stats,
                 'computed_at': datetime.now().isoformat()
             }, status=status.HTTP_200_OK)
@@ -225,10 +287,7 @@ class StressIdentificationAPIView(APIView):
     def get(self, request, *args, **kwargs):
         """Health/info endpoint."""
         try:
-            media_dir = os.path.join(settings.BASE_DIR, 'media')
-            shapefile_path = os.path.join(
-                media_dir, 'gwa_data', 'gwa_shp', 'Final_Village', 'Injection_Water_Need.shp'
-            )
+            shapefile_path = injection_shapefile_path()
             shapefile_exists = os.path.exists(shapefile_path)
 
             return Response({
@@ -242,6 +301,7 @@ class StressIdentificationAPIView(APIView):
                     'shapefile_path': shapefile_path,
                     'shapefile_exists': shapefile_exists,
                     'required_fields': ['gsrData', 'years_count'],
+                    'bulk_fields': ['gsrData', 'years_counts'],
                     'years_count_range': '1-50',
                     'gsr_data_fields': ['village_code', 'village_name', 'recharge', 'total_demand'],
                     'shapefile_fields': ['village_co', 'Injection_'],
@@ -1,3 +1,21 @@
-from django.test import TestCase
+import pandas as pd
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .stress import score_stress
+
+
+class ScoreStressTests(SimpleTestCase):
+    def test_record_without_code_keeps_integer_codes(self):
+        layer = pd.DataFrame({'injection': [2000.0, 0.0]}, index=pd.Index(['123', '456'], name='village_co'))
+        gsr_data = [
+            {'village_code': 123, 'village_name': 'A', 'recharge': 5000, 'total_demand': 1000},
+            {'village_name': 'No code', 'recharge': 10, 'total_demand': 0},
+            {'village_code': 456, 'village_name': 'B', 'recharge': 500, 'total_demand': 1000},
+        ]
+
+        result = score_stress(gsr_data, layer, [10])
+
+        self.assertEqual(list(result['village_code']), ['123', '456'])
+        self.assertEqual(list(result['village_name']), ['A', 'B'])
+        self.assertEqual(result['stress'][:, 0].tolist(), [4.2, 0.0])
+        self.assertEqual(result['with_injection'], 1)
@@ -11,9 +11,14 @@ from typing import Dict, List, Any
 import os
 from django.conf import settings
 from datetime import datetime
+from .trend_batch import run_mk_batch, MODIFIED_TESTS
+from main.temp_artifacts import temp_registry
 
 logger = logging.getLogger(__name__)
 
+# Methods evaluated for all wells at once by trend_batch
+BATCH_METHODS = ['mann_kendall'] + list(MODIFIED_TESTS)
+
 class GroundwaterTrendAnalysisView(APIView):
     """
     Enhanced Groundwater Trend Analysis API View
@@ -29,7 +34,7 @@ class GroundwaterTrendAnalysisView(APIView):
         
         Expected payload:
         {
-            "method": "mann_kendall",  # mann_kendall or pettitt
+            "method": "mann_kendall",  # mann_kendall, hamed_rao, yue_wang or pettitt
             "data_type": "PRE",        # PRE or POST
             "from_year": 2015,         # Dynamic based on available data
             "to_year": 2020,           # Dynamic based on available data
@@ -168,7 +173,7 @@ class GroundwaterTrendAnalysisView(APIView):
                 'error': 'Analysis period must be at least 2 years for meaningful trend detection'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        valid_methods = ['mann_kendall', 'pettitt']
+        valid_methods = BATCH_METHODS + ['pettitt']
         if method not in valid_methods:
             return Response({
                 'error': f'method must be one of: {valid_methods}'
@@ -200,7 +205,8 @@ class GroundwaterTrendAnalysisView(APIView):
             csv_path = os.path.join(temp_dir, csv_filename)
             
             # Read CSV file
-            df = pd.read_csv(csv_path)
+            with temp_registry.in_use(csv_path):
+                df = pd.read_csv(csv_path)
             print(f"[DEBUG] Total rows in CSV: {len(df)}")
             print(f"[DEBUG] Columns in CSV: {df.columns.tolist()}")
             
@@ -354,57 +360,14 @@ class GroundwaterTrendAnalysisView(APIView):
             
             print(f"[DEBUG] Relevant columns for {data_type} ({from_year}-{to_year}): {relevant_columns}")
             
-            trend_results = []
-            
-            # Process each well
-            for _, well_row in df.iterrows():
-                try:
-                    well_id = well_row['well_id']
-                    hydrograph = well_row['hydrograph_code']
-                    lat = well_row['latitude']
-                    lon = well_row['longitude']
-                    village = well_row['village_name']
-                    district = well_row['district_name']
-                    state = well_row['state_name']
-                    
-                    # Extract time series data for the specified period and data type
-                    time_series, years_with_data = self.extract_time_series_from_columns(
-                        well_row, data_type, from_year, to_year
-                    )
-                    
-                    # Check for sufficient data points
-                    if len(time_series) < 3:
-                        result = {
-                            'well_id': well_id,
-                            'hydrograph_code': hydrograph,
-                            'latitude': float(lat) if lat is not None else None,
-                            'longitude': float(lon) if lon is not None else None,
-                            'village_name': village,
-                            'district_name': district,
-                            'state_name': state,
-                            'data_points': len(time_series),
-                            'years_available': years_with_data,
-                            'time_series': time_series,
-                            'trend': 'insufficient_data',
-                            'trend_direction': 'insufficient_data',
-                            'significance': 'not_applicable',
-                            'p_value': None,
-                            'method_used': method,
-                            'data_coverage_percentage': round((len(time_series) / (to_year - from_year + 1)) * 100, 1)
-                        }
-                        trend_results.append(result)
-                        continue
-                    
-                    # Calculate trend
-                    result = self.calculate_trend(
-                        well_id, hydrograph, lat, lon, village, district, state,
-                        time_series, years_with_data, method, from_year, to_year
-                    )
-                    trend_results.append(result)
-                
-                except Exception as e:
-                    logger.error(f"Error processing trend for well {well_row.get('well_id')}: {str(e)}")
-                    continue
+            if method in BATCH_METHODS:
+                trend_results = self.perform_batch_trend_analysis(
+                    df, relevant_columns, method, from_year, to_year
+                )
+            else:
+                trend_results = self.perform_per_well_trend_analysis(
+                    df, method, data_type, from_year, to_year
+                )
             
             # Generate summary, map data, statistics, and table data
             summary = self.generate_trend_summary(trend_results)
@@ -424,6 +387,148 @@ class GroundwaterTrendAnalysisView(APIView):
             logger.error(f"Error in perform_trend_analysis: {str(e)}")
             raise
 
+    def perform_per_well_trend_analysis(self, df: pd.DataFrame, method: str, data_type: str,
+                                        from_year: int, to_year: int) -> List[Dict]:
+        """Run the trend test one well at a time (used for Pettitt)"""
+        trend_results = []
+        
+        # Process each well
+        for _, well_row in df.iterrows():
+            try:
+                well_id = well_row['well_id']
+                hydrograph = well_row['hydrograph_code']
+                lat = well_row['latitude']
+                lon = well_row['longitude']
+                village = well_row['village_name']
+                district = well_row['district_name']
+                state = well_row['state_name']
+                
+                # Extract time series data for the specified period and data type
+                time_series, years_with_data = self.extract_time_series_from_columns(
+                    well_row, data_type, from_year, to_year
+                )
+                
+                # Check for sufficient data points
+                if len(time_series) < 3:
+                    result = {
+                        'well_id': well_id,
+                        'hydrograph_code': hydrograph,
+                        'latitude': float(lat) if lat is not None else None,
+                        'longitude': float(lon) if lon is not None else None,
+                        'village_name': village,
+                        'district_name': district,
+                        'state_name': state,
+                        'data_points': len(time_series),
+                        'years_available': years_with_data,
+                        'time_series': time_series,
+                        'trend': 'insufficient_data',
+                        'trend_direction': 'insufficient_data',
+                        'significance': 'not_applicable',
+                        'p_value': None,
+                        'method_used': method,
+                        'data_coverage_percentage': round((len(time_series) / (to_year - from_year + 1)) * 100, 1)
+                    }
+                    trend_results.append(result)
+                    continue
+                
+                # Calculate trend
+                result = self.calculate_trend(
+                    well_id, hydrograph, lat, lon, village, district, state,
+                    time_series, years_with_data, method, from_year, to_year
+                )
+                trend_results.append(result)
+            
+            except Exception as e:
+                logger.error(f"Error processing trend for well {well_row.get('well_id')}: {str(e)}")
+                continue
+        
+        return trend_results
+
+    def perform_batch_trend_analysis(self, df: pd.DataFrame, relevant_columns: List[str], method: str,
+                                     from_year: int, to_year: int) -> List[Dict]:
+        """Run Mann-Kendall (original or modified) for all wells at once via run_mk_batch"""
+        years = [int(col.split('_')[-1]) for col in relevant_columns]
+        total_years = to_year - from_year + 1
+        
+        if relevant_columns:
+            values = df[relevant_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        else:
+            values = np.empty((len(df), 0), dtype=float)
+        valid = ~np.isnan(values)
+        data_points = valid.sum(axis=1)
+        
+        sufficient = data_points >= 3
+        batch = run_mk_batch(values[sufficient], method=method)
+        batch.index = np.flatnonzero(sufficient)
+        print(f"[DEBUG] Batch {method} test run on {int(sufficient.sum())} of {len(df)} wells")
+        
+        lat = df['latitude'].to_numpy()
+        lon = df['longitude'].to_numpy()
+        
+        trend_results = []
+        for i, well in enumerate(df[['well_id', 'hydrograph_code', 'village_name',
+                                     'district_name', 'state_name']].itertuples(index=False)):
+            time_series = values[i][valid[i]].tolist()
+            years_with_data = [year for year, ok in zip(years, valid[i]) if ok]
+            
+            result = {
+                'well_id': well.well_id,
+                'hydrograph_code': well.hydrograph_code,
+                'latitude': float(lat[i]) if lat[i] is not None else None,
+                'longitude': float(lon[i]) if lon[i] is not None else None,
+                'village_name': well.village_name,
+                'district_name': well.district_name,
+                'state_name': well.state_name,
+                'data_points': len(time_series),
+                'years_available': years_with_data,
+                'time_series': time_series,
+                'data_coverage_percentage': round((len(time_series) / total_years) * 100, 1)
+            }
+            
+            if not sufficient[i]:
+                result.update({
+                    'trend': 'insufficient_data',
+                    'trend_direction': 'insufficient_data',
+                    'significance': 'not_applicable',
+                    'p_value': None,
+                    'method_used': method
+                })
+                trend_results.append(result)
+                continue
+            
+            result['analysis_period'] = f"{from_year}-{to_year}"
+            row = batch.loc[i]
+            if pd.notna(row['error']):
+                logger.error(f"Error in trend calculation for well {well.well_id}: {row['error']}")
+                result.update({
+                    'trend': 'error',
+                    'trend_direction': 'error',
+                    'significance': 'error',
+                    'tau': None,
+                    'p_value': None,
+                    'slope': None,
+                    'error_message': row['error'],
+                    'method_used': method,
+                    'trend_magnitude': 0
+                })
+            else:
+                trend = row['trend']
+                slope = float(row['slope'])
+                result.update({
+                    'trend': trend,
+                    'trend_direction': trend if trend in ('increasing', 'decreasing') else 'no_trend',
+                    'significance': 'significant' if row['p'] < 0.05 else 'not_significant',
+                    'tau': float(row['Tau']),
+                    'p_value': float(row['p']),
+                    'slope': slope,
+                    'z_score': float(row['z']),
+                    'method_used': method,
+                    'trend_magnitude': abs(slope) if slope else 0
+                })
+            trend_results.append(result)
+        
+        return trend_results
+
     def extract_time_series_from_columns(self, well_row: pd.Series, data_type: str, 
                                         from_year: int, to_year: int) -> tuple:
         """Extract time series data from columns matching data_type and year range"""
@@ -577,7 +682,7 @@ class GroundwaterTrendAnalysisView(APIView):
         for result in trend_results:
             if result['latitude'] is not None and result['longitude'] is not None:
                 # Calculate bubble size based on significance and method
-                if result.get('method_used') == 'mann_kendall':
+                if result.get('method_used') in BATCH_METHODS:
                     tau = result.get('tau', 0)
                     bubble_size = max(8, min(25, abs(tau) * 30)) if tau is not None else 8
                 else:  # Pettitt method
@@ -622,7 +727,7 @@ class GroundwaterTrendAnalysisView(APIView):
         """Classify trend strength based on method and values"""
         method = result.get('method_used')
         
-        if method == 'mann_kendall':
+        if method in BATCH_METHODS:
             tau = result.get('tau')
             if tau is None:
                 return 'unknown'
@@ -670,7 +775,7 @@ class GroundwaterTrendAnalysisView(APIView):
                 'analysis_period': result.get('analysis_period')
             }
             
-            if result.get('method_used') == 'mann_kendall':
+            if result.get('method_used') in BATCH_METHODS:
                 row.update({
                     'tau': round(result['tau'], 4) if result['tau'] else None,
                     'slope': round(result['slope'], 4) if result['slope'] else None,
@@ -698,7 +803,7 @@ class GroundwaterTrendAnalysisView(APIView):
         
         valid_results = [r for r in trend_results if r['p_value'] is not None]
         significant_results = [r for r in valid_results if r['significance'] == 'significant']
-        mann_kendall_results = [r for r in valid_results if r.get('method_used') == 'mann_kendall']
+        mann_kendall_results = [r for r in valid_results if r.get('method_used') in BATCH_METHODS]
         pettitt_results = [r for r in valid_results if r.get('method_used') == 'pettitt']
         
         statistics = {
@@ -0,0 +1,130 @@
+"""
+Columnar trend artifact for the GSR pipeline.
+
+The trend analysis writes its Mann-Kendall results as CSV for download and,
+next to it, a typed Parquet file sorted and keyed by village code. GSR reads
+the Parquet (converting a CSV once if that is all there is) and keeps the
+loaded table in a small per-process cache keyed by path and mtime.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from django.conf import settings
+
+from main.temp_artifacts import temp_registry
+
+TREND_KEY = 'Village_ID'
+TREND_COLUMNS = {
+    'Village_ID': 'string',
+    'Village_Name': 'string',
+    'SUBDIS_COD': 'string',
+    'Trend_Status': 'category',
+    'Mann_Kendall_Tau': 'float64',
+    'P_Value': 'float64',
+    'Sen_Slope': 'float64',
+    'Data_Points': 'Int64',
+}
+
+_CACHE_SIZE = 16
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def artifact_path_for(csv_path):
+    """media/temp/<name>.csv -> media/temp/<name>.parquet"""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def _typed(trend_df):
+    """Keep the columns GSR needs, typed, one row per village, sorted by code"""
+    df = trend_df[[c for c in TREND_COLUMNS if c in trend_df.columns]].copy()
+    df[TREND_KEY] = df[TREND_KEY].astype(str).str.strip()
+    df = df[df[TREND_KEY] != '']
+    for col, dtype in TREND_COLUMNS.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif dtype == 'Int64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        elif col != TREND_KEY:
+            df[col] = df[col].astype(str).str.strip().astype(dtype)
+    df[TREND_KEY] = df[TREND_KEY].astype('string')
+    # Last row wins for duplicate villages, like the old dict build
+    df = df.drop_duplicates(TREND_KEY, keep='last')
+    return df.sort_values(TREND_KEY).reset_index(drop=True)
+
+
+def write_trend_artifact(trend_df, csv_path, owner='gwa.trends'):
+    """Write the Parquet artifact next to the trend CSV; returns its path (None if unavailable)"""
+    path = artifact_path_for(csv_path)
+    try:
+        _typed(trend_df).to_parquet(path, index=False)
+    except ImportError:
+        print("⚠️ pyarrow not installed - trend artifact not written, GSR will read the CSV")
+        return None
+    except Exception as e:
+        print(f"⚠️ Could not write trend artifact {path}: {e}")
+        return None
+    temp_registry.register(path, owner=owner)
+    return path
+
+
+def _read(csv_path):
+    parquet_path = artifact_path_for(csv_path)
+    if os.path.exists(parquet_path):
+        with temp_registry.in_use(parquet_path):
+            return parquet_path, pd.read_parquet(parquet_path)
+
+    # Older results only have the CSV: convert once
+    with temp_registry.in_use(csv_path):
+        table = _typed(pd.read_csv(csv_path, dtype={TREND_KEY: str}))
+    try:
+        table.to_parquet(parquet_path, index=False)
+        temp_registry.register(parquet_path, owner='gwa.gsr')
+    except Exception:
+        pass
+    return csv_path, table
+
+
+def load_trend_table(trend_csv_filename):
+    """
+    Trend results indexed by village code (str). Empty DataFrame if the
+    file is missing. Cached per (path, mtime) so repeated GSR runs on the
+    same trend result skip the read.
+    """
+    empty = pd.DataFrame(columns=['Trend_Status'], index=pd.Index([], name=TREND_KEY, dtype='string'))
+    if not trend_csv_filename:
+        return empty
+
+    csv_path = os.path.join(settings.MEDIA_ROOT, 'temp', trend_csv_filename)
+    parquet_path = artifact_path_for(csv_path)
+    source = parquet_path if os.path.exists(parquet_path) else csv_path
+    if not os.path.exists(source):
+        print(f"⚠️ Trend CSV file not found: {csv_path}")
+        return empty
+
+    key = (source, os.path.getmtime(source))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            temp_registry.touch(source)
+            return _cache[key]
+
+    try:
+        source, table = _read(csv_path)
+    except Exception as e:
+        print(f"❌ Error loading trend data: {str(e)}")
+        return empty
+
+    table = table.set_index(TREND_KEY)
+    print(f"📄 Loaded trend table with {len(table)} villages from: {source}")
+
+    with _cache_lock:
+        _cache[key] = table
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return table
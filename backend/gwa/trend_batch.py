@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pymannkendall as mk
+from scipy.stats import norm
+
+logger = logging.getLogger(__name__)
+
+# Columns of the batch result, in the same order/naming as pymannkendall's namedtuple
+RESULT_COLUMNS = ['trend', 'h', 'p', 'z', 'Tau', 's', 'var_s', 'slope', 'intercept', 'n', 'error']
+
+MODIFIED_TESTS = {
+    'hamed_rao': mk.hamed_rao_modification_test,
+    'yue_wang': mk.yue_wang_modification_test,
+}
+
+# Rows per vectorized block; pairwise tensors are (rows x years x years)
+VECTOR_BLOCK_ROWS = 2000
+
+
+def _original_test_block(values, alpha):
+    """
+    Vectorized Mann-Kendall original test for one block of series.
+    values: (rows x years) float array, NaN = missing year (skipped like mk.original_test)
+    """
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=1).astype(float)
+
+    # Pair mask i < j over valid observations only
+    upper = np.triu(np.ones((values.shape[1], values.shape[1]), dtype=bool), k=1)
+    pair_valid = valid[:, :, None] & valid[:, None, :] & upper[None, :, :]
+
+    diff = values[:, None, :] - values[:, :, None]  # x_j - x_i
+    s = np.where(pair_valid, np.sign(diff), 0.0).sum(axis=(1, 2))
+
+    # Tie correction: each member of a tie group of size t contributes (t-1)(2t+5)
+    same = (values[:, :, None] == values[:, None, :]) & valid[:, :, None] & valid[:, None, :]
+    group_size = same.sum(axis=2).astype(float)
+    tie_term = np.where(valid, (group_size - 1) * (2 * group_size + 5), 0.0).sum(axis=1)
+    var_s = (n * (n - 1) * (2 * n + 5) - tie_term) / 18.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd = np.sqrt(var_s)
+        z = np.where(s > 0, (s - 1) / sd, np.where(s < 0, (s + 1) / sd, 0.0))
+        tau = s / (0.5 * n * (n - 1))
+
+        # Sen's slope on the compacted series (positions of valid values only),
+        # matching mk.sens_slope on the list passed by the view
+        pos = np.cumsum(valid, axis=1) - 1
+        dpos = (pos[:, None, :] - pos[:, :, None]).astype(float)
+        pair_slopes = np.where(pair_valid, diff / dpos, np.nan)
+        flat = pair_slopes.reshape(len(values), -1)
+        has_pairs = pair_valid.reshape(len(values), -1).any(axis=1)
+        slope = np.full(len(values), np.nan)
+        if has_pairs.any():
+            slope[has_pairs] = np.nanmedian(flat[has_pairs], axis=1)
+
+        # Intercept: nanmedian(x) - median(compacted index) * slope
+        has_values = n > 0
+        median_x = np.full(len(values), np.nan)
+        if has_values.any():
+            median_x[has_values] = np.nanmedian(values[has_values], axis=1)
+        intercept = median_x - ((n - 1) / 2.0) * slope
+
+    p = 2 * (1 - norm.cdf(np.abs(z)))
+    h = np.abs(z) > norm.ppf(1 - alpha / 2)
+    trend = np.where(h & (z < 0), 'decreasing', np.where(h & (z > 0), 'increasing', 'no trend'))
+
+    return {
+        'trend': trend,
+        'h': h,
+        'p': p,
+        'z': z,
+        'Tau': tau,
+        's': s,
+        'var_s': var_s,
+        'slope': slope,
+        'intercept': intercept,
+        'n': n.astype(int),
+        'error': np.full(len(values), None, dtype=object),
+    }
+
+
+def original_test_batch(values, alpha=0.05):
+    """
+    Mann-Kendall original test for many series at once.
+    Returns a DataFrame with one row per input row (RESULT_COLUMNS).
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim != 2:
+        raise ValueError('values must be a 2-D (series x years) array')
+
+    blocks = []
+    for start in range(0, len(values), VECTOR_BLOCK_ROWS):
+        blocks.append(pd.DataFrame(_original_test_block(values[start:start + VECTOR_BLOCK_ROWS], alpha)))
+
+    if not blocks:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(blocks, ignore_index=True)[RESULT_COLUMNS]
+
+
+def _modified_test_chunk(args):
+    """Process-pool worker: run one modified MK variant over a chunk of compacted series"""
+    variant, series_chunk, alpha = args
+    test = MODIFIED_TESTS[variant]
+    rows = []
+    for series in series_chunk:
+        try:
+            r = test(series, alpha=alpha)
+            rows.append((r.trend, bool(r.h), float(r.p), float(r.z), float(r.Tau), float(r.s),
+                         float(r.var_s), float(r.slope), float(r.intercept), len(series), None))
+        except Exception as e:
+            rows.append(('error', False, np.nan, np.nan, np.nan, np.nan,
+                         np.nan, np.nan, np.nan, len(series), str(e)))
+    return rows
+
+
+def modified_test_batch(values, variant, alpha=0.05, chunk_size=250, max_workers=None):
+    """
+    Hamed-Rao / Yue-Wang modified Mann-Kendall tests for many series.
+    These need per-series autocorrelation, so they are run with pymannkendall
+    in chunks across a process pool (inline when there is only one chunk).
+    """
+    if variant not in MODIFIED_TESTS:
+        raise ValueError(f"variant must be one of: {list(MODIFIED_TESTS)}")
+
+    values = np.asarray(values, dtype=float)
+    series = [row[~np.isnan(row)] for row in values]
+    chunks = [(variant, series[i:i + chunk_size], alpha) for i in range(0, len(series), chunk_size)]
+
+    if not chunks:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    if len(chunks) == 1:
+        rows = _modified_test_chunk(chunks[0])
+    else:
+        max_workers = max_workers or min(multiprocessing.cpu_count(), 8, len(chunks))
+        rows = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_rows in executor.map(_modified_test_chunk, chunks):
+                rows.extend(chunk_rows)
+
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def run_mk_batch(values, method='mann_kendall', alpha=0.05, chunk_size=250, max_workers=None):
+    """
+    Entry point used by the trend views.
+    method: 'mann_kendall' (vectorized original test), 'hamed_rao' or 'yue_wang'
+    """
+    if method == 'mann_kendall':
+        return original_test_batch(values, alpha=alpha)
+    return modified_test_batch(values, method, alpha=alpha, chunk_size=chunk_size, max_workers=max_workers)
@@ -21,6 +21,9 @@ from collections import namedtuple
 import uuid
 from datetime import datetime
 
+from main.temp_artifacts import temp_registry
+from .trend_artifact import write_trend_artifact
+
 warnings.filterwarnings('ignore')
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -140,7 +143,8 @@ class GroundwaterTrendAnalysisView(View):
         villages_gdf = filtered_villages.copy()
 
         try:
-            wells_df = pd.read_csv(wells_csv_path)
+            with temp_registry.in_use(wells_csv_path):
+                wells_df = pd.read_csv(wells_csv_path)
             wells_gdf = gpd.GeoDataFrame(
                 wells_df,
                 geometry=gpd.points_from_xy(wells_df['LONGITUDE'], wells_df['LATITUDE']),
@@ -879,6 +883,7 @@ class GroundwaterTrendAnalysisView(View):
             numeric_cols = ['Mann_Kendall_Tau', 'P_Value', 'Sen_Slope', 'Mean_Depth', 'Std_Depth', 'Min_Depth', 'Max_Depth']
             trend_results_df[numeric_cols] = trend_results_df[numeric_cols].round(4)
             trend_results_df.to_csv(trend_csv_path, index=False)
+            write_trend_artifact(trend_results_df, trend_csv_path)
             
             print(f"✅ Saved Mann-Kendall CSV: {trend_csv_path}")
 
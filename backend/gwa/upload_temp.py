@@ -9,6 +9,7 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.http import JsonResponse
 import uuid
 from rest_framework.permissions import AllowAny
+from main.temp_artifacts import temp_registry
 
 class CSVUploadView(APIView):
     permission_classes = [AllowAny]
@@ -50,6 +51,7 @@ class CSVUploadView(APIView):
             
             # Get file info
             file_size = os.path.getsize(file_path)
+            temp_registry.register(file_path, owner='gwa.upload_csv', size=file_size)
             
             return Response({
                 'success': True,
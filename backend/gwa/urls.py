@@ -7,11 +7,11 @@ from .upload_temp import CSVUploadView
 from .validate import CSVValidationView
 from .trends import GroundwaterTrendAnalysisView
 from .catchment import VillagesByCatchmentFileAPI
-from .recharge2 import GroundwaterRechargeView
+from .recharge2 import GroundwaterRechargeView, GroundwaterRechargeBatchView
 from .views import PopulationForecastAPI
 from .crops import GetCropsBySeasonView
 from .agriculture import AgriculturalDemandAPIView
-from .gsr import GSRComputeAPIView
+from .gsr import GSRComputeAPIView, GSRMapImageView
 from .stress import StressIdentificationAPIView
 from .pdf import PDFGenerationView
 # from interpolation import InterpolateRasterView
@@ -26,10 +26,12 @@ urlpatterns = [
     path('trends', GroundwaterTrendAnalysisView.as_view(), name='trends'),
     path('villagescatchment', VillagesByCatchmentFileAPI.as_view(), name="villages-by-catchment-file"),
     path('recharge2', GroundwaterRechargeView.as_view(), name='recharge'),
+    path('recharge2/batch', GroundwaterRechargeBatchView.as_view(), name='recharge-batch'),
     path("forecast-population", PopulationForecastAPI.as_view(), name="forecast-population"),
     path('crops', GetCropsBySeasonView.as_view(), name='crops'),
     path('agricultural', AgriculturalDemandAPIView.as_view(), name='agricultural'),
     path('gsr', GSRComputeAPIView.as_view(), name='gsr'),
+    path('gsr/map/<str:filename>', GSRMapImageView.as_view(), name='gsr-map'),
     path('stress', StressIdentificationAPIView.as_view(), name='stress'),
     path ('pdf', PDFGenerationView.as_view(), name='pdf'),
 ]
\ No newline at end of file
@@ -0,0 +1,192 @@
+# gwa/zonal.py - Label-raster zonal statistics for village aggregation
+#
+# All village polygons are burned into one label grid on the raster window,
+# then mean/min/max/count/sum/std/median are reduced per village with
+# np.bincount and ufunc.reduceat. Cost is one rasterize + one sort over the
+# window pixels, independent of how many villages are selected.
+
+import numpy as np
+import rasterio
+from rasterio.features import rasterize, geometry_window
+from rasterio.transform import rowcol
+from rasterio.errors import WindowError
+from rasterio.windows import Window, from_bounds, transform as window_transform
+
+ZONAL_STATS = ['count', 'sum', 'mean', 'min', 'max', 'std', 'median']
+
+
+def _small_zone_pixels(geom, shape, transform, all_touched):
+    """Flat pixel indices for one geometry rasterized on its own bounding window"""
+    height, width = shape
+    win = from_bounds(*geom.bounds, transform=transform)
+    row0 = max(int(np.floor(win.row_off)), 0)
+    col0 = max(int(np.floor(win.col_off)), 0)
+    row1 = min(int(np.ceil(win.row_off + win.height)) + 1, height)
+    col1 = min(int(np.ceil(win.col_off + win.width)) + 1, width)
+
+    if row1 > row0 and col1 > col0:
+        sub_transform = window_transform(Window(col0, row0, col1 - col0, row1 - row0), transform)
+        burned = rasterize(
+            [(geom, 1)], out_shape=(row1 - row0, col1 - col0), transform=sub_transform,
+            fill=0, all_touched=all_touched, dtype='uint8'
+        )
+        rows, cols = np.nonzero(burned)
+        if len(rows):
+            return (rows + row0) * width + (cols + col0)
+
+    # Degenerate / sub-pixel geometry: the pixel holding its representative point
+    point = geom.representative_point()
+    row, col = rowcol(transform, point.x, point.y)
+    if 0 <= row < height and 0 <= col < width:
+        return np.array([row * width + col])
+    return np.array([], dtype=np.int64)
+
+
+def village_pixel_index(geometries, shape, transform, all_touched=True):
+    """
+    Map raster pixels to villages with a single label grid.
+
+    Every pixel whose centre lies in a polygon goes to that polygon. With
+    all_touched, pixels only touched by a boundary go to one of the touching
+    polygons. Villages left without any pixel (sliver or sub-pixel polygons,
+    or all of whose pixels belong to neighbours) are rasterized on their own
+    so they still get the pixels rasterstats would have given them.
+
+    Returns (pixel_idx, zone): flat pixel index and 0-based village index
+    pairs. A pixel can appear more than once only through that fallback.
+    """
+    geometries = list(geometries)
+    n_zones = len(geometries)
+    if not n_zones:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    shapes = [(geom, idx + 1) for idx, geom in enumerate(geometries) if geom is not None and not geom.is_empty]
+    labels = np.zeros(shape, dtype=np.int32)
+    if shapes:
+        labels = rasterize(shapes, out_shape=shape, transform=transform, fill=0, all_touched=False, dtype='int32')
+        if all_touched:
+            touched = rasterize(shapes, out_shape=shape, transform=transform, fill=0, all_touched=True, dtype='int32')
+            labels = np.where(labels > 0, labels, touched)
+
+    flat = labels.ravel()
+    pixel_idx = np.flatnonzero(flat)
+    zone = flat[pixel_idx].astype(np.int64) - 1
+
+    present = np.bincount(zone, minlength=n_zones) > 0
+    extra_idx, extra_zone = [], []
+    for idx in np.flatnonzero(~present):
+        geom = geometries[idx]
+        if geom is None or geom.is_empty:
+            continue
+        pixels = _small_zone_pixels(geom, shape, transform, all_touched)
+        extra_idx.append(pixels)
+        extra_zone.append(np.full(len(pixels), idx, dtype=np.int64))
+
+    if extra_idx:
+        pixel_idx = np.concatenate([pixel_idx] + extra_idx)
+        zone = np.concatenate([zone] + extra_zone)
+    return pixel_idx, zone
+
+
+def zonal_stats_stack(stack, pixel_idx, zone, n_zones, nodata=None):
+    """
+    Per-village statistics for every band of a (bands x rows x cols) stack
+    (or a single 2-D band) in one pass.
+
+    Band and village are folded into one key so a single bincount / sort
+    covers all bands. Returns {stat: array (bands x zones)} for ZONAL_STATS,
+    squeezed to (zones,) for 2-D input. Empty zones have count 0 and NaN
+    elsewhere; std is the population std like rasterstats.
+    """
+    stack = np.asarray(stack)
+    single = stack.ndim == 2
+    if single:
+        stack = stack[None]
+    n_bands = stack.shape[0]
+    size = n_bands * n_zones
+
+    vals = stack.reshape(n_bands, -1)[:, pixel_idx].astype(np.float64)
+    keys = np.arange(n_bands, dtype=np.int64)[:, None] * n_zones + zone[None, :]
+    valid = np.isfinite(vals)
+    if nodata is not None and np.isfinite(nodata):
+        valid &= vals != nodata
+    keys, vals = keys[valid], vals[valid]
+
+    count = np.bincount(keys, minlength=size)
+    total = np.bincount(keys, weights=vals, minlength=size)
+    has = count > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(has, total / np.maximum(count, 1), np.nan)
+        sq = np.bincount(keys, weights=(vals - mean[keys]) ** 2, minlength=size)
+        std = np.where(has, np.sqrt(sq / np.maximum(count, 1)), np.nan)
+
+    # Sort by (key, value): groups are contiguous and ordered within
+    order = np.lexsort((vals, keys))
+    sorted_vals = vals[order]
+    starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+    minimum = np.full(size, np.nan)
+    maximum = np.full(size, np.nan)
+    median = np.full(size, np.nan)
+    if has.any():
+        minimum[has] = np.minimum.reduceat(sorted_vals, starts[has])
+        maximum[has] = np.maximum.reduceat(sorted_vals, starts[has])
+        lo = starts[has] + (count[has] - 1) // 2
+        hi = starts[has] + count[has] // 2
+        median[has] = (sorted_vals[lo] + sorted_vals[hi]) / 2
+
+    result = {
+        'count': count,
+        'sum': np.where(has, total, np.nan),
+        'mean': mean,
+        'min': minimum,
+        'max': maximum,
+        'std': std,
+        'median': median,
+    }
+    shape = (n_zones,) if single else (n_bands, n_zones)
+    return {key: value.reshape(shape) for key, value in result.items()}
+
+
+def zonal_stats_array(stack, transform, geometries, nodata=None, all_touched=True):
+    """Zonal statistics for an in-memory band or band stack on the given grid"""
+    geometries = list(geometries)
+    shape = np.asarray(stack).shape[-2:]
+    pixel_idx, zone = village_pixel_index(geometries, shape, transform, all_touched)
+    return zonal_stats_stack(stack, pixel_idx, zone, len(geometries), nodata)
+
+
+def zonal_stats_raster(raster_path, geometries, nodata=None, all_touched=True, bands=None):
+    """
+    Zonal statistics for a raster file, reading only the window covering
+    the union of the geometries. bands: 1-based band list (default all).
+    """
+    geometries = list(geometries)
+    with rasterio.open(raster_path) as src:
+        bands = bands or list(range(1, src.count + 1))
+        nodata = src.nodata if nodata is None else nodata
+        try:
+            window = geometry_window(src, [g for g in geometries if g is not None and not g.is_empty])
+            data = src.read(bands, window=window)
+            transform = src.window_transform(window)
+        except WindowError:
+            # Selection does not overlap the raster: every village is empty
+            data = np.full((len(bands), 1, 1), np.nan)
+            transform = src.transform
+
+    if len(bands) == 1:
+        data = data[0]
+    return zonal_stats_array(data, transform, geometries, nodata=nodata, all_touched=all_touched)
+
+
+def zonal_records(result, band=None):
+    """rasterstats-style list of {stat: value} dicts (None for empty villages)"""
+    arrays = {key: (value if band is None else value[band]) for key, value in result.items()}
+    records = []
+    for i in range(len(arrays['count'])):
+        count = int(arrays['count'][i])
+        record = {'count': count}
+        for key in ZONAL_STATS[1:]:
+            record[key] = float(arrays[key][i]) if count > 0 else None
+        records.append(record)
+    return records
@@ -90,6 +90,22 @@ DATABASES = {
     }
 }
 
+# "default" stays per process. "shared" is seen by every worker and holds
+# only refresh locks and short-lived state (swa climatology and cubes);
+# losing an entry to culling at worst repeats a check. Data versions and
+# dirty flags are tables (Basic.DataVersion, swa.SwaCubeDirty), not cache keys.
+# Create the cache table with `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'TIMEOUT': 60 * 15,
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -192,6 +208,11 @@ ALLOWED_HOSTS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/DSS_Anas/media/'
 
+# Temp artifacts under media/temp (see main/temp_artifacts.py)
+TEMP_ARTIFACT_BUDGET_MB = int(os.environ.get('TEMP_ARTIFACT_BUDGET_MB', 5120))
+TEMP_ARTIFACT_DEFAULT_TTL_SECONDS = 6 * 3600
+TEMP_ARTIFACT_EVICT_INTERVAL_SECONDS = 300
+
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -5,6 +5,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from django.db.models import Sum
+from .. import cubes
+from ..climate_engine import index_series, load_admin_runoff, summarize
 from ..models import ClimateAdmin
 import io
 import base64
@@ -45,6 +47,75 @@ def render_climate_admin_png(points, village, sd_code, source_id, start_year, en
     return base64.b64encode(buf.read()).decode("utf-8")
 
 
+def admin_series(source_id, start_year, end_year, subdistrict_codes, vlcodes, summary_only=False):
+    """
+    (columns, summaries) with "village" and "subdistrict" set on every entry;
+    summary-only requests are answered from the annual cube for the villages
+    it covers and from the raw table for the rest (columns is None then)
+    """
+    if summary_only:
+        if subdistrict_codes:
+            entities = cubes.source_entities(cubes.CLIMATE_ADMIN, subdistrict_codes, scenario=int(source_id))
+        else:
+            entities = vlcodes
+        covered, missing = cubes.split_covered(cubes.CLIMATE_ADMIN, entities, scenario=int(source_id))
+        if covered:
+            info = cubes.entity_info(cubes.CLIMATE_ADMIN, covered, scenario=int(source_id))
+            summaries = cubes.annual_series(
+                cubes.CLIMATE_ADMIN, covered, [int(source_id)], start_year, end_year
+            )
+            for entry in summaries:
+                entry["village"], entry["subdistrict"], _ = info[entry["key"]]
+            if missing:
+                summaries += _raw_series(source_id, start_year, end_year, None, missing)[1]
+                summaries.sort(key=lambda entry: entry["key"])
+            return None, summaries
+
+    return _raw_series(source_id, start_year, end_year, subdistrict_codes, vlcodes)
+
+
+def _raw_series(source_id, start_year, end_year, subdistrict_codes, vlcodes):
+    columns = load_admin_runoff(source_id, start_year, end_year, subdistrict_codes, vlcodes)
+    summaries = summarize(columns, ["runoff"])
+    for entry in summaries:
+        entry["village"] = columns["village"][entry["start"]]
+        entry["subdistrict"] = columns["subdistrict"][entry["start"]]
+    return columns, summaries
+
+
+def admin_result(columns, entry, sd_code, source_id, start_year, end_year, vlcode=None):
+    """Response block of one village's ClimateAdmin series (summary only when columns is None)"""
+    total_runoff = entry["totals"]["runoff"]
+    per_year = {
+        str(year): {
+            "total_runoff": round(totals["runoff"], 3),
+            "avg_monthly_runoff": round(totals["runoff"] / count, 3),
+        }
+        for year, count, totals in entry["per_year"]
+    }
+    result = {
+        "subdistrict_code": sd_code,
+        "source_id": source_id,
+        "vlcode": entry["key"] if vlcode is None else vlcode,
+        "village": entry["village"],
+        "start_year": start_year,
+        "end_year": end_year,
+        "summary": {
+            "total_runoff": round(total_runoff, 3),
+            "avg_monthly_runoff": round(total_runoff / max(1, entry["count"]), 3),
+            "per_year": per_year,
+        },
+    }
+    if columns is not None:
+        rows = slice(entry["start"], entry["stop"])
+        result["data"] = {"points": [
+            {"year": y, "mon": m, "surq_cnt_m3": r}
+            for y, m, r in zip(columns["year"][rows].tolist(), columns["mon"][rows].tolist(),
+                               columns["runoff"][rows].tolist())
+        ]}
+    return result
+
+
 class ClimateAdminView(APIView):
     """Optimized API for surface runoff data (aggregated at DB level)."""
     permission_classes = [AllowAny]
@@ -56,6 +127,7 @@ class ClimateAdminView(APIView):
             source_id = request.data.get("source_id")
             start_year = int(request.data.get("start_year", 2021))
             end_year = int(request.data.get("end_year", start_year))
+            summary_only = str(request.data.get("summary_only", False)).lower() in ("1", "true", "yes")
 
             # Validation
             if subdistrict_codes and vlcodes:
@@ -76,71 +148,34 @@ class ClimateAdminView(APIView):
             if end_year < start_year:
                 return Response({"error": "end_year must be >= start_year"}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Every village in one grouped query, totals from grouped reductions
+            columns, summaries = admin_series(
+                source_id, start_year, end_year, subdistrict_codes, vlcodes, summary_only
+            )
+
             results = {}
 
             # --- Mode 1: By Subdistrict ---
             if subdistrict_codes:
+                by_subdistrict = {}
+                for entry in summaries:
+                    by_subdistrict.setdefault(str(entry["subdistrict"]), []).append(entry)
+
                 for sd_code in subdistrict_codes:
                     try:
-                        qs = (
-                            ClimateAdmin.objects.filter(
-                                subdistrict_code_id=sd_code,
-                                source_id=source_id,
-                                year__gte=start_year,
-                                year__lte=end_year,
-                            )
-                            .values("vlcode", "village", "year", "mon")
-                            .annotate(runoff=Sum("surq_cnt_m3"))
-                            .order_by("vlcode", "year", "mon")
-                        )
+                        entries = by_subdistrict.get(str(sd_code), [])
 
-                        if not qs.exists():
+                        if not entries:
                             results[f"{sd_code}_{source_id}"] = {
                                 "error": f"No data found for subdistrict {sd_code}, source {source_id}, years {start_year}-{end_year}"
                             }
                             continue
 
-                        villages = {}
-                        for row in qs:
-                            vlcode = row["vlcode"]
-                            vname = row["village"]
-                            if vlcode not in villages:
-                                villages[vlcode] = {"village": vname, "points": []}
-                            villages[vlcode]["points"].append({
-                                "year": row["year"],
-                                "mon": row["mon"],
-                                "surq_cnt_m3": float(row["runoff"])
-                            })
-
-                        for vlcode, vdata in villages.items():
-                            points = vdata["points"]
-                            total_runoff = sum(p["surq_cnt_m3"] for p in points)
-
-                            per_year = {}
-                            for y in range(start_year, end_year + 1):
-                                y_points = [p for p in points if p["year"] == y]
-                                if not y_points:
-                                    continue
-                                total = sum(p["surq_cnt_m3"] for p in y_points)
-                                per_year[str(y)] = {
-                                    "total_runoff": round(total, 3),
-                                    "avg_monthly_runoff": round(total / len(y_points), 3),
-                                }
-
-                            results[f"{sd_code}_{source_id}_{vlcode}"] = {
-                                "subdistrict_code": sd_code,
-                                "source_id": source_id,
-                                "vlcode": vlcode,
-                                "village": vdata["village"],
-                                "start_year": start_year,
-                                "end_year": end_year,
-                                "data": {"points": points},
-                                "summary": {
-                                    "total_runoff": round(total_runoff, 3),
-                                    "avg_monthly_runoff": round(total_runoff / max(1, len(points)), 3),
-                                    "per_year": per_year,
-                                },
-                            }
+                        for entry in entries:
+                            vlcode = entry["key"]
+                            results[f"{sd_code}_{source_id}_{vlcode}"] = admin_result(
+                                columns, entry, sd_code, source_id, start_year, end_year
+                            )
 
                     except Exception as e:
                         logger.error(f"Error processing subdistrict {sd_code}, source {source_id}: {str(e)}")
@@ -150,61 +185,21 @@ class ClimateAdminView(APIView):
 
             # --- Mode 2: By Village codes ---
             elif vlcodes:
+                series = index_series(summaries)
                 for vlcode in vlcodes:
                     try:
-                        qs = (
-                            ClimateAdmin.objects.filter(
-                                vlcode=vlcode,
-                                source_id=source_id,
-                                year__gte=start_year,
-                                year__lte=end_year,
-                            )
-                            .values("subdistrict_code_id", "village", "year", "mon")
-                            .annotate(runoff=Sum("surq_cnt_m3"))
-                            .order_by("year", "mon")
-                        )
+                        entry = series.get((int(vlcode), int(source_id)))
 
-                        if not qs.exists():
+                        if entry is None:
                             results[f"{vlcode}_{source_id}"] = {
                                 "error": f"No data found for village {vlcode}, source {source_id}, years {start_year}-{end_year}"
                             }
                             continue
 
-                        sd_code = qs.first()["subdistrict_code_id"]
-                        vname = qs.first()["village"]
-
-                        points = [
-                            {"year": row["year"], "mon": row["mon"], "surq_cnt_m3": float(row["runoff"])}
-                            for row in qs
-                        ]
-
-                        total_runoff = sum(p["surq_cnt_m3"] for p in points)
-
-                        per_year = {}
-                        for y in range(start_year, end_year + 1):
-                            y_points = [p for p in points if p["year"] == y]
-                            if not y_points:
-                                continue
-                            total = sum(p["surq_cnt_m3"] for p in y_points)
-                            per_year[str(y)] = {
-                                "total_runoff": round(total, 3),
-                                "avg_monthly_runoff": round(total / len(y_points), 3),
-                            }
-
-                        results[f"{sd_code}_{source_id}_{vlcode}"] = {
-                            "subdistrict_code": sd_code,
-                            "source_id": source_id,
-                            "vlcode": vlcode,
-                            "village": vname,
-                            "start_year": start_year,
-                            "end_year": end_year,
-                            "data": {"points": points},
-                            "summary": {
-                                "total_runoff": round(total_runoff, 3),
-                                "avg_monthly_runoff": round(total_runoff / max(1, len(points)), 3),
-                                "per_year": per_year,
-                            },
-                        }
+                        sd_code = entry["subdistrict"]
+                        results[f"{sd_code}_{source_id}_{vlcode}"] = admin_result(
+                            columns, entry, sd_code, source_id, start_year, end_year, vlcode=vlcode
+                        )
 
                     except Exception as e:
                         logger.error(f"Error processing village {vlcode}, source {source_id}: {str(e)}")
@@ -11,30 +11,19 @@ import matplotlib.pyplot as plt
 import io
 import base64
 
+from .. import cubes
+from ..fdc_engine import (
+    DEFAULT_PERCENTILES, entity_fdc, flow_duration, parse_curve_points, parse_percentiles, pivot,
+)
 from ..models import AdminFlow
 
 
-def compute_fdc_and_quantiles(flows, targets=[10, 25, 50, 75, 90]):
+def compute_fdc_and_quantiles(flows, targets=DEFAULT_PERCENTILES):
     flows = np.array([f for f in flows if f is not None], dtype=float)
     if flows.size == 0:
         return None
-
-    sorted_flows = np.sort(flows)[::-1]
-    N = sorted_flows.size
-    ranks = np.arange(1, N + 1)
-    exceed_prob = ranks / (N + 1.0) * 100.0
-
-    quantiles = {}
-    for t in targets:
-        q = float(np.interp(t, exceed_prob, sorted_flows))
-        quantiles[f"Q{t}"] = q
-
-    return {
-        "n": int(N),
-        "exceed_prob": exceed_prob.tolist(),
-        "sorted_flows": sorted_flows.tolist(),
-        "quantiles": quantiles,
-    }
+    fdc = flow_duration(flows[None, :], targets)
+    return entity_fdc(fdc, 0, targets)
 
 
 def render_fdc_png(exceed_prob, sorted_flows, label, q25=None, width=800, height=450, dpi=160):
@@ -64,6 +53,25 @@ def render_fdc_png(exceed_prob, sorted_flows, label, q25=None, width=800, height
     return b64
 
 
+def cube_village_fdc(vlcodes, percentiles):
+    """
+    {vlcode: (subdistrict_code, result block)} of VillageFlowDurationCurveAPI
+    read from the FDC cube, for quantile-only requests with percentiles in
+    cubes.FDC_PERCENTILES and villages the cube covers
+    """
+    info = cubes.entity_info(cubes.ADMINFLOW, vlcodes)
+    quantiles = cubes.fdc_percentiles(cubes.ADMINFLOW, vlcodes, percentiles)
+    blocks = {}
+    for vlcode, (village_name, subdistrict_code, n) in info.items():
+        values = quantiles.get(vlcode, {})
+        blocks[vlcode] = (subdistrict_code, {
+            "village": village_name,
+            "n": n,
+            "quantiles": {f"Q{p}": values.get(p) for p in percentiles},
+        })
+    return blocks
+
+
 # -------------------- JSON API (Final Version) --------------------
 class VillageFlowDurationCurveAPI(APIView):
     permission_classes = [AllowAny]
@@ -90,70 +98,111 @@ class VillageFlowDurationCurveAPI(APIView):
         if isinstance(vlcodes, str):
             vlcodes = [v.strip() for v in vlcodes.split(",") if v.strip()]
 
+        try:
+            percentiles = parse_percentiles(request.data.get("percentiles"))
+            curve_points = parse_curve_points(request.data.get("curve_points"))
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        include_full_curve = str(request.data.get("include_full_curve", True)).lower() not in ("0", "false", "no")
+
+        # Quantile-only requests are answered from the precomputed FDC cube
+        # for the villages it covers; the rest go through the raw path below
+        cube_blocks, missing = {}, None
+        if (
+            not include_full_curve
+            and curve_points is None
+            and set(percentiles) <= set(cubes.FDC_PERCENTILES)
+        ):
+            if subdistrict_codes:
+                entities = cubes.source_entities(cubes.ADMINFLOW, subdistrict_codes)
+            else:
+                entities = [int(v) for v in vlcodes]
+            covered, missing = cubes.split_covered(cubes.ADMINFLOW, entities)
+            if covered:
+                cube_blocks = cube_village_fdc(covered, percentiles)
+            else:
+                missing = None
+
         final_results = {}
         errors = {}
 
+        # One query for every requested village, then one (villages x timesteps) FDC pass
+        rows = []
+        if missing != []:
+            qs = AdminFlow.objects.all()
+            if missing is not None:
+                qs = qs.filter(vlcode__in=missing)
+            elif subdistrict_codes:
+                qs = qs.filter(subdistrict_code_id__in=subdistrict_codes)
+            else:
+                qs = qs.filter(vlcode__in=vlcodes)
+            rows = list(qs.order_by("id").values_list("subdistrict_code_id", "vlcode", "village", "surq_cnt_m3"))
+
+        subdistrict_col = np.array([-1 if r[0] is None else r[0] for r in rows], dtype=np.int64)
+        vlcode_col = np.array([r[1] for r in rows], dtype=np.int64)
+        flow_col = np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=np.float64)
+
+        group_by = (subdistrict_col, vlcode_col) if subdistrict_codes else (vlcode_col,)
+        first_rows, fdc = [], None
+        if rows:
+            first_rows, matrix = pivot(flow_col, *group_by)
+            fdc = flow_duration(matrix, percentiles, curve_points)
+
         # ---------------------------------
         # Case 1: Handle subdistrict codes
         # ---------------------------------
         if subdistrict_codes:
-            for subdistrict_code in subdistrict_codes:
-                villages = (
-                    AdminFlow.objects.filter(subdistrict_code_id=subdistrict_code)
-                    .values("vlcode", "village", "surq_cnt_m3")
-                )
+            by_subdistrict, cube_by_subdistrict = {}, {}
+            for i, first in enumerate(first_rows):
+                by_subdistrict.setdefault(str(subdistrict_col[first]), []).append(i)
+            for vlcode, (subdistrict_code_id, block) in cube_blocks.items():
+                cube_by_subdistrict.setdefault(str(subdistrict_code_id), []).append((vlcode, block))
 
-                if not villages.exists():
+            for subdistrict_code in subdistrict_codes:
+                entities = by_subdistrict.get(str(subdistrict_code), [])
+                cube_villages = cube_by_subdistrict.get(str(subdistrict_code), [])
+                if not entities and not cube_villages:
                     errors[subdistrict_code] = f"No villages found for subdistrict {subdistrict_code}"
                     continue
 
-                results = {}
-                village_map = {}
-
-                for row in villages:
-                    vlcode = row["vlcode"]
-                    village_name = row["village"]
-                    flow = row["surq_cnt_m3"]
-                    village_map.setdefault(vlcode, {"name": village_name, "flows": []})["flows"].append(flow)
-
-                for vlcode, data in village_map.items():
-                    flows = data["flows"]
-                    computed = compute_fdc_and_quantiles(flows)
-                    if not computed:
-                        errors[str(vlcode)] = f"No data found for village {data['name']}"
+                results = {str(vlcode): block for vlcode, block in cube_villages}
+                for i in entities:
+                    vlcode, village_name = rows[first_rows[i]][1], rows[first_rows[i]][2]
+                    if not fdc["counts"][i]:
+                        errors[str(vlcode)] = f"No data found for village {village_name}"
                     else:
                         results[str(vlcode)] = {
-                            "village": data["name"],
-                            **computed,
+                            "village": village_name,
+                            **entity_fdc(fdc, i, percentiles, include_full_curve),
                         }
 
-                final_results[subdistrict_code] = results
+                final_results[subdistrict_code] = dict(sorted(results.items(), key=lambda item: int(item[0])))
 
         # ---------------------------------
         # Case 2: Handle vlcode directly
         # ---------------------------------
         elif vlcodes:
+            entity_of = {int(rows[first][1]): i for i, first in enumerate(first_rows)}
             for vlcode in vlcodes:
-                flows_qs = AdminFlow.objects.filter(vlcode=vlcode).values(
-                    "village", "surq_cnt_m3", "subdistrict_code_id"
-                )
-                if not flows_qs.exists():
-                    errors[str(vlcode)] = f"No data found for village code {vlcode}"
+                if int(vlcode) in cube_blocks:
+                    subdistrict_code_id, block = cube_blocks[int(vlcode)]
+                    final_results[str(vlcode)] = {**block, "subdistrict_code": subdistrict_code_id}
                     continue
 
-                flows = [row["surq_cnt_m3"] for row in flows_qs]
-                village_name = flows_qs[0]["village"]
-                subdistrict_code_id = flows_qs[0]["subdistrict_code_id"]
+                i = entity_of.get(int(vlcode))
+                if i is None:
+                    errors[str(vlcode)] = f"No data found for village code {vlcode}"
+                    continue
 
-                computed = compute_fdc_and_quantiles(flows)
-                if not computed:
+                subdistrict_code_id, _, village_name, _ = rows[first_rows[i]]
+                if not fdc["counts"][i]:
                     errors[str(vlcode)] = f"Could not compute FDC for {village_name}"
                     continue
 
                 final_results[str(vlcode)] = {
                     "village": village_name,
                     "subdistrict_code": subdistrict_code_id,
-                    **computed,
+                    **entity_fdc(fdc, i, percentiles, include_full_curve),
                 }
 
         # ---------------------------------
@@ -5,15 +5,35 @@ from django.http import JsonResponse
 from rest_framework.views import APIView
 from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
-from collections import defaultdict
-from ..models import AdminFlow
+from ..charts import chart_base64, chart_url, register_chart
+from ..climatology import ADMINFLOW, village_month_matrix
+from ..eflow_engine import curve_series, fdc_quantiles
 
-# PNG rendering imports
-import io
-import base64
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+
+def q25_surplus(flows):
+    """
+    Q25 (FDC method), surplus volume and statistics for every village at once.
+    flows: (villages x 12) monthly mean runoff (m3), NaN where a month has no data.
+    Each month counts as 30 days of surplus, as before.
+    """
+    valid = np.isfinite(flows)
+    counts = valid.sum(axis=1)
+    (q25,) = fdc_quantiles(flows, 25)
+    q25 = np.where(counts > 0, q25, 0.0)
+
+    excess = np.where(valid & (flows > q25[:, None]), flows - q25[:, None], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_flow = np.where(valid, flows, 0.0).sum(axis=1) / counts
+
+    return {
+        "q25": q25,
+        "surplus_Mm3": excess.sum(axis=1) * 30 * 86400 / 1e6,
+        "surplus_months": (excess > 0).sum(axis=1),
+        "max_flow": np.where(valid, flows, -np.inf).max(axis=1),
+        "min_flow": np.where(valid, flows, np.inf).min(axis=1),
+        "mean_flow": mean_flow,
+        "data_points": counts,
+    }
 
 
 class VillageSurplusAPI(APIView):
@@ -26,21 +46,6 @@ class VillageSurplusAPI(APIView):
     parser_classes = [JSONParser]
     permission_classes = [AllowAny]
 
-    def flow_duration_curve(self, flows, percentile):
-        """Return discharge at given exceedance percentile from sorted flows."""
-        flows = np.array(flows)
-        flows = flows[~np.isnan(flows)]
-        flows = flows[flows >= 0]
-
-        if len(flows) == 0:
-            return 0.0
-
-        flows_sorted = np.sort(flows)[::-1]
-        N = len(flows_sorted)
-        ranks = np.arange(1, N + 1)
-        exceed_prob = ranks / (N + 1) * 100
-        return float(np.interp(percentile, exceed_prob, flows_sorted))
-
     def post(self, request):
         try:
             subdistrict_codes = request.data.get("subdistrict_codes")
@@ -64,31 +69,35 @@ class VillageSurplusAPI(APIView):
             final_results = {}
             errors = {}
 
+            # One read of the materialized climatology for every requested village
+            codes, villages, subdistricts, flows = village_month_matrix(
+                ADMINFLOW, subdistrict_codes=subdistrict_codes, vlcodes=vlcodes
+            )
+            surplus = q25_surplus(flows)
+
             # -------------------------------
             # Case 1: Handle subdistrict mode
             # -------------------------------
             if subdistrict_codes:
                 for subdistrict_code in subdistrict_codes:
-                    qs = AdminFlow.objects.filter(subdistrict_code_id=subdistrict_code).order_by("year", "mon")
-                    if not qs.exists():
+                    rows = np.flatnonzero(subdistricts == float(subdistrict_code))
+                    if not rows.size:
                         errors[subdistrict_code] = f"No data found for subdistrict {subdistrict_code}"
                         continue
 
-                    results = self.process_villages(qs)
-                    final_results[subdistrict_code] = results
+                    final_results[subdistrict_code] = self.village_results(rows, codes, villages, flows, surplus)
 
             # -------------------------------
             # Case 2: Handle single village mode
             # -------------------------------
             elif vlcodes:
                 for vlcode in vlcodes:
-                    qs = AdminFlow.objects.filter(vlcode=vlcode).order_by("year", "mon")
-                    if not qs.exists():
+                    rows = np.flatnonzero(codes == int(vlcode))
+                    if not rows.size:
                         errors[str(vlcode)] = f"No data found for village code {vlcode}"
                         continue
 
-                    results = self.process_villages(qs)
-                    final_results[str(vlcode)] = results
+                    final_results[str(vlcode)] = self.village_results(rows, codes, villages, flows, surplus)
 
             return JsonResponse(
                 {
@@ -107,60 +116,32 @@ class VillageSurplusAPI(APIView):
             return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
 
     # -----------------------------------------
-    # Shared village processing logic
+    # Shared village response building
     # -----------------------------------------
-    def process_villages(self, qs):
+    def village_results(self, rows, codes, villages, flows, surplus):
         results = {}
-        village_groups = defaultdict(list)
-
-        for row in qs:
-            village_groups[(row.vlcode, row.village)].append({
-                "year": row.year,
-                "month": row.mon,
-                "flow": float(row.surq_cnt_m3) if row.surq_cnt_m3 is not None else 0.0,
-            })
-
-        for (vlcode, village), records in village_groups.items():
-            monthly_flows = defaultdict(list)
-            for r in records:
-                monthly_flows[r["month"]].append(r["flow"])
-
-            averaged_data = []
-            for m in sorted(monthly_flows.keys()):
-                vals = [f for f in monthly_flows[m] if f is not None and f >= 0]
-                if vals:
-                    averaged_data.append({"month": m, "flow": float(np.mean(vals))})
-
-            if not averaged_data:
+        for i in rows:
+            vlcode, village = int(codes[i]), villages[i]
+            months, month_flows = curve_series(flows[i])
+
+            if not month_flows.size:
                 results[vlcode] = {"error": f"No valid data for {village} ({vlcode})"}
                 continue
 
-            all_flows = [e["flow"] for e in averaged_data]
-            Q25 = self.flow_duration_curve(all_flows, 25)
-
-            surplus_flows = []
-            total_surplus_m3 = 0.0
-            for e in averaged_data:
-                surplus = max(0, e["flow"] - Q25)
-                surplus_flows.append(surplus)
-                total_surplus_m3 += surplus * 30 * 86400  # convert to m³
-
-            surplus_Mm3 = total_surplus_m3 / 1e6
-
             results[vlcode] = {
                 "vlcode": vlcode,
                 "village": village,
-                "Q25_m3": round(float(Q25), 3),
-                "surplus_runoff_Mm3": round(float(surplus_Mm3), 3),
+                "Q25_m3": round(float(surplus["q25"][i]), 3),
+                "surplus_runoff_Mm3": round(float(surplus["surplus_Mm3"][i]), 3),
                 "statistics": {
-                    "max_flow": round(float(np.max(all_flows)), 3),
-                    "min_flow": round(float(np.min(all_flows)), 3),
-                    "mean_flow": round(float(np.mean(all_flows)), 3),
-                    "surplus_months": int(sum(1 for s in surplus_flows if s > 0)),
-                    "total_data_points": len(averaged_data),
+                    "max_flow": round(float(surplus["max_flow"][i]), 3),
+                    "min_flow": round(float(surplus["min_flow"][i]), 3),
+                    "mean_flow": round(float(surplus["mean_flow"][i]), 3),
+                    "surplus_months": int(surplus["surplus_months"][i]),
+                    "total_data_points": int(surplus["data_points"][i]),
                 },
                 "timeseries": [
-                    {"month": e["month"], "flow": round(e["flow"], 3)} for e in averaged_data
+                    {"month": int(m), "flow": round(float(f), 3)} for m, f in zip(months, month_flows)
                 ],
             }
 
@@ -169,37 +150,13 @@ class VillageSurplusAPI(APIView):
 
 class VillageSurplusImageAPI(APIView):
     """
-    API to generate PNG image for a single village (vlcode).
+    API to generate the chart for a single village (vlcode); the PNG is
+    rendered on first fetch of image_url (see swa/charts.py).
     Accepts only 'vlcode', rejects 'subdistrict_codes' if passed.
     """
 
     permission_classes = [AllowAny]
 
-    def render_village_png(self, timeseries, q25, vlcode, village, width=1000, height=420, dpi=140):
-        """Generate PNG chart for a village timeseries."""
-        months = [int(p['month']) for p in timeseries]
-        flows = [float(p['flow']) for p in timeseries]
-
-        fig, ax = plt.subplots(figsize=(width / dpi, height / dpi), dpi=dpi)
-        ax.plot(months, flows, color="#16a34a", linewidth=2, marker="o",
-                label=f"{village} ({vlcode}) Flow")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Flow (m³)")
-        ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
-
-        if q25 is not None:
-            ax.axhline(y=q25, color="#dc2626", linestyle="--", linewidth=2, label="Q25 Threshold")
-
-        ax.set_title("Village Surplus Runoff Analysis")
-        ax.legend(loc="best")
-        fig.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, facecolor="white")
-        plt.close(fig)
-        buf.seek(0)
-        return base64.b64encode(buf.read()).decode("utf-8")
-
     def post(self, request):
         subdistrict_codes = request.data.get("subdistrict_codes")
         vlcode = request.data.get("vlcode")
@@ -212,43 +169,28 @@ class VillageSurplusImageAPI(APIView):
         if not vlcode:
             return JsonResponse({"error": "vlcode is required"}, status=400)
 
-        qs = AdminFlow.objects.filter(vlcode=vlcode).order_by("year", "mon")
-        if not qs.exists():
+        codes, villages, _, flows = village_month_matrix(ADMINFLOW, vlcodes=[vlcode])
+        if not codes.size:
             return JsonResponse({"error": f"No data found for vlcode {vlcode}"}, status=404)
 
-        village = qs.first().village
-        village_groups = defaultdict(list)
-        for row in qs:
-            village_groups[(row.vlcode, row.village)].append({
-                "year": row.year,
-                "month": row.mon,
-                "flow": float(row.surq_cnt_m3) if row.surq_cnt_m3 is not None else 0.0,
-            })
-
-        # Only one village for this vlcode
-        (_, _), records = list(village_groups.items())[0]
-
-        monthly_flows = defaultdict(list)
-        for r in records:
-            monthly_flows[r["month"]].append(r["flow"])
-
-        averaged_data = []
-        for m in sorted(monthly_flows.keys()):
-            vals = [f for f in monthly_flows[m] if f is not None and f >= 0]
-            if vals:
-                averaged_data.append({"month": m, "flow": float(np.mean(vals))})
-
-        if not averaged_data:
+        village = villages[0]
+        months, all_flows = curve_series(flows[0])
+        if not all_flows.size:
             return JsonResponse({"error": f"No valid data for village {village} ({vlcode})"}, status=404)
 
-        all_flows = [e["flow"] for e in averaged_data]
-        Q25 = VillageSurplusAPI().flow_duration_curve(all_flows, 25)
+        Q25 = float(q25_surplus(flows)["q25"][0])
 
-        image_b64 = self.render_village_png(averaged_data, Q25, vlcode, village)
+        chart = register_chart("village_surplus", months, all_flows, Q25, village=village, vlcode=vlcode)
 
-        return JsonResponse({
+        response = {
             "vlcode": vlcode,
             "village": village,
             "Q25_m3": round(float(Q25), 3),
-            "image_base64": image_b64
-        })
+            "timeseries": [
+                {"month": int(m), "flow": round(float(f), 3)} for m, f in zip(months, all_flows)
+            ],
+            "image_url": chart_url(request, chart),
+        }
+        if str(request.data.get("include_image_base64", True)).lower() not in ("0", "false", "no"):
+            response["image_base64"] = chart_base64(chart)
+        return JsonResponse(response)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SwaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "swa"
+
+    def ready(self):
+        import swa.signals
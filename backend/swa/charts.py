@@ -0,0 +1,240 @@
+"""
+Lazy, cached chart rendering for the e-flow and surplus APIs.
+
+The compute APIs no longer draw anything. They store a small chart spec
+(series, threshold, labels) under media/swa_chart_specs and return its URL.
+The PNG is rendered on the first GET with a per-thread reusable Figure/Agg
+canvas and kept in media/temp/swa_charts, keyed by (series hash, method,
+size). The key is a hash of the spec, so images are immutable and served
+with an ETag.
+
+PNGs are temp artifacts: when the evictor removes one, the next GET
+renders it again from the spec, so an image_url keeps working. Specs are
+registered too, with SPEC_TTL_SECONDS refreshed on every use, so an
+image_url stays valid for that long after it was last requested.
+
+The compute APIs still inline image_base64 unless the request sends
+include_image_base64=false.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.urls import reverse
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from main.temp_artifacts import temp_registry
+
+# Bump when the look of the charts changes so cached images are not reused
+STYLE_VERSION = 'swa-chart-v1'
+
+DEFAULT_WIDTH = 1000
+DEFAULT_HEIGHT = 420
+MIN_SIZE, MAX_SIZE = 200, 2400
+DPI = 140
+SPEC_TTL_SECONDS = 30 * 24 * 3600
+
+CHART_KEY_RE = re.compile(r'^[0-9a-f]{24}$')
+
+_local = threading.local()
+
+
+def chart_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'temp', 'swa_charts')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spec_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'swa_chart_specs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _spec_path(key):
+    path = os.path.join(spec_dir(), f"{key}.json")
+    if not os.path.exists(path):
+        # Specs written before they moved out of the temp directory
+        legacy = os.path.join(chart_dir(), f"{key}.json")
+        if os.path.exists(legacy):
+            return legacy
+    return path
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+
+
+def _series(values, ndigits=6):
+    return [round(float(v), ndigits) for v in values]
+
+
+def chart_size(width=None, height=None):
+    """(width, height) in pixels, defaulting and clamping request values"""
+    def clamp(value, default):
+        try:
+            return int(np.clip(int(value), MIN_SIZE, MAX_SIZE))
+        except (TypeError, ValueError):
+            return default
+    return clamp(width, DEFAULT_WIDTH), clamp(height, DEFAULT_HEIGHT)
+
+
+def register_chart(kind, x, y, threshold=None, method=None, **labels):
+    """
+    Store the spec of a chart and return its key; nothing is rendered.
+    The key covers the series hash, the method/threshold and the labels.
+    """
+    x, y = _series(x), _series(y)
+    spec = {
+        'kind': kind,
+        'x': x,
+        'y': y,
+        'threshold': None if threshold is None or not np.isfinite(threshold) else float(threshold),
+        'method': method,
+        'labels': labels,
+    }
+    key = _digest([STYLE_VERSION, _digest([x, y]), method, spec])
+    path = os.path.join(spec_dir(), f"{key}.json")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(spec, f)
+        os.replace(tmp_path, path)
+    temp_registry.register(path, owner='swa.chart_specs', ttl_seconds=SPEC_TTL_SECONDS)
+    return key
+
+
+def chart_url(request, key):
+    return request.build_absolute_uri(reverse('swa-chart', args=[key]))
+
+
+def _canvas(width, height):
+    """This thread's Figure/Agg canvas, cleared and resized"""
+    if getattr(_local, 'fig', None) is None:
+        _local.fig = Figure(dpi=DPI)
+        FigureCanvasAgg(_local.fig)
+    fig = _local.fig
+    fig.clf()
+    fig.set_size_inches(width / DPI, height / DPI)
+    return fig
+
+
+def _draw_eflow(ax, spec):
+    x, y, thr = np.array(spec['x']), np.array(spec['y']), spec['threshold']
+    ax.plot(x, y, color="#2563eb", linewidth=2, marker="o", markersize=4, label="Monthly flow")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Flow (cms)")
+    ax.set_xlim(1, 12)
+    ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
+    if thr is not None:
+        ax.axhline(y=thr, color="#7c3aed", linestyle="--", linewidth=2, label=f"{spec['method']} threshold")
+    ax.set_title(f"Eflow: {spec['method']} • Subbasin {spec['labels']['sub_id']}")
+
+
+def _draw_admin_eflow(ax, spec):
+    x, y, thr = np.array(spec['x']), np.array(spec['y']), spec['threshold']
+    labels = spec['labels']
+    ax.plot(x, y, color="#2563eb", linewidth=2, marker="o", markersize=4, label="Average Flow (L/s)")
+    if thr is not None:
+        ax.axhline(y=thr, color="#7c3aed", linestyle="--", linewidth=2,
+                   label=f"{spec['method']} threshold ({thr:.4f} L/s)")
+        # Shade area above threshold (surplus)
+        thr_arr = np.full_like(y, thr)
+        mask = y > thr_arr
+        if np.any(mask):
+            ax.fill_between(x, y, thr_arr, where=mask, interpolate=True, alpha=0.25, color="#16a34a",
+                            label="Surplus area")
+    ax.set_xlabel("Day / Month")
+    ax.set_ylabel("Flow (L/s)")
+    ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
+    ax.set_title(f"Eflow: {spec['method']} • {labels['village']} ({labels['vlcode']})")
+    annotation = f"Surplus: {labels['surplus_ML']:.6f} ML  ({int(round(labels['surplus_L'])):,} L)"
+    ax.text(0.02, 0.98, annotation, transform=ax.transAxes,
+            fontsize=10, verticalalignment='top',
+            bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="#999999", alpha=0.8))
+
+
+def _draw_surplus(ax, spec):
+    ax.plot(spec['x'], spec['y'], color="#2563eb", linewidth=2, label=f"Subbasin {spec['labels']['sub_id']} Avg Flow")
+    ax.set_xlabel("Day of Year")
+    ax.set_ylabel("Flow (cms)")
+    ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
+    if spec['threshold'] is not None:
+        ax.axhline(y=spec['threshold'], color="#dc2626", linestyle="--", linewidth=2, label="Q25 Threshold")
+    ax.set_title("Surface Water Surplus Analysis")
+
+
+def _draw_village_surplus(ax, spec):
+    labels = spec['labels']
+    ax.plot(spec['x'], spec['y'], color="#16a34a", linewidth=2, marker="o",
+            label=f"{labels['village']} ({labels['vlcode']}) Flow")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Flow (m³)")
+    ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
+    if spec['threshold'] is not None:
+        ax.axhline(y=spec['threshold'], color="#dc2626", linestyle="--", linewidth=2, label="Q25 Threshold")
+    ax.set_title("Village Surplus Runoff Analysis")
+
+
+DRAWERS = {
+    'eflow': _draw_eflow,
+    'admin_eflow': _draw_admin_eflow,
+    'surplus': _draw_surplus,
+    'village_surplus': _draw_village_surplus,
+}
+
+
+def chart_image_path(key, width=None, height=None):
+    """
+    Path of the PNG for a chart key and size, rendering it on first use
+    and again after the evictor removed it. None if the key is unknown.
+    """
+    if not key or not CHART_KEY_RE.match(key):
+        return None
+    width, height = chart_size(width, height)
+    path = os.path.join(chart_dir(), f"{key}_{width}x{height}.png")
+    if os.path.exists(path):
+        temp_registry.touch(path)
+        return path
+
+    spec_path = _spec_path(key)
+    try:
+        with open(spec_path) as f:
+            spec = json.load(f)
+    except FileNotFoundError:
+        return None
+    temp_registry.register(spec_path, owner='swa.chart_specs', ttl_seconds=SPEC_TTL_SECONDS)
+
+    fig = _canvas(width, height)
+    ax = fig.add_subplot(1, 1, 1)
+    DRAWERS[spec['kind']](ax, spec)
+    ax.legend(loc="best")
+    fig.tight_layout()
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, format="png", dpi=DPI, facecolor="white")
+    fig.clf()
+    os.replace(tmp_path, path)
+    temp_registry.register(path, owner='swa.charts')
+    print(f"📈 Rendered {spec['kind']} chart {key} ({width}x{height})")
+    return path
+
+
+def chart_etag(key, width=None, height=None):
+    width, height = chart_size(width, height)
+    return f'"{key}-{width}x{height}"'
+
+
+def chart_base64(key, width=None, height=None):
+    """Inline PNG for callers that still ask for base64"""
+    import base64
+
+    path = chart_image_path(key, width, height)
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode("utf-8")
@@ -3,8 +3,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from django.db.models import Q
-from .models import ClimateDrain
+from . import cubes
+from .climate_engine import (
+    SCENARIOS, drain_points, drain_summary, index_series, load_drain, scenario_comparison, summarize,
+)
 import io
 import base64
 import logging
@@ -45,6 +47,40 @@ def render_climate_png_multi(points, sub_id, scenario, start_year, end_year, wid
     buf.seek(0)
     return base64.b64encode(buf.read()).decode("utf-8")
 
+def drain_series(sub_ids, scenarios, start_year, end_year, summary_only=False):
+    """
+    (columns, summaries) for the requested subbasins; summary-only requests
+    are answered from the annual cube for the subbasins it covers and from
+    the raw table for the rest (columns is None then)
+    """
+    if summary_only:
+        covered, missing = cubes.split_covered(cubes.CLIMATE_DRAIN, sub_ids)
+        if covered:
+            summaries = cubes.annual_series(
+                cubes.CLIMATE_DRAIN, covered, [int(s) for s in scenarios], start_year, end_year
+            )
+            if missing:
+                summaries += summarize(load_drain(missing, scenarios, start_year, end_year), ["flow_in", "flow_out"])
+                summaries.sort(key=lambda entry: (entry["key"], entry["scenario"]))
+            return None, summaries
+    columns = load_drain(sub_ids, scenarios, start_year, end_year)
+    return columns, summarize(columns, ["flow_in", "flow_out"])
+
+
+def summary_result(sub_id, scenario, start_year, end_year, entry):
+    return {
+        "subbasin_id": sub_id,
+        "scenario": scenario,
+        "start_year": start_year,
+        "end_year": end_year,
+        "summary": drain_summary(entry),
+    }
+
+
+def flag(request, name):
+    return str(request.data.get(name, False)).lower() in ('1', 'true', 'yes')
+
+
 class ClimateChangeView(APIView):
     permission_classes = [AllowAny]
 
@@ -52,6 +88,7 @@ class ClimateChangeView(APIView):
         try:
             sub_ids = request.data.get('sub_ids', [])
             scenario = int(request.data.get('scenario', 585))
+            summary_only = flag(request, 'summary_only')
             year = request.data.get('year')  # keep for backward compatibility
             start_year = request.data.get('start_year')
             end_year = request.data.get('end_year')
@@ -73,64 +110,33 @@ class ClimateChangeView(APIView):
             if not sub_ids:
                 return Response({"error": "No subbasin IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-            if scenario not in [126, 245, 370, 585]:
+            if scenario not in SCENARIOS:
                 return Response({"error": "Invalid scenario. Must be one of: 126, 245, 370, 585"}, status=status.HTTP_400_BAD_REQUEST)
 
             if end_year < start_year:
                 return Response({"error": "end_year must be >= start_year"}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Every subbasin in one query, totals from grouped reductions
+            columns, summaries = drain_series(sub_ids, [scenario], start_year, end_year, summary_only)
+            series = index_series(summaries)
+
             results = {}
             for sub_id in sub_ids:
                 try:
-                    qs = ClimateDrain.objects.filter(
-                        sub=sub_id,
-                        rch=scenario,
-                        year__gte=start_year,
-                        year__lte=end_year
-                    ).order_by('year', 'mon')
-
-                    if not qs.exists():
+                    entry = series.get((int(sub_id), scenario))
+                    if entry is None:
                         results[f"{sub_id}_{scenario}"] = {
                             "error": f"No data found for subbasin {sub_id}, scenario {scenario}, years {start_year}-{end_year}"
                         }
                         continue
 
-                    points = []
-                    area_km2 = None
-                    for rec in qs:
-                        if area_km2 is None:
-                            area_km2 = float(rec.areakm2)
-                        points.append({
-                            "year": int(rec.year),
-                            "mon": int(rec.mon),
-                            "flow_in": float(rec.flow_incms),
-                            "flow_out": float(rec.flow_outcms),
-                        })
-
-                    # Compute summary
-                    total_inflow = sum(p["flow_in"] for p in points)
-                    total_outflow = sum(p["flow_out"] for p in points)
-                    net_flow = total_inflow - total_outflow
-
-                    # Per-year summaries
-                    per_year = {}
-                    for y in range(start_year, end_year + 1):
-                        y_points = [p for p in points if p["year"] == y]
-                        if not y_points:
-                            continue
-                        ti = sum(p["flow_in"] for p in y_points)
-                        to = sum(p["flow_out"] for p in y_points)
-                        per_year[str(y)] = {
-                            "total_inflow": round(ti, 3),
-                            "total_outflow": round(to, 3),
-                            "net_flow": round(ti - to, 3),
-                            "avg_monthly_inflow": round(ti / max(1, len(y_points)), 3),
-                            "avg_monthly_outflow": round(to / max(1, len(y_points)), 3),
-                        }
+                    # Totals only: no points or image
+                    if summary_only:
+                        results[f"{sub_id}_{scenario}"] = summary_result(sub_id, scenario, start_year, end_year, entry)
+                        continue
 
                     # x_index for frontend (0..N-1)
-                    for idx, p in enumerate(points):
-                        p["x_index"] = idx
+                    points = drain_points(columns, entry)
 
                     image_base64 = render_climate_png_multi(points, sub_id, scenario, start_year, end_year)
 
@@ -141,16 +147,9 @@ class ClimateChangeView(APIView):
                         "end_year": end_year,
                         "data": {
                             "points": points,  # [{year, mon, flow_in, flow_out, x_index}]
-                            "area_km2": area_km2 or 0
-                        },
-                        "summary": {
-                            "total_inflow": round(total_inflow, 3),
-                            "total_outflow": round(total_outflow, 3),
-                            "net_flow": round(net_flow, 3),
-                            "avg_monthly_inflow": round(total_inflow / max(1, len(points)), 3),
-                            "avg_monthly_outflow": round(total_outflow / max(1, len(points)), 3),
-                            "per_year": per_year
+                            "area_km2": float(columns["area_km2"][entry["start"]]) or 0
                         },
+                        "summary": drain_summary(entry),
                         "image_base64": image_base64
                     }
 
@@ -171,7 +170,9 @@ class ClimateScenarioComparisonView(APIView):
     def post(self, request):
         try:
             sub_ids = request.data.get('sub_ids', [])
-            scenarios = request.data.get('scenarios', [126, 245, 370, 585])
+            scenarios = request.data.get('scenarios', SCENARIOS)
+            include_comparison = flag(request, 'include_comparison')
+            summary_only = flag(request, 'summary_only')
             start_year = int(request.data.get('start_year', 2021))
             end_year = int(request.data.get('end_year', start_year))
 
@@ -180,55 +181,29 @@ class ClimateScenarioComparisonView(APIView):
             if end_year < start_year:
                 return Response({"error": "end_year must be >= start_year"}, status=status.HTTP_400_BAD_REQUEST)
 
+            # All subbasins and scenarios in one query, totals from grouped reductions
+            columns, summaries = drain_series(sub_ids, scenarios, start_year, end_year, summary_only)
+            series = index_series(summaries)
+
             results = {}
 
             for sub_id in sub_ids:
                 for scenario in scenarios:
                     try:
-                        qs = ClimateDrain.objects.filter(
-                            sub=sub_id, rch=scenario,
-                            year__gte=start_year, year__lte=end_year
-                        ).order_by('year', 'mon')
-
-                        if not qs.exists():
+                        entry = series.get((int(sub_id), int(scenario)))
+                        if entry is None:
                             results[f"{sub_id}_{scenario}"] = {
                                 "error": f"No data found for subbasin {sub_id}, scenario {scenario}, years {start_year}-{end_year}"
                             }
                             continue
 
-                        points = []
-                        area_km2 = None
-                        for rec in qs:
-                            if area_km2 is None:
-                                area_km2 = float(rec.areakm2)
-                            points.append({
-                                "year": int(rec.year),
-                                "mon": int(rec.mon),
-                                "flow_in": float(rec.flow_incms),
-                                "flow_out": float(rec.flow_outcms),
-                            })
-
-                        total_inflow = sum(p["flow_in"] for p in points)
-                        total_outflow = sum(p["flow_out"] for p in points)
-                        net_flow = total_inflow - total_outflow
-
-                        per_year = {}
-                        for y in range(start_year, end_year + 1):
-                            y_points = [p for p in points if p["year"] == y]
-                            if not y_points:
-                                continue
-                            ti = sum(p["flow_in"] for p in y_points)
-                            to = sum(p["flow_out"] for p in y_points)
-                            per_year[str(y)] = {
-                                "total_inflow": round(ti, 3),
-                                "total_outflow": round(to, 3),
-                                "net_flow": round(ti - to, 3),
-                                "avg_monthly_inflow": round(ti / max(1, len(y_points)), 3),
-                                "avg_monthly_outflow": round(to / max(1, len(y_points)), 3),
-                            }
+                        if summary_only:
+                            results[f"{sub_id}_{scenario}"] = summary_result(
+                                sub_id, scenario, start_year, end_year, entry
+                            )
+                            continue
 
-                        for idx, p in enumerate(points):
-                            p["x_index"] = idx
+                        points = drain_points(columns, entry)
 
                         image_base64 = render_climate_png_multi(points, sub_id, scenario, start_year, end_year)
 
@@ -239,16 +214,9 @@ class ClimateScenarioComparisonView(APIView):
                             "end_year": end_year,
                             "data": {
                                 "points": points,
-                                "area_km2": area_km2 or 0
-                            },
-                            "summary": {
-                                "total_inflow": round(total_inflow, 3),
-                                "total_outflow": round(total_outflow, 3),
-                                "net_flow": round(net_flow, 3),
-                                "avg_monthly_inflow": round(total_inflow / max(1, len(points)), 3),
-                                "avg_monthly_outflow": round(total_outflow / max(1, len(points)), 3),
-                                "per_year": per_year
+                                "area_km2": float(columns["area_km2"][entry["start"]]) or 0
                             },
+                            "summary": drain_summary(entry),
                             "image_base64": image_base64
                         }
 
@@ -258,6 +226,10 @@ class ClimateScenarioComparisonView(APIView):
                             "error": f"Error processing subbasin {sub_id}, scenario {scenario}: {str(e)}"
                         }
 
+            # Scenario totals side by side per subbasin (opt-in, keeps the keyed results intact)
+            if include_comparison:
+                results["comparison"] = scenario_comparison(summaries, sub_ids, scenarios)
+
             return Response(results, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -0,0 +1,185 @@
+# swa/climate_engine.py - Climate scenario engine for the climate views
+#
+# All requested (unit, scenario, year range) rows come from one query into
+# typed numpy columns sorted by (unit, scenario, year, month). Overall and
+# per-year totals are grouped reductions (np.add.reduceat) over those
+# columns, so the cost is linear in the rows instead of years x rows.
+
+import numpy as np
+from django.db.models import Min, Sum
+
+from .models import ClimateAdmin, ClimateDrain
+
+SCENARIOS = [126, 245, 370, 585]
+
+
+def _starts(*columns):
+    """Indexes where any of the (sorted) columns changes value"""
+    n = len(columns[0])
+    change = np.zeros(n, dtype=bool)
+    if n:
+        change[0] = True
+        for column in columns:
+            change[1:] |= column[1:] != column[:-1]
+    return np.flatnonzero(change)
+
+
+def _columns(rows, spec):
+    """values_list rows -> {name: array} with the dtypes in spec [(name, dtype)]"""
+    if not rows:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in spec}
+    return {name: np.array(values, dtype=dtype) for (name, dtype), values in zip(spec, zip(*rows))}
+
+
+def load_drain(sub_ids, scenarios, start_year, end_year):
+    """ClimateDrain rows for every subbasin and scenario in one query"""
+    rows = list(
+        ClimateDrain.objects.filter(
+            sub__in=sub_ids,
+            rch__in=scenarios,
+            year__gte=start_year,
+            year__lte=end_year,
+        )
+        .order_by("sub", "rch", "year", "mon")
+        .values_list("sub", "rch", "year", "mon", "areakm2", "flow_incms", "flow_outcms")
+    )
+    return _columns(rows, [
+        ("key", np.int64), ("scenario", np.int64), ("year", np.int64), ("mon", np.int64),
+        ("area_km2", np.float64), ("flow_in", np.float64), ("flow_out", np.float64),
+    ])
+
+
+def load_admin_runoff(source_id, start_year, end_year, subdistrict_codes=None, vlcodes=None):
+    """ClimateAdmin runoff summed per (village, year, month) for every village in one query"""
+    qs = ClimateAdmin.objects.filter(source_id=source_id, year__gte=start_year, year__lte=end_year)
+    if subdistrict_codes:
+        qs = qs.filter(subdistrict_code_id__in=subdistrict_codes)
+    else:
+        qs = qs.filter(vlcode__in=vlcodes)
+    rows = list(
+        qs.values("vlcode", "year", "mon")
+        .annotate(
+            runoff=Sum("surq_cnt_m3"),
+            village_name=Min("village"),
+            subdistrict=Min("subdistrict_code_id"),
+        )
+        .order_by("vlcode", "year", "mon")
+        .values_list("vlcode", "year", "mon", "runoff", "village_name", "subdistrict")
+    )
+    columns = _columns(rows, [
+        ("key", np.int64), ("year", np.int64), ("mon", np.int64),
+        ("runoff", np.float64), ("village", object), ("subdistrict", object),
+    ])
+    columns["scenario"] = np.full(len(columns["key"]), int(source_id), dtype=np.int64)
+    return columns
+
+
+def summarize(columns, value_names):
+    """
+    One entry per (key, scenario) series:
+    {key, scenario, start, stop, count, totals: {name: total},
+     per_year: [(year, count, {name: total})]}
+    """
+    key, scenario, year = columns["key"], columns["scenario"], columns["year"]
+    n = len(key)
+    series_starts = _starts(key, scenario)
+    year_starts = _starts(key, scenario, year)
+    if not n:
+        return []
+
+    series_stops = np.r_[series_starts[1:], n]
+    year_counts = np.diff(np.r_[year_starts, n])
+    totals = {name: np.add.reduceat(columns[name], series_starts) for name in value_names}
+    year_totals = {name: np.add.reduceat(columns[name], year_starts) for name in value_names}
+    # Series each year group belongs to
+    year_series = np.searchsorted(series_starts, year_starts, side="right") - 1
+    year_bounds = np.searchsorted(year_series, np.arange(len(series_starts) + 1))
+
+    series = []
+    for s, (start, stop) in enumerate(zip(series_starts, series_stops)):
+        years = range(year_bounds[s], year_bounds[s + 1])
+        series.append({
+            "key": int(key[start]),
+            "scenario": int(scenario[start]),
+            "start": int(start),
+            "stop": int(stop),
+            "count": int(stop - start),
+            "totals": {name: float(totals[name][s]) for name in value_names},
+            "per_year": [
+                (int(year[year_starts[g]]), int(year_counts[g]),
+                 {name: float(year_totals[name][g]) for name in value_names})
+                for g in years
+            ],
+        })
+    return series
+
+
+def index_series(series):
+    """{(key, scenario): series entry}"""
+    return {(entry["key"], entry["scenario"]): entry for entry in series}
+
+
+def drain_summary(entry):
+    """Summary block of a ClimateDrain series, in the views' response format"""
+    totals, count = entry["totals"], entry["count"]
+    per_year = {}
+    for year, year_count, year_totals in entry["per_year"]:
+        ti, to = year_totals["flow_in"], year_totals["flow_out"]
+        per_year[str(year)] = {
+            "total_inflow": round(ti, 3),
+            "total_outflow": round(to, 3),
+            "net_flow": round(ti - to, 3),
+            "avg_monthly_inflow": round(ti / max(1, year_count), 3),
+            "avg_monthly_outflow": round(to / max(1, year_count), 3),
+        }
+    total_inflow, total_outflow = totals["flow_in"], totals["flow_out"]
+    return {
+        "total_inflow": round(total_inflow, 3),
+        "total_outflow": round(total_outflow, 3),
+        "net_flow": round(total_inflow - total_outflow, 3),
+        "avg_monthly_inflow": round(total_inflow / max(1, count), 3),
+        "avg_monthly_outflow": round(total_outflow / max(1, count), 3),
+        "per_year": per_year,
+    }
+
+
+def drain_points(columns, entry):
+    """[{year, mon, flow_in, flow_out, x_index}] for a ClimateDrain series"""
+    rows = slice(entry["start"], entry["stop"])
+    return [
+        {"year": y, "mon": m, "flow_in": fi, "flow_out": fo, "x_index": idx}
+        for idx, (y, m, fi, fo) in enumerate(zip(
+            columns["year"][rows].tolist(), columns["mon"][rows].tolist(),
+            columns["flow_in"][rows].tolist(), columns["flow_out"][rows].tolist(),
+        ))
+    ]
+
+
+def scenario_comparison(series, sub_ids, scenarios):
+    """
+    Side-by-side totals per subbasin: each metric is a list aligned with
+    `scenarios` (None where a scenario has no data).
+    """
+    lookup = index_series(series)
+    comparison = {}
+    for sub_id in sub_ids:
+        entries = [lookup.get((int(sub_id), int(scenario))) for scenario in scenarios]
+        years = sorted({year for entry in entries if entry for year, _, _ in entry["per_year"]})
+        per_year = {
+            str(year): {"total_inflow": [], "total_outflow": [], "net_flow": []} for year in years
+        }
+        block = {"scenarios": list(scenarios), "total_inflow": [], "total_outflow": [], "net_flow": [],
+                 "per_year": per_year}
+        for entry in entries:
+            totals = entry["totals"] if entry else None
+            block["total_inflow"].append(round(totals["flow_in"], 3) if totals else None)
+            block["total_outflow"].append(round(totals["flow_out"], 3) if totals else None)
+            block["net_flow"].append(round(totals["flow_in"] - totals["flow_out"], 3) if totals else None)
+            by_year = {year: year_totals for year, _, year_totals in entry["per_year"]} if entry else {}
+            for year in years:
+                yt = by_year.get(year)
+                per_year[str(year)]["total_inflow"].append(round(yt["flow_in"], 3) if yt else None)
+                per_year[str(year)]["total_outflow"].append(round(yt["flow_out"], 3) if yt else None)
+                per_year[str(year)]["net_flow"].append(round(yt["flow_in"] - yt["flow_out"], 3) if yt else None)
+        comparison[str(sub_id)] = block
+    return comparison
@@ -0,0 +1,186 @@
+# swa/climatology.py - Materialized village x month runoff climatology
+#
+# VillageMonthlyClimatology holds one row per (dataset, source_id, vlcode,
+# month) with the mean of the non-negative surq_cnt_m3 values (NULL counts
+# as 0.0, as the per-row loop did; surplus), the plain mean of the non-NULL
+# values (e-flow) and the row counts, built from AdminFlow and ClimateAdmin
+# in one grouped query each. It is the only village x month
+# materialization: the village APIs read a (villages x 12) array from it
+# instead of scanning the raw monthly rows.
+#
+# Refresh: `manage.py refresh_climatology` after loading data; ORM saves and
+# deletes bump the dataset's data version (signals.py) past the version the
+# last build recorded; and every CHECK_TIMEOUT the
+# source row count is compared with the materialized one, which catches
+# bulk loads that bypass signals. A stale dataset is rebuilt in a
+# background thread (one per deployment, under a shared cache lock) while
+# requests keep reading the last complete build.
+
+import threading
+
+import numpy as np
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Avg, Count, FloatField, Min, Q, Sum
+from django.db.models.functions import Coalesce
+
+from Basic.data_versions import bump_version, get_version, set_version
+
+from .models import AdminFlow, ClimateAdmin, VillageMonthlyClimatology
+
+# Refresh locks and the freshness state must be seen by every worker
+cache = caches["shared"]
+
+ADMINFLOW = "adminflow"
+CLIMATE_ADMIN = "climate_admin"
+SOURCES = {
+    ADMINFLOW: AdminFlow,
+    CLIMATE_ADMIN: ClimateAdmin,
+}
+
+CHECK_TIMEOUT = 60 * 10  # 10 minutes
+REFRESH_LOCK_TIMEOUT = 60 * 15
+
+
+def _state_key(dataset):
+    return f"swa_climatology_{dataset}"
+
+
+def _built_key(dataset):
+    return f"{_state_key(dataset)}_built"
+
+
+def _fresh_key(dataset, version):
+    return f"{_state_key(dataset)}_fresh_{version}"
+
+
+def mark_climatology_stale(dataset):
+    """Force a rebuild of the dataset's climatology on next use"""
+    bump_version(_state_key(dataset))
+
+
+def refresh_climatology(dataset):
+    """Rebuild the climatology rows of one dataset; returns the row count"""
+    model = SOURCES[dataset]
+    version = get_version(_state_key(dataset))
+    group = ["vlcode", "mon"] + (["source_id"] if dataset == CLIMATE_ADMIN else [])
+    # NULL runoff was read as 0.0, so it is a valid (non-negative) value
+    runoff = Coalesce("surq_cnt_m3", 0.0, output_field=FloatField())
+    valid = Q(surq_cnt_m3__gte=0) | Q(surq_cnt_m3__isnull=True)
+    rows = (
+        model.objects.values(*group)
+        .annotate(
+            mean_m3=Avg(runoff, filter=valid),
+            mean_all_m3=Avg("surq_cnt_m3"),
+            valid_count=Count("id", filter=valid),
+            record_count=Count("id"),
+            village_name=Min("village"),
+            subdistrict=Min("subdistrict_code_id"),
+        )
+        .order_by()
+    )
+    objs = [
+        VillageMonthlyClimatology(
+            dataset=dataset,
+            source_id=row.get("source_id", 0),
+            vlcode=row["vlcode"],
+            village=row["village_name"],
+            subdistrict_code_id=row["subdistrict"],
+            mon=row["mon"],
+            mean_m3=row["mean_m3"],
+            mean_all_m3=row["mean_all_m3"],
+            valid_count=row["valid_count"],
+            record_count=row["record_count"],
+        )
+        for row in rows.iterator()
+    ]
+
+    with transaction.atomic():
+        VillageMonthlyClimatology.objects.filter(dataset=dataset).delete()
+        VillageMonthlyClimatology.objects.bulk_create(objs, batch_size=5000)
+
+    # Saves during the build bumped the version past this one: still stale
+    set_version(_built_key(dataset), version)
+    cache.set(_fresh_key(dataset, version), True, CHECK_TIMEOUT)
+    print(f"📅 Refreshed {dataset} climatology: {len(objs)} village-months")
+    return len(objs)
+
+
+def _refresh_in_background(dataset, lock_key):
+    try:
+        refresh_climatology(dataset)
+    except Exception as e:
+        print(f"❌ Climatology refresh failed for {dataset}: {e}")
+    finally:
+        cache.delete(lock_key)
+        connection.close()
+
+
+def ensure_climatology(dataset):
+    """
+    Start a background rebuild when the dataset's climatology is stale or out
+    of step with its source; requests keep reading the current rows. Only a
+    dataset that was never built is built inline, there is nothing to serve.
+    """
+    version = get_version(_state_key(dataset))
+    if cache.get(_fresh_key(dataset, version)):
+        return
+
+    materialized = (
+        VillageMonthlyClimatology.objects.filter(dataset=dataset)
+        .aggregate(rows=Sum("record_count"))["rows"] or 0
+    )
+    stale = get_version(_built_key(dataset)) < version
+    if not stale and SOURCES[dataset].objects.count() == materialized:
+        cache.set(_fresh_key(dataset, version), True, CHECK_TIMEOUT)
+        return
+
+    # One rebuild at a time across workers (the cache is shared)
+    lock_key = f"{_state_key(dataset)}_lock"
+    if not cache.add(lock_key, 1, REFRESH_LOCK_TIMEOUT):
+        return
+    if not materialized:
+        try:
+            refresh_climatology(dataset)
+        finally:
+            cache.delete(lock_key)
+        return
+    threading.Thread(
+        target=_refresh_in_background, args=(dataset, lock_key),
+        name=f"climatology-refresh-{dataset}", daemon=True,
+    ).start()
+
+
+def village_month_matrix(dataset=ADMINFLOW, source_id=0, subdistrict_codes=None, vlcodes=None,
+                         field="mean_m3"):
+    """
+    Climatology for the selected villages as arrays:
+    (vlcodes (V,), villages [V], subdistrict codes (V,), means (V x 12), NaN where no valid data).
+    field="mean_all_m3" gives the plain monthly means the e-flow engine uses.
+    """
+    ensure_climatology(dataset)
+    qs = VillageMonthlyClimatology.objects.filter(dataset=dataset, source_id=source_id)
+    if subdistrict_codes:
+        qs = qs.filter(subdistrict_code_id__in=subdistrict_codes)
+    else:
+        qs = qs.filter(vlcode__in=vlcodes)
+    rows = list(
+        qs.order_by("vlcode", "mon")
+        .values_list("vlcode", "village", "subdistrict_code_id", "mon", field)
+    )
+    if not rows:
+        return np.empty(0, dtype=np.int64), [], np.empty(0), np.empty((0, 12))
+
+    codes, names, subdistricts, months, means = zip(*rows)
+    codes = np.array(codes, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    row = np.cumsum(np.r_[False, codes[1:] != codes[:-1]])
+
+    matrix = np.full((len(starts), 12), np.nan)
+    months = np.array(months, dtype=np.int64)
+    in_range = (months >= 1) & (months <= 12)
+    values = np.array([np.nan if m is None else m for m in means], dtype=np.float64)
+    matrix[row[in_range], months[in_range] - 1] = values[in_range]
+
+    subdistricts = np.array([np.nan if s is None else s for s in subdistricts], dtype=np.float64)
+    return codes[starts], [names[i] for i in starts], subdistricts[starts], matrix
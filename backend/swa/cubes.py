@@ -0,0 +1,344 @@
+# swa/cubes.py - Precomputed surface-water aggregate cubes
+#
+# SubbasinFlow, ClimateDrain, AdminFlow and ClimateAdmin are summarized per
+# entity (sub or vlcode) and scenario (rch / source_id) into four compact
+# indexed tables:
+#
+#   swa_cube_entity   label, subdistrict and row count per entity
+#   swa_cube_monthly  mean value per month (drain datasets; the village
+#                     monthly means are VillageMonthlyClimatology, climatology.py)
+#   swa_cube_annual   totals per year (which also give scenario totals)
+#   swa_cube_fdc      flow-duration percentiles Q5..Q95
+#
+# `manage.py build_swa_cubes` builds them (run after loading data). ORM
+# saves and deletes mark the entity dirty in swa_cube_dirty (signals.py)
+# and the next read that touches it rebuilds just that entity. Every CHECK_TIMEOUT the source
+# row count is compared with the cube's, which catches bulk loads that
+# bypass signals: until a background rebuild brings it back in step the
+# dataset is read from the raw tables.
+#
+# Readers ask split_covered() which of their entities the cube has and scan
+# the raw tables for the rest, so an entity missing from the cube is never
+# dropped from an answer.
+
+import threading
+
+import numpy as np
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Min, Sum
+from django.utils import timezone
+
+from .fdc_engine import flow_duration, pivot
+from .models import (
+    AdminFlow, ClimateAdmin, ClimateDrain, SubbasinFlow,
+    SwaAnnualCube, SwaCubeDirty, SwaCubeEntity, SwaFdcCube, SwaMonthlyCube,
+)
+
+# Refresh locks and the freshness state must be seen by every worker
+cache = caches["shared"]
+
+SUBBASIN_FLOW = "subbasin_flow"
+CLIMATE_DRAIN = "climate_drain"
+ADMINFLOW = "adminflow"
+CLIMATE_ADMIN = "climate_admin"
+
+# Source table layout per dataset
+DATASETS = {
+    SUBBASIN_FLOW: {
+        "model": SubbasinFlow, "entity": "sub", "scenario": None, "month": "month",
+        "value": "flow_out_cms", "inflow": "flow_in_cms", "label": None, "subdistrict": None,
+    },
+    CLIMATE_DRAIN: {
+        "model": ClimateDrain, "entity": "sub", "scenario": "rch", "month": "mon",
+        "value": "flow_outcms", "inflow": "flow_incms", "label": None, "subdistrict": None,
+    },
+    ADMINFLOW: {
+        "model": AdminFlow, "entity": "vlcode", "scenario": None, "month": "mon",
+        "value": "surq_cnt_m3", "inflow": None, "label": "village", "subdistrict": "subdistrict_code_id",
+    },
+    CLIMATE_ADMIN: {
+        "model": ClimateAdmin, "entity": "vlcode", "scenario": "source_id", "month": "mon",
+        "value": "surq_cnt_m3", "inflow": None, "label": "village", "subdistrict": "subdistrict_code_id",
+    },
+}
+
+# Their monthly means are read from VillageMonthlyClimatology
+CLIMATOLOGY_DATASETS = {ADMINFLOW, CLIMATE_ADMIN}
+
+FDC_PERCENTILES = list(range(5, 100, 5))
+BUILD_CHUNK = 500          # entities per build batch
+CHECK_TIMEOUT = 60 * 5
+REFRESH_LOCK_TIMEOUT = 60 * 60
+
+
+def _state_key(dataset):
+    return f"swa_cube_state_{dataset}"
+
+
+def mark_cube_dirty(dataset, entity):
+    """Rebuild this entity's cube rows on next read"""
+    SwaCubeDirty.objects.update_or_create(
+        dataset=dataset, entity=int(entity), defaults={"marked_at": timezone.now()}
+    )
+
+
+def _group(layout, *fields):
+    """Group-by fields with the scenario column when the dataset has one"""
+    return [layout["entity"]] + ([layout["scenario"]] if layout["scenario"] else []) + list(fields)
+
+
+def _scenario(layout, row):
+    return int(row[layout["scenario"]]) if layout["scenario"] else 0
+
+
+def _build_chunk(dataset, entities):
+    """Cube rows for a list of entities, grouped in SQL (the FDC from one values_list)"""
+    layout = DATASETS[dataset]
+    qs = layout["model"].objects.filter(**{f"{layout['entity']}__in": entities})
+    entity_field, value = layout["entity"], layout["value"]
+
+    entity_aggregates = {"row_count": Count("id")}
+    if layout["label"]:
+        entity_aggregates["label_value"] = Min(layout["label"])
+    if layout["subdistrict"]:
+        entity_aggregates["subdistrict"] = Min(layout["subdistrict"])
+    entity_rows = [
+        SwaCubeEntity(
+            dataset=dataset, scenario=_scenario(layout, row), entity=row[entity_field],
+            label=row.get("label_value") or "", subdistrict_code_id=row.get("subdistrict"),
+            rows=row["row_count"],
+        )
+        for row in qs.values(*_group(layout)).annotate(**entity_aggregates).order_by()
+    ]
+
+    monthly_rows = [] if dataset in CLIMATOLOGY_DATASETS else [
+        SwaMonthlyCube(
+            dataset=dataset, scenario=_scenario(layout, row), entity=row[entity_field],
+            mon=row[layout["month"]], mean_value=row["mean_value"], count=row["row_count"],
+        )
+        for row in qs.values(*_group(layout, layout["month"]))
+        .annotate(mean_value=Avg(value), row_count=Count("id")).order_by()
+    ]
+
+    annual_aggregates = {
+        "total": Sum(value),
+        "row_count": Count("id"),
+        "month_count": Count(layout["month"], distinct=True),
+    }
+    if layout["inflow"]:
+        annual_aggregates["total_in"] = Sum(layout["inflow"])
+    annual_rows = [
+        SwaAnnualCube(
+            dataset=dataset, scenario=_scenario(layout, row), entity=row[entity_field],
+            year=row["year"], total=row["total"], total_in=row.get("total_in"),
+            count=row["row_count"], months=row["month_count"],
+        )
+        for row in qs.values(*_group(layout, "year")).annotate(**annual_aggregates).order_by()
+    ]
+
+    # FDC percentiles: one (entities x timesteps) pass per chunk
+    fdc_rows = []
+    scenario_field = layout["scenario"]
+    fields = [entity_field, scenario_field, value] if scenario_field else [entity_field, value]
+    raw = list(qs.values_list(*fields))
+    if raw:
+        columns = list(zip(*raw))
+        entity_col = np.array(columns[0], dtype=np.int64)
+        scenario_col = np.array(columns[1], dtype=np.int64) if scenario_field else np.zeros(len(raw), dtype=np.int64)
+        value_col = np.array([np.nan if v is None else v for v in columns[-1]], dtype=np.float64)
+        first_rows, matrix = pivot(value_col, entity_col, scenario_col)
+        fdc = flow_duration(matrix, FDC_PERCENTILES)
+        quantiles = fdc["quantiles"]
+        valid = {
+            (int(scenario_col[first]), int(entity_col[first])): int(fdc["counts"][i])
+            for i, first in enumerate(first_rows)
+        }
+        for row in entity_rows:
+            row.valid_rows = valid.get((row.scenario, row.entity), 0)
+        for i, first in enumerate(first_rows):
+            for k, percentile in enumerate(FDC_PERCENTILES):
+                q = quantiles[i, k]
+                fdc_rows.append(SwaFdcCube(
+                    dataset=dataset, scenario=int(scenario_col[first]), entity=int(entity_col[first]),
+                    percentile=percentile, value=None if np.isnan(q) else float(q),
+                ))
+
+    with transaction.atomic():
+        for model in (SwaCubeEntity, SwaMonthlyCube, SwaAnnualCube, SwaFdcCube):
+            model.objects.filter(dataset=dataset, entity__in=entities).delete()
+        SwaCubeEntity.objects.bulk_create(entity_rows, batch_size=5000)
+        SwaMonthlyCube.objects.bulk_create(monthly_rows, batch_size=5000)
+        SwaAnnualCube.objects.bulk_create(annual_rows, batch_size=5000)
+        SwaFdcCube.objects.bulk_create(fdc_rows, batch_size=5000)
+    return len(entity_rows)
+
+
+def refresh_cubes(dataset, entities=None):
+    """Rebuild the cubes of a dataset, or only of the given entities; returns series count"""
+    layout = DATASETS[dataset]
+    full = entities is None
+    if full:
+        entities = list(
+            layout["model"].objects.values_list(layout["entity"], flat=True).distinct().order_by(layout["entity"])
+        )
+        # Entities that no longer exist in the source
+        stale = SwaCubeEntity.objects.filter(dataset=dataset).exclude(entity__in=entities)
+        stale_entities = list(stale.values_list("entity", flat=True).distinct())
+        if stale_entities:
+            with transaction.atomic():
+                for model in (SwaCubeEntity, SwaMonthlyCube, SwaAnnualCube, SwaFdcCube):
+                    model.objects.filter(dataset=dataset, entity__in=stale_entities).delete()
+    entities = [int(e) for e in entities]
+
+    series = 0
+    for start in range(0, len(entities), BUILD_CHUNK):
+        chunk = entities[start:start + BUILD_CHUNK]
+        started = timezone.now()
+        series += _build_chunk(dataset, chunk)
+        # Marks set while the chunk was built stay for the next read
+        SwaCubeDirty.objects.filter(dataset=dataset, entity__in=chunk, marked_at__lt=started).delete()
+
+    if full:
+        cache.delete(_state_key(dataset))
+    print(f"🧊 Refreshed {dataset} cubes: {len(entities)} entities, {series} series")
+    return series
+
+
+def _refresh_in_background(dataset, lock_key):
+    try:
+        refresh_cubes(dataset)
+    except Exception as e:
+        print(f"❌ Cube refresh failed for {dataset}: {e}")
+    finally:
+        cache.delete(lock_key)
+        connection.close()
+
+
+def cube_available(dataset, entities=None):
+    """
+    True when the dataset's cubes are built and in step with the source
+    table (row counts compared every CHECK_TIMEOUT; a mismatch, or entities
+    built before valid_rows was stored, starts a background rebuild). Dirty entities among `entities` are rebuilt first
+    so the cube answer matches the raw tables.
+    """
+    state = cache.get(_state_key(dataset))
+    if state is None:
+        built_rows = SwaCubeEntity.objects.filter(dataset=dataset).aggregate(rows=Sum("rows"))["rows"]
+        if not built_rows:
+            state = "empty"
+        elif built_rows == DATASETS[dataset]["model"].objects.count() and not (
+            SwaCubeEntity.objects.filter(dataset=dataset, valid_rows__isnull=True).exists()
+        ):
+            state = "fresh"
+        else:
+            state = "stale"
+            lock_key = f"{_state_key(dataset)}_lock"
+            if cache.add(lock_key, 1, REFRESH_LOCK_TIMEOUT):
+                threading.Thread(
+                    target=_refresh_in_background, args=(dataset, lock_key),
+                    name=f"swa-cube-refresh-{dataset}", daemon=True,
+                ).start()
+        cache.set(_state_key(dataset), state, CHECK_TIMEOUT)
+    if state != "fresh":
+        return False
+    if entities:
+        refresh_dirty(dataset, entities)
+    return True
+
+
+def split_covered(dataset, entities, scenario=None):
+    """
+    (entities the cube has, entities to read from the raw table), both as
+    ints in request order; everything is raw when the cube is not usable
+    """
+    entities = [int(e) for e in entities]
+    if not entities or not cube_available(dataset, entities):
+        return [], entities
+    qs = SwaCubeEntity.objects.filter(dataset=dataset, entity__in=entities)
+    if scenario is not None:
+        qs = qs.filter(scenario=scenario)
+    covered = set(qs.values_list("entity", flat=True))
+    return [e for e in entities if e in covered], [e for e in entities if e not in covered]
+
+
+def refresh_dirty(dataset, entities):
+    """Rebuild the entities that were saved or deleted since the last build"""
+    dirty = list(
+        SwaCubeDirty.objects.filter(dataset=dataset, entity__in=[int(e) for e in entities])
+        .values_list("entity", flat=True)
+    )
+    if dirty:
+        refresh_cubes(dataset, dirty)
+
+
+def source_entities(dataset, subdistrict_codes, scenario=None):
+    """Entities of the given subdistricts, from the source table so new ones are not missed"""
+    layout = DATASETS[dataset]
+    qs = layout["model"].objects.filter(**{f"{layout['subdistrict']}__in": subdistrict_codes})
+    if scenario is not None and layout["scenario"]:
+        qs = qs.filter(**{layout["scenario"]: scenario})
+    return list(qs.values_list(layout["entity"], flat=True).distinct().order_by(layout["entity"]))
+
+
+def monthly_rows(dataset, entities, scenario=0):
+    """[(entity, mon, mean_value)] ordered by entity, month (drain datasets)"""
+    return list(
+        SwaMonthlyCube.objects.filter(dataset=dataset, scenario=scenario, entity__in=entities)
+        .order_by("entity", "mon")
+        .values_list("entity", "mon", "mean_value")
+    )
+
+
+def entity_info(dataset, entities, scenario=0):
+    """{entity: (label, subdistrict_code_id, valid_rows)}, valid_rows counting finite values only"""
+    return {
+        entity: (label, subdistrict, valid_rows)
+        for entity, label, subdistrict, valid_rows in SwaCubeEntity.objects.filter(
+            dataset=dataset, scenario=scenario, entity__in=entities
+        ).values_list("entity", "label", "subdistrict_code_id", "valid_rows")
+    }
+
+
+def fdc_percentiles(dataset, entities, percentiles, scenario=0):
+    """{entity: {percentile: value}} for percentiles in FDC_PERCENTILES"""
+    result = {}
+    for entity, percentile, value in SwaFdcCube.objects.filter(
+        dataset=dataset, scenario=scenario, entity__in=entities, percentile__in=percentiles
+    ).values_list("entity", "percentile", "value"):
+        result.setdefault(entity, {})[percentile] = value
+    return result
+
+
+def annual_series(dataset, entities, scenarios, start_year, end_year):
+    """
+    Per (entity, scenario) series in the climate_engine.summarize format,
+    built from the annual cube: totals and per-year totals of "flow_in" /
+    "flow_out" (drain datasets) or "runoff" (village datasets).
+    """
+    layout = DATASETS[dataset]
+    rows = (
+        SwaAnnualCube.objects.filter(
+            dataset=dataset, entity__in=entities, scenario__in=scenarios,
+            year__gte=start_year, year__lte=end_year,
+        )
+        .order_by("entity", "scenario", "year")
+        .values_list("entity", "scenario", "year", "total", "total_in", "count", "months")
+    )
+    series = []
+    for entity, scenario, year, total, total_in, count, months in rows:
+        if not series or (series[-1]["key"], series[-1]["scenario"]) != (entity, scenario):
+            names = ["flow_in", "flow_out"] if layout["inflow"] else ["runoff"]
+            series.append({
+                "key": entity, "scenario": scenario, "count": 0,
+                "totals": {name: 0.0 for name in names}, "per_year": [],
+            })
+        entry = series[-1]
+        # Village views count (year, month) points, drain views count rows
+        year_count = count if layout["inflow"] else months
+        values = {"flow_in": total_in or 0.0, "flow_out": total or 0.0} if layout["inflow"] else {"runoff": total or 0.0}
+        entry["count"] += year_count
+        for name, v in values.items():
+            entry["totals"][name] += v
+        entry["per_year"].append((year, year_count, values))
+    return series
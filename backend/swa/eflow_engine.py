@@ -0,0 +1,157 @@
+# swa/eflow_engine.py - Environmental-flow engine shared by EflowAPI and AdmineflowAPI
+#
+# Monthly mean flows for every requested unit (subbasin or village) come from
+# one GROUP BY (unit, month) query into a (units x 12) array. The seven
+# thresholds and the surplus volumes are then computed for all units at once
+# with broadcast operations. Months without data are NaN and are left out of
+# every statistic, like the per-unit pandas groupby was. Subbasin means the
+# monthly cube has (cubes.py) and village means the climatology has
+# (climatology.py) are read from them; only the rest is grouped from the raw
+# tables.
+
+import numpy as np
+from django.db.models import Avg, Min
+
+from . import climatology, cubes
+from .fdc_engine import quantiles_from_sorted, sort_descending
+from .models import AdminFlow, SubbasinFlow
+
+METHOD_KEYS = [
+    "FDC-Q95",
+    "FDC-Q90",
+    "Tennant-10%",
+    "Tennant-30%",
+    "Tennant-60%",
+    "Tessmann",
+    "Smakhtin",
+]
+MONTHS = np.arange(1, 13)
+SECONDS_PER_DAY = 86400.0
+
+
+def _monthly_matrix(rows, unit_field, value_field):
+    """Grouped (unit, month, value) rows -> (unit keys in first-seen order, (units x 12) array)"""
+    position, values = {}, []
+    for row in rows:
+        unit = row[unit_field]
+        if unit not in position:
+            position[unit] = len(values)
+            values.append(np.full(12, np.nan))
+        month = int(row["month"])
+        if 1 <= month <= 12 and row[value_field] is not None:
+            values[position[unit]][month - 1] = row[value_field]
+    flows = np.vstack(values) if values else np.empty((0, 12))
+    return list(position), flows
+
+
+def subbasin_monthly_flows(sub_ids):
+    """(subbasins found, (subbasins x 12) mean flow_out_cms); cube rows plus one raw query for the rest"""
+    covered, missing = cubes.split_covered(cubes.SUBBASIN_FLOW, sub_ids)
+    rows = [
+        {"sub": entity, "month": mon, "flow": value}
+        for entity, mon, value in (cubes.monthly_rows(cubes.SUBBASIN_FLOW, covered) if covered else [])
+    ]
+    if missing:
+        rows += list(
+            SubbasinFlow.objects.filter(sub__in=missing)
+            .values("sub", "month")
+            .annotate(flow=Avg("flow_out_cms"))
+            .order_by("sub", "month")
+        )
+        rows.sort(key=lambda row: (row["sub"], row["month"]))
+    return _monthly_matrix(rows, "sub", "flow")
+
+
+def village_monthly_flows(subdistrict_codes=None, vlcodes=None):
+    """
+    (vlcodes found, {vlcode: (village, subdistrict_code)}, (villages x 12)
+    mean surq_cnt_m3): villages in the climatology are read from it, the
+    rest in one grouped query
+    """
+    if subdistrict_codes:
+        vlcodes = cubes.source_entities(cubes.ADMINFLOW, subdistrict_codes)
+    vlcodes = [int(v) for v in vlcodes]
+
+    codes, villages, subdistricts, volumes = climatology.village_month_matrix(
+        climatology.ADMINFLOW, vlcodes=vlcodes, field="mean_all_m3"
+    ) if vlcodes else ([], [], [], np.empty((0, 12)))
+    meta = {
+        int(code): (village, None if np.isnan(subdistrict) else int(subdistrict))
+        for code, village, subdistrict in zip(codes, villages, subdistricts)
+    }
+    missing = [v for v in vlcodes if v not in meta]
+    if not missing:
+        return list(meta), meta, volumes
+
+    rows = list(
+        AdminFlow.objects.filter(vlcode__in=missing)
+        .values("vlcode", "mon")
+        .annotate(
+            volume=Avg("surq_cnt_m3"),
+            village_name=Min("village"),
+            subdistrict=Min("subdistrict_code_id"),
+        )
+        .order_by("vlcode", "mon")
+    )
+    for row in rows:
+        row["month"] = row["mon"]
+        meta.setdefault(row["vlcode"], (row["village_name"], row["subdistrict"]))
+    raw_codes, raw_volumes = _monthly_matrix(rows, "vlcode", "volume")
+
+    # Both parts are sorted by vlcode; merge them
+    vlcodes_found = [int(code) for code in codes] + raw_codes
+    order = np.argsort(vlcodes_found, kind="stable")
+    return [vlcodes_found[i] for i in order], meta, np.vstack([volumes, raw_volumes])[order]
+
+
+def fdc_quantiles(flows, *exceed_probs):
+    """Flow exceeded exceed_prob % of the time, per row of a NaN-padded array"""
+    ordered, counts = sort_descending(flows)
+    quantiles = quantiles_from_sorted(ordered, counts, exceed_probs)
+    return [quantiles[:, k] for k in range(len(exceed_probs))]
+
+
+def eflow_thresholds(flows):
+    """(units x 7) thresholds in METHOD_KEYS order for (units x 12) monthly means"""
+    counts = np.isfinite(flows).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        qmaf = np.nansum(flows, axis=1) / counts
+
+    q95, q90 = fdc_quantiles(flows, 95, 90)
+
+    # Tessmann compares Qmaf with 40% of the mean monthly flow, which is Qmaf
+    tessmann = np.where(qmaf > 0.4 * qmaf, 0.4 * qmaf, qmaf)
+
+    return np.column_stack([
+        q95,
+        q90,
+        0.1 * qmaf,
+        0.3 * qmaf,
+        0.6 * qmaf,
+        tessmann,
+        0.2 * qmaf,
+    ])
+
+
+def surplus_totals(flows, thresholds):
+    """
+    (units x 7) sum over months of max(flow - threshold, 0) * seconds per day,
+    each monthly mean standing for one representative day as before
+    """
+    excess = np.where(
+        np.isfinite(flows)[:, None, :] & (flows[:, None, :] > thresholds[:, :, None]),
+        flows[:, None, :] - thresholds[:, :, None],
+        0.0,
+    )
+    return (excess * SECONDS_PER_DAY).sum(axis=2)
+
+
+def volume_to_lps(volumes_m3):
+    """Daily volume (m3/day) -> flow rate (L/s)"""
+    return volumes_m3 / SECONDS_PER_DAY * 1000.0
+
+
+def curve_series(flows_row):
+    """(months, flows) for the months that have data, as the old groupby gave"""
+    present = np.isfinite(flows_row)
+    return MONTHS[present], flows_row[present]
@@ -0,0 +1,128 @@
+# swa/fdc_engine.py - Flow-duration-curve engine
+#
+# Flows for many entities (villages, subbasins) are pivoted into one
+# (entities x timesteps) matrix padded with NaN. The matrix is sorted along
+# the time axis once; exceedance quantiles for any percentile set and
+# optional downsampled curves are then read for every entity at once with
+# np.take_along_axis. Exceedance probability of rank i out of N is
+# i / (N + 1) * 100 and values in between are interpolated linearly, clamped
+# at the ends, exactly like np.interp over the sorted flows.
+
+import numpy as np
+
+DEFAULT_PERCENTILES = [10, 25, 50, 75, 90]
+MAX_CURVE_POINTS = 1000
+
+
+def pivot(values, *group_columns):
+    """
+    Group 1-D values by the group columns into a NaN-padded matrix.
+    Returns (first row index of each group in the input, (groups x max size) matrix).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+
+    order = np.lexsort(tuple(np.asarray(c) for c in reversed(group_columns)))
+    change = np.zeros(values.size, dtype=bool)
+    change[0] = True
+    for column in group_columns:
+        column = np.asarray(column)[order]
+        change[1:] |= column[1:] != column[:-1]
+
+    group = np.cumsum(change) - 1
+    starts = np.flatnonzero(change)
+    position = np.arange(values.size) - starts[group]
+
+    matrix = np.full((starts.size, position.max() + 1), np.nan)
+    matrix[group, position] = values[order]
+    return order[starts], matrix
+
+
+def sort_descending(matrix):
+    """(rows sorted high to low with NaN padding last, valid count per row)"""
+    valid = np.isfinite(matrix)
+    counts = valid.sum(axis=1)
+    ordered = -np.sort(np.where(valid, -matrix, np.inf), axis=1)
+    ordered[np.arange(ordered.shape[1]) >= counts[:, None]] = np.nan
+    return ordered, counts
+
+
+def quantiles_from_sorted(ordered, counts, percentiles):
+    """(rows x len(percentiles)) flow exceeded p % of the time, NaN for empty rows"""
+    p = np.asarray(percentiles, dtype=np.float64)[None, :]
+    n = counts.astype(np.float64)[:, None]
+    top = np.maximum(n, 1)
+    position = np.clip(p * (n + 1) / 100.0, 1, top)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.minimum(lo + 1, top.astype(np.int64))
+    frac = position - lo
+    low_value = np.take_along_axis(ordered, lo - 1, axis=1)
+    high_value = np.take_along_axis(ordered, hi - 1, axis=1)
+    result = low_value + frac * (high_value - low_value)
+    result[counts == 0] = np.nan
+    return result
+
+
+def flow_duration(matrix, percentiles=DEFAULT_PERCENTILES, curve_points=None):
+    """
+    FDC of every row: {"ordered", "counts", "quantiles" (rows x K)} plus
+    "curve_prob"/"curve_flows" (rows x curve_points) when curve_points is set.
+    """
+    if not matrix.shape[1]:
+        matrix = np.full((matrix.shape[0], 1), np.nan)
+    ordered, counts = sort_descending(matrix)
+    result = {
+        "ordered": ordered,
+        "counts": counts,
+        "quantiles": quantiles_from_sorted(ordered, counts, percentiles),
+    }
+    if curve_points:
+        grid = np.linspace(0.0, 100.0, int(curve_points))
+        result["curve_prob"] = grid
+        result["curve_flows"] = quantiles_from_sorted(ordered, counts, grid)
+    return result
+
+
+def exceedance_probabilities(n):
+    return np.arange(1, n + 1) / (n + 1.0) * 100.0
+
+
+def parse_percentiles(raw):
+    """Request percentiles -> sorted unique ints in 1..99. Raises ValueError."""
+    if raw is None:
+        return list(DEFAULT_PERCENTILES)
+    if isinstance(raw, str):
+        raw = [p for p in raw.split(",") if p.strip()]
+    percentiles = sorted({int(float(p)) for p in raw})
+    if not percentiles or percentiles[0] < 1 or percentiles[-1] > 99:
+        raise ValueError("percentiles must be between 1 and 99")
+    return percentiles
+
+
+def parse_curve_points(raw):
+    """Request curve_points -> None or an int in 2..MAX_CURVE_POINTS. Raises ValueError."""
+    if raw in (None, "", 0, "0"):
+        return None
+    points = int(raw)
+    if points < 2 or points > MAX_CURVE_POINTS:
+        raise ValueError(f"curve_points must be between 2 and {MAX_CURVE_POINTS}")
+    return points
+
+
+def entity_fdc(fdc, row, percentiles, include_full_curve=True):
+    """Response block for one row in the compute_fdc_and_quantiles format"""
+    n = int(fdc["counts"][row])
+    block = {
+        "n": n,
+        "quantiles": {f"Q{p}": float(q) for p, q in zip(percentiles, fdc["quantiles"][row])},
+    }
+    if include_full_curve:
+        block["exceed_prob"] = exceedance_probabilities(n).tolist()
+        block["sorted_flows"] = fdc["ordered"][row, :n].tolist()
+    if "curve_flows" in fdc:
+        block["curve"] = {
+            "exceed_prob": fdc["curve_prob"].tolist(),
+            "flows": fdc["curve_flows"][row].tolist(),
+        }
+    return block
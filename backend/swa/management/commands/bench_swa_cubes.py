@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db.models import Avg
+
+from swa import cubes
+from swa.climate_engine import SCENARIOS, load_drain, summarize
+from swa.fdc_engine import flow_duration, pivot
+from swa.models import AdminFlow, SubbasinFlow
+
+
+class Command(BaseCommand):
+    help = "Benchmark raw-table scans against the precomputed aggregate cubes (build them first)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subs", type=int, default=50, help="Subbasins to query")
+        parser.add_argument("--villages", type=int, default=500, help="Villages to query")
+        parser.add_argument("--start-year", type=int, default=2021)
+        parser.add_argument("--end-year", type=int, default=2050)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def timed(self, fn):
+        best, result = None, None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def report(self, name, raw_s, cube_s, max_diff):
+        self.stdout.write(
+            f"{name:<22} raw {raw_s * 1000:9.2f} ms   cube {cube_s * 1000:8.2f} ms "
+            f"({raw_s / max(cube_s, 1e-9):6.1f}x)   max |difference| {max_diff:.3e}"
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = max(1, options["repeat"])
+        start_year, end_year = options["start_year"], options["end_year"]
+        for dataset in (cubes.SUBBASIN_FLOW, cubes.ADMINFLOW, cubes.CLIMATE_DRAIN):
+            if not cubes.cube_available(dataset):
+                self.stderr.write(self.style.ERROR(f"{dataset} cube is not built; run build_swa_cubes"))
+                return
+
+        subs = list(SubbasinFlow.objects.values_list("sub", flat=True).distinct().order_by("sub")[:options["subs"]])
+        vlcodes = list(
+            AdminFlow.objects.values_list("vlcode", flat=True).distinct().order_by("vlcode")[:options["villages"]]
+        )
+
+        # Monthly means per subbasin
+        def raw_monthly():
+            return {
+                (r["sub"], r["month"]): r["flow"]
+                for r in SubbasinFlow.objects.filter(sub__in=subs).values("sub", "month")
+                .annotate(flow=Avg("flow_out_cms")).order_by()
+            }
+
+        def cube_monthly():
+            return {(e, m): v for e, m, v in cubes.monthly_rows(cubes.SUBBASIN_FLOW, subs)}
+
+        raw_s, raw = self.timed(raw_monthly)
+        cube_s, cube = self.timed(cube_monthly)
+        diff = max((abs(raw[k] - cube.get(k, np.nan)) for k in raw), default=0.0)
+        self.report("subbasin monthly mean", raw_s, cube_s, diff)
+
+        # FDC percentiles per village
+        percentiles = [10, 25, 50, 75, 90]
+
+        def raw_fdc():
+            rows = list(AdminFlow.objects.filter(vlcode__in=vlcodes).values_list("vlcode", "surq_cnt_m3"))
+            if not rows:
+                return {}
+            codes, flows = zip(*rows)
+            codes = np.array(codes, dtype=np.int64)
+            first_rows, matrix = pivot(np.array(flows, dtype=np.float64), codes)
+            quantiles = flow_duration(matrix, percentiles)["quantiles"]
+            return {int(codes[first]): quantiles[i] for i, first in enumerate(first_rows)}
+
+        def cube_fdc():
+            return cubes.fdc_percentiles(cubes.ADMINFLOW, vlcodes, percentiles)
+
+        raw_s, raw = self.timed(raw_fdc)
+        cube_s, cube = self.timed(cube_fdc)
+        diff = max(
+            (abs(q - (cube.get(code, {}).get(p) or np.nan))
+             for code, values in raw.items() for p, q in zip(percentiles, values)),
+            default=0.0,
+        )
+        self.report("village FDC quantiles", raw_s, cube_s, diff)
+
+        # Scenario totals per subbasin
+        def raw_totals():
+            columns = load_drain(subs, SCENARIOS, start_year, end_year)
+            return {(e["key"], e["scenario"]): e["totals"]["flow_out"]
+                    for e in summarize(columns, ["flow_in", "flow_out"])}
+
+        def cube_totals():
+            return {(e["key"], e["scenario"]): e["totals"]["flow_out"]
+                    for e in cubes.annual_series(cubes.CLIMATE_DRAIN, subs, SCENARIOS, start_year, end_year)}
+
+        raw_s, raw = self.timed(raw_totals)
+        cube_s, cube = self.timed(cube_totals)
+        diff = max((abs(v - cube.get(k, np.nan)) for k, v in raw.items()), default=0.0)
+        self.report("climate scenario totals", raw_s, cube_s, diff)
+
+        self.stdout.write(f"{len(subs)} subbasins, {len(vlcodes)} villages, years {start_year}-{end_year}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from swa.cubes import DATASETS, refresh_cubes
+
+
+class Command(BaseCommand):
+    help = "Build the precomputed surface-water aggregate cubes (run after loading data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", choices=sorted(DATASETS), help="Only build this dataset")
+        parser.add_argument(
+            "--entities", help="Comma-separated subs / vlcodes to rebuild incrementally (needs --dataset)"
+        )
+
+    def handle(self, *args, **options):
+        entities = None
+        if options["entities"]:
+            if not options["dataset"]:
+                self.stderr.write(self.style.ERROR("--entities needs --dataset"))
+                return
+            entities = [int(e) for e in options["entities"].split(",") if e.strip()]
+
+        datasets = [options["dataset"]] if options["dataset"] else list(DATASETS)
+        for dataset in datasets:
+            series = refresh_cubes(dataset, entities)
+            self.stdout.write(self.style.SUCCESS(f"{dataset}: {series} series"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from swa.climatology import SOURCES, refresh_climatology
+
+
+class Command(BaseCommand):
+    help = "Rebuild the village x month runoff climatology from AdminFlow / ClimateAdmin (run after loading data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", choices=sorted(SOURCES), help="Only rebuild this dataset")
+
+    def handle(self, *args, **options):
+        datasets = [options["dataset"]] if options["dataset"] else list(SOURCES)
+        for dataset in datasets:
+            rows = refresh_climatology(dataset)
+            self.stdout.write(self.style.SUCCESS(f"{dataset}: {rows} village-months"))
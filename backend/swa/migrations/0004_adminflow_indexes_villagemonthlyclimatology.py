@@ -0,0 +1,63 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0003_adminflow_climateadmin"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="adminflow",
+            index=models.Index(fields=["vlcode"], name="adminflow_vlcode_30e434_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="adminflow",
+            index=models.Index(
+                fields=["subdistrict_code_id"], name="adminflow_subdist_f87e6c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="adminflow",
+            index=models.Index(fields=["year", "mon"], name="adminflow_year_ad36f4_idx"),
+        ),
+        migrations.CreateModel(
+            name="VillageMonthlyClimatology",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("source_id", models.IntegerField(default=0)),
+                ("vlcode", models.BigIntegerField()),
+                ("village", models.CharField(max_length=255)),
+                ("subdistrict_code_id", models.IntegerField(blank=True, null=True)),
+                ("mon", models.IntegerField()),
+                ("mean_m3", models.FloatField(null=True)),
+                ("valid_count", models.IntegerField()),
+                ("record_count", models.IntegerField()),
+            ],
+            options={
+                "db_table": "village_monthly_climatology",
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "source_id", "vlcode"],
+                        name="village_mon_dataset_5f6da3_idx",
+                    ),
+                    models.Index(
+                        fields=["dataset", "source_id", "subdistrict_code_id"],
+                        name="village_mon_dataset_131f62_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0004_adminflow_indexes_villagemonthlyclimatology"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="climatedrain",
+            index=models.Index(
+                fields=["sub", "rch", "year"], name="climate_dra_sub_8c5965_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="climateadmin",
+            index=models.Index(
+                fields=["source_id", "vlcode", "year"],
+                name="climate_adm_source__a91896_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="climateadmin",
+            index=models.Index(
+                fields=["source_id", "subdistrict_code_id", "year"],
+                name="climate_adm_source__c32cd6_idx",
+            ),
+        ),
+    ]
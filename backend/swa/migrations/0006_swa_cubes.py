@@ -0,0 +1,133 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0005_climate_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SwaCubeEntity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("scenario", models.IntegerField(default=0)),
+                ("entity", models.BigIntegerField()),
+                ("label", models.CharField(blank=True, default="", max_length=255)),
+                ("subdistrict_code_id", models.IntegerField(blank=True, null=True)),
+                ("rows", models.IntegerField()),
+            ],
+            options={
+                "db_table": "swa_cube_entity",
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "entity"], name="swa_cube_en_dataset_177877_idx"
+                    ),
+                    models.Index(
+                        fields=["dataset", "subdistrict_code_id"],
+                        name="swa_cube_en_dataset_5c69c0_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SwaMonthlyCube",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("scenario", models.IntegerField(default=0)),
+                ("entity", models.BigIntegerField()),
+                ("mon", models.IntegerField()),
+                ("mean_value", models.FloatField(null=True)),
+                ("count", models.IntegerField()),
+            ],
+            options={
+                "db_table": "swa_cube_monthly",
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "scenario", "entity"],
+                        name="swa_cube_mo_dataset_f2df6c_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SwaAnnualCube",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("scenario", models.IntegerField(default=0)),
+                ("entity", models.BigIntegerField()),
+                ("year", models.IntegerField()),
+                ("total", models.FloatField(null=True)),
+                ("total_in", models.FloatField(null=True)),
+                ("count", models.IntegerField()),
+                ("months", models.IntegerField()),
+            ],
+            options={
+                "db_table": "swa_cube_annual",
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "scenario", "entity", "year"],
+                        name="swa_cube_an_dataset_76a928_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SwaFdcCube",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("scenario", models.IntegerField(default=0)),
+                ("entity", models.BigIntegerField()),
+                ("percentile", models.IntegerField()),
+                ("value", models.FloatField(null=True)),
+            ],
+            options={
+                "db_table": "swa_cube_fdc",
+                "indexes": [
+                    models.Index(
+                        fields=["dataset", "scenario", "entity"],
+                        name="swa_cube_fd_dataset_7268e2_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
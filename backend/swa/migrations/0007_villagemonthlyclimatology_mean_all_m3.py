@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:05
+
+from django.db import migrations, models
+from django.db.models import Avg
+
+
+def fill_mean_all(apps, schema_editor):
+    """Fill mean_all_m3 on the existing climatology; drop the village monthly cube rows it replaces"""
+    Climatology = apps.get_model("swa", "VillageMonthlyClimatology")
+    sources = {
+        "adminflow": apps.get_model("swa", "AdminFlow"),
+        "climate_admin": apps.get_model("swa", "ClimateAdmin"),
+    }
+    for dataset, model in sources.items():
+        group = ["vlcode", "mon"] + (["source_id"] if dataset == "climate_admin" else [])
+        means = {
+            (row.get("source_id", 0), row["vlcode"], row["mon"]): row["mean_all"]
+            for row in model.objects.values(*group).annotate(mean_all=Avg("surq_cnt_m3")).order_by().iterator()
+        }
+        rows = list(Climatology.objects.filter(dataset=dataset).only("id", "source_id", "vlcode", "mon"))
+        for row in rows:
+            row.mean_all_m3 = means.get((row.source_id, row.vlcode, row.mon))
+        Climatology.objects.bulk_update(rows, ["mean_all_m3"], batch_size=5000)
+
+    apps.get_model("swa", "SwaMonthlyCube").objects.filter(dataset__in=list(sources)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0006_swa_cubes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="villagemonthlyclimatology",
+            name="mean_all_m3",
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(fill_mean_all, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0007_villagemonthlyclimatology_mean_all_m3"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SwaCubeDirty",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset", models.CharField(max_length=16)),
+                ("entity", models.BigIntegerField()),
+                ("marked_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "swa_cube_dirty",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dataset", "entity"), name="swa_cube_dirty_unique"
+                    )
+                ],
+            },
+        ),
+    ]
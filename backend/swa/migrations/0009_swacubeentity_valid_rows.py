@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("swa", "0008_swacubedirty"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="swacubeentity",
+            name="valid_rows",
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -37,6 +37,7 @@ class ClimateDrain(models.Model):
             models.Index(fields=["year", "mon"]),
             models.Index(fields=["yyyymm"]),
             models.Index(fields=["rch"]),
+            models.Index(fields=["sub", "rch", "year"]),
         ]
 
     def __str__(self):
@@ -56,6 +57,11 @@ class AdminFlow(models.Model):
         db_table = "adminflow"  
         verbose_name = "Admin Flow"
         verbose_name_plural = "Admin Flows"
+        indexes = [
+            models.Index(fields=["vlcode"]),
+            models.Index(fields=["subdistrict_code_id"]),
+            models.Index(fields=["year", "mon"]),
+        ]
 
     def __str__(self):
         return f"{self.village} ({self.vlcode}) - {self.year}-{self.mon}"
@@ -74,6 +80,117 @@ class ClimateAdmin(models.Model):
         db_table = "climate_admin"  
         verbose_name = "Climate Admin"
         verbose_name_plural = "Climate Admins"
+        indexes = [
+            models.Index(fields=["source_id", "vlcode", "year"]),
+            models.Index(fields=["source_id", "subdistrict_code_id", "year"]),
+        ]
 
     def __str__(self):
         return f"{self.village} ({self.vlcode}) - {self.year}-{self.mon}"
+
+
+class VillageMonthlyClimatology(models.Model):
+    """
+    Village x month mean runoff materialized from AdminFlow (dataset
+    "adminflow") and ClimateAdmin (dataset "climate_admin", per source_id).
+    Rebuilt by swa/climatology.py; never edited by hand.
+    """
+    dataset = models.CharField(max_length=16)
+    source_id = models.IntegerField(default=0)
+    vlcode = models.BigIntegerField()
+    village = models.CharField(max_length=255)
+    subdistrict_code_id = models.IntegerField(null=True, blank=True)
+    mon = models.IntegerField()
+    mean_m3 = models.FloatField(null=True)       # mean of the non-negative values (NULL as 0.0)
+    mean_all_m3 = models.FloatField(null=True)   # mean of every non-NULL value (e-flow)
+    valid_count = models.IntegerField()          # rows with surq_cnt_m3 >= 0 or NULL
+    record_count = models.IntegerField()         # all source rows
+
+    class Meta:
+        db_table = "village_monthly_climatology"
+        indexes = [
+            models.Index(fields=["dataset", "source_id", "vlcode"]),
+            models.Index(fields=["dataset", "source_id", "subdistrict_code_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.dataset}/{self.source_id} {self.village} ({self.vlcode}) - {self.mon}"
+
+
+# ---- Precomputed aggregate cubes (swa/cubes.py) ----
+
+class SwaCubeEntity(models.Model):
+    """One row per (dataset, scenario, entity) that has data in the cubes"""
+    dataset = models.CharField(max_length=16)
+    scenario = models.IntegerField(default=0)   # rch / source_id, 0 when the dataset has none
+    entity = models.BigIntegerField()           # sub or vlcode
+    label = models.CharField(max_length=255, blank=True, default="")
+    subdistrict_code_id = models.IntegerField(null=True, blank=True)
+    rows = models.IntegerField()
+    valid_rows = models.IntegerField(null=True)  # finite values, the FDC sample size; NULL until rebuilt
+
+    class Meta:
+        db_table = "swa_cube_entity"
+        indexes = [
+            models.Index(fields=["dataset", "entity"]),
+            models.Index(fields=["dataset", "subdistrict_code_id"]),
+        ]
+
+
+class SwaCubeDirty(models.Model):
+    """Entity saved or deleted since its cubes were built (signals.py)"""
+    dataset = models.CharField(max_length=16)
+    entity = models.BigIntegerField()
+    marked_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "swa_cube_dirty"
+        constraints = [
+            models.UniqueConstraint(fields=["dataset", "entity"], name="swa_cube_dirty_unique"),
+        ]
+
+
+class SwaMonthlyCube(models.Model):
+    dataset = models.CharField(max_length=16)
+    scenario = models.IntegerField(default=0)
+    entity = models.BigIntegerField()
+    mon = models.IntegerField()
+    mean_value = models.FloatField(null=True)
+    count = models.IntegerField()
+
+    class Meta:
+        db_table = "swa_cube_monthly"
+        indexes = [
+            models.Index(fields=["dataset", "scenario", "entity"]),
+        ]
+
+
+class SwaAnnualCube(models.Model):
+    dataset = models.CharField(max_length=16)
+    scenario = models.IntegerField(default=0)
+    entity = models.BigIntegerField()
+    year = models.IntegerField()
+    total = models.FloatField(null=True)
+    total_in = models.FloatField(null=True)     # inflow total, drain datasets only
+    count = models.IntegerField()               # rows
+    months = models.IntegerField()              # distinct months
+
+    class Meta:
+        db_table = "swa_cube_annual"
+        indexes = [
+            models.Index(fields=["dataset", "scenario", "entity", "year"]),
+        ]
+
+
+class SwaFdcCube(models.Model):
+    dataset = models.CharField(max_length=16)
+    scenario = models.IntegerField(default=0)
+    entity = models.BigIntegerField()
+    percentile = models.IntegerField()
+    value = models.FloatField(null=True)
+
+    class Meta:
+        db_table = "swa_cube_fdc"
+        indexes = [
+            models.Index(fields=["dataset", "scenario", "entity"]),
+        ]
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import cubes
+from .climatology import ADMINFLOW, CLIMATE_ADMIN, mark_climatology_stale
+from .cubes import mark_cube_dirty
+from .models import AdminFlow, ClimateAdmin, ClimateDrain, SubbasinFlow
+
+
+# The village x month climatology is materialized from these tables
+@receiver(post_save, sender=AdminFlow)
+@receiver(post_delete, sender=AdminFlow)
+def invalidate_adminflow_climatology(sender, **kwargs):
+    mark_climatology_stale(ADMINFLOW)
+
+
+@receiver(post_save, sender=ClimateAdmin)
+@receiver(post_delete, sender=ClimateAdmin)
+def invalidate_climate_admin_climatology(sender, **kwargs):
+    mark_climatology_stale(CLIMATE_ADMIN)
+
+
+# Cube rows are per entity, so only the touched sub / village is rebuilt
+@receiver(post_save, sender=SubbasinFlow)
+@receiver(post_delete, sender=SubbasinFlow)
+def invalidate_subbasin_flow_cube(sender, instance, **kwargs):
+    mark_cube_dirty(cubes.SUBBASIN_FLOW, instance.sub)
+
+
+@receiver(post_save, sender=ClimateDrain)
+@receiver(post_delete, sender=ClimateDrain)
+def invalidate_climate_drain_cube(sender, instance, **kwargs):
+    mark_cube_dirty(cubes.CLIMATE_DRAIN, instance.sub)
+
+
+@receiver(post_save, sender=AdminFlow)
+@receiver(post_delete, sender=AdminFlow)
+def invalidate_adminflow_cube(sender, instance, **kwargs):
+    mark_cube_dirty(cubes.ADMINFLOW, instance.vlcode)
+
+
+@receiver(post_save, sender=ClimateAdmin)
+@receiver(post_delete, sender=ClimateAdmin)
+def invalidate_climate_admin_cube(sender, instance, **kwargs):
+    mark_cube_dirty(cubes.CLIMATE_ADMIN, instance.vlcode)
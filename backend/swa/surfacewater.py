@@ -8,12 +8,7 @@ from rest_framework.permissions import AllowAny
 from .models import SubbasinFlow
 from collections import defaultdict
 
-# NEW: imports for image generation
-import io
-import base64
-import matplotlib
-matplotlib.use("Agg")  # headless, PNG-capable backend for servers
-import matplotlib.pyplot as plt
+from .charts import chart_base64, chart_url, register_chart
 
 
 class SurplusRunoffAPI(APIView):
@@ -41,40 +36,13 @@ class SurplusRunoffAPI(APIView):
         exceed_prob = ranks / (N + 1) * 100
         return float(np.interp(percentile, exceed_prob, flows_sorted))
 
-    # NEW: server-side PNG renderer for a subbasin's averaged timeseries
-    def render_timeseries_png(self, timeseries, q25, sub_id, width=1000, height=420, dpi=140):
-        """
-        timeseries: list of dicts with keys 'day' and 'flow'
-        q25: float or None
-        """
-        days = [int(p['day']) for p in timeseries]
-        flows = [float(p['flow']) for p in timeseries]
-
-        fig, ax = plt.subplots(figsize=(width / dpi, height / dpi), dpi=dpi)
-        ax.plot(days, flows, color="#2563eb", linewidth=2, label=f"Subbasin {sub_id} Avg Flow")
-        ax.set_xlabel("Day of Year")
-        ax.set_ylabel("Flow (cms)")
-        ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.6)
-
-        if q25 is not None:
-            ax.axhline(y=q25, color="#dc2626", linestyle="--", linewidth=2, label="Q25 Threshold")
-
-        ax.set_title("Surface Water Surplus Analysis")
-        ax.legend(loc="best")
-        fig.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, facecolor="white")
-        plt.close(fig)
-        buf.seek(0)
-        return base64.b64encode(buf.read()).decode("utf-8")
-
     def post(self, request):
         try:
             subbasins = request.data.get("subbasins")  # expect a list like [1,2,3]
 
             if not subbasins:
                 return JsonResponse({"error": "subbasins parameter is required"}, status=400)
+            include_base64 = str(request.data.get("include_image_base64", True)).lower() not in ("0", "false", "no")
 
             # Normalize input to a list of integers
             if isinstance(subbasins, str):  # e.g. "1,2,3"
@@ -137,8 +105,14 @@ class SurplusRunoffAPI(APIView):
 
                 surplus_volume_Mm3 = total_surplus_volume_m3 / 1e6
 
-                # NEW: render PNG and attach to response
-                image_b64 = self.render_timeseries_png(averaged_data, Q25, sub_id=sub)
+                # Chart is rendered on first fetch of image_url (charts.py)
+                chart = register_chart(
+                    "surplus",
+                    [entry['day'] for entry in averaged_data],
+                    all_avg_flows,
+                    Q25,
+                    sub_id=sub,
+                )
 
                 results[sub] = {
                     "subbasin": sub,
@@ -157,8 +131,10 @@ class SurplusRunoffAPI(APIView):
                         {"day": entry['day'], "flow": round(entry['flow'], 3)}
                         for entry in averaged_data
                     ],
-                    "image_base64": image_b64,  # NEW
+                    "image_url": chart_url(request, chart),
                 }
+                if include_base64:
+                    results[sub]["image_base64"] = chart_base64(chart)
 
             return JsonResponse(results, safe=False)
 
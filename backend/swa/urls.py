@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import Subbasin, SubbasinStudyAreaMap
-from .views import FlowDurationCurveAPI
+from .views import FlowDurationCurveAPI, ChartImageView
 from .surfacewater import SurplusRunoffAPI
 from .eflow import EflowAPI
 from .climate import ClimateChangeView, ClimateScenarioComparisonView
@@ -12,6 +12,7 @@ urlpatterns = [
      path("fdc", FlowDurationCurveAPI.as_view(), name="fdc-api"),
      path("surfacewater", SurplusRunoffAPI.as_view(), name="surfacewater-api"),
      path("eflow", EflowAPI.as_view(), name="eflow-api"),
+     path("charts/<str:key>", ChartImageView.as_view(), name="swa-chart"),
      path('climate', ClimateChangeView.as_view(), name='climate-change'),
      path('climate/comparison', ClimateScenarioComparisonView.as_view(), name='climate-comparison'),
      path("adminfdc", VillageFlowDurationCurveAPI.as_view(), name="fdc-api"),
@@ -20,9 +20,15 @@ import os
 import geopandas as gpd
 import matplotlib.pyplot as plt
 from django.conf import settings
-from django.http import FileResponse
+from django.http import FileResponse, Http404, HttpResponseNotModified
 from matplotlib.patches import FancyArrowPatch, Rectangle
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from . import cubes
+from .charts import CHART_KEY_RE, chart_etag, chart_image_path
+from .fdc_engine import (
+    DEFAULT_PERCENTILES, entity_fdc, flow_duration, parse_curve_points, parse_percentiles, pivot,
+    quantiles_from_sorted,
+)
 
 
 # ------------------------------------
@@ -35,6 +41,33 @@ class Subbasin(APIView):
             return Response({"message": "No subbasins found"}, status=status.HTTP_404_NOT_FOUND)
         return Response(list(subs), status=status.HTTP_200_OK)
     
+#------------------------------------------
+
+class ChartImageView(APIView):
+    """
+    Serves e-flow/surplus charts, rendering them on first fetch (charts.py).
+    ?width=&height= pick the size; keys are content hashes, so responses
+    are immutable with an ETag for conditional requests.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, key):
+        if not CHART_KEY_RE.match(key):
+            raise Http404("Chart not found")
+
+        width, height = request.query_params.get("width"), request.query_params.get("height")
+        etag = chart_etag(key, width, height)
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponseNotModified()
+        else:
+            path = chart_image_path(key, width, height)
+            if path is None:
+                raise Http404("Chart not found")
+            response = FileResponse(open(path, "rb"), content_type="image/png")
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
 #------------------------------------------    
     
 class SubbasinStudyAreaMap(APIView):
@@ -156,28 +189,12 @@ class SubbasinStudyAreaMap(APIView):
 #-------------------------------------------------------   
 
 #Drain mode FDC Curve API
-def compute_fdc_and_quantiles(flows, targets=[10, 25, 50, 75, 90]):
+def compute_fdc_and_quantiles(flows, targets=DEFAULT_PERCENTILES):
     flows = np.array([f for f in flows if f is not None], dtype=float)
     if flows.size == 0:
         return None
-
-    # Sort descending
-    sorted_flows = np.sort(flows)[::-1]
-    N = sorted_flows.size
-    ranks = np.arange(1, N + 1)
-    exceed_prob = ranks / (N + 1.0) * 100.0
-
-    quantiles = {}
-    for t in targets:
-        q = float(np.interp(t, exceed_prob, sorted_flows))
-        quantiles[f"Q{t}"] = q
-
-    return {
-        "n": int(N),
-        "exceed_prob": exceed_prob.tolist(),
-        "sorted_flows": sorted_flows.tolist(),
-        "quantiles": quantiles,
-    }
+    fdc = flow_duration(flows[None, :], targets)
+    return entity_fdc(fdc, 0, targets)
 
 
 def render_fdc_png(exceed_prob, sorted_flows, sub_id, q25=None, width=800, height=450, dpi=160):
@@ -207,6 +224,13 @@ def render_fdc_png(exceed_prob, sorted_flows, sub_id, q25=None, width=800, heigh
     return b64
 
 
+def render_fdc_grid(values, sub_id):
+    """PNG through the cubes.FDC_PERCENTILES grid, drawn the same for cube and raw subbasins"""
+    curve = [(p, float(v)) for p, v in zip(cubes.FDC_PERCENTILES, values) if v is not None and np.isfinite(v)]
+    q25 = dict(curve).get(25)
+    return render_fdc_png([p for p, _ in curve], [v for _, v in curve], sub_id=sub_id, q25=q25)
+
+
 class FlowDurationCurveAPI(APIView):
     permission_classes = [AllowAny]
 
@@ -215,30 +239,70 @@ class FlowDurationCurveAPI(APIView):
         if not subs or not isinstance(subs, list):
             return Response({"error": "subs (list of subbasin IDs) is required"}, status=400)
 
+        try:
+            percentiles = parse_percentiles(request.data.get("percentiles"))
+            curve_points = parse_curve_points(request.data.get("curve_points"))
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=400)
+        include_full_curve = str(request.data.get("include_full_curve", True)).lower() not in ("0", "false", "no")
+
         results = {}
         errors = {}
 
-        for sub in subs:
-            flows = list(
-                SubbasinFlow.objects.filter(sub=sub)
-                .values_list("flow_out_cms", flat=True)
-            )
+        # Quantile-only requests: percentiles from the FDC cube for the subbasins
+        # it covers; the rest take the raw path. Both draw the image through
+        # Q5..Q95 so a subbasin looks the same whichever path answered it
+        raw_subs = subs
+        if (
+            not include_full_curve
+            and curve_points is None
+            and set(percentiles) <= set(cubes.FDC_PERCENTILES)
+        ):
+            sub_ids, _ = cubes.split_covered(cubes.SUBBASIN_FLOW, subs)
+            covered = set(sub_ids)
+            raw_subs = [sub for sub in subs if int(sub) not in covered]
+            info = cubes.entity_info(cubes.SUBBASIN_FLOW, sub_ids)
+            points = cubes.fdc_percentiles(cubes.SUBBASIN_FLOW, sub_ids, cubes.FDC_PERCENTILES)
+            for sub in subs:
+                if int(sub) not in covered:
+                    continue
+                values = points.get(int(sub))
+                if int(sub) not in info or not values or not info[int(sub)][2]:
+                    errors[str(sub)] = "No data found for this subbasin"
+                    continue
+                png_b64 = render_fdc_grid([values.get(p) for p in cubes.FDC_PERCENTILES], sub)
+                results[str(sub)] = {
+                    "n": info[int(sub)][2],
+                    "quantiles": {f"Q{p}": values.get(p) for p in percentiles},
+                    "image_base64": png_b64,
+                }
 
-            computed = compute_fdc_and_quantiles(flows)
-            if not computed:
+        # One query for every other subbasin, then one (subbasins x timesteps) FDC pass
+        rows = np.array(
+            list(SubbasinFlow.objects.filter(sub__in=raw_subs).values_list("sub", "flow_out_cms")),
+            dtype=np.float64,
+        ).reshape(-1, 2) if raw_subs else np.empty((0, 2))
+        entity_of = {}
+        if len(rows):
+            first_rows, matrix = pivot(rows[:, 1], rows[:, 0].astype(np.int64))
+            fdc = flow_duration(matrix, percentiles, curve_points)
+            grid = quantiles_from_sorted(fdc["ordered"], fdc["counts"], cubes.FDC_PERCENTILES)
+            entity_of = {int(rows[first, 0]): i for i, first in enumerate(first_rows)}
+
+        for sub in raw_subs:
+            i = entity_of.get(int(sub))
+            if i is None or not fdc["counts"][i]:
                 errors[str(sub)] = "No data found for this subbasin"
             else:
-                # Generate PNG for each sub using computed arrays
-                exceed_prob = computed["exceed_prob"]
-                sorted_flows = computed["sorted_flows"]
-                q25 = computed["quantiles"].get("Q25")
-                png_b64 = render_fdc_png(exceed_prob, sorted_flows, sub_id=sub, q25=q25)
+                computed = entity_fdc(fdc, i, percentiles, include_full_curve)
+                png_b64 = render_fdc_grid(grid[i], sub)
 
                 results[str(sub)] = {
                     **computed,
                     "image_base64": png_b64,  # New: base64-encoded PNG image
                 }
 
+        results = {str(sub): results[str(sub)] for sub in subs if str(sub) in results}
         return Response({
             "subs": subs,
             "results": results,
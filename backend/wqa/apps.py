@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WqaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wqa"
+
+    def ready(self):
+        import wqa.signals
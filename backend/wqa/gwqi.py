@@ -9,13 +9,11 @@ import rasterio
 from rasterio.transform import from_origin
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.features import shapes
-from rasterio.mask import mask
 from datetime import datetime
 import os
 import shutil
 import requests
 import geopandas as gpd
-from shapely.ops import unary_union
 from shapely.geometry import Point, shape as shapely_shape
 from scipy.interpolate import Rbf, griddata
 from scipy.spatial.distance import cdist
@@ -29,12 +27,12 @@ import time
 import re
 import glob
 import traceback
-import concurrent.futures
 from threading import Lock
 import gc
 from functools import lru_cache
-import uuid
 from .session_manager import session_manager
+from .zonal import rasterize_labels, zonal_class_stats, GWQI_CLASS_NAMES
+from .gwqi_stack import load_parameter_stack, compute_gwqi_stack, write_gwqi_cog
 
 # Constants
 RASTERS_DIR = Path("media/gwa_iprasters")
@@ -49,9 +47,8 @@ WORKSPACE = "myworkspace"
 VILLAGES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
                             'media', 'gwa_data', 'gwa_shp', 'Final_Village', 'Village.shp')
 
-# Global locks for thread safety
+# Global lock for GeoServer publishing
 geoserver_lock = Lock()
-file_write_lock = Lock()
 
 class GWQIOverlayView(APIView):
     permission_classes = [AllowAny]
@@ -432,38 +429,31 @@ class GWQIOverlayView(APIView):
                         print(f"  - {failed['parameter']}: {failed['reason']}")
                 
                 # Now load the interpolated rasters
-                raster_data, raster_metadata = self.load_csv_interpolated_rasters(
+                parameters, parameter_stack, reference_metadata = self.load_csv_interpolated_rasters(
                     selected_parameters, selected_year, village_ids, place, session_id
                 )
             else:
                 print(f"[GWQI] Using pre-existing rasters")
-                raster_data, raster_metadata = self.load_and_clip_interpolated_rasters_optimized(
+                parameters, parameter_stack, reference_metadata = self.load_and_clip_interpolated_rasters_optimized(
                     selected_parameters, selected_year, village_ids, place
                 )
 
-            if not raster_data:
+            if parameter_stack is None:
                 return {'error': 'Failed to load interpolated rasters'}
 
+            print(f"[STACK] Parameter stack {parameter_stack.shape} ({parameter_stack.nbytes / 1e6:.1f} MB)")
+            raster_data = dict(zip(parameters, parameter_stack))
+
             print(f"STEP 1B/3: Publishing rasters and creating preview images...")
             
             individual_published_layers = []
             preview_images_created = []
             
             color_schemes = self.get_parameter_color_schemes()
-            clipping_geometry = self.load_clipping_geometry_optimized(village_ids, place)
             
-            # Process individual parameters
-            for param in selected_parameters:
-                if param not in raster_data:
-                    continue
-                
+            # Process individual parameters (stack bands are already clipped to the selection)
+            for param, raster_array in raster_data.items():
                 try:
-                    raster_array = raster_data[param]
-                    metadata = raster_metadata[param]
-                    
-                    if clipping_geometry is not None:
-                        raster_array = self.apply_clipping_to_raster(raster_array, clipping_geometry, metadata)
-                    
                     # UNIQUE LAYER NAME with session
                     layer_name = f"{param}_{selected_year}_{session_id[:8]}"
                     color_scheme = color_schemes.get(param, color_schemes['ph_level'])
@@ -479,8 +469,8 @@ class GWQIOverlayView(APIView):
                         width=colored_grid.shape[1],
                         count=3,
                         dtype=rasterio.uint8,
-                        crs=metadata['crs'],
-                        transform=metadata['transform'],
+                        crs=reference_metadata['crs'],
+                        transform=reference_metadata['transform'],
                         nodata=0,
                         compress='lzw'
                     ) as dst:
@@ -511,7 +501,7 @@ class GWQIOverlayView(APIView):
             
             print(f"[PREVIEW] Created {len(preview_images_created)} preview images")
 
-            print("STEP 2/3: Running quality analysis...")
+            print("STEP 2/3: Running quality analysis and GWQI overlay with TRUE NORMALIZATION...")
             parameter_thresholds = {
                 'ph_level': 7.5, 'electrical_conductivity': 1500.0, 'carbonate': 100.0,
                 'bicarbonate': 500.0, 'chloride': 250.0, 'fluoride': 1.5, 'sulfate': 250.0,
@@ -519,68 +509,43 @@ class GWQIOverlayView(APIView):
                 'magnesium': 150.0, 'sodium': 200.0, 'potassium': 12.0, 'iron': 0.3
             }
             analysis_results = self.perform_quality_analysis_optimized(
-                raster_data, parameter_thresholds, selected_parameters
+                parameters, parameter_stack, parameter_thresholds
             )
 
             if not analysis_results:
                 return {'error': 'Failed to perform quality analysis'}
 
-            print("STEP 2B: Saving analysis rasters...")
-            analyzed_layers = self.save_analysis_rasters_parallel(
-                analysis_results, selected_parameters, selected_year, raster_metadata
-            )
-
             parameter_statistics = self.calculate_detailed_parameter_statistics_optimized(
                 raster_data, analysis_results, parameter_thresholds
             )
 
-            print("STEP 3/3: Creating GWQI overlay with TRUE NORMALIZATION...")
-            gwqi_raster = self.calculate_gwqi_overlay(
-                analysis_results['rank_maps'],
-                analysis_results['weights']
-            )
-
-            if gwqi_raster is None:
-                return {'error': 'Failed to calculate GWQI overlay'}
+            gwqi_raster = analysis_results['gwqi']
 
-            reference_metadata = next(iter(raster_metadata.values()))
             # UNIQUE COMPOSITE LAYER NAME
             composite_layer_name = f"gwqi_composite_{selected_year}_{session_id[:8]}"
-            
-            if clipping_geometry is not None:
-                gwqi_raster = self.apply_clipping_to_raster(gwqi_raster, clipping_geometry, reference_metadata)
 
             # DEBUG: Verify normalization
             valid_gwqi = gwqi_raster[~np.isnan(gwqi_raster) & np.isfinite(gwqi_raster)]
+            if valid_gwqi.size == 0:
+                return {'error': 'Failed to calculate GWQI overlay'}
             print(f"[DEBUG] Normalized GWQI stats: min={np.min(valid_gwqi):.4f}, max={np.max(valid_gwqi):.4f}, mean={np.mean(valid_gwqi):.4f}")
 
-            # CRITICAL: Save normalized GWQI raster FIRST (for village analysis)
+            # CRITICAL: Save normalized GWQI (band 1) with per-parameter CI/rank bands as one COG
+            print("STEP 3/3: Saving GWQI analysis COG...")
             normalized_gwqi_path = year_dir / f"{composite_layer_name}_normalized.tif"
             
             print(f"[DEBUG] Saving normalized GWQI to: {normalized_gwqi_path}")
             
-            with rasterio.open(
+            analyzed_layers = write_gwqi_cog(
                 normalized_gwqi_path,
-                'w',
-                driver='GTiff',
-                height=gwqi_raster.shape[0],
-                width=gwqi_raster.shape[1],
-                count=1,
-                dtype=rasterio.float32,
-                crs=reference_metadata['crs'],
-                transform=reference_metadata['transform'],
-                nodata=np.nan,
-                compress='lzw'
-            ) as dst:
-                dst.write(gwqi_raster.astype(np.float32), 1)
-            
-            print(f"[SAVE] Normalized GWQI raster saved to: {normalized_gwqi_path}")
+                parameters,
+                gwqi_raster,
+                analysis_results['ci_stack'],
+                analysis_results['rank_stack'],
+                reference_metadata
+            )
             
-            # Verify the saved raster
-            with rasterio.open(normalized_gwqi_path) as verify:
-                verify_data = verify.read(1)
-                valid_verify = verify_data[~np.isnan(verify_data) & np.isfinite(verify_data)]
-                print(f"[VERIFY] Saved raster range: {np.min(valid_verify):.4f} to {np.max(valid_verify):.4f}")
+            print(f"[SAVE] GWQI analysis COG saved to: {normalized_gwqi_path} ({len(analyzed_layers)} bands)")
 
             # Create colored version for visualization
             colored_grid, breaks, colors, labels = self.create_gwqi_colored_raster(gwqi_raster)
@@ -668,6 +633,7 @@ class GWQIOverlayView(APIView):
                 'storage_info': {
                     'permanent_storage_path': str(year_dir),
                     'normalized_raster_path': str(normalized_gwqi_path),
+                    'analysis_raster_bands': analyzed_layers,
                     'temp_directory_cleaned': False,
                     'csv_rasters_used': use_csv_interpolation
                 },
@@ -701,7 +667,7 @@ class GWQIOverlayView(APIView):
 
             print(f"GWQI GENERATION COMPLETED in {total_time:.2f}s (with UUID session)")
 
-            del raster_data, analysis_results
+            del raster_data, parameter_stack, analysis_results
             gc.collect()
 
             return response_data
@@ -718,125 +684,61 @@ class GWQIOverlayView(APIView):
             return {'error': f'GWQI generation failed: {str(e)}'}
 
     def calculate_village_analysis(self, gwqi_raster, metadata, village_ids, place):
-        """OPTIMIZED: Calculate village-wise GWQI analysis using session temp"""
+        """OPTIMIZED: Calculate village-wise GWQI analysis with a single label-raster pass"""
         try:
             print("[VILLAGE ANALYSIS] Starting OPTIMIZED village-wise analysis...")
             start_time = time.time()
             
-            villages_vector = self.load_village_shapefile()
-            if villages_vector is None:
-                print("[VILLAGE ANALYSIS] Could not load village shapefile")
-                return []
-
-            # Filter villages
-            if place == "village":
-                village_ids_float = [float(x) for x in village_ids]
-                selected_villages = villages_vector[villages_vector['village_co'].isin(village_ids_float)]
-            else:
-                village_ids_int = [int(x) for x in village_ids]
-                selected_villages = villages_vector[villages_vector['SUBDIS_COD'].isin(village_ids_int)]
-
-            if selected_villages.empty:
+            selected_villages = self.select_villages(village_ids, place)
+            if selected_villages is None:
                 print("[VILLAGE ANALYSIS] No villages found")
                 return []
 
             print(f"[VILLAGE ANALYSIS] Processing {len(selected_villages)} villages...")
 
-            # OPTIMIZATION 1: Create raster ONCE in session temp directory
-            temp_raster_path = self.session_temp_dir / f"temp_gwqi_analysis_{uuid.uuid4().hex}.tif"
-            
-            with rasterio.open(
-                temp_raster_path,
-                'w',
-                driver='GTiff',
-                height=gwqi_raster.shape[0],
-                width=gwqi_raster.shape[1],
-                count=1,
-                dtype=rasterio.float32,
-                crs=metadata['crs'],
-                transform=metadata['transform'],
-                nodata=np.nan
-            ) as dst:
-                dst.write(gwqi_raster.astype(np.float32), 1)
-
-            # OPTIMIZATION 2: Reproject ALL geometries at once
+            # Reproject ALL geometries at once
             if selected_villages.crs != metadata['crs']:
                 selected_villages = selected_villages.to_crs(metadata['crs'])
 
+            # Burn every village into one label grid aligned to the GWQI raster
+            gwqi_raster = np.asarray(gwqi_raster, dtype=np.float32)
+            labels = rasterize_labels(
+                selected_villages.geometry, gwqi_raster.shape, metadata['transform'], all_touched=True
+            )
+
+            # Single bincount pass over (village, class)
+            counts, means, class_counts = zonal_class_stats(gwqi_raster, labels, len(selected_villages))
+
             village_analysis = []
             pixel_area_km2 = 0.0009
 
-            # OPTIMIZATION 3: Reuse the same raster source
-            with rasterio.open(temp_raster_path) as src:
-                for idx, village_row in selected_villages.iterrows():
-                    try:
-                        village_name = village_row.get('village', village_row.get('VILLAGE', 'Unknown'))
-                        village_geom = village_row.geometry
-
-                        # Mask raster to village boundary (NO reprojection needed now)
-                        out_image, out_transform = mask(
-                            dataset=src,
-                            shapes=[village_geom],
-                            crop=True,
-                            nodata=np.nan,
-                            all_touched=True
-                        )
-
-                        if len(out_image.shape) == 3:
-                            village_gwqi = out_image[0]
-                        else:
-                            village_gwqi = out_image
-
-                        # Calculate statistics
-                        valid_data = village_gwqi[~np.isnan(village_gwqi) & np.isfinite(village_gwqi)]
-
-                        if len(valid_data) == 0:
-                            continue
-
-                        # Count pixels in each category (0-1 scale)
-                        excellent_count = np.sum((valid_data >= 0.8) & (valid_data <= 1.0))
-                        good_count = np.sum((valid_data >= 0.6) & (valid_data < 0.8))
-                        fair_count = np.sum((valid_data >= 0.4) & (valid_data < 0.6))
-                        poor_count = np.sum((valid_data >= 0.2) & (valid_data < 0.4))
-                        very_poor_count = np.sum((valid_data >= 0.0) & (valid_data < 0.2))
-
-                        total_pixels = len(valid_data)
-
-                        village_analysis.append({
-                            'village_name': village_name,
-                            'village_code': str(village_row.get('village_co', village_row.get('SUBDIS_COD', 'Unknown'))),
-                            'total_area_km2': round(total_pixels * pixel_area_km2, 2),
-                            'average_gwqi': round(np.mean(valid_data), 4),
-                            'percentages': {
-                                'excellent': round((excellent_count / total_pixels) * 100, 2),
-                                'good': round((good_count / total_pixels) * 100, 2),
-                                'fair': round((fair_count / total_pixels) * 100, 2),
-                                'poor': round((poor_count / total_pixels) * 100, 2),
-                                'very_poor': round((very_poor_count / total_pixels) * 100, 2)
-                            },
-                            'area_km2': {
-                                'excellent': round(excellent_count * pixel_area_km2, 2),
-                                'good': round(good_count * pixel_area_km2, 2),
-                                'fair': round(fair_count * pixel_area_km2, 2),
-                                'poor': round(poor_count * pixel_area_km2, 2),
-                                'very_poor': round(very_poor_count * pixel_area_km2, 2)
-                            },
-                            'distribution': {
-                                'excellent': int(excellent_count),
-                                'good': int(good_count),
-                                'fair': int(fair_count),
-                                'poor': int(poor_count),
-                                'very_poor': int(very_poor_count)
-                            }
-                        })
-
-                    except Exception as e:
-                        print(f"[VILLAGE ANALYSIS] Error processing village {village_name}: {str(e)}")
-                        continue
+            for i, village_row in enumerate(selected_villages.itertuples(index=False)):
+                total_pixels = int(counts[i])
+                if total_pixels == 0:
+                    continue
 
-            # Clean up temp file
-            if temp_raster_path.exists():
-                os.remove(temp_raster_path)
+                village_name = getattr(village_row, 'village', getattr(village_row, 'VILLAGE', 'Unknown'))
+                village_code = getattr(village_row, 'village_co', getattr(village_row, 'SUBDIS_COD', 'Unknown'))
+                class_pixels = dict(zip(GWQI_CLASS_NAMES, (int(c) for c in class_counts[i])))
+
+                village_analysis.append({
+                    'village_name': village_name,
+                    'village_code': str(village_code),
+                    'total_area_km2': round(total_pixels * pixel_area_km2, 2),
+                    'average_gwqi': round(float(means[i]), 4),
+                    'percentages': {
+                        name: round((class_pixels[name] / total_pixels) * 100, 2)
+                        for name in reversed(GWQI_CLASS_NAMES)
+                    },
+                    'area_km2': {
+                        name: round(class_pixels[name] * pixel_area_km2, 2)
+                        for name in reversed(GWQI_CLASS_NAMES)
+                    },
+                    'distribution': {
+                        name: class_pixels[name]
+                        for name in reversed(GWQI_CLASS_NAMES)
+                    }
+                })
 
             elapsed_time = time.time() - start_time
             print(f"[VILLAGE ANALYSIS] Completed analysis for {len(village_analysis)} villages in {elapsed_time:.2f}s")
@@ -848,8 +750,31 @@ class GWQIOverlayView(APIView):
             traceback.print_exc()
             return []
 
+    def select_villages(self, village_ids, place):
+        """Filter the village shapefile to the requested villages/subdistricts"""
+        villages_vector = self.load_village_shapefile()
+        if villages_vector is None:
+            return None
+
+        try:
+            if place == "village":
+                village_ids_float = [float(x) for x in village_ids]
+                selected_area = villages_vector[villages_vector['village_co'].isin(village_ids_float)]
+            else:
+                village_ids_int = [int(x) for x in village_ids]
+                selected_area = villages_vector[villages_vector['SUBDIS_COD'].isin(village_ids_int)]
+        except Exception as e:
+            print(f"[ERROR] Failed to filter village shapefile: {str(e)}")
+            return None
+
+        if selected_area.empty:
+            print("[ERROR] No matching villages found for clipping")
+            return None
+
+        return selected_area
+
     def load_csv_interpolated_rasters(self, selected_parameters, selected_year, village_ids, place, session_id):
-        """Load rasters created from CSV interpolation"""
+        """Load rasters created from CSV interpolation into one parameter stack"""
         print(f"[CSV RASTERS] Loading from session {session_id}, year {selected_year}")
         
         try:
@@ -866,245 +791,62 @@ class GWQIOverlayView(APIView):
         if not csv_rasters_dir.exists():
             raise FileNotFoundError(f"CSV interpolation directory not found: {csv_rasters_dir}")
         
-        # Load village shapefile
-        villages_vector = self.load_village_shapefile()
-        if villages_vector is None:
-            return {}, {}
+        selected_area = self.select_villages(village_ids, place)
+        if selected_area is None:
+            return [], None, None
         
-        # Filter to selected area
-        try:
-            if place == "village":
-                village_ids_float = [float(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['village_co'].isin(village_ids_float)]
-            else:
-                village_ids_int = [int(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['SUBDIS_COD'].isin(village_ids_int)]
-        except Exception as e:
-            print(f"[ERROR] Failed to filter village shapefile: {str(e)}")
-            return {}, {}
-        
-        if selected_area.empty:
-            print("[ERROR] No matching villages found for clipping")
-            return {}, {}
-        
-        raster_data = {}
-        raster_metadata = {}
-        
-        for parameter in selected_parameters:
-            try:
-                raster_path = csv_rasters_dir / f"{parameter}_{selected_year}.tif"
-                
-                if not raster_path.exists():
-                    print(f"[WARNING] CSV raster not found: {raster_path}")
-                    continue
-                
-                print(f"[CSV RASTERS] Loading: {raster_path}")
-                
-                with rasterio.open(raster_path) as src:
-                    # Ensure geometries are in the same CRS as raster
-                    if selected_area.crs != src.crs:
-                        selected_area_reproj = selected_area.to_crs(src.crs)
-                    else:
-                        selected_area_reproj = selected_area
-                    
-                    # Clip to selected area
-                    out_image, out_transform = mask(
-                        dataset=src,
-                        shapes=selected_area_reproj.geometry,
-                        crop=True,
-                        nodata=np.nan,
-                        all_touched=True
-                    )
-                    
-                    if len(out_image.shape) == 3:
-                        raster_array = out_image[0]
-                    else:
-                        raster_array = out_image
-                    
-                    metadata = {
-                        'transform': out_transform,
-                        'crs': src.crs,
-                        'shape': raster_array.shape,
-                        'dtype': rasterio.float32,
-                        'nodata': src.nodata,
-                        'data_year': selected_year,
-                        'source_file': str(raster_path),
-                        'source_type': 'CSV_INTERPOLATION'
-                    }
-                    
-                    raster_data[parameter] = raster_array.astype(np.float32)
-                    raster_metadata[parameter] = metadata
-                    
-            except Exception as e:
-                print(f"[ERROR] Failed to load CSV raster for {parameter}: {str(e)}")
-                traceback.print_exc()
-                continue
+        raster_paths = {
+            parameter: csv_rasters_dir / f"{parameter}_{selected_year}.tif"
+            for parameter in selected_parameters
+        }
+        parameters, stack, metadata = load_parameter_stack(raster_paths, selected_area)
+        if metadata is not None:
+            metadata.update({'data_year': selected_year, 'source_type': 'CSV_INTERPOLATION'})
         
-        print(f"[CSV RASTERS] Loaded {len(raster_data)}/{len(selected_parameters)} rasters")
-        return raster_data, raster_metadata
+        print(f"[CSV RASTERS] Loaded {len(parameters)}/{len(selected_parameters)} rasters")
+        return parameters, stack, metadata
 
     def load_and_clip_interpolated_rasters_optimized(self, selected_parameters, selected_year, village_ids, place):
-        """Load rasters with parallel processing"""
+        """Load pre-existing rasters into one clipped (params x rows x cols) stack"""
         print(f"[OPTIMIZED] Loading {len(selected_parameters)} rasters for year {selected_year}")
         start_time = time.time()
         
-        villages_vector = self.load_village_shapefile()
-        if villages_vector is None:
-            return {}, {}
-
-        try:
-            if place == "village":
-                village_ids_float = [float(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['village_co'].isin(village_ids_float)]
-            else:
-                village_ids_int = [int(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['SUBDIS_COD'].isin(village_ids_int)]
-
-            if selected_area.empty:
-                print("[ERROR] No matching villages found for clipping")
-                return {}, {}
-
-        except Exception as e:
-            print(f"[ERROR] Failed to filter village shapefile: {str(e)}")
-            return {}, {}
-
-        def process_single_raster(parameter):
-            try:
-                raster_filename = f"{parameter}_{selected_year}.tif"
-                raster_path = RASTERS_DIR / raster_filename
-
-                if not raster_path.exists():
-                    print(f"[WARNING] Raster not found: {raster_path}")
-                    return None, None, None
-
-                with rasterio.open(raster_path) as src:
-                    if selected_area.crs != src.crs:
-                        selected_area_reproj = selected_area.to_crs(src.crs)
-                    else:
-                        selected_area_reproj = selected_area
+        selected_area = self.select_villages(village_ids, place)
+        if selected_area is None:
+            return [], None, None
 
-                    valid_geometries = []
-                    for geom in selected_area_reproj.geometry:
-                        if geom.is_valid:
-                            valid_geometries.append(geom)
-                        else:
-                            fixed_geom = geom.buffer(0)
-                            if fixed_geom.is_valid:
-                                valid_geometries.append(fixed_geom)
-
-                    if not valid_geometries:
-                        return None, None, None
-
-                    if len(valid_geometries) > 1:
-                        try:
-                            unified_geometry = unary_union(valid_geometries)
-                            clip_geometries = [unified_geometry] if unified_geometry.is_valid else valid_geometries
-                        except:
-                            clip_geometries = valid_geometries
-                    else:
-                        clip_geometries = valid_geometries
-
-                    out_image, out_transform = mask(
-                        dataset=src,
-                        shapes=clip_geometries,
-                        crop=True,
-                        nodata=src.nodata,
-                        all_touched=True,
-                        invert=False
-                    )
-
-                    if len(out_image.shape) == 3 and out_image.shape[0] >= 1:
-                        raster_array = out_image[0]
-                    else:
-                        raster_array = out_image
-
-                    metadata = {
-                        'transform': out_transform,
-                        'crs': src.crs,
-                        'shape': raster_array.shape,
-                        'dtype': rasterio.float32,
-                        'nodata': src.nodata,
-                        'bounds': rasterio.transform.array_bounds(
-                            raster_array.shape[0],
-                            raster_array.shape[1],
-                            out_transform
-                        ),
-                        'valid_pixels': len(raster_array[~np.isnan(raster_array)]),
-                        'total_pixels': raster_array.size,
-                        'data_year': selected_year,
-                        'source_file': str(raster_path)
-                    }
-
-                    return parameter, raster_array.astype(np.float32), metadata
-
-            except Exception as e:
-                print(f"[ERROR] Failed to process {parameter}: {str(e)}")
-                return None, None, None
-
-        raster_data = {}
-        raster_metadata = {}
-        
-        max_workers = min(4, len(selected_parameters))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_param = {executor.submit(process_single_raster, param): param for param in selected_parameters}
-            
-            for future in concurrent.futures.as_completed(future_to_param):
-                result = future.result()
-                if result[0] is not None:
-                    param, data, metadata = result
-                    raster_data[param] = data
-                    raster_metadata[param] = metadata
+        raster_paths = {
+            parameter: RASTERS_DIR / f"{parameter}_{selected_year}.tif"
+            for parameter in selected_parameters
+        }
+        parameters, stack, metadata = load_parameter_stack(raster_paths, selected_area)
+        if metadata is not None:
+            metadata.update({'data_year': selected_year, 'source_type': 'EXISTING_RASTERS'})
 
         load_time = time.time() - start_time
-        print(f"[OPTIMIZED] Loaded {len(raster_data)}/{len(selected_parameters)} rasters in {load_time:.2f}s")
+        print(f"[OPTIMIZED] Loaded {len(parameters)}/{len(selected_parameters)} rasters in {load_time:.2f}s")
         
-        return raster_data, raster_metadata
+        return parameters, stack, metadata
 
-    def perform_quality_analysis_optimized(self, raster_data, thresholds, parameters):
-        """Parallel CI and Rank calculations"""
-        print(f"[OPTIMIZED] Running parallel quality analysis")
+    def perform_quality_analysis_optimized(self, parameters, stack, thresholds):
+        """CI, rank, weights and GWQI as broadcast operations over the parameter stack"""
+        print(f"[OPTIMIZED] Running stacked quality analysis")
         start_time = time.time()
         
         try:
-            ci_maps = {}
-            rank_maps = {}
-
-            def calculate_ci_for_param(param_data_tuple):
-                param, data = param_data_tuple
-                threshold = thresholds.get(param, 1.0)
-                ci = self.calculate_concentration_index(data, threshold)
-                return param, ci
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(parameters))) as executor:
-                ci_futures = [executor.submit(calculate_ci_for_param, (param, raster_data[param])) 
-                             for param in parameters if param in raster_data]
-                
-                for future in concurrent.futures.as_completed(ci_futures):
-                    param, ci = future.result()
-                    ci_maps[param] = ci
-
-            def calculate_rank_for_param(param_ci_tuple):
-                param, ci_data = param_ci_tuple
-                rank = self.calculate_ranking(ci_data)
-                return param, rank
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(ci_maps))) as executor:
-                rank_futures = [executor.submit(calculate_rank_for_param, (param, ci_data)) 
-                               for param, ci_data in ci_maps.items()]
-                
-                for future in concurrent.futures.as_completed(rank_futures):
-                    param, rank = future.result()
-                    rank_maps[param] = rank
-
-            weights = self.calculate_weights(rank_maps, ci_maps, thresholds, parameters, raster_data)
+            threshold_values = [thresholds.get(param, 1.0) for param in parameters]
+            result = compute_gwqi_stack(stack, threshold_values)
 
             total_time = time.time() - start_time
             print(f"[OPTIMIZED] Analysis completed in {total_time:.2f}s")
 
             return {
-                'ci_maps': ci_maps,
-                'rank_maps': rank_maps,
-                'weights': weights,
+                'ci_stack': result['ci'],
+                'rank_stack': result['rank'],
+                'ci_maps': dict(zip(parameters, result['ci'])),
+                'rank_maps': dict(zip(parameters, result['rank'])),
+                'weights': {param: float(w) for param, w in zip(parameters, result['weights'])},
+                'gwqi': result['gwqi'],
                 'parameter_thresholds': thresholds
             }
 
@@ -1113,107 +855,8 @@ class GWQIOverlayView(APIView):
             traceback.print_exc()
             return None
 
-    def save_analysis_rasters_parallel(self, analysis_results, selected_parameters, selected_year, raster_metadata):
-        """Save analysis rasters in parallel using session temp directory"""
-        print(f"[OPTIMIZED] Saving analysis rasters to session temp")
-        analyzed_layers = []
-        
-        def save_raster_pair(param):
-            if param not in analysis_results['ci_maps'] or param not in analysis_results['rank_maps']:
-                return []
-                
-            try:
-                timestamp = int(time.time() * 1000)
-                ci_layer = f"ci_{param}_{selected_year}_{timestamp}"
-                rank_layer = f"rank_{param}_{selected_year}_{timestamp}"
-                
-                saved_layers = []
-                
-                ci_path = self.save_analysis_raster(
-                    analysis_results['ci_maps'][param],
-                    ci_layer,
-                    raster_metadata[param],
-                    'CI'
-                )
-                if ci_path:
-                    saved_layers.append(ci_layer)
-                
-                rank_path = self.save_analysis_raster(
-                    analysis_results['rank_maps'][param],
-                    rank_layer,
-                    raster_metadata[param],
-                    'Rank'
-                )
-                if rank_path:
-                    saved_layers.append(rank_layer)
-                
-                return saved_layers
-                
-            except Exception as e:
-                print(f"[ERROR] Failed to save analysis rasters for {param}: {str(e)}")
-                return []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = [executor.submit(save_raster_pair, param) for param in selected_parameters]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                analyzed_layers.extend(result)
-
-        return analyzed_layers
-
-    def save_analysis_raster(self, data_array, layer_name, metadata, analysis_type):
-        """Save analysis raster to session temp directory"""
-        try:
-            with file_write_lock:
-                temp_path = self.session_temp_dir / f"{layer_name}.tif"
-
-                if len(data_array.shape) == 3:
-                    data_array = data_array[0]
-
-                with rasterio.open(
-                    temp_path,
-                    'w',
-                    driver='GTiff',
-                    height=data_array.shape[0],
-                    width=data_array.shape[1],
-                    count=1,
-                    dtype=rasterio.float32,
-                    crs=metadata['crs'],
-                    transform=metadata['transform'],
-                    nodata=np.nan,
-                    compress='lzw'
-                ) as dst:
-                    dst.write(data_array, 1)
-
-                return str(temp_path)
-
-        except Exception as e:
-            print(f"[ERROR] Failed to save {analysis_type} raster: {str(e)}")
-            return None
-
-    def load_clipping_geometry_optimized(self, village_ids, place):
-        """Load clipping geometry with caching"""
-        try:
-            villages_vector = self.load_village_shapefile()
-            if villages_vector is None:
-                return None
-
-            if place == "village":
-                village_ids_float = [float(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['village_co'].isin(village_ids_float)]
-            else:
-                village_ids_int = [int(x) for x in village_ids]
-                selected_area = villages_vector[villages_vector['SUBDIS_COD'].isin(village_ids_int)]
-
-            return selected_area if not selected_area.empty else None
-
-        except Exception as e:
-            print(f"[ERROR] Failed to load clipping geometry: {str(e)}")
-            return None
-
     def calculate_detailed_parameter_statistics_optimized(self, raster_data, analysis_results, thresholds):
-        """Calculate statistics in parallel"""
+        """Calculate per-parameter statistics from the stack views"""
         print(f"[OPTIMIZED] Calculating statistics")
         
         try:
@@ -1267,12 +910,9 @@ class GWQIOverlayView(APIView):
                     }
 
             parameter_statistics = {}
-            with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(raster_data))) as executor:
-                futures = [executor.submit(calculate_param_stats, param) for param in raster_data.keys()]
-                
-                for future in concurrent.futures.as_completed(futures):
-                    param, stats = future.result()
-                    parameter_statistics[param] = stats
+            for param in raster_data.keys():
+                param, stats = calculate_param_stats(param)
+                parameter_statistics[param] = stats
 
             return parameter_statistics
             
@@ -1412,155 +1052,6 @@ class GWQIOverlayView(APIView):
             print(f"[ERROR] Failed to create colored raster for {parameter}: {str(e)}")
             return np.zeros((*data.shape, 3), dtype=np.uint8), [], []
 
-    def apply_clipping_to_raster(self, raster_data, clipping_geometry, metadata):
-        """Apply clipping geometry to raster data using session temp"""
-        try:
-            temp_raster_path = self.session_temp_dir / f"temp_clipping_{uuid.uuid4().hex}.tif"
-
-            with rasterio.open(
-                temp_raster_path,
-                'w',
-                driver='GTiff',
-                height=raster_data.shape[0],
-                width=raster_data.shape[1],
-                count=1,
-                dtype=rasterio.float32,
-                crs=metadata['crs'],
-                transform=metadata['transform'],
-                nodata=np.nan
-            ) as dst:
-                dst.write(raster_data, 1)
-
-            with rasterio.open(temp_raster_path) as src:
-                if clipping_geometry.crs != src.crs:
-                    clipping_geometry = clipping_geometry.to_crs(src.crs)
-
-                out_image, out_transform = mask(
-                    dataset=src,
-                    shapes=clipping_geometry.geometry,
-                    crop=True,
-                    nodata=np.nan,
-                    all_touched=True,
-                    invert=False
-                )
-
-                if len(out_image.shape) == 3:
-                    clipped_data = out_image[0]
-                else:
-                    clipped_data = out_image
-
-                metadata['transform'] = out_transform
-                metadata['shape'] = clipped_data.shape
-
-            os.remove(temp_raster_path)
-            return clipped_data
-
-        except Exception as e:
-            print(f"[ERROR] Clipping failed: {str(e)}")
-            return raster_data
-
-    def calculate_concentration_index(self, p_array, threshold):
-        """Calculate Concentration Index: CI = (P - T) / (P + T)"""
-        if hasattr(p_array, 'mask'):
-            valid_mask = ~p_array.mask
-            p_array = p_array.data
-        else:
-            valid_mask = np.isfinite(p_array) & (p_array > 0)
-
-        numerator = p_array - threshold
-        denominator = p_array + threshold
-        ci = np.full_like(p_array, np.nan, dtype=np.float32)
-        calc_mask = valid_mask & (denominator != 0)
-        ci[calc_mask] = numerator[calc_mask] / denominator[calc_mask]
-        ci = np.clip(ci, -1, 1)
-        return ci
-
-    def calculate_ranking(self, ci_array):
-        """Calculate Ranking: R = 0.5 * (CI)^2 + 4.5 * CI + 5"""
-        valid_mask = ~np.isnan(ci_array) & np.isfinite(ci_array)
-        rank = np.full_like(ci_array, np.nan, dtype=np.float32)
-        valid_ci = ci_array[valid_mask]
-        rank[valid_mask] = 0.5 * (valid_ci ** 2) + 4.5 * valid_ci + 5
-        rank[valid_mask] = np.clip(rank[valid_mask], 1, 10)
-        return rank
-
-    def calculate_weights(self, rank_maps, ci_maps, thresholds, parameters, raster_data):
-        """Weight calculation: W = R + 2 if mean(P) > T else W = R"""
-        weights = {}
-
-        for param in parameters:
-            if param in rank_maps and param in raster_data:
-                p_array = raster_data[param]
-                rank_arr = rank_maps[param]
-                threshold = thresholds.get(param, 1.0)
-
-                valid_ranks = rank_arr[~np.isnan(rank_arr) & np.isfinite(rank_arr)]
-                if len(valid_ranks) == 0:
-                    weights[param] = 5.0
-                    continue
-
-                mean_rank = np.mean(valid_ranks)
-
-                valid_p = p_array[~np.isnan(p_array) & np.isfinite(p_array)]
-                if len(valid_p) == 0:
-                    weights[param] = mean_rank
-                    continue
-
-                mean_p = np.mean(valid_p)
-
-                if mean_p > threshold:
-                    weights[param] = mean_rank + 2
-                else:
-                    weights[param] = mean_rank
-
-        return weights
-
-    def calculate_gwqi_overlay(self, rank_rasters, weights):
-        """Calculate GWQI Overlay with TRUE MIN-MAX NORMALIZATION to 0-1"""
-        try:
-            first_key = list(rank_rasters.keys())[0]
-            shape = rank_rasters[first_key].shape
-
-            weighted_sum = np.zeros(shape, dtype=np.float32)
-            weight_sum = np.zeros(shape, dtype=np.float32)
-
-            for param, rank_arr in rank_rasters.items():
-                weight = weights.get(param, 5.0)
-                valid_mask = ~np.isnan(rank_arr) & np.isfinite(rank_arr)
-
-                weighted_sum[valid_mask] += rank_arr[valid_mask] * weight
-                weight_sum[valid_mask] += weight
-
-            gwqi = np.full(shape, np.nan, dtype=np.float32)
-            valid_pixels = weight_sum > 0
-
-            if np.any(valid_pixels):
-                n = len(rank_rasters)
-                raw_gwqi = 100 - (weighted_sum[valid_pixels] / n)
-                
-                actual_min = np.min(raw_gwqi)
-                actual_max = np.max(raw_gwqi)
-                
-                print(f"[NORMALIZATION] Raw GWQI range: {actual_min:.2f} to {actual_max:.2f}")
-                
-                if actual_max > actual_min:
-                    gwqi[valid_pixels] = (raw_gwqi - actual_min) / (actual_max - actual_min)
-                else:
-                    gwqi[valid_pixels] = 0.5
-                
-                valid_gwqi = ~np.isnan(gwqi) & np.isfinite(gwqi)
-                gwqi[valid_gwqi] = np.clip(gwqi[valid_gwqi], 0, 1)
-                
-                print(f"[NORMALIZATION] Normalized GWQI range: {np.min(gwqi[valid_gwqi]):.4f} to {np.max(gwqi[valid_gwqi]):.4f}")
-                print(f"[NORMALIZATION] Mean normalized GWQI: {np.mean(gwqi[valid_gwqi]):.4f}")
-
-            return gwqi
-
-        except Exception as e:
-            print(f"[ERROR] GWQI overlay calculation error: {str(e)}")
-            traceback.print_exc()
-            return None
-
     def calculate_gwqi_statistics(self, gwqi_raster):
         """Calculate statistics for GWQI overlay (normalized 0-1 scale)"""
         try:
@@ -0,0 +1,228 @@
+# wqa/gwqi_stack.py - Stacked-array GWQI computation
+#
+# All selected parameter rasters live in one (params x rows x cols) float32
+# stack on a shared grid. CI, rank, weights and the normalized overlay are
+# broadcast operations over that stack using one validity mask.
+
+import numpy as np
+import rasterio
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.warp import reproject, Resampling
+from shapely.ops import unary_union
+
+
+def _clip_geometries(selected_area, crs):
+    """Selected village geometries in the raster CRS, invalid ones repaired"""
+    if selected_area.crs != crs:
+        selected_area = selected_area.to_crs(crs)
+
+    geometries = []
+    for geom in selected_area.geometry:
+        if geom is None or geom.is_empty:
+            continue
+        if not geom.is_valid:
+            geom = geom.buffer(0)
+        if geom.is_valid:
+            geometries.append(geom)
+
+    if len(geometries) > 1:
+        try:
+            unified = unary_union(geometries)
+            if unified.is_valid:
+                return [unified]
+        except Exception:
+            pass
+    return geometries
+
+
+def load_parameter_stack(raster_paths, selected_area):
+    """
+    Read every parameter raster into one float32 stack clipped to the selection.
+
+    raster_paths: {parameter: path} in the order the bands should be stacked
+    selected_area: GeoDataFrame of the selected villages
+
+    The first readable raster defines the grid (window of the selection bounds).
+    Rasters on the same source grid are read through that window; anything else
+    is reprojected onto it. Nodata and pixels outside the selection become NaN.
+
+    Returns (parameters, stack, metadata); stack is None when nothing was read.
+    """
+    parameters = []
+    stack = None
+    grid = None
+
+    for parameter, path in raster_paths.items():
+        if not path.exists():
+            print(f"[WARNING] Raster not found: {path}")
+            continue
+
+        try:
+            with rasterio.open(path) as src:
+                if grid is None:
+                    geometries = _clip_geometries(selected_area, src.crs)
+                    if not geometries:
+                        print("[ERROR] No valid clipping geometries")
+                        return [], None, None
+
+                    window = geometry_window(src, geometries)
+                    transform = src.window_transform(window)
+                    shape = (int(window.height), int(window.width))
+                    inside = geometry_mask(
+                        geometries, out_shape=shape, transform=transform,
+                        all_touched=True, invert=True
+                    )
+                    grid = {
+                        'window': window,
+                        'transform': transform,
+                        'shape': shape,
+                        'inside': inside,
+                        'crs': src.crs,
+                        'src_transform': src.transform,
+                        'src_shape': src.shape,
+                    }
+                    stack = np.full((len(raster_paths),) + shape, np.nan, dtype=np.float32)
+
+                band = stack[len(parameters)]
+                same_grid = (
+                    src.crs == grid['crs']
+                    and src.transform == grid['src_transform']
+                    and src.shape == grid['src_shape']
+                )
+                if same_grid:
+                    data = src.read(1, window=grid['window'], masked=True)
+                    band[:] = data.astype(np.float32).filled(np.nan)
+                else:
+                    print(f"[STACK] Reprojecting {parameter} onto reference grid")
+                    reproject(
+                        source=rasterio.band(src, 1),
+                        destination=band,
+                        src_nodata=src.nodata,
+                        dst_transform=grid['transform'],
+                        dst_crs=grid['crs'],
+                        dst_nodata=np.nan,
+                        resampling=Resampling.bilinear
+                    )
+
+                band[~grid['inside']] = np.nan
+                parameters.append(parameter)
+
+        except Exception as e:
+            print(f"[ERROR] Failed to load {parameter}: {str(e)}")
+            if stack is not None:
+                stack[len(parameters)] = np.nan
+            continue
+
+    if not parameters:
+        return [], None, None
+
+    metadata = {
+        'transform': grid['transform'],
+        'crs': grid['crs'],
+        'shape': grid['shape'],
+        'dtype': rasterio.float32,
+        'nodata': np.nan,
+        'bounds': rasterio.transform.array_bounds(grid['shape'][0], grid['shape'][1], grid['transform']),
+        'valid_pixels': int(grid['inside'].sum()),
+        'total_pixels': int(grid['inside'].size),
+    }
+    return parameters, stack[:len(parameters)], metadata
+
+
+def compute_gwqi_stack(stack, thresholds):
+    """
+    CI, rank, weights and normalized GWQI for a (params x rows x cols) stack.
+
+    thresholds: per-parameter threshold T, same order as the stack bands
+      CI   = clip((P - T) / (P + T), -1, 1)           where P is finite and > 0
+      Rank = clip(0.5 * CI^2 + 4.5 * CI + 5, 1, 10)
+      W    = mean(Rank) + 2 if mean(P) > T else mean(Rank)   (5.0 if no ranks)
+      GWQI = min-max normalized 100 - sum(Rank * W) / n_params
+    """
+    n_params = stack.shape[0]
+    T = np.asarray(thresholds, dtype=np.float32).reshape(n_params, 1, 1)
+
+    finite = np.isfinite(stack)
+    ci_valid = finite & (stack > 0) & ((stack + T) != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ci = np.where(ci_valid, (stack - T) / (stack + T), np.nan).astype(np.float32)
+    np.clip(ci, -1, 1, out=ci)
+
+    rank = np.where(ci_valid, 0.5 * ci ** 2 + 4.5 * ci + 5, np.nan).astype(np.float32)
+    np.clip(rank, 1, 10, out=rank)
+
+    # Per-parameter means over the shared validity masks
+    rank_count = ci_valid.sum(axis=(1, 2))
+    p_count = finite.sum(axis=(1, 2))
+    rank_sum = np.where(ci_valid, rank, 0).sum(axis=(1, 2), dtype=np.float64)
+    p_sum = np.where(finite, stack, 0).sum(axis=(1, 2), dtype=np.float64)
+    mean_rank = np.divide(rank_sum, rank_count, out=np.full(n_params, np.nan), where=rank_count > 0)
+    mean_p = np.divide(p_sum, p_count, out=np.full(n_params, np.nan), where=p_count > 0)
+
+    weights = np.where(p_count > 0, np.where(mean_p > T.ravel(), mean_rank + 2, mean_rank), mean_rank)
+    weights = np.where(rank_count > 0, weights, 5.0)
+
+    # Weighted overlay with min-max normalization to 0-1
+    w = weights.reshape(n_params, 1, 1).astype(np.float32)
+    weighted_sum = np.where(ci_valid, rank * w, 0).sum(axis=0, dtype=np.float32)
+    any_valid = ci_valid.any(axis=0)
+
+    gwqi = np.full(stack.shape[1:], np.nan, dtype=np.float32)
+    if np.any(any_valid):
+        raw_gwqi = 100 - (weighted_sum[any_valid] / n_params)
+        actual_min = float(raw_gwqi.min())
+        actual_max = float(raw_gwqi.max())
+        print(f"[NORMALIZATION] Raw GWQI range: {actual_min:.2f} to {actual_max:.2f}")
+
+        if actual_max > actual_min:
+            gwqi[any_valid] = np.clip((raw_gwqi - actual_min) / (actual_max - actual_min), 0, 1)
+        else:
+            gwqi[any_valid] = 0.5
+
+    return {
+        'ci': ci,
+        'rank': rank,
+        'weights': weights,
+        'mean_rank': mean_rank,
+        'mean_p': mean_p,
+        'gwqi': gwqi,
+        'valid': any_valid,
+    }
+
+
+def write_gwqi_cog(path, parameters, gwqi, ci, rank, metadata):
+    """
+    Write GWQI, per-parameter CI and per-parameter rank as one multi-band COG.
+    Band 1 is always the normalized GWQI so single-band readers keep working.
+    Returns the band descriptions in band order.
+    """
+    descriptions = (
+        ['gwqi']
+        + [f"ci_{param}" for param in parameters]
+        + [f"rank_{param}" for param in parameters]
+    )
+    height, width = gwqi.shape
+
+    with rasterio.open(
+        path,
+        'w',
+        driver='COG',
+        height=height,
+        width=width,
+        count=len(descriptions),
+        dtype=rasterio.float32,
+        crs=metadata['crs'],
+        transform=metadata['transform'],
+        nodata=np.nan,
+        compress='deflate',
+        predictor=3,
+        blocksize=512
+    ) as dst:
+        dst.write(gwqi.astype(np.float32, copy=False), 1)
+        dst.write(ci.astype(np.float32, copy=False), list(range(2, 2 + len(parameters))))
+        dst.write(rank.astype(np.float32, copy=False), list(range(2 + len(parameters), 2 + 2 * len(parameters))))
+        for band, description in enumerate(descriptions, start=1):
+            dst.set_band_description(band, description)
+
+    return descriptions
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wqa", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="well",
+            index=models.Index(
+                fields=["SUBDIS_COD", "YEAR"], name="wqa_well_SUBDIS__8d1074_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="well",
+            index=models.Index(
+                fields=["village_code", "YEAR"], name="wqa_well_village_ea2d6a_idx"
+            ),
+        ),
+    ]
@@ -56,5 +56,11 @@ class Well(models.Model):
 
     YEAR = models.IntegerField(null=True, blank=True, help_text="Sample collection year")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["SUBDIS_COD", "YEAR"]),
+            models.Index(fields=["village_code", "YEAR"]),
+        ]
+
     def __str__(self):
         return f"Well FID {self.FID_clip} in village {self.village_code_id}"
\ No newline at end of file
@@ -2,16 +2,33 @@ import uuid
 import shutil
 from pathlib import Path
 from datetime import datetime, timedelta
-from threading import Lock
+from threading import Lock, local
+from contextlib import contextmanager
 import json
 import logging
+import sqlite3
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from main.temp_artifacts import temp_registry
 
 logger = logging.getLogger(__name__)
 
 class SessionManager:
+    """
+    GWQI session registry backed by an embedded SQLite database (WAL mode).
+
+    Every gunicorn worker opens the same database file, so lookups are
+    consistent across processes; create/extend/access are single-row writes
+    and expiry cleanup is one indexed delete on expires_at.
+    """
     _instance = None
     _lock = Lock()
+
+    _COLUMNS = (
+        'id', 'user_id', 'year', 'created_at', 'expires_at', 'last_accessed',
+        'temp_dir', 'output_dir', 'interpolated_dir', 'session_root',
+        'status', 'timeout_minutes'
+    )
     
     def __new__(cls):
         if cls._instance is None:
@@ -25,53 +42,140 @@ class SessionManager:
         if self._initialized:
             return
             
-        self.base_sessions_dir = Path("media/temp/sessions")
-        self.sessions_file = self.base_sessions_dir / "active_sessions.json"
-        self.lock = Lock()
+        self.base_sessions_dir = Path(settings.MEDIA_ROOT, 'temp', 'sessions')
+        self.db_path = self.base_sessions_dir / "sessions.sqlite3"
+        self.legacy_sessions_file = self.base_sessions_dir / "active_sessions.json"
+        self._local = local()
         
         # Session timeout settings
         self.default_timeout_minutes = 30  # 30 minutes timeout
         self.cleanup_interval_minutes = 5   # Check for expired sessions every 5 minutes
         
         self.base_sessions_dir.mkdir(parents=True, exist_ok=True)
-        self._load_sessions()
+        self._init_db()
+        self._import_legacy_sessions()
         self._initialized = True
         
         # Cleanup expired sessions on startup
         self.cleanup_expired_sessions()
-    
-    def _load_sessions(self):
-        if self.sessions_file.exists():
-            try:
-                with open(self.sessions_file, 'r') as f:
-                    data = json.load(f)
-                    self.sessions = {}
-                    for k, v in data.items():
-                        self.sessions[k] = {
-                            **v, 
-                            'created_at': datetime.fromisoformat(v['created_at']),
-                            'expires_at': datetime.fromisoformat(v['expires_at'])
-                        }
-            except Exception as e:
-                logger.error(f"Failed to load sessions: {e}")
-                self.sessions = {}
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                year TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                temp_dir TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                interpolated_dir TEXT NOT NULL,
+                session_root TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'active',
+                timeout_minutes INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at)")
+
+    def _import_legacy_sessions(self):
+        """One-time import of the old active_sessions.json registry"""
+        if not self.legacy_sessions_file.exists():
+            return
+        try:
+            with open(self.legacy_sessions_file, 'r') as f:
+                data = json.load(f)
+            rows = []
+            for k, v in data.items():
+                created_at = datetime.fromisoformat(v['created_at'])
+                expires_at = datetime.fromisoformat(v['expires_at'])
+                last_accessed = v.get('last_accessed')
+                last_accessed = datetime.fromisoformat(last_accessed) if isinstance(last_accessed, str) else created_at
+                rows.append((
+                    k, v.get('user_id'), v.get('year'),
+                    created_at.timestamp(), expires_at.timestamp(), last_accessed.timestamp(),
+                    v['temp_dir'], v['output_dir'], v['interpolated_dir'], v['session_root'],
+                    v.get('status', 'active'), v.get('timeout_minutes', self.default_timeout_minutes)
+                ))
+            conn = self._connect()
+            with self._transaction(conn):
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO sessions ({', '.join(self._COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                    rows
+                )
+            self.legacy_sessions_file.rename(self.legacy_sessions_file.with_suffix('.json.migrated'))
+            logger.info(f"Imported {len(rows)} sessions from {self.legacy_sessions_file}")
+        except Exception as e:
+            logger.error(f"Failed to import legacy sessions: {e}")
+
+    @contextmanager
+    def _transaction(self, conn):
+        """BEGIN IMMEDIATE so concurrent writers serialize instead of failing mid-way"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
         else:
-            self.sessions = {}
-    
-    def _save_sessions(self):
+            conn.execute("COMMIT")
+
+    def _row_to_session(self, row):
+        session = dict(row)
+        for key in ('created_at', 'expires_at', 'last_accessed'):
+            session[key] = datetime.fromtimestamp(session[key])
+        return session
+
+    def _fetch(self, session_id):
+        row = self._connect().execute(
+            "SELECT * FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return self._row_to_session(row) if row else None
+
+    def _remove_session_dir(self, session_root):
+        session_root = Path(session_root)
         try:
-            data = {}
-            for k, v in self.sessions.items():
-                data[k] = {
-                    **v, 
-                    'created_at': v['created_at'].isoformat(),
-                    'expires_at': v['expires_at'].isoformat()
-                }
-            with open(self.sessions_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            if session_root.exists():
+                shutil.rmtree(session_root)
+                logger.info(f"Removed session directory tree: {session_root}")
         except Exception as e:
-            logger.error(f"Failed to save sessions: {e}")
-    
+            logger.error(f"Failed to remove session directory {session_root}: {e}")
+
+    def _delete_where(self, where, params):
+        """Delete matching sessions in one statement, then remove their directories"""
+        conn = self._connect()
+        with self._transaction(conn):
+            roots = [r['session_root'] for r in conn.execute(
+                f"SELECT session_root FROM sessions WHERE {where}", params
+            )]
+            conn.execute(f"DELETE FROM sessions WHERE {where}", params)
+
+        for root in roots:
+            self._remove_session_dir(root)
+            temp_registry.forget(root)
+        return len(roots)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
     def create_session(self, user_id=None, year=None, timeout_minutes=None):
         """Create new session with 30-minute timeout"""
         if timeout_minutes is None:
@@ -79,65 +183,70 @@ class SessionManager:
             
         session_id = str(uuid.uuid4())
         
-        with self.lock:
-            # Create session directory structure
-            session_root = self.base_sessions_dir / session_id
-            temp_dir = session_root / "temp"
-            output_dir = session_root / "output"
-            interpolated_dir = session_root / "interpolated_rasters"
-            
-            if year:
-                output_dir = output_dir / str(year)
-            
-            # Create all directories
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            interpolated_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Set expiration to 30 minutes from now
-            created_at = datetime.now()
-            expires_at = created_at + timedelta(minutes=timeout_minutes)
-            
-            self.sessions[session_id] = {
-                'id': session_id,
-                'user_id': user_id,
-                'year': year,
-                'created_at': created_at,
-                'expires_at': expires_at,
-                'last_accessed': created_at,
-                'temp_dir': str(temp_dir),
-                'output_dir': str(output_dir),
-                'interpolated_dir': str(interpolated_dir),
-                'session_root': str(session_root),
-                'status': 'active',
-                'timeout_minutes': timeout_minutes
-            }
-            
-            self._save_sessions()
-            
-            logger.info(f"Created session {session_id} with {timeout_minutes}min timeout")
-            logger.info(f"Session structure: temp={temp_dir}, output={output_dir}, interpolated={interpolated_dir}")
-            return session_id
+        # Create session directory structure
+        session_root = self.base_sessions_dir / session_id
+        temp_dir = session_root / "temp"
+        output_dir = session_root / "output"
+        interpolated_dir = session_root / "interpolated_rasters"
+        
+        if year:
+            output_dir = output_dir / str(year)
+        
+        # Create all directories
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        interpolated_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Set expiration to 30 minutes from now
+        created_at = datetime.now()
+        expires_at = created_at + timedelta(minutes=timeout_minutes)
+        
+        self._connect().execute(
+            f"INSERT INTO sessions ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+            (
+                session_id,
+                None if user_id is None else str(user_id),
+                None if year is None else str(year),
+                created_at.timestamp(),
+                expires_at.timestamp(),
+                created_at.timestamp(),
+                str(temp_dir),
+                str(output_dir),
+                str(interpolated_dir),
+                str(session_root),
+                'active',
+                timeout_minutes
+            )
+        )
+        
+        # Session trees count toward the temp disk budget but stay leased until expiry
+        temp_registry.register(session_root, owner=f"wqa.session:{session_id}", ttl_seconds=timeout_minutes * 60)
+        temp_registry.lease(session_root, timeout_minutes * 60)
+        
+        logger.info(f"Created session {session_id} with {timeout_minutes}min timeout")
+        logger.info(f"Session structure: temp={temp_dir}, output={output_dir}, interpolated={interpolated_dir}")
+        return session_id
     
     def get_session(self, session_id):
         """Get session if it exists and is not expired"""
-        with self.lock:
-            if session_id not in self.sessions:
-                raise ValueError(f"Session {session_id} not found")
-            
-            session = self.sessions[session_id]
-            
-            # Check if session is expired
-            if datetime.now() > session['expires_at']:
-                logger.info(f"Session {session_id} has expired, cleaning up")
-                self.cleanup_session(session_id)
-                raise ValueError(f"Session {session_id} has expired")
-            
-            # Update last accessed time
-            session['last_accessed'] = datetime.now()
-            self._save_sessions()
-            
-            return session.copy()
+        session = self._fetch(session_id)
+        if session is None:
+            raise ValueError(f"Session {session_id} not found")
+        
+        # Check if session is expired
+        now = datetime.now()
+        if now > session['expires_at']:
+            logger.info(f"Session {session_id} has expired, cleaning up")
+            self.cleanup_session(session_id)
+            raise ValueError(f"Session {session_id} has expired")
+        
+        # Update last accessed time
+        self._connect().execute(
+            "UPDATE sessions SET last_accessed = ? WHERE id = ?", (now.timestamp(), session_id)
+        )
+        session['last_accessed'] = now
+        
+        return session
     
     def get_paths(self, session_id):
         """Get session paths if session is valid"""
@@ -152,82 +261,60 @@ class SessionManager:
     
     def is_session_expired(self, session_id):
         """Check if session has expired"""
-        if session_id not in self.sessions:
+        row = self._connect().execute(
+            "SELECT expires_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
             return True
-            
-        session = self.sessions[session_id]
-        return datetime.now() > session['expires_at']
+        return datetime.now().timestamp() > row['expires_at']
     
     def extend_session(self, session_id, additional_minutes=None):
         """Extend session expiration time"""
         if additional_minutes is None:
             additional_minutes = self.default_timeout_minutes
             
-        with self.lock:
-            if session_id in self.sessions:
-                current_time = datetime.now()
-                new_expires = current_time + timedelta(minutes=additional_minutes)
-                
-                self.sessions[session_id]['expires_at'] = new_expires
-                self.sessions[session_id]['last_accessed'] = current_time
-                self._save_sessions()
-                
-                logger.info(f"Extended session {session_id} by {additional_minutes} minutes")
-                return new_expires
+        current_time = datetime.now()
+        new_expires = current_time + timedelta(minutes=additional_minutes)
+        
+        cursor = self._connect().execute(
+            "UPDATE sessions SET expires_at = ?, last_accessed = ? WHERE id = ?",
+            (new_expires.timestamp(), current_time.timestamp(), session_id)
+        )
+        if cursor.rowcount:
+            session_root = self.base_sessions_dir / session_id
+            temp_registry.extend(session_root, additional_minutes * 60)
+            temp_registry.lease(session_root, additional_minutes * 60)
+            logger.info(f"Extended session {session_id} by {additional_minutes} minutes")
+            return new_expires
         return None
     
     def get_session_time_remaining(self, session_id):
         """Get remaining time for session in minutes"""
-        if session_id not in self.sessions:
+        row = self._connect().execute(
+            "SELECT expires_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
             return 0
         
-        expires_at = self.sessions[session_id]['expires_at']
-        remaining = expires_at - datetime.now()
-        return max(0, remaining.total_seconds() / 60)  # Return minutes
+        remaining = row['expires_at'] - datetime.now().timestamp()
+        return max(0, remaining / 60)  # Return minutes
     
     def cleanup_session(self, session_id):
         """Clean up specific session - removes entire session directory tree"""
-        with self.lock:
-            if session_id not in self.sessions:
-                logger.warning(f"Session {session_id} not found for cleanup")
-                return False
-            
-            session = self.sessions[session_id]
-            session_root = Path(session['session_root'])
-            
-            # Remove entire session directory tree
-            try:
-                if session_root.exists():
-                    shutil.rmtree(session_root)
-                    logger.info(f"Removed session directory tree: {session_root}")
-            except Exception as e:
-                logger.error(f"Failed to remove session directory {session_root}: {e}")
-            
-            # Remove from active sessions
-            del self.sessions[session_id]
-            self._save_sessions()
-            
-            logger.info(f"Session {session_id} cleaned up successfully")
-            return True
+        if not self._delete_where("id = ?", (session_id,)):
+            logger.warning(f"Session {session_id} not found for cleanup")
+            return False
+        
+        logger.info(f"Session {session_id} cleaned up successfully")
+        return True
     
     def cleanup_expired_sessions(self):
         """Clean up all expired sessions automatically"""
-        expired_sessions = []
-        current_time = datetime.now()
-        
-        with self.lock:
-            for session_id, session in self.sessions.items():
-                if current_time > session['expires_at']:
-                    expired_sessions.append(session_id)
-        
-        cleanup_count = 0
-        for session_id in expired_sessions:
-            try:
-                self.cleanup_session(session_id)
-                cleanup_count += 1
-                logger.info(f"Auto-cleaned expired session: {session_id}")
-            except Exception as e:
-                logger.error(f"Failed to cleanup expired session {session_id}: {e}")
+        try:
+            cleanup_count = self._delete_where("expires_at < ?", (datetime.now().timestamp(),))
+        except Exception as e:
+            logger.error(f"Failed to cleanup expired sessions: {e}")
+            return 0
         
         if cleanup_count > 0:
             logger.info(f"Cleaned up {cleanup_count} expired sessions")
@@ -240,104 +327,86 @@ class SessionManager:
             max_age_minutes = self.default_timeout_minutes
             
         cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
-        sessions_to_cleanup = []
-        
-        with self.lock:
-            for session_id, session in self.sessions.items():
-                if session['created_at'] < cutoff:
-                    sessions_to_cleanup.append(session_id)
-        
-        cleanup_count = 0
-        for session_id in sessions_to_cleanup:
-            try:
-                self.cleanup_session(session_id)
-                cleanup_count += 1
-            except Exception as e:
-                logger.error(f"Failed to cleanup old session {session_id}: {e}")
-        
-        return cleanup_count
+        try:
+            return self._delete_where("created_at < ?", (cutoff.timestamp(),))
+        except Exception as e:
+            logger.error(f"Failed to cleanup old sessions: {e}")
+            return 0
     
     def cleanup_all_sessions(self):
         """Emergency cleanup - remove all sessions"""
-        with self.lock:
-            session_ids = list(self.sessions.keys())
-        
-        cleanup_count = 0
-        for session_id in session_ids:
-            try:
-                self.cleanup_session(session_id)
-                cleanup_count += 1
-            except Exception as e:
-                logger.error(f"Failed to cleanup session {session_id}: {e}")
-        
+        cleanup_count = self._delete_where("1 = 1", ())
         logger.warning(f"Emergency cleanup: removed {cleanup_count} sessions")
         return cleanup_count
     
     def get_session_stats(self):
         """Get statistics about active sessions"""
-        with self.lock:
-            now = datetime.now()
-            stats = {
-                'total_sessions': len(self.sessions),
-                'sessions_by_age': {'< 5min': 0, '5-15min': 0, '15-30min': 0, '> 30min': 0},
-                'sessions_by_expiry': {'< 5min': 0, '5-15min': 0, '15-30min': 0, 'expired': 0},
-                'oldest_session': None,
-                'newest_session': None,
-                'expired_count': 0
-            }
+        now = datetime.now()
+        stats = {
+            'total_sessions': 0,
+            'sessions_by_age': {'< 5min': 0, '5-15min': 0, '15-30min': 0, '> 30min': 0},
+            'sessions_by_expiry': {'< 5min': 0, '5-15min': 0, '15-30min': 0, 'expired': 0},
+            'oldest_session': None,
+            'newest_session': None,
+            'expired_count': 0
+        }
+        
+        rows = self._connect().execute("SELECT created_at, expires_at FROM sessions").fetchall()
+        stats['total_sessions'] = len(rows)
+        
+        if rows:
+            ages = []
+            now_ts = now.timestamp()
             
-            if self.sessions:
-                ages = []
-                expiry_times = []
+            for row in rows:
+                # Calculate age
+                age_minutes = (now_ts - row['created_at']) / 60
+                ages.append(age_minutes)
                 
-                for session in self.sessions.values():
-                    # Calculate age
-                    age_minutes = (now - session['created_at']).total_seconds() / 60
-                    ages.append(age_minutes)
-                    
-                    # Calculate time until expiry
-                    expiry_minutes = (session['expires_at'] - now).total_seconds() / 60
-                    expiry_times.append(expiry_minutes)
-                    
-                    # Categorize by age
-                    if age_minutes < 5:
-                        stats['sessions_by_age']['< 5min'] += 1
-                    elif age_minutes < 15:
-                        stats['sessions_by_age']['5-15min'] += 1
-                    elif age_minutes < 30:
-                        stats['sessions_by_age']['15-30min'] += 1
-                    else:
-                        stats['sessions_by_age']['> 30min'] += 1
-                    
-                    # Categorize by expiry time
-                    if expiry_minutes < 0:
-                        stats['sessions_by_expiry']['expired'] += 1
-                        stats['expired_count'] += 1
-                    elif expiry_minutes < 5:
-                        stats['sessions_by_expiry']['< 5min'] += 1
-                    elif expiry_minutes < 15:
-                        stats['sessions_by_expiry']['5-15min'] += 1
-                    elif expiry_minutes < 30:
-                        stats['sessions_by_expiry']['15-30min'] += 1
+                # Calculate time until expiry
+                expiry_minutes = (row['expires_at'] - now_ts) / 60
                 
-                stats['oldest_session'] = f"{max(ages):.1f} min"
-                stats['newest_session'] = f"{min(ages):.1f} min"
+                # Categorize by age
+                if age_minutes < 5:
+                    stats['sessions_by_age']['< 5min'] += 1
+                elif age_minutes < 15:
+                    stats['sessions_by_age']['5-15min'] += 1
+                elif age_minutes < 30:
+                    stats['sessions_by_age']['15-30min'] += 1
+                else:
+                    stats['sessions_by_age']['> 30min'] += 1
+                
+                # Categorize by expiry time
+                if expiry_minutes < 0:
+                    stats['sessions_by_expiry']['expired'] += 1
+                    stats['expired_count'] += 1
+                elif expiry_minutes < 5:
+                    stats['sessions_by_expiry']['< 5min'] += 1
+                elif expiry_minutes < 15:
+                    stats['sessions_by_expiry']['5-15min'] += 1
+                elif expiry_minutes < 30:
+                    stats['sessions_by_expiry']['15-30min'] += 1
             
-            return stats
+            stats['oldest_session'] = f"{max(ages):.1f} min"
+            stats['newest_session'] = f"{min(ages):.1f} min"
+        
+        return stats
     
     def get_active_sessions(self):
         """Get list of all active (non-expired) sessions"""
-        active_sessions = []
         current_time = datetime.now()
+        rows = self._connect().execute(
+            "SELECT * FROM sessions WHERE expires_at >= ? ORDER BY expires_at",
+            (current_time.timestamp(),)
+        ).fetchall()
         
-        with self.lock:
-            for session_id, session in self.sessions.items():
-                if current_time <= session['expires_at']:
-                    session_info = session.copy()
-                    session_info['time_remaining_minutes'] = (
-                        session['expires_at'] - current_time
-                    ).total_seconds() / 60
-                    active_sessions.append(session_info)
+        active_sessions = []
+        for row in rows:
+            session_info = self._row_to_session(row)
+            session_info['time_remaining_minutes'] = (
+                session_info['expires_at'] - current_time
+            ).total_seconds() / 60
+            active_sessions.append(session_info)
         
         return active_sessions
 
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Well
+from .wells import bump_wells_version
+
+
+# Cached wells tables and stats are keyed by a data version
+@receiver(post_save, sender=Well)
+@receiver(post_delete, sender=Well)
+def invalidate_wells_cache(sender, **kwargs):
+    bump_wells_version()
@@ -13,6 +13,10 @@ from .models import Well
 from gwa.models import  State, District, Subdistrict,Village
 from .pdf_generator import generate_gwqi_report
 from .session_manager import session_manager
+from .wells import (
+    SUBDISTRICT, VILLAGE, to_arrow, to_records,
+    well_stats, wells_table, years_with_data,
+)
 import logging
 from datetime import datetime
 
@@ -37,8 +41,40 @@ def validate_year_range(year_int):
     return True, None
 
 
+WELLS_FORMATS = ('rows', 'columnar', 'arrow')
+
+
+def columnar_wells_response(kind, codes, year_int, table, response_format, include):
+    """
+    Columnar JSON ({column: [values]}) or an Arrow IPC stream of the wells.
+    JSON can carry the SQL stats and years with data of the same selection
+    (include: ["stats", "years"]) so dashboards need one request.
+    """
+    if response_format == 'arrow':
+        try:
+            body = to_arrow(table)
+        except ImportError:
+            return Response({
+                'error': 'Arrow format is not available on this server',
+                'code': 'ARROW_UNAVAILABLE'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return HttpResponse(body, content_type='application/vnd.apache.arrow.stream')
+
+    payload = {
+        'year': year_int,
+        'count': table['count'],
+        'columns': table['columns'],
+        'data': table['data'],
+    }
+    if 'stats' in include:
+        payload['stats'] = well_stats(kind, codes, year_int)
+    if 'years' in include:
+        payload['available_years'] = years_with_data(kind, codes)
+    return Response(payload, status=status.HTTP_200_OK)
+
+
 class WellsView(APIView):
-    """Optimized Wells API with select_related and only"""
+    """Wells API for admin system - subdistrict-based, row or columnar"""
     permission_classes = [AllowAny]
     
     def post(self, request):
@@ -85,25 +121,24 @@ class WellsView(APIView):
                     'code': 'INVALID_SUBDIS_FORMAT'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
+            response_format = data.get('format', 'rows')
+            if response_format not in WELLS_FORMATS:
+                return Response({
+                    'error': f'format must be one of {list(WELLS_FORMATS)}',
+                    'code': 'INVALID_FORMAT'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
             print(f"[DEBUG] Filtering wells: {subdis_codes_int}, year: {year_int}")
             
-            # OPTIMIZED QUERY with select_related and only
-            wells = Well.objects.filter(
-                SUBDIS_COD__in=subdis_codes_int,
-                YEAR=year_int
-            ).select_related(
-                'village_code'
-            ).only(
-                'id', 'Location', 'Latitude', 'Longitude',
-                'DISTRICT', 'SUB_DISTRI', 'SUBDIS_COD', 'village_code_id', 'YEAR',
-                'ph_level', 'electrical_conductivity', 'carbonate', 'bicarbonate',
-                'chloride', 'fluoride', 'sulfate', 'nitrate', 'phosphate',
-                'Hardness', 'calcium', 'magnesium', 'sodium', 'potassium',
-                'iron', 'arsenic', 'uranium'
-            )
+            # Single values_list() query, cached per (subdistricts, year)
+            table = wells_table(SUBDISTRICT, subdis_codes_int, year_int)
+            wells_count = table['count']
+            print(f"[DEBUG] Found {wells_count} wells")
             
-            wells_count = wells.count()
-            print(f"[DEBUG] Found {wells_count} wells (OPTIMIZED QUERY)")
+            if response_format != 'rows':
+                return columnar_wells_response(
+                    SUBDISTRICT, subdis_codes_int, year_int, table, response_format, data.get('include', [])
+                )
             
             if wells_count == 0:
                 return Response({
@@ -114,17 +149,9 @@ class WellsView(APIView):
                     'data': []
                 }, status=status.HTTP_200_OK)
             
-            # Use values() for efficient serialization - single query
-            wells_data = list(wells.values(
-                'id', 'Location', 'Latitude', 'Longitude',
-                'DISTRICT', 'SUB_DISTRI', 'SUBDIS_COD', 'village_code_id', 'YEAR',
-                'ph_level', 'electrical_conductivity', 'carbonate', 'bicarbonate',
-                'chloride', 'fluoride', 'sulfate', 'nitrate', 'phosphate',
-                'Hardness', 'calcium', 'magnesium', 'sodium', 'potassium',
-                'iron', 'arsenic', 'uranium'
-            ))
+            wells_data = to_records(table)
             
-            print(f"[SUCCESS] Returning {len(wells_data)} wells (1 optimized query)")
+            print(f"[SUCCESS] Returning {len(wells_data)} wells (1 query)")
             
             return Response(wells_data, status=status.HTTP_200_OK)
             
@@ -184,81 +211,33 @@ class WellsByVillageView(APIView):
                     'code': 'INVALID_VILLAGE_FORMAT'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            print(f"[DEBUG] Filtering wells: {village_codes_int}, year: {year_int}")
+            response_format = data.get('format', 'rows')
+            if response_format not in WELLS_FORMATS:
+                return Response({
+                    'error': f'format must be one of {list(WELLS_FORMATS)}',
+                    'code': 'INVALID_FORMAT'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # OPTIMIZED QUERY
-            wells_query = Well.objects.filter(
-                village_code_id__in=village_codes_int,
-                YEAR=year_int
-            ).select_related(
-                'village_code'
-            ).only(
-                'id', 'village_code_id', 'Location', 'Latitude', 'Longitude', 'YEAR',
-                'DISTRICT', 'SUB_DISTRI', 'SUBDIS_COD', 'STATE', 'STATE_CODE',
-                'ph_level', 'electrical_conductivity', 'Hardness',
-                'carbonate', 'bicarbonate', 'chloride', 'fluoride',
-                'sulfate', 'nitrate', 'phosphate',
-                'calcium', 'magnesium', 'sodium', 'potassium',
-                'iron', 'arsenic', 'uranium',
-                'FID_Village', 'village'
-            )
+            print(f"[DEBUG] Filtering wells: {village_codes_int}, year: {year_int}")
             
-            wells_count = wells_query.count()
+            # Single values_list() query, cached per (villages, year); columns
+            # already carry the drain system's names and null handling
+            table = wells_table(VILLAGE, village_codes_int, year_int)
+            wells_count = table['count']
             print(f"[DEBUG] Found {wells_count} wells for drain system")
             
+            if response_format != 'rows':
+                return columnar_wells_response(
+                    VILLAGE, village_codes_int, year_int, table, response_format, data.get('include', [])
+                )
+            
             if wells_count == 0:
                 print(f"[INFO] No wells found for village codes {village_codes_int} and year {year_int}")
                 return Response([], status=status.HTTP_200_OK)
             
-            # Efficient serialization
-            wells_data = list(wells_query.values(
-                'id', 'village_code_id', 'Location', 'Latitude', 'Longitude', 'YEAR',
-                'DISTRICT', 'SUB_DISTRI', 'SUBDIS_COD', 'STATE', 'STATE_CODE',
-                'ph_level', 'electrical_conductivity', 'Hardness',
-                'carbonate', 'bicarbonate', 'chloride', 'fluoride',
-                'sulfate', 'nitrate', 'phosphate',
-                'calcium', 'magnesium', 'sodium', 'potassium',
-                'iron', 'arsenic', 'uranium',
-                'FID_Village', 'village'
-            ))
-            
-            # Transform to expected format
-            transformed_data = []
-            for well in wells_data:
-                transformed_data.append({
-                    'id': well['id'],
-                    'VILLAGE_CODE': well['village_code_id'],
-                    'LOCATION': well['Location'] or '',
-                    'LATITUDE': float(well['Latitude']) if well['Latitude'] else None,
-                    'LONGITUDE': float(well['Longitude']) if well['Longitude'] else None,
-                    'YEAR': well['YEAR'],
-                    'DISTRICT': well['DISTRICT'] or '',
-                    'SUB_DISTRICT': well['SUB_DISTRI'] or '',
-                    'SUBDIS_CODE': well['SUBDIS_COD'],
-                    'STATE': well['STATE'] or '',
-                    'STATE_CODE': well['STATE_CODE'],
-                    'PH_LEVEL': float(well['ph_level']) if well['ph_level'] is not None else None,
-                    'ELECTRICAL_CONDUCTIVITY': float(well['electrical_conductivity']) if well['electrical_conductivity'] is not None else None,
-                    'HARDNESS': float(well['Hardness']) if well['Hardness'] is not None else None,
-                    'CARBONATE': float(well['carbonate']) if well['carbonate'] is not None else None,
-                    'BICARBONATE': float(well['bicarbonate']) if well['bicarbonate'] is not None else None,
-                    'CHLORIDE': float(well['chloride']) if well['chloride'] is not None else None,
-                    'FLUORIDE': float(well['fluoride']) if well['fluoride'] is not None else None,
-                    'SULFATE': float(well['sulfate']) if well['sulfate'] is not None else None,
-                    'NITRATE': float(well['nitrate']) if well['nitrate'] is not None else None,
-                    'PHOSPHATE': float(well['phosphate']) if well['phosphate'] is not None else None,
-                    'CALCIUM': float(well['calcium']) if well['calcium'] is not None else None,
-                    'MAGNESIUM': float(well['magnesium']) if well['magnesium'] is not None else None,
-                    'SODIUM': float(well['sodium']) if well['sodium'] is not None else None,
-                    'POTASSIUM': float(well['potassium']) if well['potassium'] is not None else None,
-                    'IRON': float(well['iron']) if well['iron'] is not None else None,
-                    'ARSENIC': float(well['arsenic']) if well['arsenic'] is not None else None,
-                    'URANIUM': float(well['uranium']) if well['uranium'] is not None else None,
-                    'FID_VILLAGE': well['FID_Village'],
-                    'VILLAGE_NAME': well['village'],
-                })
+            transformed_data = to_records(table)
             
-            print(f"[SUCCESS] Returning {len(transformed_data)} groundwater quality wells (1 optimized query)")
+            print(f"[SUCCESS] Returning {len(transformed_data)} groundwater quality wells (1 query)")
             
             return Response(transformed_data, status=status.HTTP_200_OK)
             
@@ -463,13 +442,29 @@ class AvailableYearsView(APIView):
             
             print(f"[DEBUG] Available years: {available_years}")
             
-            return Response({
+            payload = {
                 'available_years': available_years,
                 'count': len(available_years),
                 'range': f'2019-{current_year}',
                 'current_year': current_year,
                 'message': f'Years from 2019 to {current_year}'
-            }, status=status.HTTP_200_OK)
+            }
+            
+            # ?subdis_cod=1,2 or ?village_codes=... also lists the years that have wells
+            subdis_cod = request.query_params.get('subdis_cod')
+            village_codes = request.query_params.get('village_codes')
+            if subdis_cod or village_codes:
+                kind = SUBDISTRICT if subdis_cod else VILLAGE
+                try:
+                    codes = [int(code) for code in (subdis_cod or village_codes).split(',') if code.strip()]
+                except ValueError:
+                    return Response({
+                        'error': 'subdis_cod and village_codes must be comma-separated integers',
+                        'code': 'INVALID_CODES_FORMAT'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                payload['years_with_data'] = years_with_data(kind, codes)
+            
+            return Response(payload, status=status.HTTP_200_OK)
             
         except Exception as e:
             logger.error(f"Error getting available years: {str(e)}", exc_info=True)
@@ -516,24 +511,28 @@ class WellStatsView(APIView):
                     'code': 'INVALID_YEAR_FORMAT'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            if subdis_cod:
-                # Admin system stats - OPTIMIZED
-                subdis_codes_int = [int(code) for code in subdis_cod]
-                total_wells = Well.objects.filter(
-                    SUBDIS_COD__in=subdis_codes_int,
-                    YEAR=year_int
-                ).count()
-            else:
-                # Drain system stats - OPTIMIZED
-                village_codes_int = [int(code) for code in village_codes]
-                total_wells = Well.objects.filter(
-                    village_code_id__in=village_codes_int,
-                    YEAR=year_int
-                ).count()
+            try:
+                if subdis_cod:
+                    # Admin system stats
+                    kind, codes = SUBDISTRICT, [int(code) for code in subdis_cod]
+                else:
+                    # Drain system stats
+                    kind, codes = VILLAGE, [int(code) for code in village_codes]
+            except (ValueError, TypeError):
+                return Response({
+                    'error': 'Invalid subdistrict or village codes format',
+                    'code': 'INVALID_CODES_FORMAT'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Count and per-parameter min/mean/max in one aggregate query (cached)
+            stats = well_stats(kind, codes, year_int)
+            total_wells = stats['total_wells']
             
             return Response({
                 'year': year_int,
                 'total_wells': total_wells,
+                'villages': stats['villages'],
+                'parameters': stats['parameters'],
                 'message': f'Found {total_wells} wells for year {year_int}'
             }, status=status.HTTP_200_OK)
             
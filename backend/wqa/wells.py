@@ -0,0 +1,158 @@
+# wqa/wells.py - Wells query layer
+#
+# One values_list() query per selection, returned as columns
+# ({column: [values]}) instead of a list of per-well dicts. Tables, SQL
+# aggregates and the years with data are cached per (selection, year) and
+# dropped when wells change (signals.py).
+
+import hashlib
+import io
+import json
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min
+
+from Basic.data_versions import bump_version, get_version
+
+from .models import Well
+
+SUBDISTRICT = 'subdistrict'
+VILLAGE = 'village'
+
+PARAMETER_FIELDS = [
+    'ph_level', 'electrical_conductivity', 'carbonate', 'bicarbonate',
+    'chloride', 'fluoride', 'sulfate', 'nitrate', 'phosphate',
+    'Hardness', 'calcium', 'magnesium', 'sodium', 'potassium',
+    'iron', 'arsenic', 'uranium',
+]
+
+# Columns of the admin (subdistrict) wells response, as before
+SUBDISTRICT_COLUMNS = [
+    'id', 'Location', 'Latitude', 'Longitude',
+    'DISTRICT', 'SUB_DISTRI', 'SUBDIS_COD', 'village_code_id', 'YEAR',
+] + PARAMETER_FIELDS
+
+# Drain (village) wells: (model field, response column)
+VILLAGE_COLUMNS = [
+    ('id', 'id'),
+    ('village_code_id', 'VILLAGE_CODE'),
+    ('Location', 'LOCATION'),
+    ('Latitude', 'LATITUDE'),
+    ('Longitude', 'LONGITUDE'),
+    ('YEAR', 'YEAR'),
+    ('DISTRICT', 'DISTRICT'),
+    ('SUB_DISTRI', 'SUB_DISTRICT'),
+    ('SUBDIS_COD', 'SUBDIS_CODE'),
+    ('STATE', 'STATE'),
+    ('STATE_CODE', 'STATE_CODE'),
+] + [(field, field.upper()) for field in PARAMETER_FIELDS] + [
+    ('FID_Village', 'FID_VILLAGE'),
+    ('village', 'VILLAGE_NAME'),
+]
+
+# Text columns sent as '' instead of null, and coordinates where 0 means missing
+_BLANK_AS_EMPTY = {'LOCATION', 'DISTRICT', 'SUB_DISTRICT', 'STATE'}
+_ZERO_AS_NULL = {'LATITUDE', 'LONGITUDE'}
+
+CACHE_TIMEOUT = 60 * 30  # 30 minutes
+VERSION_KEY = "wqa_wells_version"
+
+
+def bump_wells_version():
+    """Invalidate every cached wells table and statistic"""
+    bump_version(VERSION_KEY)
+
+
+def _cache_key(prefix, kind, codes, year=None):
+    version = get_version(VERSION_KEY)
+    payload = json.dumps([kind, sorted(codes), year])
+    return f"wqa_{prefix}_{version}_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}"
+
+
+def _cached(key, build):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def _queryset(kind, codes):
+    if kind == SUBDISTRICT:
+        return Well.objects.filter(SUBDIS_COD__in=codes)
+    return Well.objects.filter(village_code_id__in=codes)
+
+
+def _fetch_table(kind, codes, year):
+    if kind == SUBDISTRICT:
+        fields, columns = SUBDISTRICT_COLUMNS, SUBDISTRICT_COLUMNS
+    else:
+        fields = [field for field, _ in VILLAGE_COLUMNS]
+        columns = [column for _, column in VILLAGE_COLUMNS]
+
+    rows = list(_queryset(kind, codes).filter(YEAR=year).order_by('id').values_list(*fields))
+    data = {column: list(values) for column, values in zip(columns, zip(*rows))} if rows else {c: [] for c in columns}
+
+    if kind == VILLAGE:
+        for column in _BLANK_AS_EMPTY:
+            data[column] = [value or '' for value in data[column]]
+        for column in _ZERO_AS_NULL:
+            data[column] = [float(value) if value else None for value in data[column]]
+
+    return {'columns': columns, 'data': data, 'count': len(rows)}
+
+
+def wells_table(kind, codes, year):
+    """{'columns', 'data': {column: [values]}, 'count'} for the selection and year, cached"""
+    return _cached(_cache_key('table', kind, codes, year), lambda: _fetch_table(kind, codes, year))
+
+
+def well_stats(kind, codes, year):
+    """Well count, village count and min/mean/max of every parameter, in one aggregate query"""
+    def build():
+        aggregates = {'total_wells': Count('id'), 'villages': Count('village_code', distinct=True)}
+        for field in PARAMETER_FIELDS:
+            aggregates[f'{field}__min'] = Min(field)
+            aggregates[f'{field}__avg'] = Avg(field)
+            aggregates[f'{field}__max'] = Max(field)
+        row = _queryset(kind, codes).filter(YEAR=year).aggregate(**aggregates)
+        return {
+            'total_wells': row['total_wells'],
+            'villages': row['villages'],
+            'parameters': {
+                field: {
+                    'min': row[f'{field}__min'],
+                    'mean': row[f'{field}__avg'],
+                    'max': row[f'{field}__max'],
+                }
+                for field in PARAMETER_FIELDS
+            },
+        }
+    return _cached(_cache_key('stats', kind, codes, year), build)
+
+
+def years_with_data(kind, codes):
+    """Years that have wells for the selection, newest first"""
+    def build():
+        return list(
+            _queryset(kind, codes).exclude(YEAR__isnull=True)
+            .values_list('YEAR', flat=True).distinct().order_by('-YEAR')
+        )
+    return _cached(_cache_key('years', kind, codes), build)
+
+
+def to_records(table):
+    """Columnar table -> list of per-well dicts (the original response shape)"""
+    columns = table['columns']
+    return [dict(zip(columns, row)) for row in zip(*(table['data'][c] for c in columns))]
+
+
+def to_arrow(table):
+    """Columnar table -> Arrow IPC stream bytes (requires pyarrow)"""
+    import pyarrow as pa
+
+    batch = pa.table({column: table['data'][column] for column in table['columns']})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_table(batch)
+    return sink.getvalue()
@@ -41,6 +41,7 @@ from reportlab.platypus import (
 from reportlab.platypus.frames import Frame
 from celery import group, chord
 from app.conf.settings import Settings
+from app.utils.temp_registry import temp_registry
 from app.api.service.geoserver import Geoserver
 from app.conf.celery import app
 from app.api.schema.stp_schema import  StpPriorityDrainReport
@@ -1171,6 +1172,9 @@ def document_gen1(self,payload: StpPriorityDrainReport):
     try:
         progress_recorder.set_progress(1, total, description="Starting task")
         unique_folder_path=f"{Settings().TEMP_DIR}/{str(uuid.uuid4())}"
+        os.makedirs(unique_folder_path, exist_ok=True)
+        temp_registry.register(unique_folder_path, owner="celery.stp_priority_drain_document")
+        temp_registry.lease(unique_folder_path, 3600)
         table_data = [item.model_dump() for item in payload.table]
         location_data =[item for item in payload.location]
         weight_data= [["Factor", "Weight"]] + [[d.file_name, str(d.weight)] for d in payload.weight_data]
@@ -18,6 +18,9 @@ import uuid
 from app.database.config.dependency import db_dependency
 from pathlib import Path
 from app.conf.settings import Settings
+from app.utils.temp_registry import temp_registry
+from app.utils.aligned_factor_store import aligned_factor_store
+from app.utils.block_overlay import clipped_overlay, weighted_overlay
 from datetime import datetime
 import numpy as np
 import pandas as pd
@@ -91,6 +94,7 @@ class RasterProcess(VectorProcess):
         self.raster_store="stp_raster_store"
         self.config = config
         self.aligned_arrays = []
+        self.aligned_paths = []
         self.reference_profile = None
         os.makedirs(self.output_dir, exist_ok=True)
         
@@ -124,40 +128,37 @@ class RasterProcess(VectorProcess):
         norm_array = (array - min_val) / (max_val - min_val + 1e-6)
         return norm_array
     
-    def align_rasters(self, raster_paths: List[str]) -> None:            
+    def align_rasters(self, raster_paths: List[str], load: bool = True) -> None:            
         minx, _, maxx, maxy, width, height = self._calculate_common_extent(raster_paths)
         transform = from_origin(minx, maxy, 
                                self.config.target_resolution[0], 
                                self.config.target_resolution[1])
         
- 
+        # Reprojected + normalized factors are reused from the aligned-factor store
+        self.aligned_paths = []
+        self.aligned_arrays = []
+        self.reference_profile = None
         for path in tqdm(raster_paths, desc="Aligning rasters"):
-            with rasterio.open(path) as src:
-                dst_array = np.zeros((height, width), dtype=np.float32)
-                reproject(
-                    source=rasterio.band(src, 1),
-                    destination=dst_array,
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=self.config.target_crs,
-                    resampling=Resampling.bilinear
-                )
-                
-                # Normalize
-                norm_array = self._normalize_array(dst_array)
-                self.aligned_arrays.append(norm_array)
+            aligned_path = aligned_factor_store.get(
+                path, self.config.target_crs, transform, width, height,
+                resampling=Resampling.bilinear, normalize=True
+            )
+            self.aligned_paths.append(aligned_path)
+            if load:
+                with rasterio.open(aligned_path) as aligned:
+                    self.aligned_arrays.append(aligned.read(1))
                 
-                # Save reference profile from first raster
-                if self.reference_profile is None:
+            # Save reference profile from first raster
+            if self.reference_profile is None:
+                with rasterio.open(path) as src:
                     self.reference_profile = src.meta.copy()
-                    self.reference_profile.update({
-                        "crs": self.config.target_crs,
-                        "transform": transform,
-                        "width": width,
-                        "height": height,
-                        "dtype": 'float32'
-                    })
+                self.reference_profile.update({
+                    "crs": self.config.target_crs,
+                    "transform": transform,
+                    "width": width,
+                    "height": height,
+                    "dtype": 'float32'
+                })
         
     def create_weighted_overlay(self, weights: List[float], output_name: str = "weighted_overlay.tif") -> str:
         
@@ -199,17 +200,13 @@ class RasterProcess(VectorProcess):
             combined_constraint_mask = np.ones_like(weighted_sum, dtype=np.float32)
 
             for path in constraint_paths:
-                constraint_aligned = np.zeros_like(weighted_sum, dtype=np.float32)
-                with rasterio.open(path) as src:
-                    reproject(
-                        source=rasterio.band(src, 1),
-                        destination=constraint_aligned,
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=self.reference_profile['transform'],
-                        dst_crs=self.reference_profile['crs'],
-                        resampling=Resampling.nearest
-                    )
+                aligned_path = aligned_factor_store.get(
+                    path, self.reference_profile['crs'], self.reference_profile['transform'],
+                    self.reference_profile['width'], self.reference_profile['height'],
+                    resampling=Resampling.nearest, normalize=False
+                )
+                with rasterio.open(aligned_path) as aligned:
+                    constraint_aligned = aligned.read(1)
 
                 constraint_mask = np.where(constraint_aligned >= 1, 1, 0).astype("float32")
                 combined_constraint_mask *= constraint_mask
@@ -223,6 +220,38 @@ class RasterProcess(VectorProcess):
 
         return output_path, final_priority
     
+    def _aligned_constraints(self, constraint_paths: List[str] = None) -> List[str]:
+        return [
+            aligned_factor_store.get(
+                path, self.reference_profile['crs'], self.reference_profile['transform'],
+                self.reference_profile['width'], self.reference_profile['height'],
+                resampling=Resampling.nearest, normalize=False
+            )
+            for path in (constraint_paths or [])
+        ]
+
+    def streamed_overlay(self, weights: List[float], constraint_paths: List[str] = None,
+                         output_name: str = "constrained_overlay.tif"):
+        # Block-by-block weighted overlay + constraints over the aligned factors
+        constraint_aligned = self._aligned_constraints(constraint_paths)
+        output_path = os.path.join(self.config.output_path, output_name)
+        return weighted_overlay(
+            self.aligned_paths, weights, output_path, self.reference_profile,
+            constraint_paths=constraint_aligned, workers=Settings().OVERLAY_BLOCK_WORKERS
+        )
+
+    def selection_overlay(self, weights: List[float], selection: gpd.GeoDataFrame,
+                          constraint_paths: List[str] = None, output_name: str = "selection_overlay.tif"):
+        # Overlay of only the selection's pixel window, masked by the selection and the basin
+        constraint_aligned = self._aligned_constraints(constraint_paths)
+        output_path = os.path.join(self.config.output_path, output_name)
+        return clipped_overlay(
+            self.aligned_paths, weights, output_path, self.reference_profile,
+            shapes=[mapping(geom) for geom in selection.geometry],
+            constraint_paths=constraint_aligned,
+            boundary_shapes=[mapping(geom) for geom in self.get_basin().geometry]
+        )
+
     def _saveraster(self,out_image,output_path:str,out_meta:dict):
         with rasterio.open(output_path, "w", **out_meta) as dest:
             dest.write(out_image)
@@ -619,14 +648,9 @@ class GWAPriorityMapper:
     def _overlay(self,raster_path:List =None,constraintion_raster:List=None,raster_weights:List=None):
         if len(raster_path) != len(raster_weights):
             raise ValueError(f"Number of rasters ({len(raster_path)}) must match number of weights ({len(raster_weights)})")
-        self.processor.align_rasters(raster_path)
-        weighted_sum = self.processor.create_weighted_overlay(
-            raster_weights
-        )
+        self.processor.align_rasters(raster_path, load=False)
         output_name=Unique_name.unique_name_with_ext("Final_Ground_water_Potential","tif")
-        constrained_path, _ = self.processor.apply_constraint(
-            weighted_sum, output_name=output_name
-        )
+        constrained_path, _ = self.processor.streamed_overlay(raster_weights, output_name=output_name)
         final_name = Unique_name.unique_name_with_ext("Ground_water_Potential","tif")
         return constrained_path ,self.processor.clip_to_basin(constrained_path,shapefile_path=self.config.basin_shapefile , output_name=final_name)
   
@@ -666,6 +690,7 @@ class GWPumpingMapper:
             temp_path=self.Temp, 
             layer_name=raster
         )
+        temp_registry.register(self.Temp, owner="gwpz.relevance_raster")
         relevance_raster=GWPL_crud(db).get_raster_category(category="refrence",all_data=True)
         relevance_raster = [[raster.file_name,os.path.join(self.BASE_DIR, raster.file_path)] for raster in relevance_raster]
         relevance_raster.append(["Merit Score",resp["raster_path"]])
@@ -694,25 +719,15 @@ class GWPumpingMapper:
             raster_weights.append(i[1])
         return raster_path,raster_weights,constraintion_raster
     
-    def _get_overlay_raster(self,raster_path:List =None,constraintion_raster:List=None,raster_weights:List=None):
-        self.processor.align_rasters(raster_path)
-        overlay_name=Unique_name.unique_name_with_ext("overlay","tif")
-        weighted_sum = self.processor.create_weighted_overlay(
-                raster_weights, overlay_name
-            )
-        constraint_name=Unique_name.unique_name_with_ext("constraint","tif")
-        constrained_path, _ = self.processor.apply_constraints_new(
-                weighted_sum, constraint_paths=constraintion_raster, output_name=constraint_name
-            )
-        final_name = Unique_name.unique_name_with_ext("GWPZ_rasters","tif")
-        return constrained_path ,self.processor.clip_to_basin(constrained_path,shapefile_path=self.config.basin_shapefile , output_name=final_name)
-    
-    def _cliping_raster(self,final_path:str,final_name:str,payload:List):
-        vector_name=None
-        clip=payload.clip
-        final_path=self.processor.clip_to_user_villages(final_path,final_name,clip=clip,place="Drain")
-        return final_path,vector_name,clip
-    
+    def _selection_overlay_raster(self,raster_path:List,constraintion_raster:List,raster_weights:List,final_name:str,payload:List):
+        # Clip-first: overlay only the selected villages' window instead of the whole basin
+        self.processor.align_rasters(raster_path, load=False)
+        final_path,_=self.processor.selection_overlay(
+            raster_weights, self.processor.get_village(payload.clip),
+            constraint_paths=constraintion_raster, output_name=final_name
+        )
+        return final_path,payload.clip
+
     def _find_rank(self,table):
         sorted_records = sorted(
         [(i, rec["Merit Score"]) for i, rec in enumerate(table) if rec.get("Merit Score") is not None],
@@ -752,9 +767,9 @@ class GWPumpingMapper:
         
     def create_gwpz_map(self,db:db_dependency,payload:List,reverse:bool=False) -> str:
         raster_path,raster_weights,constraintion_raster=self._get_raster_with_weight(db,payload)
-        constrained_path,final_path=self._get_overlay_raster(raster_path,constraintion_raster,raster_weights)
         final_name = Unique_name.unique_name_with_ext('GWPL_raster','tif') 
-        final_path1,vector_name,clip=self._cliping_raster(final_path,final_name,payload)
+        final_path1,clip=self._selection_overlay_raster(raster_path,constraintion_raster,raster_weights,final_name,payload)
+        vector_name=None
         sld_path,sld_name=RasterProcess().processRaster(final_path1,reverse=reverse)
         unique_store_name =Unique_name.unique_name(self.config.raster_store)
         status,layer_name=geo.publish_raster(workspace_name=self.config.raster_workspace, store_name=unique_store_name, raster_path=final_path1)
@@ -827,24 +842,15 @@ class MARSuitabilityMapper:
             raster_weights.append(i[1])
         return raster_path,raster_weights,constraintion_raster
 
-    def _get_overlay_raster(self,raster_path:List =None,constraintion_raster:List=None,raster_weights:List=None):
-        self.processor.align_rasters(raster_path)
-        overlay_name=Unique_name.unique_name_with_ext("overlay","tif")
-        weighted_sum = self.processor.create_weighted_overlay(
-                raster_weights, overlay_name
-            )
-        constraint_name=Unique_name.unique_name_with_ext("constraint","tif")
-        constrained_path, _ = self.processor.apply_constraints_new(
-                weighted_sum, constraint_paths=constraintion_raster, output_name=constraint_name
-            )
-        final_name = Unique_name.unique_name_with_ext("stp_sutability","tif")
-        return constrained_path ,self.processor.clip_to_basin(constrained_path,shapefile_path=self.config.basin_shapefile , output_name=final_name)
-
-
-    def _cliping_raster(self,final_path:str,final_name:str,payload:List):
-        final_path=self.processor.clip_to_user_villages(final_path,final_name,clip=payload.clip,place="Drain")
+    def _selection_overlay_raster(self,raster_path:List,constraintion_raster:List,raster_weights:List,final_name:str,payload:List):
+        # Clip-first: overlay only the selected villages' window instead of the whole basin
+        self.processor.align_rasters(raster_path, load=False)
+        final_path,_=self.processor.selection_overlay(
+            raster_weights, self.processor.get_village(payload.clip),
+            constraint_paths=constraintion_raster, output_name=final_name
+        )
         return final_path,payload.clip
-    
+
     def get_visual_raster(self,db:db_dependency,clip:List[int]=None,place:str="Drain") -> str:
         try:
             raster_path=MARSuitability_svc.get_MAR_visual(db)
@@ -873,9 +879,8 @@ class MARSuitabilityMapper:
 
     def create_sutability_map(self,db:db_dependency,payload:List,reverse:bool=False):
         raster_path,raster_weights,constraintion_raster=self._get_raster_with_weight(db,payload)
-        constrained_path,final_path=self._get_overlay_raster(raster_path,constraintion_raster,raster_weights)
         final_name = Unique_name.unique_name_with_ext("MAR_Sutability","tif")
-        final_path1,clip=self._cliping_raster(final_path,final_name,payload)
+        final_path1,clip=self._selection_overlay_raster(raster_path,constraintion_raster,raster_weights,final_name,payload)
         sld_path,sld_name=RasterProcess().processRaster(final_path1,reverse=reverse)
         csv_path,csv_details=self.processor.clip_details(raster_path=final_path1,clip=clip,place="Admin",logic="sutability")
         unique_store_name = Unique_name.unique_name(self.config.raster_store)
@@ -21,6 +21,9 @@ from pathlib import Path
 from app.api.service.river_water_management import spt_service
 from app.database.crud.stp_crud import STP_suitability_crud
 from app.conf.settings import Settings
+from app.utils.temp_registry import temp_registry
+from app.utils.aligned_factor_store import aligned_factor_store
+from app.utils.block_overlay import clipped_overlay, weighted_overlay
 from datetime import datetime
 import zipfile
 import tempfile
@@ -36,9 +39,9 @@ from rasterio.features import rasterize
 import pandas as pd
 from rasterstats import zonal_stats
 from app.api.schema.stp_schema import STP_suitability_Area
-from scipy.ndimage import label
 from app.database.crud.stp_crud import Stp_area_crud
 from app.utils.name import Unique_name
+from app.utils.window_search import all_true_windows, cover_windows, suppress, window_means, windows_to_polygons
 
 geo=Geoserver()
 
@@ -121,6 +124,7 @@ class RasterProcess(VectorProcess):
         self.raster_store="stp_raster_store"
         self.config = config
         self.aligned_arrays = []
+        self.aligned_paths = []
         self.reference_profile = None
         os.makedirs(self.output_dir, exist_ok=True)
         
@@ -154,40 +158,37 @@ class RasterProcess(VectorProcess):
         norm_array = (array - min_val) / (max_val - min_val + 1e-6)
         return norm_array
     
-    def align_rasters(self, raster_paths: List[str]) -> None:            
+    def align_rasters(self, raster_paths: List[str], load: bool = True) -> None:            
         minx, _, maxx, maxy, width, height = self._calculate_common_extent(raster_paths)
         transform = from_origin(minx, maxy, 
                                self.config.target_resolution[0], 
                                self.config.target_resolution[1])
         
- 
+        # Reprojected + normalized factors are reused from the aligned-factor store
+        self.aligned_paths = []
+        self.aligned_arrays = []
+        self.reference_profile = None
         for path in tqdm(raster_paths, desc="Aligning rasters"):
-            with rasterio.open(path) as src:
-                dst_array = np.zeros((height, width), dtype=np.float32)
-                reproject(
-                    source=rasterio.band(src, 1),
-                    destination=dst_array,
-                    src_transform=src.transform,
-                    src_crs=src.crs,
-                    dst_transform=transform,
-                    dst_crs=self.config.target_crs,
-                    resampling=Resampling.bilinear
-                )
-                
-                # Normalize
-                norm_array = self._normalize_array(dst_array)
-                self.aligned_arrays.append(norm_array)
+            aligned_path = aligned_factor_store.get(
+                path, self.config.target_crs, transform, width, height,
+                resampling=Resampling.bilinear, normalize=True
+            )
+            self.aligned_paths.append(aligned_path)
+            if load:
+                with rasterio.open(aligned_path) as aligned:
+                    self.aligned_arrays.append(aligned.read(1))
                 
-                # Save reference profile from first raster
-                if self.reference_profile is None:
+            # Save reference profile from first raster
+            if self.reference_profile is None:
+                with rasterio.open(path) as src:
                     self.reference_profile = src.meta.copy()
-                    self.reference_profile.update({
-                        "crs": self.config.target_crs,
-                        "transform": transform,
-                        "width": width,
-                        "height": height,
-                        "dtype": 'float32'
-                    })
+                self.reference_profile.update({
+                    "crs": self.config.target_crs,
+                    "transform": transform,
+                    "width": width,
+                    "height": height,
+                    "dtype": 'float32'
+                })
         
     def create_weighted_overlay(self, weights: List[float], output_name: str = "weighted_overlay.tif") -> str:
         
@@ -246,17 +247,13 @@ class RasterProcess(VectorProcess):
             combined_constraint_mask = np.ones_like(weighted_sum, dtype=np.float32)
 
             for path in constraint_paths:
-                constraint_aligned = np.zeros_like(weighted_sum, dtype=np.float32)
-                with rasterio.open(path) as src:
-                    reproject(
-                        source=rasterio.band(src, 1),
-                        destination=constraint_aligned,
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=self.reference_profile['transform'],
-                        dst_crs=self.reference_profile['crs'],
-                        resampling=Resampling.nearest
-                    )
+                aligned_path = aligned_factor_store.get(
+                    path, self.reference_profile['crs'], self.reference_profile['transform'],
+                    self.reference_profile['width'], self.reference_profile['height'],
+                    resampling=Resampling.nearest, normalize=False
+                )
+                with rasterio.open(aligned_path) as aligned:
+                    constraint_aligned = aligned.read(1)
 
                 constraint_mask = np.where(constraint_aligned >= 1, 1, 0).astype("float32")
                 combined_constraint_mask *= constraint_mask
@@ -270,6 +267,38 @@ class RasterProcess(VectorProcess):
 
         return output_path, final_priority
     
+    def _aligned_constraints(self, constraint_paths: List[str] = None) -> List[str]:
+        return [
+            aligned_factor_store.get(
+                path, self.reference_profile['crs'], self.reference_profile['transform'],
+                self.reference_profile['width'], self.reference_profile['height'],
+                resampling=Resampling.nearest, normalize=False
+            )
+            for path in (constraint_paths or [])
+        ]
+
+    def streamed_overlay(self, weights: List[float], constraint_paths: List[str] = None,
+                         output_name: str = "constrained_overlay.tif"):
+        # Block-by-block weighted overlay + constraints over the aligned factors
+        constraint_aligned = self._aligned_constraints(constraint_paths)
+        output_path = os.path.join(self.config.output_path, output_name)
+        return weighted_overlay(
+            self.aligned_paths, weights, output_path, self.reference_profile,
+            constraint_paths=constraint_aligned, workers=Settings().OVERLAY_BLOCK_WORKERS
+        )
+
+    def selection_overlay(self, weights: List[float], selection: gpd.GeoDataFrame,
+                          constraint_paths: List[str] = None, output_name: str = "selection_overlay.tif"):
+        # Overlay of only the selection's pixel window, masked by the selection and the basin
+        constraint_aligned = self._aligned_constraints(constraint_paths)
+        output_path = os.path.join(self.config.output_path, output_name)
+        return clipped_overlay(
+            self.aligned_paths, weights, output_path, self.reference_profile,
+            shapes=[mapping(geom) for geom in selection.geometry],
+            constraint_paths=constraint_aligned,
+            boundary_shapes=[mapping(geom) for geom in self.get_basin().geometry]
+        )
+
     def _saveraster(self,out_image,output_path:str,out_meta:dict):
         with rasterio.open(output_path, "w", **out_meta) as dest:
             dest.write(out_image)
@@ -778,14 +807,9 @@ class STPPriorityMapper:
     def create_priority_map(self, raster_paths: List[str], weights: List[float],clip:List[int]=None,place:str=None) -> str:
         if len(raster_paths) != len(weights):
             raise ValueError(f"Number of rasters ({len(raster_paths)}) must match number of weights ({len(weights)})")
-        self.processor.align_rasters(raster_paths)
-        weighted_sum = self.processor.create_weighted_overlay(
-            weights
-        )
+        self.processor.align_rasters(raster_paths, load=False)
         output_name=Unique_name.unique_name_with_ext("constrained_STP_Priority","tif")
-        constrained_path, _ = self.processor.apply_constraint(
-            weighted_sum, output_name=output_name
-        )
+        constrained_path, _ = self.processor.streamed_overlay(weights, output_name=output_name)
         final_name = Unique_name.unique_name_with_ext("STP_Priority","tif")
         final_path = self.processor.clip_to_basin(
             raster_path=constrained_path,
@@ -959,30 +983,19 @@ class STPsuitabilityMapper:
         ]
         return condition_raster,constraintion_raster
     
-    def _get_overlay_raster(self,raster_path:List =None,constraintion_raster:List=None,raster_weights:List=None):
-        self.processor.align_rasters(raster_path)
-        overlay_name=Unique_name.unique_name_with_ext("overlay","tif")
-        weighted_sum = self.processor.create_weighted_overlay(
-                raster_weights, overlay_name
-            )
-        constraint_name=Unique_name.unique_name_with_ext("constraint","tif")
-        constrained_path, _ = self.processor.apply_constraints_new(
-                weighted_sum, constraint_paths=constraintion_raster, output_name=constraint_name
-            )
-        final_name = Unique_name.unique_name_with_ext("stp_suitability","tif")
-        return constrained_path ,self.processor.clip_to_basin(constrained_path,shapefile_path=self.config.basin_shapefile , output_name=final_name)
-
-    def _cliping_raster(self,final_path:str,final_name:str,payload:List):
+    def _selection_overlay_raster(self,raster_path:List,constraintion_raster:List,raster_weights:List,final_name:str,payload:List):
+        # Clip-first: overlay only the selected villages' window instead of the whole basin
         vector_name=None
         clip=payload.clip
-        if payload.place == "Drain":
-            final_path=self.processor.clip_to_user_villages(final_path,final_name,clip=clip,place=payload.place)
-        else:
+        if payload.place != "Drain":
             clip,vector_name=self._town_to_villages(clip=clip)
-            final_path=self.processor.clip_to_user_villages(final_path,final_name,clip=clip,place="Drain")
-
+        self.processor.align_rasters(raster_path, load=False)
+        final_path,_=self.processor.selection_overlay(
+            raster_weights, self.processor.get_village(clip),
+            constraint_paths=constraintion_raster, output_name=final_name
+        )
         return final_path,vector_name,clip
-    
+
     def _town_to_villages(self,clip:List):
         selected_villages =self.vector_process.get_town_village(clip)
         vector_name=self._temporory_vector(vector_temp_file=selected_villages)
@@ -1009,9 +1022,8 @@ class STPsuitabilityMapper:
     
     def create_suitability_map(self,db:db_dependency,payload:List,reverse:bool=False):
         raster_path,raster_weights,constraintion_raster=self._get_raster_with_weight(db,payload)
-        constrained_path,final_path=self._get_overlay_raster(raster_path,constraintion_raster,raster_weights)
         final_name = Unique_name.unique_name_with_ext('STP_suitability','tif') 
-        final_path1,vector_name,clip=self._cliping_raster(final_path,final_name,payload)
+        final_path1,vector_name,clip=self._selection_overlay_raster(raster_path,constraintion_raster,raster_weights,final_name,payload)
         sld_path,sld_name=RasterProcess().processRaster(final_path1,reverse=reverse)
         csv_path,csv_details=self.processor.clip_details(raster_path=final_path1,clip=clip,place="Admin",logic="suitability")
         unique_store_name =Unique_name.unique_name(self.config.raster_store)
@@ -1112,34 +1124,29 @@ class STP_Area:
         return kernel_size, pixels_needed, pixel_area
 
     def find_suitable_areas(self,reclassified, kernel_size, required_pixels, threshold_mode=True):
-        rows, cols = reclassified.shape
-        suitable_mask = np.zeros_like(reclassified, dtype=np.uint8)
-        
-        total_windows = (rows - kernel_size + 1) * (cols - kernel_size + 1)
+        # Union of every kernel_size x kernel_size window whose cells are all suitable
+        if kernel_size * kernel_size < required_pixels:
+            return np.zeros_like(reclassified, dtype=np.uint8)
+        windows = all_true_windows(reclassified == 5, kernel_size)
+        print(f"🔎 {int(windows.sum())} fully suitable {kernel_size}x{kernel_size} windows")
+        return cover_windows(windows, kernel_size, reclassified.shape)
 
-        with tqdm(total=total_windows, desc="Analyzing windows", unit="windows") as pbar:
-            for i in range(rows - kernel_size + 1):
-                for j in range(cols - kernel_size + 1):
-                    window = reclassified[i:i+kernel_size, j:j+kernel_size]
-                    
-                  
-                    if np.all(window == 5) and np.sum(window == 5) >= required_pixels:
-                        suitable_mask[i:i+kernel_size, j:j+kernel_size] = 1
-                    
-                    pbar.update(1)
-        
-        return suitable_mask
+    def find_candidate_sites(self,data, reclassified, kernel_size, transform, crs, top_n=3):
+        # Best non-overlapping fully suitable windows ranked by mean suitability
+        windows = all_true_windows(reclassified == 5, kernel_size)
+        sites = suppress(window_means(data, kernel_size), windows, kernel_size, max_sites=top_n)
+        return windows_to_polygons(sites, kernel_size, transform, crs)
 
     def extract_clusters_as_polygons(self,mask_array, transform, crs, min_area_m2=None,max_area_m2=None):
-        labeled_array, num_features = label(mask_array)
+        # 4-connected regions of the mask are exactly the polygons shapes() traces
+        mask_array = mask_array.astype(np.uint8)
         polygons, areas = [], []
-        for geom, value in shapes(labeled_array.astype(np.uint8), transform=transform):
-            if value > 0:
-                poly = shape(geom)
-                area_m2 = poly.area
-                if min_area_m2 is None or area_m2 >= min_area_m2:
-                    polygons.append(poly)
-                    areas.append(area_m2)
+        for geom, value in shapes(mask_array, mask=mask_array > 0, transform=transform):
+            poly = shape(geom)
+            area_m2 = poly.area
+            if min_area_m2 is None or area_m2 >= min_area_m2:
+                polygons.append(poly)
+                areas.append(area_m2)
         if not polygons:
             return None
         gdf = gpd.GeoDataFrame({
@@ -1187,6 +1194,7 @@ class STP_Area:
         return selected
     def stp_area_finding(self,db:db_dependency,payload:STP_suitability_Area):
         raster_path=geo.raster_download(temp_path=Settings().TEMP_DIR,layer_name=payload.layer_name)['raster_path']
+        temp_registry.register(raster_path, owner="stp.area_finding")
         MLD_CAPACITY=payload.MLD_CAPACITY
         land_per_mld=Stp_area_crud(db).get_stp_area_value(payload.TREATMENT_TECHNOLOGY).tech_value
         required_area_ha = MLD_CAPACITY * land_per_mld +(payload.CUSTOM_LAND_PER_MLD if payload.CUSTOM_LAND_PER_MLD else 0)
@@ -1204,5 +1212,8 @@ class STP_Area:
             suitable_mask, transform, crs, min_area_m2=max_area_m2,max_area_m2=max_area_m2
         )
         new_cluster=self.display_results(clusters_gdf, required_area_ha, top_n=3, tolerance_pct=20)
+        if new_cluster is None or len(new_cluster) == 0:
+            # No cluster close to the required area: offer the best sites of exactly that size
+            new_cluster = self.find_candidate_sites(data, reclassified, kernel_size, transform, crs, top_n=3)
         temp_shape_file=Settings().TEMP_DIR+"/temp.shp"
         return self.save_results(new_cluster,temp_shape_file,top_n=3)
@@ -45,6 +45,15 @@ class Settings(BaseSettings):
     #media path
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     TEMP_DIR:str = os.path.dirname(BASE_DIR)+'/temp'
+    # temp artifact registry (app/utils/temp_registry.py)
+    TEMP_ARTIFACT_BUDGET_MB:int = 5120
+    TEMP_ARTIFACT_DEFAULT_TTL_SECONDS:int = 6*3600
+    TEMP_ARTIFACT_EVICT_INTERVAL_SECONDS:int = 300
+    # aligned factor rasters (app/utils/aligned_factor_store.py), kept out of TEMP_DIR
+    ALIGNED_FACTOR_DIR:str = os.path.dirname(BASE_DIR)+'/aligned_factors'
+    ALIGNED_FACTOR_BUDGET_MB:int = 10240
+    # threads per block-streaming overlay (app/utils/block_overlay.py)
+    OVERLAY_BLOCK_WORKERS:int = 1
     subdistrict_path:str
     villages_path :str
     
@@ -0,0 +1,196 @@
+"""
+Persistent store of factor rasters aligned to a target grid.
+
+RasterProcess.align_rasters reprojected and normalized every factor on
+every STP / GWPZ / MAR request. The store materializes each
+(source file, target grid, resampling, normalization) combination once as
+a tiled, DEFLATE-compressed float32 GeoTIFF under ALIGNED_FACTOR_DIR and
+hands back its path on later requests, in any worker:
+
+  * the key is sha1(source content hash + grid + resampling + normalize),
+    so an edited source or a different grid never reuses a stale file,
+  * files are written to a temporary name and os.replace'd into place, so
+    concurrent workers at worst align the same factor twice,
+  * the source min/max (after clamping negatives to 0, as
+    _normalize_array does) are stored as GeoTIFF tags next to the data.
+
+The directory lives outside TEMP_DIR so the temp-artifact evictor leaves it
+alone. It is capped at ALIGNED_FACTOR_BUDGET_MB instead: hits bump a file's
+mtime and every new file evicts the least recently used ones over the
+budget (except those used in the last EVICT_GRACE_SECONDS); evicted
+factors are rebuilt on demand.
+Sources that are themselves per-request files in TEMP_DIR (e.g. the STP
+elevation-difference raster) are aligned next to them in TEMP_DIR and
+registered with the temp-artifact registry, so they expire with it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+
+from app.conf.settings import Settings
+from app.utils.temp_registry import temp_registry
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+HASH_CHUNK = 8 * 1024 * 1024
+EVICT_GRACE_SECONDS = 15 * 60   # factors used this recently may still be open in a request
+
+
+class AlignedFactorStore:
+    def __init__(self, root=None):
+        settings = Settings()
+        self.root = Path(root or settings.ALIGNED_FACTOR_DIR)
+        self.temp_root = Path(settings.TEMP_DIR).resolve()
+        self.budget_bytes = settings.ALIGNED_FACTOR_BUDGET_MB * 1024 * 1024
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def source_hash(self, path):
+        """Content sha1 of a source raster, memoized per (path, size, mtime)"""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(memo_key)
+        if cached:
+            return cached
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._hashes[memo_key] = digest.hexdigest()
+        return digest.hexdigest()
+
+    @staticmethod
+    def grid_definition(crs, transform, width, height):
+        return {"crs": str(crs), "transform": list(transform)[:6], "width": int(width), "height": int(height)}
+
+    def _key(self, path, grid, resampling, normalize):
+        spec = json.dumps({
+            "source": self.source_hash(path),
+            "grid": grid,
+            "resampling": Resampling(resampling).name,
+            "normalize": bool(normalize),
+        }, sort_keys=True)
+        return hashlib.sha1(spec.encode()).hexdigest()
+
+    def get(self, path, crs, transform, width, height,
+            resampling=Resampling.bilinear, normalize=True) -> str:
+        """Path of the aligned factor, building it on first use"""
+        grid = self.grid_definition(crs, transform, width, height)
+        temporary_source = self.temp_root in Path(path).resolve().parents
+        root = self.temp_root if temporary_source else self.root
+        target = root / f"{self._key(path, grid, resampling, normalize)}.tif"
+        if target.exists():
+            if not temporary_source:
+                self._touch(target)
+            return str(target)
+
+        root.mkdir(parents=True, exist_ok=True)
+        array = np.zeros((height, width), dtype=np.float32)
+        with rasterio.open(path) as src:
+            reproject(
+                source=rasterio.band(src, 1),
+                destination=array,
+                src_transform=src.transform,
+                src_crs=src.crs,
+                dst_transform=transform,
+                dst_crs=crs,
+                resampling=resampling,
+            )
+
+        tags = {"SOURCE": os.path.basename(path), "NORMALIZED": str(bool(normalize))}
+        if normalize:
+            # Same normalization as RasterProcess._normalize_array
+            array[array < 0] = 0
+            min_val, max_val = float(np.nanmin(array)), float(np.nanmax(array))
+            array = (array - min_val) / (max_val - min_val + 1e-6)
+            tags.update(SOURCE_MIN=repr(min_val), SOURCE_MAX=repr(max_val))
+
+        profile = {
+            "driver": "GTiff",
+            "dtype": "float32",
+            "count": 1,
+            "width": width,
+            "height": height,
+            "crs": crs,
+            "transform": transform,
+            "tiled": True,
+            "blockxsize": TILE_SIZE,
+            "blockysize": TILE_SIZE,
+            "compress": "deflate",
+            "predictor": 3,
+        }
+        partial = target.with_name(f"{target.stem}.{uuid.uuid4().hex}.partial.tif")
+        try:
+            with rasterio.open(partial, "w", **profile) as dst:
+                dst.write(array.astype(np.float32), 1)
+                dst.update_tags(**tags)
+            os.replace(partial, target)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        if temporary_source:
+            temp_registry.register(target, owner="aligned_factor_store")
+        else:
+            self._enforce_budget(keep=target)
+        print(f"🧱 Aligned factor cached: {os.path.basename(path)} -> {target.name}")
+        return str(target)
+
+    @staticmethod
+    def _touch(target):
+        try:
+            os.utime(target)
+        except OSError:
+            pass
+
+    def _enforce_budget(self, keep):
+        """Delete least recently used factors until the directory fits the budget"""
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".tif") or entry.name.endswith(".partial.tif"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        recent = time.time() - EVICT_GRACE_SECONDS
+        for mtime, size, path in sorted(entries):
+            if total <= self.budget_bytes or mtime >= recent:
+                break
+            if path == str(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.info("Evicted aligned factor %s", os.path.basename(path))
+
+    @staticmethod
+    def stats(aligned_path):
+        """{"min", "max"} of the source before normalization (None when not normalized)"""
+        with rasterio.open(aligned_path) as src:
+            tags = src.tags()
+        if "SOURCE_MIN" not in tags:
+            return None
+        return {"min": float(tags["SOURCE_MIN"]), "max": float(tags["SOURCE_MAX"])}
+
+
+# Global instance
+aligned_factor_store = AlignedFactorStore()
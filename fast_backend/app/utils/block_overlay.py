@@ -0,0 +1,230 @@
+"""
+Block-streaming weighted overlay over aligned factor rasters.
+
+create_weighted_overlay / apply_constraints_new held every full-extent
+factor and constraint array in memory at once. The overlay here walks the
+aligned rasters (app/utils/aligned_factor_store.py, tiled 256 x 256) block
+by block:
+
+  1. weighted sum of the normalized factor blocks (NaN -> NODATA),
+  2. times the constraint masks (cells where every constraint >= 1),
+  3. written straight into a tiled output GeoTIFF,
+  4. folded into running statistics (count, min, max, sum, histogram)
+     for classification.
+
+The result matches the in-memory path cell for cell. Peak memory is one
+block per open raster. Blocks can be processed by a thread pool; every
+thread opens its own dataset handles and writes are serialized.
+
+clipped_overlay evaluates only the pixel window of a selection (villages,
+drain catchment) and masks it by the rasterized selection and an optional
+outer boundary (the basin) before writing, which is the same raster the
+full overlay followed by clip_to_basin / clip_to_user_villages produced.
+Normalization was done on the full grid by the aligned-factor store, so
+values do not depend on the window.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.features import geometry_mask
+from rasterio.mask import raster_geometry_mask
+from rasterio.windows import Window
+
+NODATA = -9999.0
+HISTOGRAM_BINS = 256
+
+
+class OverlayStats:
+    """Running count / min / max / sum and a fixed-range histogram of valid cells"""
+
+    def __init__(self, low, high, bins=HISTOGRAM_BINS):
+        self.edges = np.linspace(low, high if high > low else low + 1.0, bins + 1)
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, block, inside=None):
+        keep = np.isfinite(block) & (block != NODATA)
+        if inside is not None:
+            keep &= inside
+        valid = block[keep]
+        if not valid.size:
+            return
+        self.count += int(valid.size)
+        self.total += float(valid.sum(dtype=np.float64))
+        low, high = float(valid.min()), float(valid.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        # Values outside the expected range land in the edge bins
+        clipped = np.clip(valid, self.edges[0], self.edges[-1])
+        self.histogram += np.histogram(clipped, bins=self.edges)[0]
+
+    def quantile_breaks(self, num_classes):
+        """Approximate equal-count class breaks from the histogram"""
+        if not self.count:
+            return []
+        cumulative = np.cumsum(self.histogram) / self.count
+        targets = np.linspace(0, 1, num_classes + 1)[1:-1]
+        inner = np.interp(targets, cumulative, self.edges[1:]).tolist()
+        return [self.min] + inner + [self.max]
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "histogram": self.histogram.tolist(),
+            "bin_edges": self.edges.tolist(),
+        }
+
+
+def _block_windows(path):
+    with rasterio.open(path) as src:
+        return [window for _, window in src.block_windows(1)]
+
+
+def _output_profile(profile):
+    out_profile = profile.copy()
+    out_profile.update({
+        "driver": "GTiff",
+        "dtype": "float32",
+        "count": 1,
+        "tiled": True,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "compress": "deflate",
+        "predictor": 3,
+    })
+    return out_profile
+
+
+def _weight_range(weights):
+    """Overlay value range of factors normalized to [0, 1]"""
+    return sum(w for w in weights if w < 0), sum(w for w in weights if w > 0)
+
+
+def _overlay_block(factors, constraints, weights, window):
+    """Weighted sum of one block (NaN -> NODATA) times the constraint masks"""
+    block = factors[0].read(1, window=window).astype(np.float32) * weights[0]
+    for src, weight in zip(factors[1:], weights[1:]):
+        block += src.read(1, window=window) * weight
+    block = np.nan_to_num(block, nan=NODATA)
+    if constraints:
+        keep = np.ones(block.shape, dtype=np.float32)
+        for src in constraints:
+            keep *= (src.read(1, window=window) >= 1)
+        block = keep * block
+    return block.astype(np.float32)
+
+
+def weighted_overlay(factor_paths, weights, output_path, profile,
+                     constraint_paths=None, workers=None):
+    """
+    Stream the weighted overlay of aligned factor rasters (same grid) into
+    output_path. Returns (output_path, OverlayStats).
+    """
+    if len(weights) != len(factor_paths):
+        raise ValueError(f"Number of weights ({len(weights)}) must match number of rasters ({len(factor_paths)})")
+    constraint_paths = constraint_paths or []
+    weights = [float(w) for w in weights]
+
+    out_profile = _output_profile(profile)
+    stats = OverlayStats(*_weight_range(weights))
+
+    local = threading.local()
+    write_lock = threading.Lock()
+
+    def handles():
+        if not hasattr(local, "factors"):
+            local.factors = [rasterio.open(p) for p in factor_paths]
+            local.constraints = [rasterio.open(p) for p in constraint_paths]
+            opened.append(local)
+        return local.factors, local.constraints
+
+    opened = []
+    windows = _block_windows(factor_paths[0])
+
+    with rasterio.open(output_path, "w", **out_profile) as dst:
+
+        def process(window):
+            factors, constraints = handles()
+            block = _overlay_block(factors, constraints, weights, window)
+            with write_lock:
+                dst.write(block, 1, window=window)
+            return block
+
+        try:
+            if workers and workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    for block in pool.map(process, windows):
+                        stats.add(block)
+            else:
+                for window in windows:
+                    stats.add(process(window))
+        finally:
+            for handle in opened:
+                for src in handle.factors + handle.constraints:
+                    src.close()
+
+        dst.update_tags(**{
+            "OVERLAY_MIN": repr(stats.min), "OVERLAY_MAX": repr(stats.max), "OVERLAY_COUNT": str(stats.count),
+        })
+
+    print(f"🧮 Block overlay: {len(windows)} blocks x {len(factor_paths)} factors -> {output_path}")
+    return output_path, stats
+
+
+def clipped_overlay(factor_paths, weights, output_path, profile, shapes,
+                    constraint_paths=None, boundary_shapes=None, block_size=256):
+    """
+    Weighted overlay of only the selection window, cells outside `shapes`
+    (or outside `boundary_shapes`) set to the nodata value (0 when the
+    profile has none), like rasterio.mask. Returns (output_path, OverlayStats).
+    """
+    if len(weights) != len(factor_paths):
+        raise ValueError(f"Number of weights ({len(weights)}) must match number of rasters ({len(factor_paths)})")
+    weights = [float(w) for w in weights]
+    fill = profile.get("nodata")
+    fill = 0 if fill is None else fill
+
+    factors = [rasterio.open(p) for p in factor_paths]
+    constraints = [rasterio.open(p) for p in (constraint_paths or [])]
+    try:
+        # Same window and pixel test as rasterio.mask.mask(crop=True)
+        outside, window_transform, window = raster_geometry_mask(factors[0], shapes, crop=True)
+        if boundary_shapes is not None:
+            outside |= geometry_mask(boundary_shapes, out_shape=outside.shape, transform=window_transform)
+        height, width = outside.shape
+
+        out_profile = _output_profile(profile)
+        out_profile.update({"height": height, "width": width, "transform": window_transform})
+        stats = OverlayStats(*_weight_range(weights))
+
+        with rasterio.open(output_path, "w", **out_profile) as dst:
+            for row in range(0, height, block_size):
+                for col in range(0, width, block_size):
+                    local = Window(col, row, min(block_size, width - col), min(block_size, height - row))
+                    source = Window(window.col_off + col, window.row_off + row, local.width, local.height)
+                    block_outside = outside[row:row + local.height, col:col + local.width]
+                    if block_outside.all():
+                        block = np.full(block_outside.shape, fill, dtype=np.float32)
+                    else:
+                        block = _overlay_block(factors, constraints, weights, source)
+                        block[block_outside] = fill
+                        stats.add(block, inside=~block_outside)
+                    dst.write(block, 1, window=local)
+            dst.update_tags(**{
+                "OVERLAY_MIN": repr(stats.min), "OVERLAY_MAX": repr(stats.max), "OVERLAY_COUNT": str(stats.count),
+            })
+    finally:
+        for src in factors + constraints:
+            src.close()
+
+    print(f"✂️ Clip-first overlay: {width}x{height} window of {profile['width']}x{profile['height']} -> {output_path}")
+    return output_path, stats
@@ -0,0 +1,340 @@
+"""
+Temp-artifact registry with a size-bounded LRU evictor for TEMP_DIR.
+
+Same design as backend/main/temp_artifacts.py: the STP/GWPZ flows and the
+celery report tasks register the folders and rasters they drop into
+TEMP_DIR with an owner and a TTL. A background thread in each worker
+process periodically:
+
+  1. adopts untracked entries in the managed directories (mtime = last access),
+  2. refreshes sizes and forgets entries that disappeared,
+  3. deletes expired entries,
+  4. deletes least-recently-used entries until the total fits the budget.
+
+Entries that are in use (pinned with a reference count and an unexpired
+lease) are never deleted. State lives in a SQLite (WAL) database inside
+TEMP_DIR so all gunicorn/celery workers share one view.
+
+This is a copy of backend/main/temp_artifacts.py with only the settings
+and managed directories changed; the two services deploy separately and
+share no package, so a fix to one belongs in the other too.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.conf.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def _entry_size(path):
+    """Size in bytes of a file or a whole directory tree (0 if missing)"""
+    try:
+        if path.is_file():
+            return path.stat().st_size
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+        return total
+    except OSError:
+        return 0
+
+
+class TempArtifactRegistry:
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        settings = Settings()
+        self.temp_root = Path(settings.TEMP_DIR).resolve()
+        self.managed_roots = [self.temp_root, self.temp_root / 'documents']
+        self.db_path = self.temp_root / '.artifacts.sqlite3'
+
+        self.budget_bytes = settings.TEMP_ARTIFACT_BUDGET_MB * 1024 * 1024
+        self.default_ttl_seconds = settings.TEMP_ARTIFACT_DEFAULT_TTL_SECONDS
+        self.evict_interval_seconds = settings.TEMP_ARTIFACT_EVICT_INTERVAL_SECONDS
+
+        self._local = threading.local()
+        self._evictor = None
+
+        self.temp_root.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+        self._initialized = True
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                path TEXT PRIMARY KEY,
+                owner TEXT,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_expires_at ON artifacts (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts (last_access)")
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _key(path):
+        return str(Path(path).resolve())
+
+    # ------------------------------------------------------------------
+    # Producer / consumer API
+    # ------------------------------------------------------------------
+    def register(self, path, owner=None, ttl_seconds=None, size=None):
+        """Register (or refresh) a file or directory produced under TEMP_DIR"""
+        path = Path(path)
+        now = time.time()
+        ttl = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+        if size is None:
+            size = _entry_size(path)
+
+        try:
+            self._connect().execute("""
+                INSERT INTO artifacts (path, owner, size, created_at, last_access, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    owner = excluded.owner,
+                    size = excluded.size,
+                    last_access = excluded.last_access,
+                    expires_at = excluded.expires_at
+            """, (self._key(path), owner, int(size), now, now, now + ttl))
+        except Exception as e:
+            logger.error(f"Failed to register temp artifact {path}: {e}")
+
+        self.start_evictor()
+        return path
+
+    def touch(self, path):
+        """Mark an artifact as recently used (moves it to the back of the LRU)"""
+        try:
+            self._connect().execute(
+                "UPDATE artifacts SET last_access = ? WHERE path = ?", (time.time(), self._key(path))
+            )
+        except Exception as e:
+            logger.error(f"Failed to touch temp artifact {path}: {e}")
+
+    def extend(self, path, ttl_seconds):
+        """Push an artifact's expiry ttl_seconds into the future"""
+        self._connect().execute(
+            "UPDATE artifacts SET expires_at = ? WHERE path = ?", (time.time() + ttl_seconds, self._key(path))
+        )
+
+    def pin(self, path, lease_seconds=3600):
+        """Protect an artifact from eviction; the lease bounds leaks from crashed workers"""
+        now = time.time()
+        try:
+            self._connect().execute("""
+                UPDATE artifacts SET refs = refs + 1, last_access = ?, lease_until = MAX(lease_until, ?)
+                WHERE path = ?
+            """, (now, now + lease_seconds, self._key(path)))
+        except Exception as e:
+            logger.error(f"Failed to pin temp artifact {path}: {e}")
+
+    def lease(self, path, lease_seconds):
+        """Hold an artifact for a fixed time without a matching unpin (e.g. a live session)"""
+        now = time.time()
+        self._connect().execute("""
+            UPDATE artifacts SET refs = MAX(refs, 1), last_access = ?, lease_until = MAX(lease_until, ?)
+            WHERE path = ?
+        """, (now, now + lease_seconds, self._key(path)))
+
+    def unpin(self, path):
+        try:
+            self._connect().execute(
+                "UPDATE artifacts SET refs = MAX(refs - 1, 0) WHERE path = ?", (self._key(path),)
+            )
+        except Exception as e:
+            logger.error(f"Failed to unpin temp artifact {path}: {e}")
+
+    @contextmanager
+    def in_use(self, path, lease_seconds=3600):
+        """with temp_registry.in_use(path): ... -- artifact cannot be evicted inside the block"""
+        self.pin(path, lease_seconds)
+        try:
+            yield Path(path)
+        finally:
+            self.unpin(path)
+
+    def forget(self, path):
+        """Drop the registry entry for an artifact its owner already deleted"""
+        self._connect().execute("DELETE FROM artifacts WHERE path = ?", (self._key(path),))
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+    def _adopt_untracked(self, conn, now):
+        """Register entries in the managed roots that no producer registered"""
+        known = {row['path'] for row in conn.execute("SELECT path FROM artifacts")}
+        skip = {str(root) for root in self.managed_roots}
+        rows = []
+        for root in self.managed_roots:
+            if not root.exists():
+                continue
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    # Skip hidden files and SQLite stores (this db)
+                    if entry.name.startswith('.') or '.sqlite3' in entry.name:
+                        continue
+                    key = self._key(entry.path)
+                    if key in known or key in skip:
+                        continue
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                    except OSError:
+                        continue
+                    rows.append((key, 'untracked', _entry_size(Path(entry.path)), mtime, mtime,
+                                 mtime + self.default_ttl_seconds))
+        if rows:
+            conn.executemany("""
+                INSERT OR IGNORE INTO artifacts (path, owner, size, created_at, last_access, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def _remove(self, path):
+        path = Path(path)
+        try:
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        except Exception as e:
+            logger.error(f"Failed to evict temp artifact {path}: {e}")
+
+    def evict(self, budget_bytes=None):
+        """One eviction pass: expired entries first, then LRU down to the budget"""
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        now = time.time()
+        conn = self._connect()
+
+        adopted = self._adopt_untracked(conn, now)
+
+        # Refresh sizes (directories such as GWQI sessions grow after registration)
+        sizes, missing = [], []
+        for row in conn.execute("SELECT path FROM artifacts").fetchall():
+            path = Path(row['path'])
+            if not path.exists():
+                missing.append((row['path'],))
+            else:
+                sizes.append((_entry_size(path), row['path']))
+
+        with self._transaction() as tx:
+            tx.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+            tx.executemany("UPDATE artifacts SET size = ? WHERE path = ?", sizes)
+
+            evictable = "NOT (refs > 0 AND lease_until > ?)"
+            victims = [r['path'] for r in tx.execute(
+                f"SELECT path FROM artifacts WHERE expires_at < ? AND {evictable}", (now, now)
+            )]
+            tx.executemany("DELETE FROM artifacts WHERE path = ?", [(p,) for p in victims])
+            expired_count = len(victims)
+
+            total = tx.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total > budget:
+                for row in tx.execute(
+                    f"SELECT path, size FROM artifacts WHERE {evictable} ORDER BY last_access",
+                    (now,)
+                ).fetchall():
+                    if total <= budget:
+                        break
+                    victims.append(row['path'])
+                    total -= row['size']
+                tx.executemany("DELETE FROM artifacts WHERE path = ?", [(p,) for p in victims[expired_count:]])
+
+        for path in victims:
+            self._remove(path)
+
+        stats = {
+            'adopted': adopted,
+            'forgotten_missing': len(missing),
+            'evicted_expired': expired_count,
+            'evicted_lru': len(victims) - expired_count,
+            'total_bytes': int(total),
+            'budget_bytes': int(budget),
+        }
+        if victims:
+            logger.info(f"Temp artifact eviction: {stats}")
+        return stats
+
+    def _evict_loop(self):
+        while True:
+            time.sleep(self.evict_interval_seconds)
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Temp artifact eviction failed: {e}")
+
+    def start_evictor(self):
+        """Start the background evictor thread for this process (idempotent)"""
+        if self._evictor is not None and self._evictor.is_alive():
+            return
+        with self._lock:
+            if self._evictor is not None and self._evictor.is_alive():
+                return
+            self._evictor = threading.Thread(target=self._evict_loop, name='temp-artifact-evictor', daemon=True)
+            self._evictor.start()
+
+    def get_stats(self):
+        row = self._connect().execute("""
+            SELECT COUNT(*) AS artifacts, COALESCE(SUM(size), 0) AS total_bytes,
+                   COALESCE(SUM(CASE WHEN refs > 0 AND lease_until > ? THEN 1 ELSE 0 END), 0) AS in_use
+            FROM artifacts
+        """, (time.time(),)).fetchone()
+        return {**dict(row), 'budget_bytes': self.budget_bytes}
+
+
+# Global instance
+temp_registry = TempArtifactRegistry()
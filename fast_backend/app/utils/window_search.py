@@ -0,0 +1,110 @@
+"""
+Sliding-window search over rasters with summed-area tables.
+
+Every k x k window of a raster is answered in O(pixels) total instead of
+O(pixels * k^2):
+
+  * window_sums: sum of each window from one summed-area table
+    (4 lookups per window),
+  * all_true_windows: windows where every cell is set (sum == k * k),
+  * window_means: NaN-aware mean of each window,
+  * cover_windows: union of the selected windows, i.e. the binary
+    opening of the mask by a k x k square, from a second table,
+  * suppress: greedy non-maximum suppression of overlapping windows,
+  * windows_to_polygons: selected windows as square polygons in one pass.
+
+Window arrays are indexed by the top-left cell, shape (rows - k + 1, cols - k + 1).
+"""
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+
+
+def summed_area_table(array: np.ndarray) -> np.ndarray:
+    """(rows + 1, cols + 1) table with a zero first row/column; float64 or int64 sums"""
+    dtype = np.int64 if array.dtype.kind in "bui" else np.float64
+    table = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=dtype)
+    np.cumsum(array, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def window_sums(array: np.ndarray, k: int) -> np.ndarray:
+    """Sum of every k x k window (empty if the raster is smaller than k)"""
+    rows, cols = array.shape
+    if k < 1 or k > rows or k > cols:
+        return np.zeros((max(rows - k + 1, 0), max(cols - k + 1, 0)), dtype=np.int64)
+    table = summed_area_table(array)
+    return table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]
+
+
+def all_true_windows(mask: np.ndarray, k: int) -> np.ndarray:
+    """Boolean window array: True where all k * k cells of the window are set"""
+    return window_sums(mask.astype(np.uint8), k) == k * k
+
+
+def window_means(values: np.ndarray, k: int) -> np.ndarray:
+    """Mean of the finite cells of every window (NaN where a window has none)"""
+    valid = np.isfinite(values)
+    sums = window_sums(np.where(valid, values, 0.0), k)
+    counts = window_sums(valid.astype(np.uint8), k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def cover_windows(windows: np.ndarray, k: int, shape: tuple) -> np.ndarray:
+    """uint8 mask of the cells covered by at least one selected window"""
+    rows, cols = shape
+    anchors = np.zeros((rows, cols), dtype=np.uint8)
+    anchors[:windows.shape[0], :windows.shape[1]] = windows
+    # Cell (r, c) is covered if any anchor lies in [r-k+1..r] x [c-k+1..c]
+    padded = np.zeros((rows + k - 1, cols + k - 1), dtype=np.uint8)
+    padded[k - 1:, k - 1:] = anchors
+    return (window_sums(padded, k) > 0).astype(np.uint8)
+
+
+def suppress(scores: np.ndarray, candidates: np.ndarray, k: int, max_sites: int = None) -> list:
+    """
+    Greedy non-maximum suppression: best-scoring candidate windows first,
+    dropping every window that overlaps one already kept.
+    Returns [(row, col, score)] in score order.
+    """
+    rows, cols = np.nonzero(candidates & np.isfinite(scores))
+    if not rows.size:
+        return []
+    order = np.argsort(-scores[rows, cols], kind="stable")
+    blocked = np.zeros(candidates.shape, dtype=bool)
+    sites = []
+    for idx in order:
+        r, c = rows[idx], cols[idx]
+        if blocked[r, c]:
+            continue
+        sites.append((int(r), int(c), float(scores[r, c])))
+        if max_sites and len(sites) >= max_sites:
+            break
+        blocked[max(r - k + 1, 0):r + k, max(c - k + 1, 0):c + k] = True
+    return sites
+
+
+def windows_to_polygons(sites: list, k: int, transform, crs) -> gpd.GeoDataFrame:
+    """[(row, col, score)] k x k windows -> square polygons (north-up transform)"""
+    if not sites:
+        return None
+    rows = np.array([s[0] for s in sites], dtype=np.float64)
+    cols = np.array([s[1] for s in sites], dtype=np.float64)
+    a, b, c, d, e, f = transform.a, transform.b, transform.c, transform.d, transform.e, transform.f
+    x0, y0 = c + cols * a + rows * b, f + cols * d + rows * e
+    x1, y1 = c + (cols + k) * a + (rows + k) * b, f + (cols + k) * d + (rows + k) * e
+    geometries = [
+        box(min(xa, xb), min(ya, yb), max(xa, xb), max(ya, yb))
+        for xa, xb, ya, yb in zip(x0, x1, y0, y1)
+    ]
+    areas = np.array([g.area for g in geometries])
+    return gpd.GeoDataFrame({
+        "cluster_id": range(1, len(sites) + 1),
+        "area_m2": areas,
+        "area_ha": areas / 10000,
+        "mean_suitability": [s[2] for s in sites],
+        "geometry": geometries,
+    }, crs=crs)
@@ -0,0 +1,115 @@
+"""
+Benchmark: full-extent overlay + clip versus clip-first overlay.
+
+Builds synthetic aligned factor rasters (tiled like the aligned-factor
+store) and times, for small / medium / full selections:
+
+  full:       weighted_overlay over the whole grid, then rasterio.mask
+              crop to the basin and to the selection (the old pipeline)
+  clip-first: clipped_overlay over the selection window only
+
+and reports wall time, peak traced memory and the largest difference.
+
+    cd fast_backend && python -m script.bench_clip_overlay --size 4000 --factors 6
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import rasterio
+from rasterio.mask import mask
+from rasterio.transform import from_origin
+from shapely.geometry import box, mapping
+
+from app.utils.block_overlay import clipped_overlay, weighted_overlay
+
+
+def _write_factors(folder, size, count, rng):
+    transform = from_origin(500000, 3500000, 30, 30)
+    profile = {
+        "driver": "GTiff", "dtype": "float32", "count": 1, "width": size, "height": size,
+        "crs": "EPSG:32644", "transform": transform, "nodata": None,
+        "tiled": True, "blockxsize": 256, "blockysize": 256, "compress": "deflate", "predictor": 3,
+    }
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"factor_{i}.tif")
+        with rasterio.open(path, "w", **profile) as dst:
+            for _, window in dst.block_windows(1):
+                dst.write(rng.random((window.height, window.width), dtype=np.float32), 1, window=window)
+        paths.append(path)
+    return paths, profile
+
+
+def _square(profile, fraction):
+    """Square selection covering `fraction` of the grid area, centred"""
+    t, size = profile["transform"], profile["width"]
+    side = size * np.sqrt(fraction) * t.a
+    cx, cy = t.c + size * t.a / 2, t.f - size * t.a / 2
+    return box(cx - side / 2, cy - side / 2, cx + side / 2, cy + side / 2)
+
+
+def _measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=4000, help="Grid width and height in pixels")
+    parser.add_argument("--factors", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    weights = list(rng.dirichlet(np.ones(args.factors)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths, profile = _write_factors(folder, args.size, args.factors, rng)
+        basin = [mapping(_square(profile, 0.9))]
+        print(f"{args.factors} factors on a {args.size}x{args.size} grid")
+
+        for name, fraction in (("small", 0.01), ("medium", 0.1), ("full", 0.9)):
+            selection = [mapping(_square(profile, fraction))]
+
+            def full_path():
+                overlay, _ = weighted_overlay(paths, weights, os.path.join(folder, "overlay.tif"), profile)
+                with rasterio.open(overlay) as src:
+                    image, basin_transform = mask(src, basin, crop=True)
+                    meta = src.meta.copy()
+                meta.update(height=image.shape[1], width=image.shape[2], transform=basin_transform)
+                with rasterio.open(os.path.join(folder, "basin.tif"), "w", **meta) as dst:
+                    dst.write(image)
+                with rasterio.open(os.path.join(folder, "basin.tif")) as src:
+                    return mask(src, selection, crop=True)[0][0]
+
+            def clip_first():
+                output, _ = clipped_overlay(
+                    paths, weights, os.path.join(folder, "clipped.tif"), profile,
+                    shapes=selection, boundary_shapes=basin,
+                )
+                with rasterio.open(output) as src:
+                    return src.read(1)
+
+            full_s, full_peak, full_result = _measure(full_path)
+            clip_s, clip_peak, clip_result = _measure(clip_first)
+            same_shape = full_result.shape == clip_result.shape
+            diff = float(np.abs(full_result - clip_result).max()) if same_shape else float("nan")
+            print(
+                f"{name:<7} full {full_s:7.2f}s {full_peak / 2**20:8.1f} MiB   "
+                f"clip-first {clip_s:7.2f}s {clip_peak / 2**20:8.1f} MiB   "
+                f"({full_s / max(clip_s, 1e-9):5.1f}x)   shape match {same_shape}, max |difference| {diff:.3e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # app/api/v1/recharge_api.py
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field, field_validator
 
@@ -16,6 +16,11 @@ class RechargeRequest(BaseModel):
     selectedSubDistricts: Optional[List[int]] = None
 
 
+class RechargeBatchRequest(RechargeRequest):
+    # Years (2015) or explicit [pre_column, post_column] / {"pre": ..., "post": ...} pairs
+    yearPairs: List[Union[int, str, List[str], Dict[str, str]]]
+
+
 
 # ==============================
 # POST /recharge
@@ -38,3 +43,29 @@ async def groundwater_recharge_analysis(payload: RechargeRequest):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+
+# ==============================
+# POST /recharge2/batch
+# ==============================
+@router.post("/recharge2/batch")
+async def groundwater_recharge_batch_analysis(payload: RechargeBatchRequest):
+    service = RechargeService(media_root="media")
+    try:
+        selected_villages = None
+        if payload.selectedVillages:
+            selected_villages = [str(v) for v in payload.selectedVillages]
+
+        return service.analyze_batch(
+            csv_filename=payload.csvFilename,
+            year_pairs=payload.yearPairs,
+            selected_villages=selected_villages,
+            selected_subdistricts=payload.selectedSubDistricts
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from app.services.stress_identification_service import StressIdentificationService
 
@@ -11,7 +11,8 @@ service = StressIdentificationService()
 
 class StressRequest(BaseModel):
     gsrData: List[Dict[str, Any]]
-    years_count: int
+    years_count: Optional[int] = None
+    years_counts: Optional[List[int]] = None
     selectedSubDistricts: List[Any] = []
     timestamp: str | None = None
 
@@ -19,12 +20,21 @@ class StressRequest(BaseModel):
 @router.post("/stress")
 def compute_stress(request: StressRequest):
     try:
+        if request.years_counts is not None:
+            return service.compute_stress_batch(
+                gsr_data=request.gsrData,
+                years_counts=request.years_counts,
+            )
+        if request.years_count is None:
+            raise HTTPException(status_code=400, detail="years_count or years_counts is required")
         response = service.compute_stress(
             gsr_data=request.gsrData,
             years_count=request.years_count,
         )
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
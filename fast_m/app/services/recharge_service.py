@@ -1,5 +1,6 @@
 # app/services/recharge_service.py
 import os
+import re
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -7,49 +8,30 @@ import rasterio
 from rasterio.transform import from_origin
 from rasterio.crs import CRS
 from rasterio.mask import mask
+from rasterio.features import geometry_mask
 from scipy.spatial import cKDTree
-from rasterstats import zonal_stats
 from shapely.geometry import Point
 from shapely.ops import unary_union
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Tuple
-import multiprocessing
+
+from app.services.zonal_service import zonal_stats_array, zonal_stats_raster, zonal_records
 
 
 # ------------------------------------------
-# Helper: Ultra-fast parallel zonal stats
+# Helper: Label-raster zonal stats
 # ------------------------------------------
 def fast_zonal_stats(
     geometries: List,
     raster_path: str,
-    stats_list: List[str],
+    stats_list: Optional[List[str]] = None,
     nodata: float = -9999,
-    chunk_size: int = 100
+    all_touched: bool = True
 ) -> List[Dict]:
-    def process_chunk(start_idx: int):
-        end_idx = min(start_idx + chunk_size, len(geometries))
-        chunk_geoms = geometries[start_idx:end_idx]
-        return zonal_stats(
-            chunk_geoms,
-            raster_path,
-            stats=stats_list,
-            nodata=nodata,
-            all_touched=True
-        )
-
-    max_workers = min(multiprocessing.cpu_count(), 8)
-    results = []
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(process_chunk, i)
-            for i in range(0, len(geometries), chunk_size)
-        ]
-        for future in futures:
-            results.extend(future.result())
-
-    return results
+    """All villages from one label raster over the union window (see zonal_service)"""
+    return zonal_records(
+        zonal_stats_raster(raster_path, geometries, nodata=nodata, all_touched=all_touched)
+    )
 
 
 # --------------------------------------
@@ -127,6 +109,185 @@ def interpolate_for_villages(
     return grid, bounds, width, height, transform, None
 
 
+# --------------------------------------
+# Helper: Multi-year batch IDW + zonal
+# --------------------------------------
+# Extra neighbour candidates per grid cell so every year can still find
+# n_neighbors valid wells when some wells are missing that year
+CANDIDATE_FACTOR = 4
+# Fewer wells than this within the 5 km buffer: use every well (both flows)
+BUFFER_MIN_WELLS = 5
+# Fewer valid wells than this: the year cannot be interpolated
+MIN_IDW_WELLS = 3
+
+
+def resolve_year_pairs(columns: List[str], year_pairs: List[Any]) -> List[Tuple[str, List[str], List[str]]]:
+    """
+    Turn the requested year pairs into (label, pre_columns, post_columns).
+
+    Each item can be a year (2015 -> every column containing 'pre' / 'post'
+    and '2015'), a [pre_column, post_column] pair or {"pre": ..., "post": ...}.
+    Raises ValueError naming the first pair that matches no columns.
+    """
+    resolved = []
+    for item in year_pairs:
+        if isinstance(item, dict):
+            pre, post = item.get('pre'), item.get('post')
+            label = item.get('label') or f"{pre}-{post}"
+            pre_cols, post_cols = [pre], [post]
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            pre_cols, post_cols = [item[0]], [item[1]]
+            label = f"{item[0]}-{item[1]}"
+        else:
+            year = str(item).strip()
+            label = year
+            pre_cols = [c for c in columns if 'pre' in c.lower() and re.search(rf"(?<!\d){year}(?!\d)", c)]
+            post_cols = [c for c in columns if 'post' in c.lower() and re.search(rf"(?<!\d){year}(?!\d)", c)]
+
+        missing = [c for c in pre_cols + post_cols if c not in columns]
+        if not pre_cols or not post_cols or missing:
+            raise ValueError(f"Could not resolve pre/post columns for year pair {item!r}")
+        resolved.append((label, pre_cols, post_cols))
+    return resolved
+
+
+def fluctuation_matrix(df: pd.DataFrame, resolved_pairs: List[Tuple[str, List[str], List[str]]]) -> np.ndarray:
+    """(points x years) water fluctuation = mean(pre) - mean(post), NaN where missing"""
+    columns = []
+    for _, pre_cols, post_cols in resolved_pairs:
+        pre = df[pre_cols].apply(pd.to_numeric, errors='coerce').mean(axis=1, skipna=True)
+        post = df[post_cols].apply(pd.to_numeric, errors='coerce').mean(axis=1, skipna=True)
+        columns.append((pre - post).to_numpy(dtype=np.float64))
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+
+def _idw_points(tree: cKDTree, values: np.ndarray, points: np.ndarray, k: int, power: int) -> np.ndarray:
+    """IDW at points from the k nearest of the tree's wells"""
+    dists, idxs = tree.query(points, k=k)
+    if k == 1:
+        dists, idxs = dists[:, None], idxs[:, None]
+    dists[dists == 0] = 1e-10
+    w = 1.0 / (dists ** power)
+    return (w * values[idxs]).sum(axis=1) / w.sum(axis=1)
+
+
+def idw_stack(
+    coords: np.ndarray,
+    values: np.ndarray,
+    bounds: Tuple[float, float, float, float],
+    cell_size: int = 30,
+    power: int = 2,
+    n_neighbors: int = 3,
+    chunk_size: int = 10000
+) -> Tuple[np.ndarray, rasterio.Affine]:
+    """
+    IDW-interpolate every column of values onto one grid in a single sweep.
+
+    The KD-tree and the neighbour query are shared by all years: each grid
+    cell queries n_neighbors * CANDIDATE_FACTOR candidates once, and each year
+    uses its n_neighbors nearest candidates that have a value that year.
+    Cells where too few candidates have a value that year are queried again
+    against that year's valid wells only, so every band follows the
+    single-year "n_neighbors nearest valid wells" rule.
+
+    Returns (stack (years x rows x cols) float32, transform).
+    """
+    minx, miny, maxx, maxy = bounds
+    x_coords = np.arange(minx, maxx, cell_size)
+    y_coords = np.arange(miny, maxy, cell_size)
+    grid_x, grid_y = np.meshgrid(x_coords, y_coords[::-1])
+    xi = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    n_years = values.shape[1]
+    k = int(min(len(coords), n_neighbors * CANDIDATE_FACTOR))
+    tree = cKDTree(coords)
+    valid_values = np.isfinite(values)
+    filled = np.where(valid_values, values, 0.0)
+    need = np.minimum(valid_values.sum(axis=0), n_neighbors)   # wells per cell, per year
+    year_trees = {}
+
+    out = np.empty((n_years, len(xi)), dtype=np.float32)
+    for start in range(0, len(xi), chunk_size):
+        end = min(start + chunk_size, len(xi))
+        dists, idxs = tree.query(xi[start:end], k=k)
+        if k == 1:
+            dists, idxs = dists[:, None], idxs[:, None]
+        dists[dists == 0] = 1e-10
+        base_w = 1.0 / (dists ** power)                      # (cells x k)
+
+        use = valid_values[idxs]                             # (cells x k x years)
+        use &= np.cumsum(use, axis=1) <= n_neighbors
+        w = base_w[:, :, None] * use
+        w_sum = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[:, start:end] = ((w * filled[idxs]).sum(axis=1) / w_sum).T
+
+        deficient = use.sum(axis=1) < need[None, :]           # (cells x years)
+        for year in np.flatnonzero(deficient.any(axis=0)):
+            if need[year] == 0:
+                continue
+            if year not in year_trees:
+                valid = valid_values[:, year]
+                year_trees[year] = (cKDTree(coords[valid]), values[valid, year])
+            cells = np.flatnonzero(deficient[:, year])
+            year_tree, year_values = year_trees[year]
+            out[year, start + cells] = _idw_points(
+                year_tree, year_values, xi[start:end][cells], int(need[year]), power
+            )
+
+    stack = out.reshape(n_years, *grid_x.shape)
+    transform = from_origin(minx, maxy, cell_size, cell_size)
+    return stack, transform
+
+
+def batch_recharge_table(
+    filtered_gdf: gpd.GeoDataFrame,
+    stack: np.ndarray,
+    transform: rasterio.Affine,
+    labels: List[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    One zonal pass over all fluctuation bands.
+
+    Pixels whose centre is outside the selected villages are dropped first
+    (as the single-year flow does by clipping the raster), then every band is
+    reduced per village with all_touched zones.
+
+    Returns (recharge (villages x years), mean fluctuation (villages x years),
+    pixel counts (villages x years)) as DataFrames indexed by village_co.
+    """
+    geometries = list(filtered_gdf.geometry)
+    outside = geometry_mask(
+        [unary_union(geometries)], out_shape=stack.shape[1:], transform=transform, all_touched=False
+    )
+    clipped = np.where(outside[None, :, :], np.nan, stack)
+
+    stats = zonal_stats_array(clipped, transform, geometries, all_touched=True)
+    mean = stats['mean'].T                                   # (villages x years)
+    count = stats['count'].T
+
+    area = pd.to_numeric(filtered_gdf['Shape_Area'], errors='coerce').to_numpy(dtype=np.float64)
+    sy = pd.to_numeric(filtered_gdf['SY'], errors='coerce').to_numpy(dtype=np.float64)
+    recharge = np.where(count > 0, (area * sy)[:, None] * mean / 1000, np.nan)
+
+    # Villages split over several polygons share a code: sum recharge and
+    # pixels per code, and weight the mean fluctuation by pixel count
+    index = pd.Index(filtered_gdf['village_co'].astype(str).to_numpy(), name='village_co')
+    by_code = [
+        pd.DataFrame(a, index=index, columns=labels).groupby(level=0, sort=False).sum(min_count=1)
+        for a in (recharge, mean * count, count)
+    ]
+    recharge_df, weighted_df, count_df = by_code
+    count_df = count_df.fillna(0)
+    return recharge_df, weighted_df / count_df.where(count_df > 0), count_df
+
+
+def village_names(filtered_gdf: gpd.GeoDataFrame) -> pd.Series:
+    """village name per village_co (first polygon's name when a code repeats)"""
+    names = pd.Series(filtered_gdf['village'].to_numpy(), index=filtered_gdf['village_co'].astype(str).to_numpy())
+    return names[~names.index.duplicated()]
+
+
 # ----------------------------------------------------------------------
 # Core Service Class
 # ----------------------------------------------------------------------
@@ -325,12 +486,12 @@ class RechargeService:
 
         buffered = unary_union(filtered.geometry).buffer(5000)
         pts_in = points_gdf[points_gdf.geometry.within(buffered)]
-        if len(pts_in) < 5:
+        if len(pts_in) < BUFFER_MIN_WELLS:
             pts_in = points_gdf
 
         # === 5. Check if we have enough points for IDW ===
         valid_points = pts_in[~pts_in['water_fluctuation'].isna()]
-        if len(valid_points) < 3:
+        if len(valid_points) < MIN_IDW_WELLS:
             # FALLBACK: Use pre-calculated recharge from CSV
             ts = datetime.now().strftime("%Y%m%d_%H%M%S")
             return self._fallback_to_csv_recharge(
@@ -369,8 +530,7 @@ class RechargeService:
         # === 8. Zonal stats ===
         geoms = [r.geometry for _, r in filtered.iterrows()]
         codes = [r['village_co'] for _, r in filtered.iterrows()]
-        chunk = max(10, min(len(geoms) // (multiprocessing.cpu_count() * 2), 200))
-        stats = fast_zonal_stats(geoms, clipped_path, ['mean', 'count', 'min', 'max', 'std', 'median'], chunk_size=chunk)
+        stats = fast_zonal_stats(geoms, clipped_path, ['mean', 'count', 'min', 'max', 'std', 'median'])
 
         # === 9. Recharge ===
         attr_map = {
@@ -436,7 +596,7 @@ class RechargeService:
                 "input_csv": csv_filename,
                 "filter_type": filter_type,
                 "filter_values": filter_vals,
-                "interpolation_method": "ULTRA-OPTIMIZED IDW + Parallel Zonal Stats",
+                "interpolation_method": "ULTRA-OPTIMIZED IDW + Label-Raster Zonal Stats",
                 "recharge_calculation": "recharge = (Shape_Area × SY × mean_water_fluctuation)/1000",
             },
             "output_files": {
@@ -449,6 +609,145 @@ class RechargeService:
         }
 
 
+    # ------------------------------------------------------------------
+    # Batch entry point – many PRE/POST year pairs in one pass
+    # ------------------------------------------------------------------
+    def analyze_batch(
+        self,
+        csv_filename: str,
+        year_pairs: List[Any],
+        selected_villages: Optional[List[str]] = None,
+        selected_subdistricts: Optional[List[int]] = None,
+    ) -> Dict[str, Any]:
+        if not selected_villages and not selected_subdistricts:
+            raise ValueError("Either selectedVillages or selectedSubDistricts must be provided")
+
+        # === 1. Load CSV & fluctuation matrix (wells x years) ===
+        csv_path = os.path.join(self.temp_dir, csv_filename)
+        if not os.path.exists(csv_path):
+            raise ValueError(f"CSV not found: {csv_path}")
+
+        df = pd.read_csv(csv_path, dtype={'LATITUDE': 'float32', 'LONGITUDE': 'float32'})
+        df.columns = df.columns.str.strip()
+        if 'LATITUDE' not in df.columns or 'LONGITUDE' not in df.columns:
+            raise ValueError("Missing LATITUDE/LONGITUDE")
+
+        resolved = resolve_year_pairs(list(df.columns), year_pairs)
+        labels = [label for label, _, _ in resolved]
+        df = df.dropna(subset=['LATITUDE', 'LONGITUDE']).reset_index(drop=True)
+        fluctuation = fluctuation_matrix(df, resolved)
+
+        # === 2. Load & filter shapefile ===
+        shp_path = os.path.join(self.media_root, "gwa_data", "gwa_shp", "Final_Village", "Village_PET_PE_SY_Crop.shp")
+        if not os.path.exists(shp_path):
+            raise ValueError(f"Shapefile missing: {shp_path}")
+
+        gdf = gpd.read_file(shp_path)
+        required = ['village_co', 'SUBDIS_COD', 'village', 'SY', 'Shape_Area']
+        missing = [c for c in required if c not in gdf.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+
+        if selected_villages:
+            gdf['village_co'] = gdf['village_co'].astype(str)
+            filtered = gdf[gdf['village_co'].isin(selected_villages)].copy()
+            filter_type, filter_vals = "villages", selected_villages
+        else:
+            gdf['SUBDIS_COD'] = pd.to_numeric(gdf['SUBDIS_COD'], errors='coerce')
+            filtered = gdf[gdf['SUBDIS_COD'].isin(selected_subdistricts)].copy()
+            filter_type, filter_vals = "subdistricts", selected_subdistricts
+
+        if filtered.empty:
+            raise ValueError(f"No villages for {filter_type}: {filter_vals}")
+        if filtered.crs != 'EPSG:32644':
+            filtered = filtered.to_crs('EPSG:32644')
+
+        # === 3. Wells in buffer (same rule as analyze) ===
+        points_gdf = gpd.GeoDataFrame(
+            df,
+            geometry=[Point(xy) for xy in zip(df['LONGITUDE'], df['LATITUDE'])],
+            crs='EPSG:4326'
+        ).to_crs('EPSG:32644')
+        inside = points_gdf.geometry.within(unary_union(filtered.geometry).buffer(5000)).to_numpy()
+        if inside.sum() < BUFFER_MIN_WELLS:
+            inside[:] = True
+
+        keep = inside & np.isfinite(fluctuation).any(axis=1)
+        coords = np.column_stack([points_gdf.geometry.x.to_numpy(), points_gdf.geometry.y.to_numpy()])[keep]
+        values = fluctuation[keep]
+
+        wells_per_year = np.isfinite(values).sum(axis=0)
+        skipped = [label for label, n in zip(labels, wells_per_year) if n < MIN_IDW_WELLS]
+        values[:, wells_per_year < MIN_IDW_WELLS] = np.nan
+        if len(skipped) == len(labels):
+            raise ValueError(f"No year pair has at least {MIN_IDW_WELLS} valid wells for interpolation")
+
+        # === 4. One IDW stack, one zonal pass ===
+        stack, transform = idw_stack(coords, values, filtered.total_bounds, cell_size=30, power=2, n_neighbors=3)
+        recharge_df, fluctuation_df, count_df = batch_recharge_table(filtered, stack, transform, labels)
+
+        # === 5. Outputs ===
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        raster_name = f"water_fluctuation_idw_batch_{ts}.tif"
+        raster_path = os.path.join(self.temp_dir, raster_name)
+        with rasterio.open(
+            raster_path, "w", driver="GTiff", height=stack.shape[1], width=stack.shape[2], count=stack.shape[0],
+            dtype=rasterio.float32, crs=CRS.from_epsg(32644), transform=transform,
+            nodata=np.nan, compress='lzw', tiled=True, blockxsize=256, blockysize=256
+        ) as dst:
+            dst.write(stack)
+            for band, label in enumerate(labels, start=1):
+                dst.set_band_description(band, str(label))
+
+        names = village_names(filtered)
+        table = recharge_df.copy()
+        table.insert(0, 'village', names.reindex(table.index).to_numpy())
+        csv_out = f"village_wise_groundwater_recharge_batch_{ts}.csv"
+        csv_out_path = os.path.join(self.temp_dir, csv_out)
+        table.to_csv(csv_out_path)
+
+        village_rows = [
+            {
+                "village_co": code,
+                "village": names.get(code),
+                "recharge": {label: safe_float(recharge_df.at[code, label]) for label in labels},
+                "mean_water_fluctuation": {label: safe_float(fluctuation_df.at[code, label]) for label in labels},
+                "pixel_count": {label: int(count_df.at[code, label]) for label in labels},
+            }
+            for code in recharge_df.index
+        ]
+
+        yearly_summary = {
+            label: {
+                "wells_used": int(wells_per_year[i]),
+                "villages_with_data": int((count_df[label] > 0).sum()),
+                "total_recharge_mcm": round(float(np.nansum(recharge_df[label].to_numpy())) / 1_000_000, 4),
+            }
+            for i, label in enumerate(labels)
+        }
+
+        return {
+            "success": True,
+            "message": f"Batch analysis complete for {len(labels) - len(skipped)}/{len(labels)} year pairs.",
+            "metadata": {
+                "processing_timestamp": datetime.now().isoformat(),
+                "input_csv": csv_filename,
+                "filter_type": filter_type,
+                "filter_values": filter_vals,
+                "year_pairs": labels,
+                "skipped_year_pairs": skipped,
+                "interpolation_method": "Shared-neighbour IDW stack + single zonal pass",
+                "recharge_calculation": "recharge = (Shape_Area × SY × mean_water_fluctuation)/1000",
+            },
+            "output_files": {
+                "interpolated_raster_stack": {"filename": raster_name, "path": raster_path, "size_bytes": os.path.getsize(raster_path), "bands": labels},
+                "village_results_csv": {"filename": csv_out, "path": csv_out_path, "size_bytes": os.path.getsize(csv_out_path)},
+            },
+            "yearly_summary": yearly_summary,
+            "village_wise_results": village_rows,
+        }
+
+
 # ----------------------------------------------------------------------
 # JSON-safe helpers
 # ----------------------------------------------------------------------
@@ -1,8 +1,11 @@
 import os
+import threading
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
 from fastapi import HTTPException
 from pydantic import BaseModel
 from app.core.config import settings
@@ -15,119 +18,146 @@ class GSRVillage(BaseModel):
     total_demand: float
 
 
-class StressIdentificationService:
-    
-
-    shapefile_path: Optional[str] = None
-    shapefile_map: Dict[str, float] = {}
-
-    def load_shapefile(self) -> None:
-        """Load shapefile once and store mapping {village_co: injection}."""
-        try:
-            if not self.shapefile_path:
-                media_dir = os.path.join(settings.BASE_DIR, "media")
-                self.shapefile_path = os.path.join(
-                    media_dir,
-                    "gwa_data",
-                    "gwa_shp",
-                    "Final_Village",
-                    "Injection_Water_Need.shp",
-                )
-
-            if not os.path.exists(self.shapefile_path):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Shapefile not found at {self.shapefile_path}",
-                )
-
-            gdf = gpd.read_file(self.shapefile_path)
-
-            if "village_co" not in gdf.columns or "Injection_" not in gdf.columns:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Shapefile missing required fields: village_co / Injection_",
-                )
-
-            gdf["village_co"] = gdf["village_co"].astype(str).str.strip()
-
-            mapping = {}
-            for _, row in gdf.iterrows():
-                key = row["village_co"]
-                try:
-                    val = float(row.get("Injection_", 0) or 0)
-                except:
-                    val = 0.0
-                mapping[key] = val
-
-            self.shapefile_map = mapping
-            print(f"Loaded shapefile — {len(mapping)} villages")
-
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error loading shapefile: {str(e)}")
+_injection_cache: Dict[str, Any] = {}
+_injection_lock = threading.Lock()
 
-    def compute_stress(
-        self,
-        gsr_data: List[Dict[str, Any]],
-        years_count: int,
-    ) -> Dict[str, Any]:
 
-        if years_count <= 0:
-            raise HTTPException(status_code=400, detail="years_count must be > 0")
+def injection_shapefile_path() -> str:
+    return os.path.join(
+        settings.BASE_DIR, "media", "gwa_data", "gwa_shp", "Final_Village", "Injection_Water_Need.shp"
+    )
 
-        if not self.shapefile_map:
-            self.load_shapefile()
 
-        stress_results = []
-        villages_processed = 0
-        villages_with_injection = 0
+def load_injection_layer() -> gpd.GeoDataFrame:
+    """
+    Injection village layer indexed by village_co with a float 'injection'
+    column, held per process and reloaded only when the shapefile changes.
+    """
+    shapefile_path = injection_shapefile_path()
+    if not os.path.exists(shapefile_path):
+        raise HTTPException(status_code=400, detail=f"Shapefile not found at {shapefile_path}")
 
-        for row in gsr_data:
-            village_code = str(row.get("village_code", "")).strip()
+    mtime = os.path.getmtime(shapefile_path)
+    with _injection_lock:
+        cached = _injection_cache.get(shapefile_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-            if not village_code:
-                continue
-            if village_code not in self.shapefile_map:
-                continue
+        gdf = gpd.read_file(shapefile_path)
+        if "village_co" not in gdf.columns or "Injection_" not in gdf.columns:
+            raise HTTPException(
+                status_code=400,
+                detail="Shapefile missing required fields: village_co / Injection_",
+            )
 
-            recharge = float(row.get("recharge", 0) or 0)
-            demand = float(row.get("total_demand", 0) or 0)
-            village_name = row.get("village_name", "Unknown")
+        gdf["village_co"] = gdf["village_co"].astype(str).str.strip()
+        gdf["injection"] = pd.to_numeric(gdf["Injection_"], errors="coerce").fillna(0.0).astype(np.float64)
+        gdf = gdf.drop_duplicates("village_co", keep="last").set_index("village_co")
 
-            injection = self.shapefile_map.get(village_code, 0)
-            if injection > 0:
-                villages_with_injection += 1
+        _injection_cache[shapefile_path] = (mtime, gdf)
+        print(f"Loaded shapefile — {len(gdf)} villages")
+        return gdf
 
-            stress = (max(recharge - demand, 0) + (injection / years_count)) / 1000
 
-            stress_results.append(
-                {
-                    "village_code": village_code,
-                    "village_name": village_name,
-                    "recharge": round(recharge, 4),
-                    "total_demand": round(demand, 4),
-                    "injection": round(injection, 4) / 1000,
-                    "years_count": years_count,
-                    "stress_value": round(stress, 2),
-                }
-            )
-
-            villages_processed += 1
+class StressIdentificationService:
 
+    def score(self, gsr_data: List[Dict[str, Any]], years_counts: List[int]) -> Dict[str, Any]:
+        """
+        Vectorized stress for every submitted village and years_count scenario:
+        (max(recharge - demand, 0) + injection / years) / 1000
+        """
+        for years_count in years_counts:
+            if years_count <= 0:
+                raise HTTPException(status_code=400, detail="years_count must be > 0")
+
+        layer = load_injection_layer()
+        frame = pd.DataFrame.from_records(gsr_data)
+        # Per record: a column with a missing code is float and would give "123.0"
+        codes = pd.Series([str(row.get("village_code", "")).strip() for row in gsr_data], index=frame.index)
+        keep = ((codes != "") & codes.isin(layer.index)).to_numpy()
+
+        def column(name):
+            if name not in frame.columns:
+                return np.zeros(len(frame))
+            return pd.to_numeric(frame[name], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+
+        codes = codes[keep].to_numpy(dtype=str)
+        recharge = column("recharge")[keep]
+        demand = column("total_demand")[keep]
+        names = (
+            frame["village_name"].fillna("Unknown") if "village_name" in frame.columns
+            else pd.Series("Unknown", index=frame.index)
+        )[keep].to_numpy()
+        injection = layer["injection"].reindex(codes).to_numpy(dtype=np.float64)
+
+        years = np.asarray(years_counts, dtype=np.float64)
+        stress = (np.maximum(recharge - demand, 0)[:, None] + injection[:, None] / years[None, :]) / 1000
+
+        rows = pd.DataFrame({
+            "village_code": codes,
+            "village_name": names,
+            "recharge": np.round(recharge, 4),
+            "total_demand": np.round(demand, 4),
+            "injection": np.round(injection, 4) / 1000,
+        })
+        with_injection = int((injection > 0).sum())
         summary = {
-            "total_villages_processed": villages_processed,
-            "villages_with_injection_data": villages_with_injection,
-            "villages_without_injection_data": villages_processed - villages_with_injection,
-            "years_count_used": years_count,
-            "shapefile_villages_available": len(self.shapefile_map),
+            "total_villages_processed": len(rows),
+            "villages_with_injection_data": with_injection,
+            "villages_without_injection_data": len(rows) - with_injection,
+            "shapefile_villages_available": len(layer),
             "gsr_input_villages": len(gsr_data),
         }
+        return {"rows": rows, "stress": np.round(stress, 2), "summary": summary}
+
+    def compute_stress(
+        self,
+        gsr_data: List[Dict[str, Any]],
+        years_count: int,
+    ) -> Dict[str, Any]:
+
+        scored = self.score(gsr_data, [years_count])
+        rows = scored["rows"]
+        rows["years_count"] = years_count
+        rows["stress_value"] = scored["stress"][:, 0]
+
+        summary = scored["summary"]
+        summary["years_count_used"] = years_count
 
         return {
             "success": True,
-            "data": stress_results,
-            "message": f"Stress values computed for {len(stress_results)} villages",
+            "data": rows.to_dict("records"),
+            "message": f"Stress values computed for {len(rows)} villages",
             "years_count": years_count,
-            "total_villages": len(stress_results),
+            "total_villages": len(rows),
+            "summary_stats": summary,
+            "computed_at": datetime.now().isoformat(),
+        }
+
+    def compute_stress_batch(
+        self,
+        gsr_data: List[Dict[str, Any]],
+        years_counts: List[int],
+    ) -> Dict[str, Any]:
+        """Every years_count scenario in one pass; stress_values keyed by years_count"""
+        years_counts = list(dict.fromkeys(years_counts))
+        if not years_counts:
+            raise HTTPException(status_code=400, detail="years_counts must not be empty")
+
+        scored = self.score(gsr_data, years_counts)
+        records = scored["rows"].to_dict("records")
+        for record, values in zip(records, scored["stress"].tolist()):
+            record["stress_values"] = {str(y): v for y, v in zip(years_counts, values)}
+
+        summary = scored["summary"]
+        summary["years_counts_used"] = years_counts
+
+        return {
+            "success": True,
+            "data": records,
+            "message": f"Stress values computed for {len(records)} villages for {len(years_counts)} scenarios",
+            "years_counts": years_counts,
+            "total_villages": len(records),
             "summary_stats": summary,
             "computed_at": datetime.now().isoformat(),
         }